@@ -3,6 +3,7 @@
 import os
 import sys
 import json
+import asyncio
 import logging
 import subprocess
 import traceback
@@ -13,10 +14,16 @@ import requests # Đảm bảo import requests
 # --- Real Imports ---
 # Giả sử các import này hoạt động đúng dựa trên cấu trúc project của bạn
 # và PYTHONPATH đã được thiết lập chính xác trong Dockerfile.
-from src.core.config_loader import load_config, Config
+from src.core.config_loader import load_config, parse_ollama_endpoints, Config
 from src.core.sarif_generator import SarifGenerator
 from src.core.shared_context import SharedReviewContext, ChangedFile
-from src.orchestrator.graph_definition import get_compiled_graph
+from src.core.diff_parser import parse_unified_diff, parse_raw_diff_status, get_hunk_context_lines, DEFAULT_HUNK_CONTEXT_LINES
+from src.core.git_blob_reader import GitBlobReader
+from src.core.llm_cache import get_llm_response_cache
+from src.core.tool_cache import get_tool_result_cache
+from src.core.ollama_balancer import get_ollama_endpoint_balancer
+from src.core.model_warmup import start_model_warmup
+from src.orchestrator.graph_definition import get_compiled_graph, is_async_pipeline_enabled, get_run_models, get_preload_models
 from src.orchestrator.state import GraphState
 
 # Cấu hình logging cơ bản
@@ -78,14 +85,29 @@ def set_action_output_env_file(name: str, value: Any): # Chấp nhận Any, sẽ
         print(f"::set-output name={name}::{escaped_value_for_set_output}")
 
 
+def _decode_blob_content(file_path: str, data: bytes) -> Optional[str]:
+    """Giải mã nội dung blob; None với file nhị phân, ký tự UTF-8 lỗi được thay thế (có log) thay vì bỏ qua file."""
+    if b"\0" in data[:8000]:
+        logger.info(f"Changed file '{file_path}' looks binary, skipping content review.")
+        return None
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as e:
+        logger.warning(f"Changed file '{file_path}' is not valid UTF-8 ({e}); undecodable bytes are replaced.")
+        return data.decode("utf-8", errors="replace")
+
+
 def get_changed_files(
     workspace_path: Path, 
     head_sha: str, 
-    base_sha: Optional[str]
+    base_sha: Optional[str],
+    context_lines: int = DEFAULT_HUNK_CONTEXT_LINES
 ) -> List[ChangedFile]:
     """
-    Lấy danh sách file thay đổi giữa base_sha và head_sha,
-    và đọc nội dung của chúng.
+    Lấy danh sách file thay đổi giữa base_sha và head_sha cùng trạng thái (rename/delete, `-M`),
+    blob id và các hunk của chúng trong một lệnh `git diff --raw -p -U<context_lines>` duy nhất,
+    rồi đọc nội dung tại head_sha của mọi file qua một tiến trình `git cat-file --batch`.
+    File bị xóa được bỏ qua; file chỉ đổi tên (không đổi nội dung) được đánh dấu để không review.
     """
     changed_files_data: List[ChangedFile] = []
     
@@ -104,41 +126,56 @@ def get_changed_files(
         subprocess.run(safe_dir_cmd, check=True, cwd=workspace_path, capture_output=True, text=True)
         logger.info(f"Set safe.directory for {workspace_path} inside container.")
 
-        diff_command = ["git", "diff", "--name-only", base_sha, head_sha]
+        # Một lệnh diff cho trạng thái + blob id (--raw, như --name-status -M) lẫn hunk (-p);
+        # quotepath=off để path unicode không bị quote
+        diff_command = [
+            "git", "-c", "core.quotepath=off", "diff", "-M", "--raw", "--no-abbrev", "-p", f"-U{context_lines}",
+            "--no-color", "--no-ext-diff", base_sha, head_sha
+        ]
         logger.info(f"Running git diff command using SHAs: {' '.join(diff_command)}")
         
-        result = subprocess.run(diff_command, capture_output=True, text=True, cwd=workspace_path, check=False)
+        result = subprocess.run(diff_command, capture_output=True, text=True, encoding="utf-8", errors="replace", cwd=workspace_path, check=False)
 
         if result.returncode != 0:
             logger.error(f"Git diff command failed (code {result.returncode}) when diffing {base_sha}..{head_sha}.")
-            logger.error(f"Stdout: {result.stdout.strip()}")
+            logger.error(f"Stdout: {result.stdout.strip()[:2000]}")
             logger.error(f"Stderr: {result.stderr.strip()}")
             logger.error("Ensure both commit SHAs exist in the local repository history (fetch-depth: 0 might be needed in checkout action).")
             raise RuntimeError(f"git diff failed between {base_sha} and {head_sha}. Stderr: {result.stderr.strip()}")
             
-        changed_file_paths_str = result.stdout.strip()
-        if not changed_file_paths_str:
+        file_statuses = parse_raw_diff_status(result.stdout)
+        if not file_statuses:
             logger.info(f"Git diff between {base_sha} and {head_sha} returned no changed file paths.")
             return [] # Không có file thay đổi là một kịch bản hợp lệ
-            
-        changed_file_paths = [p for p in changed_file_paths_str.split('\n') if p] # Lọc dòng rỗng
-        logger.info(f"Changed files found between SHAs: {changed_file_paths}")
-
-        for file_path_str in changed_file_paths:
-            full_file_path = (workspace_path / file_path_str).resolve()
-            if full_file_path.is_file(): 
-                try:
-                    content = full_file_path.read_text(encoding='utf-8')
-                    # Lưu đường dẫn tương đối với workspace_path
-                    relative_path_str = str(Path(file_path_str)) 
-                    changed_files_data.append(ChangedFile(path=relative_path_str, content=content))
-                    logger.debug(f"Read content for changed file: {relative_path_str}")
-                except Exception as e:
-                    logger.warning(f"Could not read file {full_file_path} (relative: {file_path_str}): {e}")
-            elif full_file_path.exists():
-                logger.info(f"Changed path '{file_path_str}' exists but is not a file (e.g., a directory or submodule), skipping content read.")
+        hunks_by_path = parse_unified_diff(result.stdout)
+        logger.info(f"Changed files found between SHAs: {[f'{s.change_type}:{s.path}' for s in file_statuses]}")
+
+        reviewable_statuses = []
+        for file_status in file_statuses:
+            if file_status.change_type == "deleted":
+                logger.info(f"Changed path '{file_status.path}' was deleted, skipping content read.")
+            elif not file_status.is_regular_file:
+                logger.info(f"Changed path '{file_status.path}' is not a regular file (mode {file_status.new_mode}, e.g. a symlink or submodule), skipping content read.")
             else:
-                logger.info(f"Changed path '{file_path_str}' not found (likely deleted or renamed without follow), skipping content read.")
+                reviewable_statuses.append(file_status)
+
+        with GitBlobReader(workspace_path) as blob_reader:
+            blobs = blob_reader.read_blobs([s.new_blob for s in reviewable_statuses if s.new_blob])
+
+        for file_status in reviewable_statuses:
+            data = blobs.get(file_status.new_blob) if file_status.new_blob else None
+            if data is None:
+                logger.warning(f"Could not read blob {file_status.new_blob} for changed file '{file_status.path}'.")
+                continue
+            content = _decode_blob_content(file_status.path, data)
+            if content is None:
+                continue
+            changed_files_data.append(ChangedFile(
+                path=str(Path(file_status.path)), content=content,
+                diff_hunks=hunks_by_path.get(file_status.path, []),
+                change_type=file_status.change_type, old_path=file_status.old_path, similarity=file_status.similarity
+            ))
+            logger.debug(f"Read content for changed file: {file_status.path}")
     except FileNotFoundError as fnf_err: # Lỗi nếu git không được cài
         logger.error(f"Git command not found. Ensure git is installed in the Docker image: {fnf_err}")
         raise
@@ -201,9 +238,12 @@ def main():
         # 1. Đọc inputs
         github_token = get_env_input("github_token", required=True)
         ollama_base_url = get_env_input("ollama_base_url", required=True, default="http://localhost:11434")
+        ollama_endpoints_str = get_env_input("ollama_endpoints", required=False) # Các endpoint thêm, phân tách bằng dấu phẩy/xuống dòng
         project_config_path_str = get_env_input("project_config_path", required=False)
         sarif_output_filename = get_env_input("sarif_output_file", required=False, default="novaguard-report.sarif")
         fail_on_severity_str = get_env_input("fail_on_severity", required=False, default="none").lower()
+        llm_cache_path_str = get_env_input("llm_cache_path", required=False)
+        llm_cache_bypass = get_env_input("llm_cache_bypass", required=False, default="false").lower() == "true"
 
         # 2. Lấy ngữ cảnh GitHub
         github_event_path_str = os.environ.get("GITHUB_EVENT_PATH")
@@ -260,13 +300,28 @@ def main():
             default_config_dir=default_config_dir,
             project_config_dir_str=project_config_path_str, # Có thể là None
             ollama_base_url=str(ollama_base_url),
-            workspace_path=workspace_path
+            workspace_path=workspace_path,
+            ollama_endpoints=parse_ollama_endpoints(ollama_endpoints_str or "")
         )
+        # Đường dẫn cache LLM tương đối được tính từ workspace
+        llm_cache_path = Path(llm_cache_path_str or config_obj.get_llm_cache_setting("path") or ".novaguard_cache/llm_responses.sqlite")
+        config_obj.llm_cache_config["path"] = str(llm_cache_path if llm_cache_path.is_absolute() else (workspace_path / llm_cache_path).resolve())
+        if llm_cache_bypass:
+            config_obj.llm_cache_config["bypass"] = True
+        # Cache kết quả tool Tier 1 cũng tính từ workspace
+        tool_cache_path = Path(config_obj.get_tool_cache_setting("path") or ".novaguard_cache/tool_results.sqlite")
+        config_obj.tool_cache_config["path"] = str(tool_cache_path if tool_cache_path.is_absolute() else (workspace_path / tool_cache_path).resolve())
+        # Kiểm tra và load sẵn các model lần chạy này dùng, trong nền, song song với git diff và Tier 1
+        run_models = get_run_models(config_obj)
+        model_warmup = start_model_warmup(config_obj, models=run_models, preload_models=get_preload_models(config_obj, run_models))
 
         # 4. Lấy Code Changes
         changed_files: List[ChangedFile] = []
         if github_base_sha_to_diff and github_head_sha_to_diff:
-            changed_files = get_changed_files(workspace_path, github_head_sha_to_diff, github_base_sha_to_diff)
+            changed_files = get_changed_files(
+                workspace_path, github_head_sha_to_diff, github_base_sha_to_diff,
+                context_lines=get_hunk_context_lines(config_obj)
+            )
         else:
             logger.warning("Base SHA or Head SHA for diffing is unavailable. No files will be analyzed for changes.")
             final_error_messages.append("Could not determine base and head commits for diffing. Analysis skipped.")
@@ -299,9 +354,28 @@ def main():
         logger.info(f"Initial graph input prepared with {len(changed_files)} files for review.")
 
         # 7. Chạy Orchestrator Graph
-        logger.info("Invoking the review orchestrator graph...")
-        final_state_from_graph: Optional[GraphState] = orchestrator_app.invoke(initial_graph_input) # type: ignore
+        if is_async_pipeline_enabled(config_obj):
+            # Các LLM call của mọi agent chạy chồng lên nhau trên một event loop
+            logger.info("Invoking the review orchestrator graph asynchronously (ainvoke)...")
+            final_state_from_graph: Optional[GraphState] = asyncio.run(orchestrator_app.ainvoke(initial_graph_input)) # type: ignore
+        else:
+            logger.info("Invoking the review orchestrator graph...")
+            final_state_from_graph = orchestrator_app.invoke(initial_graph_input) # type: ignore
         
+        llm_response_cache = get_llm_response_cache(config_obj)
+        if llm_response_cache:
+            llm_response_cache.log_stats()
+        tool_result_cache = get_tool_result_cache(config_obj)
+        if tool_result_cache:
+            tool_result_cache.log_stats()
+        if model_warmup:
+            model_warmup.wait(timeout=5)
+            final_error_messages.extend(msg for msg in model_warmup.missing_model_messages() if msg not in final_error_messages)
+        ollama_balancer = get_ollama_endpoint_balancer(config_obj)
+        if ollama_balancer:
+            ollama_balancer.log_stats()
+            ollama_balancer.stop()
+
         if final_state_from_graph:
             final_error_messages.extend(err for err in final_state_from_graph.get("error_messages", []) if err not in final_error_messages)
             final_sarif_report_object = final_state_from_graph.get("final_sarif_report")
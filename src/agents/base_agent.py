@@ -1,28 +1,469 @@
 # NOVAGUARD-AI/src/agents/base_agent.py
+import json
+import asyncio
 import logging
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Type
 from ..core.config_loader import Config
 from ..core.ollama_client import OllamaClientWrapper
-from ..core.prompt_manager import PromptManager
+from ..core.prompt_manager import (
+    PromptManager, PROMPT_LAYOUT_SHARED_PREFIX, SHARED_CONTEXT_PROMPT_NAME, SHARED_PREFIX_SYSTEM_MESSAGE, get_prompt_layout,
+)
+from ..core.context_window import ContextWindowManager
+from ..core.json_stream import JsonListStreamParser
+from ..core.json_recovery import (
+    JSON_REPAIR_SYSTEM_MESSAGE, JsonRepairSettings, acquire_json_repair, build_json_repair_prompt, is_cut_off_json, recover_json,
+)
+from .finding_schema import LLMFinding, findings_response_schema, structured_output_instructions, validate_findings
 from ..core.shared_context import ChangedFile, SharedReviewContext
+from ..core.diff_parser import get_review_scope, build_hunk_excerpt, REVIEW_SCOPE_HUNKS
 
 logger = logging.getLogger(__name__)
 
+# Tham số do agent quyết định, không được ghi đè bằng section `generation` của models.yml
+_RESERVED_REQUEST_KEYS = ("model_name", "prompt", "system_message_content", "is_json_mode")
+# Key của section `generation` do agent dùng, không gửi cho Ollama
+_AGENT_OPTION_KEYS = ("stream_findings", "max_findings", "structured_output")
+
 class BaseAgent:
+    """
+    Base class for the file-level review agents.
+
+    `review()` (sync) and `areview()` (async) share the same per-file flow:
+    `_prepare_file_request()` builds the LLM request for one file, the request is sent
+    with `OllamaClientWrapper.invoke`/`ainvoke`, each item of the JSON list returned by the LLM
+    is validated against `finding_model`, and `_format_llm_finding()` converts it into a finding dict.
+    Subclasses implement those two hooks (or override `review` entirely).
+    Requests built with `_build_llm_request()` carry the agent's generation options from
+    models.yml and are fitted to the model context window (`num_ctx` sized per request,
+    see `ContextWindowManager`). With `structured_output` the request carries the JSON Schema of
+    `finding_model` as Ollama's `format` and short output instructions derived from it instead of
+    the prompt's `output_format_instructions`.
+    With `stream_findings` in the agent's generation options the response is parsed while it
+    streams (`JsonListStreamParser`), and the generation is stopped once `max_findings` findings
+    were read or the output can no longer become valid JSON.
+    Malformed JSON is recovered locally (`recover_json`); only when that fails the model is asked
+    once to repair its response, within the per-run `json_repair` budget.
+    """
+    # Shape of one finding object returned by the LLM (structured-output schema and validation)
+    finding_model: Type[LLMFinding] = LLMFinding
+    # Keys under which an LLM may nest the findings list when it returns a JSON object
+    # (only needed for unconstrained output; structured output always uses "findings")
+    response_list_keys: List[str] = ["findings", "results"]
+
     def __init__(self, agent_name: str, config: Config, ollama_client: OllamaClientWrapper, prompt_manager: PromptManager):
         self.agent_name = agent_name
         self.config = config
         self.ollama_client = ollama_client
         self.prompt_manager = prompt_manager
+        self.context_window = ContextWindowManager.from_config(config)
         logger.info(f"{self.agent_name} initialized.")
 
-    def review(self, 
-                files_data: List[ChangedFile], 
+    def review(self,
+                files_data: List[ChangedFile],
                 tier1_tool_results: Optional[Dict[str, Any]] = None, # Thêm cho các agent cần
                 pr_context: Optional[SharedReviewContext] = None) -> List[Dict[str, Any]]:
+        """Reviews the files one LLM call at a time and returns all findings."""
+        logger.info(f"<{self.agent_name}> Starting review for {len(files_data)} files.")
+        all_findings: List[Dict[str, Any]] = []
+        relevant_files = self._get_relevant_files(files_data)
+        if not relevant_files:
+            logger.info(f"<{self.agent_name}> No files match supported languages. Skipping review.")
+            return all_findings
+
+        for file_data in relevant_files:
+            request = self._prepare_file_request(file_data, tier1_tool_results, pr_context)
+            if request is None:
+                continue
+            try:
+                logger.info(f"<{self.agent_name}> Invoking LLM '{request['model_name']}' for {file_data.path}.")
+                findings_parser = self._new_findings_parser()
+                response_text = self.ollama_client.invoke(**request, stream_monitor=findings_parser)
+                llm_findings_list = self._parse_llm_response(file_data, request, response_text, findings_parser)
+                if llm_findings_list is None:
+                    llm_findings_list = self._repair_llm_response(request, response_text, file_data.path) or []
+                all_findings.extend(self._format_llm_findings(file_data, llm_findings_list))
+            except Exception as e:
+                logger.error(f"<{self.agent_name}> Error during LLM interaction or processing for {file_data.path}: {e}", exc_info=True)
+        logger.info(f"<{self.agent_name}> Review completed. Total findings: {len(all_findings)}.")
+        return all_findings
+
+    async def areview(self,
+                files_data: List[ChangedFile],
+                tier1_tool_results: Optional[Dict[str, Any]] = None,
+                pr_context: Optional[SharedReviewContext] = None,
+                request_semaphore: Optional[asyncio.Semaphore] = None) -> List[Dict[str, Any]]:
+        """
+        Async variant of `review()`: the LLM calls for all files overlap on the running
+        event loop (bounded by `request_semaphore` if given). Findings keep file order.
+        """
+        logger.info(f"<{self.agent_name}> Starting async review for {len(files_data)} files.")
+        relevant_files = self._get_relevant_files(files_data)
+        if not relevant_files:
+            logger.info(f"<{self.agent_name}> No files match supported languages. Skipping review.")
+            return []
+
+        requests = [(file_data, self._prepare_file_request(file_data, tier1_tool_results, pr_context)) for file_data in relevant_files]
+
+        async def _areview_file(file_data: ChangedFile, request: Dict[str, Any]) -> List[Dict[str, Any]]:
+            try:
+                logger.info(f"<{self.agent_name}> Asynchronously invoking LLM '{request['model_name']}' for {file_data.path}.")
+                findings_parser = self._new_findings_parser()
+                response_text = await self._ainvoke(request, request_semaphore, stream_monitor=findings_parser)
+                llm_findings_list = self._parse_llm_response(file_data, request, response_text, findings_parser)
+                if llm_findings_list is None:
+                    llm_findings_list = await self._arepair_llm_response(request, response_text, file_data.path, request_semaphore=request_semaphore) or []
+                return self._format_llm_findings(file_data, llm_findings_list)
+            except Exception as e:
+                logger.error(f"<{self.agent_name}> Error during async LLM interaction or processing for {file_data.path}: {e}", exc_info=True)
+                return []
+
+        per_file_findings = await asyncio.gather(*[
+            _areview_file(file_data, request) for file_data, request in requests if request is not None
+        ])
+        all_findings = [finding for file_findings in per_file_findings for finding in file_findings]
+        logger.info(f"<{self.agent_name}> Async review completed. Total findings: {len(all_findings)}.")
+        return all_findings
+
+    def _prepare_file_request(
+        self,
+        file_data: ChangedFile,
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Builds the keyword arguments for `OllamaClientWrapper.invoke` for one file
+        (model_name, prompt, system_message_content, is_json_mode, temperature, ...),
+        or returns None to skip the file.
+        """
         # This method should be overridden by subclasses
         raise NotImplementedError(f"Review method not implemented for {self.agent_name}")
 
+    def _format_llm_finding(self, file_data: ChangedFile, llm_finding: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Converts one finding object returned by the LLM into a standard finding dict."""
+        raise NotImplementedError(f"Finding formatting not implemented for {self.agent_name}")
+
+    async def _ainvoke(self, request: Dict[str, Any], request_semaphore: Optional[asyncio.Semaphore], **kwargs: Any) -> str:
+        """`OllamaClientWrapper.ainvoke`, bounded by `request_semaphore` if given."""
+        if request_semaphore is None:
+            return await self.ollama_client.ainvoke(**request, **kwargs)
+        async with request_semaphore:
+            return await self.ollama_client.ainvoke(**request, **kwargs)
+
+    def _parse_llm_response(
+        self,
+        file_data: ChangedFile,
+        request: Dict[str, Any],
+        response_text: str,
+        findings_parser: Optional[JsonListStreamParser] = None
+    ) -> Optional[List[Any]]:
+        """Logs the exchange and extracts the findings list of the LLM response for one file; None if it is not (recoverable) JSON."""
+        # --- DEBUG LOG ---
+        logger.info(f"<{self.agent_name}>:\n>>> START PROMPT <<<\n{request['prompt'].strip()}\n>>> END PROMPT <<<")
+        logger.info(f"<{self.agent_name}> RAW LLM RESPONSE for {file_data.path}:\n>>> START LLM RESPONSE <<<\n{response_text.strip()}\n>>> END LLM RESPONSE <<<")
+        return self._findings_list_from_response(response_text, findings_parser, file_data.path)
+
+    def _format_llm_findings(self, file_data: ChangedFile, llm_findings_list: List[Any]) -> List[Dict[str, Any]]:
+        """Validates the findings returned by the LLM for one file against `finding_model` and formats them."""
+        findings: List[Dict[str, Any]] = []
+        for llm_finding in validate_findings(llm_findings_list, self.finding_model, f"<{self.agent_name}> {file_data.path}"):
+            finding = self._format_llm_finding(file_data, llm_finding)
+            if finding is not None:
+                findings.append(finding)
+        logger.info(f"<{self.agent_name}> LLM processing yielded {len(findings)} findings for {file_data.path}.")
+        return findings
+
+    def _new_findings_parser(self) -> Optional[JsonListStreamParser]:
+        """Incremental parser for one response, or None when `stream_findings` is off."""
+        if self._agent_option("stream_findings") is not True:
+            return None
+        max_findings = self._agent_option("max_findings")
+        if not isinstance(max_findings, int) or isinstance(max_findings, bool) or max_findings <= 0:
+            max_findings = None
+        return JsonListStreamParser(list_keys=self.response_list_keys, max_items=max_findings)
+
+    def _findings_list_from_response(
+        self,
+        response_text: str,
+        findings_parser: Optional[JsonListStreamParser],
+        context_label: str,
+        allow_partial: bool = True
+    ) -> Optional[List[Any]]:
+        """
+        Extracts the list of findings from a JSON-mode LLM response (already streamed into
+        `findings_parser`, if any). Valid JSON goes through `_findings_list_from_json()`; malformed JSON
+        is recovered with `recover_json()` (code fences, trailing commas, single quotes, complete items
+        of a cut-off list). Returns None when nothing could be recovered, so the caller may ask the
+        model to repair it. With `allow_partial=False` a truncated response also yields None.
+        """
+        if findings_parser is not None and not findings_parser.consumed: # Response từ LLM cache: chưa đi qua parser
+            findings_parser.feed(response_text)
+        stripped_response_text = response_text.strip()
+        if not stripped_response_text:
+            logger.warning(f"<{self.agent_name}> LLM returned empty or whitespace-only response for {context_label}.")
+            return []
+        if findings_parser is not None:
+            if findings_parser.complete and findings_parser.error is None:
+                return self._findings_list_from_json(findings_parser.document)
+            if findings_parser.capped:
+                logger.warning(f"<{self.agent_name}> LLM response for {context_label} reached max_findings ({findings_parser.max_items}); the rest of the generation was skipped.")
+                return findings_parser.items
+            problem = findings_parser.error or "ended before the JSON was complete (num_predict?)"
+        else:
+            try:
+                return self._findings_list_from_json(json.loads(stripped_response_text))
+            except json.JSONDecodeError as e:
+                problem = str(e)
+
+        recovered = recover_json(response_text)
+        if recovered is not None and (allow_partial or not recovered.truncated):
+            findings_list = self._findings_list_from_json(recovered.value)
+            logger.warning(f"<{self.agent_name}> LLM response for {context_label} was not valid JSON ({problem}); recovered {len(findings_list)} findings ({'; '.join(recovered.repairs) or 'no changes'}).")
+            return findings_list
+        if allow_partial and findings_parser is not None and findings_parser.items:
+            logger.warning(f"<{self.agent_name}> Stopped reading the LLM response for {context_label}: {problem}. Keeping {len(findings_parser.items)} findings read before it.")
+            return findings_parser.items
+        logger.error(f"<{self.agent_name}> Failed to parse LLM JSON response for {context_label}: {problem}. Response: '{response_text[:500]}...'")
+        return None
+
+    def _build_repair_request(self, request: Dict[str, Any], response_text: str, context_label: str) -> Optional[Dict[str, Any]]:
+        """
+        `invoke` keyword arguments asking the model to fix its malformed JSON response, or None when
+        repairs are disabled, the per-run budget (`json_repair.max_repairs_per_run`) is spent, or the
+        response is too long or has no JSON to repair. The call is short: no code, only the response.
+        """
+        settings = JsonRepairSettings.from_config(self.config)
+        if not settings.enabled:
+            return None
+        if "[" not in response_text and "{" not in response_text:
+            logger.info(f"<{self.agent_name}> No JSON to repair in the LLM response for {context_label}.")
+            return None
+        if is_cut_off_json(response_text): # Phần bị cắt không thể sửa lại được
+            logger.info(f"<{self.agent_name}> Not repairing the LLM response for {context_label}: it was cut off before the JSON was complete.")
+            return None
+        if len(response_text) > settings.max_response_chars:
+            logger.warning(f"<{self.agent_name}> Not repairing the LLM response for {context_label}: {len(response_text)} characters (json_repair.max_response_chars={settings.max_response_chars}).")
+            return None
+        if not acquire_json_repair(settings):
+            logger.warning(f"<{self.agent_name}> Not repairing the LLM response for {context_label}: json_repair.max_repairs_per_run ({settings.max_repairs_per_run}) reached.")
+            return None
+        model_name = request["model_name"]
+        prompt = build_json_repair_prompt(response_text)
+        # Output xấp xỉ độ dài response gốc
+        output_tokens = self.context_window.estimate_tokens(model_name, response_text) + 64
+        repair_request: Dict[str, Any] = {
+            "model_name": model_name,
+            "prompt": prompt,
+            "system_message_content": JSON_REPAIR_SYSTEM_MESSAGE,
+            "is_json_mode": True,
+            "temperature": 0.0,
+            "num_predict": output_tokens,
+            "early_stop_json": True,
+        }
+        if "format" in request: # Structured output: bản sửa cũng phải theo schema
+            repair_request["format"] = request["format"]
+        if self.context_window.enabled:
+            prompt_tokens = self.context_window.estimate_tokens(model_name, prompt, JSON_REPAIR_SYSTEM_MESSAGE)
+            repair_request["num_ctx"] = self.context_window.select_num_ctx(model_name, prompt_tokens, output_tokens)
+        logger.info(f"<{self.agent_name}> Asking LLM '{model_name}' to repair its invalid JSON response for {context_label}.")
+        return repair_request
+
+    def _repair_llm_response(self, request: Dict[str, Any], response_text: str, context_label: str, allow_partial: bool = True) -> Optional[List[Any]]:
+        """Findings list from one repair call (see `_build_repair_request`), or None if not repaired."""
+        repair_request = self._build_repair_request(request, response_text, context_label)
+        if repair_request is None:
+            return None
+        repaired_text = self.ollama_client.invoke(**repair_request)
+        return self._findings_list_from_response(repaired_text, None, f"{context_label} (repaired)", allow_partial)
+
+    async def _arepair_llm_response(
+        self,
+        request: Dict[str, Any],
+        response_text: str,
+        context_label: str,
+        allow_partial: bool = True,
+        request_semaphore: Optional[asyncio.Semaphore] = None
+    ) -> Optional[List[Any]]:
+        """Async variant of `_repair_llm_response()`."""
+        repair_request = self._build_repair_request(request, response_text, context_label)
+        if repair_request is None:
+            return None
+        repaired_text = await self._ainvoke(repair_request, request_semaphore)
+        return self._findings_list_from_response(repaired_text, None, f"{context_label} (repaired)", allow_partial)
+
+    def _findings_list_from_json(self, parsed_response: Any) -> List[Any]:
+        """Applies the list / single-object / nested-key heuristics to an already parsed response."""
+        if isinstance(parsed_response, list):
+            logger.debug(f"<{self.agent_name}> LLM returned a JSON list with {len(parsed_response)} items.")
+            return parsed_response
+        if isinstance(parsed_response, dict):
+            is_single_finding = "line_start" in parsed_response and ("message" in parsed_response or "message_text" in parsed_response)
+            if is_single_finding:
+                logger.debug(f"<{self.agent_name}> LLM returned a single JSON object, treating it as one finding.")
+                return [parsed_response]
+            for key in self.response_list_keys:
+                if isinstance(parsed_response.get(key), list):
+                    logger.debug(f"<{self.agent_name}> LLM returned a dict, extracted list from key '{key}'.")
+                    return parsed_response[key]
+            logger.warning(f"<{self.agent_name}> LLM response was a JSON dict, but no known key contained a list, and it didn't look like a single finding object. Got dict keys: {list(parsed_response.keys())}")
+            return []
+        logger.warning(f"<{self.agent_name}> LLM response parsed but was not a JSON list or dict. Got: {type(parsed_response)}")
+        return []
+
+    def _get_relevant_files(self, files_data: List[ChangedFile]) -> List[ChangedFile]:
+        supported_languages = getattr(self, "supported_languages", None)
+        if supported_languages is None:
+            return list(files_data)
+        return self._filter_files_by_language(files_data, supported_languages)
+
+    def _select_prompt_template_name(self, file_data: ChangedFile) -> str:
+        """Uses `<language_specific_prompt_prefix><language>` if such a template exists, else the default prompt."""
+        prompt_template_name = f"{self.language_specific_prompt_prefix}{file_data.language}"
+        if not self.config.get_prompt_template(prompt_template_name):
+            logger.debug(f"<{self.agent_name}> Specific prompt '{prompt_template_name}' not found in config. Using default '{self.default_prompt_name}'.")
+            prompt_template_name = self.default_prompt_name
+        return prompt_template_name
+
+    def _get_pr_prompt_context(self, pr_context: Optional[SharedReviewContext]) -> Dict[str, str]:
+        """PR title/description for prompts ("Not available" when missing)."""
+        return {
+            "pr_title": pr_context.pr_title if pr_context and pr_context.pr_title else "Not available",
+            "pr_description": pr_context.pr_body if pr_context and pr_context.pr_body else "Not available",
+        }
+
+    def _get_code_prompt_context(self, file_data: ChangedFile) -> Dict[str, str]:
+        """
+        The code shown to the LLM: the whole file, or with `review_scope: hunks` only the changed
+        regions (line-numbered, see `build_hunk_excerpt`) plus a note telling the model how to read them.
+        Files without diff hunks are always sent in full.
+        """
+        if get_review_scope(self.config) == REVIEW_SCOPE_HUNKS:
+            excerpt = build_hunk_excerpt(file_data.content, file_data.diff_hunks)
+            if excerpt is not None:
+                logger.debug(f"<{self.agent_name}> Hunk-only review for {file_data.path}: {len(excerpt)} of {len(file_data.content)} characters.")
+                return {
+                    "file_content": excerpt,
+                    "code_scope_note": (
+                        "Only the changed regions of this file are shown, with surrounding context. "
+                        "Each line starts with its line number in the file, and added or modified lines are marked with '+' before the '|'. "
+                        "Use these line numbers for 'line_start'/'line_end', focus on the marked lines, and do not report code in the omitted ('...') regions."
+                    ),
+                }
+        return {"file_content": file_data.content, "code_scope_note": ""}
+
+    def _build_llm_request(
+        self,
+        file_data: ChangedFile,
+        prompt_template_name: str,
+        prompt_variables: Dict[str, Any],
+        system_message_content: str,
+        temperature: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Resolves the model and renders the prompt, fitted to the model context window (few-shot
+        examples, PR description and distant code are dropped in that order when it is too long).
+        With `prompt_layout: shared_prefix` see `_shared_prefix_render()`.
+        Returns None (after logging) if the model or the prompt is unavailable.
+        """
+        model_name = self.config.get_model_for_agent(self.agent_name)
+        if not model_name:
+            logger.error(f"<{self.agent_name}> Model name not configured. Skipping file {file_data.path}.")
+            return None
+        shared_prefix = get_prompt_layout(self.config) == PROMPT_LAYOUT_SHARED_PREFIX
+        if shared_prefix:
+            render = self._shared_prefix_render(prompt_template_name, system_message_content)
+            system_message_content = SHARED_PREFIX_SYSTEM_MESSAGE
+        else:
+            render = lambda variables: self.prompt_manager.get_prompt(prompt_template_name, variables)
+        request = self._render_llm_request(
+            model_name, render, {"include_examples": True, **prompt_variables}, system_message_content, temperature,
+            file_data=file_data, label=f" of {self.agent_name} for {file_data.path}"
+        )
+        if request is None:
+            logger.error(f"<{self.agent_name}> Could not render prompt '{prompt_template_name}' for {file_data.path}. Skipping.")
+        elif shared_prefix:
+            # Balancer gửi các request cùng prefix tới cùng endpoint (KV cache của prefix còn trên server đó)
+            request["prompt_prefix_key"] = f"{model_name}:{file_data.path}"
+        return request
+
+    def _shared_prefix_render(self, prompt_template_name: str, agent_system_message: str) -> Callable[[Dict[str, Any]], Optional[str]]:
+        """
+        Render function of the `shared_prefix` layout: the `shared_review_context` template (PR context
+        and code, identical for every agent reviewing the same file) comes first, followed by the agent's
+        own role and its template rendered with `shared_context_above`, which leaves out what the prefix
+        already shows. Together with the shared system message, the agents' prompts for one file start with
+        the same tokens, so Ollama reuses the prompt cache of that prefix instead of re-evaluating the code.
+        """
+        def render(variables: Dict[str, Any]) -> Optional[str]:
+            prefix = self.prompt_manager.get_prompt(SHARED_CONTEXT_PROMPT_NAME, variables)
+            instructions = self.prompt_manager.get_prompt(prompt_template_name, {**variables, "shared_context_above": True})
+            if not prefix or not instructions:
+                return None
+            return f"{prefix}\n{agent_system_message}\n\n{instructions}"
+        return render
+
+    def _agent_option(self, key: str) -> Any:
+        """Value of an agent-only key (`_AGENT_OPTION_KEYS`) of this agent's generation options, or None."""
+        options = self.config.get_generation_options(self.agent_name)
+        return options.get(key) if isinstance(options, dict) else None
+
+    def _generation_options(self) -> Dict[str, Any]:
+        """Ollama generation options of this agent (`generation` section of models.yml), minus reserved request and agent-only keys."""
+        options = self.config.get_generation_options(self.agent_name)
+        if not isinstance(options, dict):
+            return {}
+        reserved = [key for key in options if key in _RESERVED_REQUEST_KEYS]
+        if reserved:
+            logger.warning(f"<{self.agent_name}> Ignoring generation options {reserved}: they are set by the agent.")
+        return {
+            key: value for key, value in options.items()
+            if key not in _RESERVED_REQUEST_KEYS and key not in _AGENT_OPTION_KEYS and value is not None
+        }
+
+    def _render_llm_request(
+        self,
+        model_name: str,
+        render: Callable[[Dict[str, Any]], Optional[str]],
+        prompt_variables: Dict[str, Any],
+        system_message_content: str,
+        temperature: float,
+        file_data: Optional[ChangedFile] = None,
+        label: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Renders the prompt and builds the `invoke` keyword arguments: the agent's generation options
+        from models.yml (a configured `temperature` overrides the agent default) and, unless the
+        context window manager is disabled, the fitted prompt with its `num_ctx`. With `structured_output`
+        the response is constrained to the `finding_model` schema. None if rendering fails.
+        """
+        options = self._generation_options()
+        structured_output = self._agent_option("structured_output") is True
+        if structured_output:
+            prompt_variables = {**prompt_variables, "output_format_instructions": structured_output_instructions(self.finding_model)}
+            options["format"] = findings_response_schema(self.finding_model)
+        temperature = options.pop("temperature", temperature)
+        num_predict = options.get("num_predict")
+        output_tokens = num_predict if isinstance(num_predict, int) and not isinstance(num_predict, bool) and num_predict > 0 else None
+        if self.context_window.enabled:
+            fitted = self.context_window.fit_prompt(
+                model_name, render, prompt_variables, system_message_content,
+                file_data=file_data, output_tokens=output_tokens, label=label
+            )
+            if fitted is None:
+                return None
+            rendered_prompt: Optional[str] = fitted.prompt
+            options.setdefault("num_ctx", fitted.num_ctx)
+        else:
+            rendered_prompt = render(prompt_variables)
+        if not rendered_prompt:
+            return None
+        return {
+            "model_name": model_name,
+            "prompt": rendered_prompt,
+            "system_message_content": system_message_content,
+            "is_json_mode": True,
+            "temperature": temperature,
+            **options,
+        }
 
     def _filter_files_by_language(self, files_data: List[ChangedFile], supported_languages: List[str]) -> List[ChangedFile]:
         """Helper to filter files based on supported languages."""
@@ -34,8 +475,8 @@ class BaseAgent:
             logger.debug(f"{self.agent_name} filtered {len(files_data) - len(filtered_files)} files not matching supported languages: {supported_languages}")
         return filtered_files
 
-    def _format_finding(self, file_path: str, line_start: int, message: str, rule_id_suffix:str, level:str, suggestion: Optional[str]=None, code_snippet: Optional[str]=None) -> Dict[str, Any]:
-        return {
+    def _format_finding(self, file_path: str, line_start: int, message: str, rule_id_suffix:str, level:str, suggestion: Optional[str]=None, code_snippet: Optional[str]=None, line_end: Optional[int]=None, confidence: Optional[str]=None) -> Dict[str, Any]:
+        finding = {
             "file_path": file_path,
             "line_start": line_start,
             "message_text": message,
@@ -44,4 +485,7 @@ class BaseAgent:
             "tool_name": self.agent_name,
             "suggestion": suggestion,
             "code_snippet": code_snippet
-        }
\ No newline at end of file
+        }
+        if line_end is not None: finding["line_end"] = line_end
+        if confidence is not None: finding["confidence"] = confidence
+        return finding
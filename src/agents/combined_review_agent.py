@@ -0,0 +1,158 @@
+# NOVAGUARD-AI/src/agents/combined_review_agent.py
+import os
+import logging
+from typing import List, Dict, Any, Optional
+
+from .base_agent import BaseAgent
+from .bug_hunter_agent import BugHunterAgent
+from .finding_schema import CombinedFinding, validate_findings
+from .opti_tune_agent import OptiTuneAgent
+from .securi_sense_agent import SecuriSenseAgent
+from .style_guardian_agent import StyleGuardianAgent
+from ..core.shared_context import ChangedFile, SharedReviewContext
+from ..core.config_loader import Config
+from ..core.ollama_client import OllamaClientWrapper
+from ..core.prompt_manager import PromptManager
+
+logger = logging.getLogger(__name__)
+
+AGENT_MODE_SPECIALISTS = "specialists"
+AGENT_MODE_COMBINED = "combined"
+SUPPORTED_AGENT_MODES = (AGENT_MODE_SPECIALISTS, AGENT_MODE_COMBINED)
+
+# Agent chuyên biệt nhận finding của từng category (rule_id, level, tool_name theo agent đó)
+CATEGORY_AGENTS = {
+    "style": StyleGuardianAgent,
+    "bug": BugHunterAgent,
+    "security": SecuriSenseAgent,
+    "performance": OptiTuneAgent,
+}
+# category -> (field loại issue, field gợi ý sửa) trong finding model của agent chuyên biệt
+_CATEGORY_FIELDS = {
+    "style": ("code_issue_category", "suggestion"),
+    "bug": ("bug_type", "suggestion"),
+    "security": ("vulnerability_type", "suggested_fix"),
+    "performance": ("optimization_type", "suggested_change"),
+}
+_COMBINED_ONLY_KEYS = ("category", "issue_type", "severity", "suggestion", "cwe_id")
+
+
+def get_agent_mode(config: Any) -> str:
+    """
+    Returns how files are reviewed by the LLM: `orchestration.agent_mode` in models.yml ("specialists":
+    one call per file and specialist agent, or "combined": one `CombinedReviewAgent` call per file),
+    overridable with the NOVAGUARD_AGENT_MODE environment variable.
+    """
+    env_value = os.environ.get("NOVAGUARD_AGENT_MODE")
+    mode = env_value.strip().lower() if env_value else config.get_orchestration_setting("agent_mode", AGENT_MODE_SPECIALISTS)
+    if mode in SUPPORTED_AGENT_MODES:
+        return mode
+    if isinstance(mode, str):
+        logger.warning(f"Unknown agent mode '{mode}'. Using '{AGENT_MODE_SPECIALISTS}'.")
+    return AGENT_MODE_SPECIALISTS
+
+
+class CombinedReviewAgent(BaseAgent):
+    """
+    Reviews each file for style, bugs, security and performance in a single LLM call.
+
+    The LLM tags every finding with a category; each finding is converted to the finding model of
+    the specialist agent of its category (`CATEGORY_AGENTS`) and formatted by that agent, so it gets
+    the same rule_id namespace, level and tool_name as if the specialist had reported it. Categories
+    whose specialist does not support the file's language are neither requested nor kept.
+    """
+    # Khóa có thể chứa danh sách findings khi LLM trả về một JSON object
+    response_list_keys = ["findings", "results", "issues"]
+    finding_model = CombinedFinding
+
+    def __init__(self, config: Config, ollama_client: OllamaClientWrapper, prompt_manager: PromptManager):
+        super().__init__("CombinedReviewer", config, ollama_client, prompt_manager)
+        self.specialists: Dict[str, BaseAgent] = {
+            category: agent_class(config=config, ollama_client=ollama_client, prompt_manager=prompt_manager)
+            for category, agent_class in CATEGORY_AGENTS.items()
+        }
+        self.supported_languages = list(dict.fromkeys(
+            language for specialist in self.specialists.values() for language in specialist.supported_languages
+        ))
+        self.default_prompt_name = "combined_review_general"
+        self.language_specific_prompt_prefix = "combined_review_"
+
+    def _categories_for(self, file_data: ChangedFile) -> List[str]:
+        """Categories whose specialist agent supports the file's language."""
+        return [category for category, specialist in self.specialists.items() if specialist._get_relevant_files([file_data])]
+
+    def _prepare_file_request(
+        self,
+        file_data: ChangedFile,
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext]
+    ) -> Optional[Dict[str, Any]]:
+        categories = self._categories_for(file_data)
+        logger.debug(f"<{self.agent_name}> Reviewing file: {file_data.path} (Language: {file_data.language}, categories: {categories})")
+        style_agent: StyleGuardianAgent = self.specialists["style"] # type: ignore[assignment]
+        security_agent: SecuriSenseAgent = self.specialists["security"] # type: ignore[assignment]
+        linter_issues = style_agent._get_relevant_linter_findings(file_data.path, file_data.language, tier1_tool_results) if "style" in categories else []
+        sast_issues = security_agent._get_relevant_sast_findings(file_data.path, tier1_tool_results) if "security" in categories else []
+        prompt_template_name = self._select_prompt_template_name(file_data)
+
+        prompt_variables = {
+            "agent_name": self.agent_name,
+            "file_path": file_data.path,
+            **self._get_code_prompt_context(file_data),
+            "language": file_data.language,
+            "review_categories": ", ".join(f"`{category}`" for category in categories),
+            "linter_feedback": "\n".join(linter_issues) if linter_issues else "No specific linter issues reported for this file by Tier 1 tools.",
+            "sast_tool_feedback": "\n".join(sast_issues) if sast_issues else "No specific findings reported for this file by SAST tools in Tier 1.",
+            **self._get_pr_prompt_context(pr_context),
+            "output_format_instructions": """Please provide your findings STRICTLY as a JSON list.
+- If multiple issues are found, return a list of JSON objects.
+- If only one issue is found, return a list containing a single JSON object.
+- If no issues are found, return an empty JSON list: [].
+Each JSON object in the list should represent a single issue and have AT LEAST the following keys:
+- "category": string (one of the review categories above: "style", "bug", "security", "performance")
+- "line_start": integer (the line number where the issue starts or is most evident)
+- "message": string (a concise description of the issue and its impact)
+- "issue_type": string (the kind of issue, e.g., "naming", "LogicError", "SQLInjection", "LoopOptimization")
+- "severity": string (your assessment of severity, for performance the expected impact: "critical", "high", "medium", "low")
+You MAY also include these OPTIONAL keys if applicable:
+- "line_end": integer (optional, the line number where the issue ends)
+- "suggestion": string (optional, a concrete suggestion on how to fix or improve it)
+- "cwe_id": string (optional, for security issues, the most relevant CWE ID, e.g., "CWE-89")
+- "explanation_steps": list_of_strings (optional, brief step-by-step reasoning for your finding)
+- "confidence": string (optional, your confidence in this finding: "high", "medium", "low")"""
+        }
+        system_msg = (f"You are {self.agent_name}, an AI assistant reviewing {file_data.language} code for style, bugs, security and performance issues in a single pass.")
+        return self._build_llm_request(file_data, prompt_template_name, prompt_variables, system_msg, temperature=0.3)
+
+    def _format_llm_finding(self, file_data: ChangedFile, llm_finding: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        category = llm_finding["category"]
+        specialist = self.specialists[category]
+        if not specialist._get_relevant_files([file_data]):
+            logger.debug(f"<{self.agent_name}> Dropping {category} finding for {file_data.path}: {specialist.agent_name} does not review {file_data.language}.")
+            return None
+        specialist_findings = validate_findings(
+            [self._to_specialist_finding(category, llm_finding)], specialist.finding_model, f"<{self.agent_name}> {file_data.path}"
+        )
+        if not specialist_findings:
+            return None
+        return specialist._format_llm_finding(file_data, specialist_findings[0])
+
+    @staticmethod
+    def _to_specialist_finding(category: str, llm_finding: Dict[str, Any]) -> Dict[str, Any]:
+        """Renames the keys of a combined finding to those of its category's finding model."""
+        issue_type_key, suggestion_key = _CATEGORY_FIELDS[category]
+        finding = {key: value for key, value in llm_finding.items() if key not in _COMBINED_ONLY_KEYS}
+        if llm_finding.get("issue_type") not in (None, "general"): # "general": dùng giá trị mặc định của agent chuyên biệt
+            finding[issue_type_key] = llm_finding["issue_type"]
+        if llm_finding.get("suggestion") is not None:
+            finding[suggestion_key] = llm_finding["suggestion"]
+        severity = llm_finding.get("severity")
+        if category == "performance":
+            finding["estimated_impact"] = "significant" if severity == "critical" else severity
+        elif category == "style":
+            finding["severity"] = "high" if severity == "critical" else severity
+        else:
+            finding["severity"] = severity
+        if category == "security" and llm_finding.get("cwe_id") is not None:
+            finding["cwe_id"] = llm_finding["cwe_id"]
+        return finding
@@ -0,0 +1,180 @@
+# NOVAGUARD-AI/src/agents/finding_schema.py
+
+import logging
+from typing import Any, Dict, List, Optional, Type
+
+from pydantic import AliasChoices, BaseModel, ConfigDict, Field, ValidationError, field_validator, model_validator
+
+logger = logging.getLogger(__name__)
+
+# Key chứa danh sách finding trong response có cấu trúc (có trong response_list_keys của mọi agent)
+FINDINGS_KEY = "findings"
+
+_CONFIDENCE_VALUES = ["high", "medium", "low"]
+_SEVERITY_VALUES = ["critical", "high", "medium", "low"]
+# Category của finding trong review gộp (CombinedReviewAgent), mỗi category ứng với một agent chuyên biệt
+COMBINED_REVIEW_CATEGORIES = ["style", "bug", "security", "performance"]
+_CATEGORY_ALIASES = {
+    "styles": "style", "formatting": "style", "bugs": "bug", "logic": "bug", "correctness": "bug",
+    "vulnerability": "security", "optimization": "performance", "optimisation": "performance", "perf": "performance",
+}
+
+_JSON_TYPE_NAMES = {"integer": "integer", "string": "string", "number": "number", "boolean": "boolean", "array": "list"}
+
+
+class LLMFinding(BaseModel):
+    """
+    One finding as returned by an agent's LLM. Every agent's finding model derives from it.
+
+    The model is both the JSON Schema sent as Ollama's structured-output `format` (see
+    `findings_response_schema()`) and the validation of every returned finding. Fields with a
+    non-None default are required in the schema, so a constrained LLM always fills them, but fall
+    back to the default when unconstrained output omits them: a finding without `line_start` is
+    reported on line 1, and one without `message` gets an empty message, which each agent replaces
+    with its own placeholder. Unknown keys are kept.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    line_start: int = Field(default=1, description="Line number where the issue starts, as numbered in the code shown.")
+    line_end: Optional[int] = Field(default=None, description="Line number where the issue ends.")
+    message: str = Field(default="", description="Concise description of the issue and its impact.")
+    explanation_steps: Optional[List[str]] = Field(default=None, description="Brief step-by-step reasoning for the finding.")
+    confidence: Optional[str] = Field(default=None, description="Your confidence in this finding.", json_schema_extra={"enum": _CONFIDENCE_VALUES})
+
+    @model_validator(mode="before")
+    @classmethod
+    def _drop_null_values(cls, data: Any) -> Any:
+        # null do LLM sinh ra được coi như thiếu key: dùng giá trị mặc định thay vì loại cả finding
+        if isinstance(data, dict):
+            return {key: value for key, value in data.items() if value is not None}
+        return data
+
+
+class StyleFinding(LLMFinding):
+    severity: str = Field(default="low", description="Severity of the style issue.", json_schema_extra={"enum": ["high", "medium", "low"]})
+    code_issue_category: str = Field(default="general", description="Short category of the issue, e.g. 'naming', 'formatting', 'docstring'.")
+    suggestion: Optional[str] = Field(default=None, description="Brief suggestion on how to fix or improve it.")
+
+
+class BugFinding(LLMFinding):
+    bug_type: str = Field(default="general_bug", description="Kind of bug, e.g. 'NullPointerException', 'ResourceLeak', 'LogicError'.")
+    severity: str = Field(default="medium", description="Severity of the potential bug.", json_schema_extra={"enum": _SEVERITY_VALUES})
+    suggestion: Optional[str] = Field(default=None, description="Brief suggestion on how to fix or further investigate it.")
+
+
+class SecurityFinding(LLMFinding):
+    vulnerability_type: str = Field(default="generic_security", description="Kind of vulnerability, e.g. 'SQLInjection', 'XSS', 'PathTraversal'.")
+    severity: str = Field(default="medium", description="Severity of the vulnerability.", json_schema_extra={"enum": _SEVERITY_VALUES})
+    suggested_fix: Optional[str] = Field(default=None, description="Concrete remediation, with secure code if possible.")
+    cwe_id: Optional[str] = Field(default=None, description="Most relevant CWE ID, e.g. 'CWE-89'.")
+    cvss_score_v3: Optional[str] = Field(default=None, description="Estimated CVSS v3.1 score, e.g. '7.5'.")
+
+
+class OptimizationFinding(LLMFinding):
+    optimization_type: str = Field(default="general_opt", description="Kind of optimization, e.g. 'AlgorithmRefinement', 'DataStructureChoice', 'LoopOptimization', 'CachingStrategy'.")
+    estimated_impact: str = Field(default="low", description="Expected performance gain.", json_schema_extra={"enum": ["low", "medium", "high", "significant"]})
+    suggested_change: Optional[str] = Field(default=None, description="Concrete change, ideally with a short before/after snippet.")
+    implementation_difficulty: Optional[str] = Field(default=None, description="How hard the change is to implement.", json_schema_extra={"enum": ["low", "medium", "high"]})
+
+
+class CombinedFinding(LLMFinding):
+    category: str = Field(description="Review category of the issue.", json_schema_extra={"enum": COMBINED_REVIEW_CATEGORIES})
+    issue_type: str = Field(default="general", description="Short kind of issue, e.g. 'naming', 'LogicError', 'SQLInjection', 'LoopOptimization'.")
+    severity: str = Field(default="medium", description="Severity (for performance: expected impact) of the issue.", json_schema_extra={"enum": _SEVERITY_VALUES})
+    suggestion: Optional[str] = Field(default=None, description="Concrete suggestion on how to fix or improve it.")
+    cwe_id: Optional[str] = Field(default=None, description="Most relevant CWE ID for a security issue, e.g. 'CWE-89'.")
+
+    @field_validator("category", mode="before")
+    @classmethod
+    def _normalize_category(cls, value: Any) -> Any:
+        # Output không bị ràng buộc schema có thể dùng tên khác / viết hoa cho category
+        if isinstance(value, str):
+            category = value.strip().lower()
+            category = _CATEGORY_ALIASES.get(category, category)
+            if category not in COMBINED_REVIEW_CATEGORIES:
+                raise ValueError(f"unknown category '{value}'")
+            return category
+        return value
+
+
+class MetaReviewFinding(LLMFinding):
+    file_path: str = Field(description="Path of the file, as in the input findings.")
+    message: str = Field(
+        validation_alias=AliasChoices("message", "message_text"),
+        description="Refined description; may include the reasoning for merging or dropping findings.",
+    )
+    rule_id: str = Field(default="meta.refined", description="Original rule_id, or 'MetaReviewer.Consolidated' for merged findings.")
+    level: str = Field(default="note", description="Final severity.", json_schema_extra={"enum": ["error", "warning", "note"]})
+    tool_name: Optional[str] = Field(default=None, description="Originating agent, if preserved.")
+    suggestion: Optional[str] = Field(default=None, description="Refined suggestion.")
+    meta_comment: Optional[str] = Field(default=None, description="Note about the meta-review decision on this finding.")
+    original_rule_ids: Optional[List[str]] = Field(default=None, description="rule_ids of the findings merged into this one.")
+
+
+def _property_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """A pydantic property schema without titles/defaults, `Optional[X]` reduced to X."""
+    variants = [variant for variant in schema.get("anyOf", []) if variant.get("type") != "null"]
+    result = dict(variants[0]) if len(variants) == 1 else {key: value for key, value in schema.items() if key != "anyOf"}
+    for key in ("description", "enum"):
+        if key in schema:
+            result[key] = schema[key]
+    result.pop("title", None)
+    result.pop("default", None)
+    return result
+
+
+def finding_json_schema(finding_model: Type[LLMFinding]) -> Dict[str, Any]:
+    """JSON Schema of one finding object: required fields plus fields with a non-None default."""
+    pydantic_schema = finding_model.model_json_schema()
+    properties = {name: _property_schema(schema) for name, schema in pydantic_schema["properties"].items()}
+    required = [
+        name for name, field in finding_model.model_fields.items()
+        if field.is_required() or field.default is not None
+    ]
+    return {"type": "object", "properties": properties, "required": required, "additionalProperties": False}
+
+
+def findings_response_schema(finding_model: Type[LLMFinding]) -> Dict[str, Any]:
+    """JSON Schema of a whole response, `{"findings": [<finding>, ...]}`, for Ollama's `format`."""
+    return {
+        "type": "object",
+        "properties": {FINDINGS_KEY: {"type": "array", "items": finding_json_schema(finding_model)}},
+        "required": [FINDINGS_KEY],
+    }
+
+
+def structured_output_instructions(finding_model: Type[LLMFinding]) -> str:
+    """Short output instructions for a schema-constrained request (replaces the prose format instructions)."""
+    schema = finding_json_schema(finding_model)
+    lines = [
+        f'Return a JSON object whose "{FINDINGS_KEY}" key is the list of findings, one object per issue '
+        f'(an empty list if there are none). Keys of each finding:'
+    ]
+    for name, prop in schema["properties"].items():
+        type_name = _JSON_TYPE_NAMES.get(prop.get("type", ""), "string")
+        if type_name == "list":
+            type_name = "list of strings"
+        qualifier = "" if name in schema["required"] else ", optional"
+        allowed = f" One of: {', '.join(prop['enum'])}." if "enum" in prop else ""
+        lines.append(f'- "{name}" ({type_name}{qualifier}): {prop.get("description", "")}{allowed}')
+    return "\n".join(lines)
+
+
+def validate_findings(items: List[Any], finding_model: Type[LLMFinding], context_label: str) -> List[Dict[str, Any]]:
+    """
+    Validates the finding objects returned by an LLM against `finding_model`. Returns them as dicts
+    (missing optional keys omitted); invalid items are logged and skipped.
+    """
+    findings: List[Dict[str, Any]] = []
+    for index, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            logger.warning(f"Skipping finding {index} for {context_label}: expected a JSON object, got {item!r}.")
+            continue
+        try:
+            finding = finding_model.model_validate(item)
+        except ValidationError as e:
+            problems = "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'finding'}: {error['msg']}" for error in e.errors())
+            logger.warning(f"Skipping invalid finding {index} for {context_label} ({problems}): {item}")
+            continue
+        findings.append(finding.model_dump(exclude_none=True))
+    return findings
@@ -68,6 +68,25 @@ def _deep_merge_dicts(base: Dict[Any, Any], override: Dict[Any, Any]) -> Dict[An
     return merged
 
 
+def parse_ollama_endpoints(value: Any) -> List[str]:
+    """
+    Normalizes an Ollama endpoint setting into a list of base URLs.
+    Accepts a string with one or more URLs separated by commas/whitespace, or a list of such strings.
+    Duplicates (ignoring a trailing "/") are dropped, order is kept.
+    """
+    raw_items: List[str] = []
+    if isinstance(value, str):
+        raw_items = value.replace(",", " ").split()
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            raw_items.extend(parse_ollama_endpoints(item))
+    endpoints: List[str] = []
+    for item in raw_items:
+        if item.rstrip("/") not in [endpoint.rstrip("/") for endpoint in endpoints]:
+            endpoints.append(item)
+    return endpoints
+
+
 class Config:
     """
     Configuration class for NovaGuard AI.
@@ -79,10 +98,13 @@ class Config:
                 tools_config: Dict[str, Any],
                 prompt_templates: Dict[str, str],
                 active_mode: str, 
-                project_config_loaded: bool = False):
+                project_config_loaded: bool = False,
+                ollama_endpoints: Optional[List[str]] = None):
         self.ollama_base_url = ollama_base_url
         self.models_config_full = models_config 
-        self.tools_config = tools_config
+        # `resource_limits` ở cấp cao nhất của tools.yml là giới hạn mặc định cho mọi tool, không phải một category
+        self.tools_config = {key: value for key, value in tools_config.items() if key != "resource_limits"}
+        self.tool_resource_limits: Dict[str, Any] = tools_config.get("resource_limits") or {}
         self.prompt_templates = prompt_templates
         self.active_mode = active_mode
         self.project_config_loaded = project_config_loaded
@@ -93,10 +115,63 @@ class Config:
             # Bạn có thể thêm logic fallback ở đây, ví dụ dùng production nếu test mode thiếu, hoặc một section 'shared_models'
             self.current_mode_models = self.models_config_full.get("modes", {}).get("production", {}) # Fallback to production as an example
 
-
-        logger.info(f"Config initialized. Ollama URL: {self.ollama_base_url}")
+        # Orchestration settings (e.g. parallel_agents): top-level `orchestration` in models.yml,
+        # overridden per key by the active mode's own `orchestration` section.
+        self.orchestration_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("orchestration") or {},
+            self.current_mode_models.get("orchestration") or {}
+        )
+        # LLM response cache settings: top-level `llm_cache` in models.yml, overridable per mode.
+        self.llm_cache_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("llm_cache") or {},
+            self.current_mode_models.get("llm_cache") or {}
+        )
+        # Tier 1 tool result cache settings: top-level `tool_cache` in models.yml, overridable per mode.
+        self.tool_cache_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("tool_cache") or {},
+            self.current_mode_models.get("tool_cache") or {}
+        )
+        # Context window settings (num_ctx buckets, max context per model): top-level `context_window`, overridable per mode.
+        self.context_window_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("context_window") or {},
+            self.current_mode_models.get("context_window") or {}
+        )
+        # Repair of malformed LLM JSON (per-run budget of repair calls): top-level `json_repair`, overridable per mode.
+        self.json_repair_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("json_repair") or {},
+            self.current_mode_models.get("json_repair") or {}
+        )
+        # Generation options (num_predict, stop, temperature, ...) per agent: top-level `generation`, overridable per mode.
+        self.generation_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("generation") or {},
+            self.current_mode_models.get("generation") or {}
+        )
+
+        # Ollama endpoint settings (danh sách endpoint, health check của load balancer): top-level `ollama`, overridable per mode.
+        self.ollama_config: Dict[str, Any] = _deep_merge_dicts(
+            self.models_config_full.get("ollama") or {},
+            self.current_mode_models.get("ollama") or {}
+        )
+        # Tất cả endpoint: ollama_base_url (có thể chứa nhiều URL), endpoint truyền vào, rồi `ollama.endpoints` trong models.yml.
+        # ollama_base_url giữ endpoint đầu tiên để code chỉ dùng một endpoint vẫn chạy như cũ.
+        self.ollama_endpoints: List[str] = parse_ollama_endpoints(
+            [ollama_base_url, ollama_endpoints or [], self.ollama_config.get("endpoints") or []]
+        )
+        if self.ollama_endpoints:
+            self.ollama_base_url = self.ollama_endpoints[0]
+
+        logger.info(f"Config initialized. Ollama URL: {self.ollama_base_url}" + (
+            f" (+{len(self.ollama_endpoints) - 1} more endpoints)" if len(self.ollama_endpoints) > 1 else ""
+        ))
         logger.debug(f"Models config: {self.models_config_full}")
         logger.debug(f"Tools config: {self.tools_config}")
+        logger.debug(f"Orchestration config: {self.orchestration_config}")
+        logger.debug(f"LLM cache config: {self.llm_cache_config}")
+        logger.debug(f"Tool cache config: {self.tool_cache_config}")
+        logger.debug(f"Context window config: {self.context_window_config}")
+        logger.debug(f"JSON repair config: {self.json_repair_config}")
+        logger.debug(f"Generation config: {self.generation_config}")
+        logger.debug(f"Ollama config: {self.ollama_config}")
         logger.debug(f"Loaded {len(self.prompt_templates)} prompt templates. Project config loaded: {self.project_config_loaded}")
 
     def get_model_for_agent(self, agent_name: str) -> Optional[str]:
@@ -114,6 +189,70 @@ class Config:
             logger.warning(f"Model name not found for task: {task_name} in active mode: {self.active_mode}")
         return model_name
 
+    def get_active_models(self) -> Dict[str, List[str]]:
+        """
+        Every model referenced by the active mode (`agents` and `tasks`), mapped to the agents/tasks
+        using it, in configuration order.
+        """
+        models: Dict[str, List[str]] = {}
+        for section in ("agents", "tasks"):
+            for user_name, model_name in (self.current_mode_models.get(section) or {}).items():
+                if isinstance(model_name, str) and model_name:
+                    models.setdefault(model_name, []).append(user_name)
+        return models
+
+    def get_orchestration_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves an orchestration setting (how the review graph is executed) for the active mode.
+        Example in models.yml: `orchestration: {parallel_agents: true}` at the top level or under a mode.
+        """
+        return self.orchestration_config.get(setting_name, default)
+
+    def get_llm_cache_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves an LLM response cache setting (`llm_cache` section of models.yml) for the active mode.
+        Example: `llm_cache: {enabled: true, path: ".novaguard_cache/llm_responses.sqlite"}`.
+        """
+        return self.llm_cache_config.get(setting_name, default)
+
+    def get_tool_cache_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves a Tier 1 tool result cache setting (`tool_cache` section of models.yml) for the active mode.
+        Example: `tool_cache: {enabled: true, path: ".novaguard_cache/tool_results.sqlite"}`.
+        """
+        return self.tool_cache_config.get(setting_name, default)
+
+    def get_context_window_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves a context window setting (`context_window` section of models.yml) for the active mode.
+        Example: `context_window: {buckets: [2048, 4096, 8192], models: {"codellama": {max_tokens: 16384}}}`.
+        """
+        return self.context_window_config.get(setting_name, default)
+
+    def get_json_repair_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves a setting of the malformed-JSON repair (`json_repair` section of models.yml) for the active mode.
+        Example: `json_repair: {enabled: true, max_repairs_per_run: 3}`.
+        """
+        return self.json_repair_config.get(setting_name, default)
+
+    def get_generation_options(self, agent_name: str) -> Dict[str, Any]:
+        """
+        Ollama generation options for one agent in the active mode: `generation.defaults` in models.yml,
+        overridden per key by `generation.agents.<agent_name>`.
+        Example: `generation: {defaults: {num_predict: 2048}, agents: {MetaReviewer: {num_predict: 4096}}}`.
+        """
+        defaults = self.generation_config.get("defaults") or {}
+        agent_options = (self.generation_config.get("agents") or {}).get(agent_name) or {}
+        return _deep_merge_dicts(defaults, agent_options)
+
+    def get_ollama_setting(self, setting_name: str, default: Any = None) -> Any:
+        """
+        Retrieves an Ollama endpoint setting (`ollama` section of models.yml) for the active mode.
+        Example: `ollama: {endpoints: ["http://gpu-1:11434"], health_check_interval_seconds: 30}`.
+        """
+        return self.ollama_config.get(setting_name, default)
+
     # --- START MODIFICATION ---
     def get_tool_command_template(self, tool_category: str, tool_key: str) -> Optional[str]:
         """
@@ -153,6 +292,15 @@ class Config:
             logger.warning(f"Configuration not found for tool category '{tool_category}' and key '{tool_key}'")
         return tool_cfg
 
+    def get_tool_resource_limits(self, tool_category: str, tool_key: str) -> Dict[str, Any]:
+        """
+        Resource limits of a tool: the top-level `resource_limits` of tools.yml, overridden per key
+        by the tool's own `resource_limits`.
+        """
+        tool_cfg = self.tools_config.get(tool_category, {}).get(tool_key)
+        tool_limits = tool_cfg.get("resource_limits") if isinstance(tool_cfg, dict) else None
+        return _deep_merge_dicts(self.tool_resource_limits, tool_limits or {})
+
 
     def get_prompt_template(self, prompt_name: str) -> Optional[str]:
         """Retrieves a specific prompt template by its name (filename stem)."""
@@ -166,7 +314,8 @@ class Config:
 def load_config(default_config_dir: Path,
                 project_config_dir_str: Optional[str],
                 ollama_base_url: str,
-                workspace_path: Path) -> Config:
+                workspace_path: Path,
+                ollama_endpoints: Optional[List[str]] = None) -> Config:
     """
     Loads configuration from default and project-specific paths.
     Project-specific configurations override defaults.
@@ -175,8 +324,9 @@ def load_config(default_config_dir: Path,
         default_config_dir: Path to the directory containing default config files (models.yml, tools.yml, prompts/).
         project_config_dir_str: Optional string path to the project-specific config directory,
                                 relative to the workspace_path.
-        ollama_base_url: The base URL for the Ollama server.
+        ollama_base_url: The base URL for the Ollama server (several URLs may be given, comma separated).
         workspace_path: The path to the GitHub workspace.
+        ollama_endpoints: Optional additional Ollama base URLs to load-balance across.
 
     Returns:
         An instance of the Config class.
@@ -255,5 +405,6 @@ def load_config(default_config_dir: Path,
         tools_config=tools_cfg,
         prompt_templates=prompt_tpls,
         active_mode=active_mode, # Truyền active_mode
-        project_config_loaded=project_config_actually_loaded
+        project_config_loaded=project_config_actually_loaded,
+        ollama_endpoints=ollama_endpoints
     )
\ No newline at end of file
@@ -0,0 +1,277 @@
+# NOVAGUARD-AI/src/core/context_window.py
+
+import math
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from .shared_context import ChangedFile
+from .diff_parser import build_focused_excerpt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = [2048, 4096, 8192, 16384, 32768]
+DEFAULT_CHARS_PER_TOKEN = 3.0
+PR_DESCRIPTION_OMITTED = "Omitted (the prompt did not fit the model context window)."
+TRUNCATED_CODE_NOTE = (
+    "The file is too long for the model context window: only the changed lines and the code nearest to them are shown. "
+    "Each line starts with its line number in the file, and added or modified lines are marked with '+' before the '|'. "
+    "Use these line numbers for 'line_start'/'line_end' and do not report code in the omitted ('...') regions."
+)
+# Prompt ngắn hơn ngưỡng này không dùng để hiệu chỉnh (overhead của chat template chiếm tỉ lệ quá lớn)
+_MIN_CALIBRATION_CHARS = 200
+# Quan sát lệch quá nhiều so với tỉ lệ cấu hình thường do Ollama dùng lại prompt cache (chỉ đếm token mới)
+_MAX_CALIBRATION_DEVIATION = 2.0
+
+
+class ContextWindowSettings(BaseModel):
+    """The `context_window` section of models.yml."""
+    enabled: bool = True
+    buckets: List[int] = Field(default_factory=lambda: list(DEFAULT_BUCKETS))
+    default_max_tokens: int = 8192
+    default_chars_per_token: float = DEFAULT_CHARS_PER_TOKEN
+    output_reserve_tokens: int = 1024
+    safety_margin: float = 1.1
+    sticky: bool = True
+    models: Dict[str, Dict[str, Any]] = Field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ContextWindowSettings":
+        """Reads the settings with `config.get_context_window_setting`, ignoring values of the wrong type."""
+        values: Dict[str, Any] = {}
+        for name, field in cls.model_fields.items():
+            value = config.get_context_window_setting(name, None)
+            if value is None:
+                continue
+            expected = {bool: bool, int: int, float: (int, float), List[int]: list, Dict[str, Dict[str, Any]]: dict}.get(field.annotation)
+            if expected is None or not isinstance(value, expected) or (expected is not bool and isinstance(value, bool)):
+                if isinstance(value, (str, int, float, list, dict)): # Giá trị YAML sai kiểu
+                    logger.warning(f"Ignoring invalid context_window setting {name}={value!r}.")
+                continue
+            values[name] = value
+        settings = cls(**values)
+        settings.buckets = sorted({int(b) for b in settings.buckets if isinstance(b, int) and b > 0}) or list(DEFAULT_BUCKETS)
+        return settings
+
+    def model_setting(self, model_name: str, key: str) -> Any:
+        """Value of `key` for the longest entry of `models` that prefixes `model_name` ("codellama" matches "codellama:7b")."""
+        matches = [prefix for prefix in self.models if model_name.startswith(prefix)]
+        for prefix in sorted(matches, key=len, reverse=True):
+            value = (self.models.get(prefix) or {}).get(key)
+            if value is not None:
+                return value
+        return None
+
+
+class TokenEstimator:
+    """
+    Estimates prompt tokens from the character count with a chars-per-token ratio per model.
+    The ratio starts from the configured value and is calibrated with the `prompt_eval_count`
+    Ollama reports for finished requests (see `record_prompt_eval`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._observed: Dict[str, Tuple[int, int]] = {} # model -> (tổng ký tự, tổng token)
+
+    def chars_per_token(self, model_name: str, configured: float = DEFAULT_CHARS_PER_TOKEN) -> float:
+        with self._lock:
+            chars, tokens = self._observed.get(model_name, (0, 0))
+        return chars / tokens if tokens else configured
+
+    def estimate(self, model_name: str, chars: int, configured: float = DEFAULT_CHARS_PER_TOKEN, safety_margin: float = 1.0) -> int:
+        return math.ceil(chars / self.chars_per_token(model_name, configured) * safety_margin)
+
+    def observe(self, model_name: str, prompt_chars: int, prompt_tokens: int, configured: float = DEFAULT_CHARS_PER_TOKEN) -> bool:
+        """Adds one (characters, evaluated tokens) sample; returns False if it was discarded as unreliable."""
+        if not model_name or prompt_chars < _MIN_CALIBRATION_CHARS or prompt_tokens <= 0:
+            return False
+        ratio = prompt_chars / prompt_tokens
+        if not configured / _MAX_CALIBRATION_DEVIATION <= ratio <= configured * _MAX_CALIBRATION_DEVIATION:
+            logger.debug(f"Ignoring prompt token sample for '{model_name}' ({prompt_chars} chars / {prompt_tokens} tokens), likely a prompt cache hit.")
+            return False
+        with self._lock:
+            chars, tokens = self._observed.get(model_name, (0, 0))
+            self._observed[model_name] = (chars + prompt_chars, tokens + prompt_tokens)
+        return True
+
+    def reset(self) -> None:
+        with self._lock:
+            self._observed.clear()
+
+
+# Một estimator và một mức num_ctx đã dùng cho mỗi model, dùng chung trong process (mọi agent, mọi endpoint)
+shared_token_estimator = TokenEstimator()
+_num_ctx_floor: Dict[str, int] = {}
+_num_ctx_floor_lock = threading.Lock()
+
+
+def record_prompt_eval(model_name: str, prompt_chars: int, prompt_tokens: Optional[int]) -> None:
+    """Calibrates the shared estimator with the prompt size Ollama reported for a finished request."""
+    if prompt_tokens:
+        shared_token_estimator.observe(model_name, prompt_chars, int(prompt_tokens))
+
+
+def reset_context_window_state() -> None:
+    """Forgets the calibration and the sticky num_ctx of every model (used by tests)."""
+    shared_token_estimator.reset()
+    with _num_ctx_floor_lock:
+        _num_ctx_floor.clear()
+
+
+class FittedPrompt(BaseModel):
+    """A rendered prompt that fits the model context window, and the num_ctx to request it with."""
+    prompt: str
+    num_ctx: int
+    estimated_tokens: int
+    dropped: List[str] = Field(default_factory=list, description="What was removed to fit, in order.")
+    fits: bool = True
+
+
+class ContextWindowManager:
+    """
+    Sizes `num_ctx` per request and keeps prompts within the model's maximum context.
+
+    `num_ctx` is the smallest configured bucket holding the estimated prompt plus the output
+    reserve. Ollama reloads a model when `num_ctx` changes, so with `sticky` the size used for a
+    model never shrinks during a run (at most one reload per bucket instead of one per switch).
+
+    A prompt that does not fit the model's `max_tokens` is reduced in priority order: few-shot
+    examples, then the PR description, then the code farthest from the changed lines. Every
+    reduction is logged; a prompt that still does not fit is sent with a warning.
+    """
+
+    def __init__(self, settings: ContextWindowSettings, estimator: Optional[TokenEstimator] = None):
+        self.settings = settings
+        self.estimator = estimator or shared_token_estimator
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ContextWindowManager":
+        return cls(ContextWindowSettings.from_config(config))
+
+    @property
+    def enabled(self) -> bool:
+        return self.settings.enabled
+
+    def max_tokens(self, model_name: str) -> int:
+        value = self.settings.model_setting(model_name, "max_tokens")
+        return int(value) if isinstance(value, (int, float)) and value > 0 else self.settings.default_max_tokens
+
+    def _configured_chars_per_token(self, model_name: str) -> float:
+        value = self.settings.model_setting(model_name, "chars_per_token")
+        return float(value) if isinstance(value, (int, float)) and value > 0 else self.settings.default_chars_per_token
+
+    def estimate_tokens(self, model_name: str, *texts: Optional[str]) -> int:
+        chars = sum(len(text) for text in texts if text)
+        return self.estimator.estimate(model_name, chars, self._configured_chars_per_token(model_name), self.settings.safety_margin)
+
+    def select_num_ctx(self, model_name: str, prompt_tokens: int, output_tokens: Optional[int] = None) -> int:
+        """Smallest bucket (capped at the model maximum) for the prompt plus the output reserve."""
+        needed = prompt_tokens + (output_tokens or self.settings.output_reserve_tokens)
+        max_tokens = self.max_tokens(model_name)
+        num_ctx = next((bucket for bucket in self.settings.buckets if needed <= bucket <= max_tokens), max_tokens)
+        if not self.settings.sticky:
+            return num_ctx
+        with _num_ctx_floor_lock:
+            num_ctx = max(num_ctx, min(_num_ctx_floor.get(model_name, 0), max_tokens))
+            if num_ctx > _num_ctx_floor.get(model_name, 0):
+                if model_name in _num_ctx_floor:
+                    logger.info(f"Growing num_ctx of '{model_name}' to {num_ctx} (prompt needs ~{needed} tokens); Ollama reloads the model once.")
+                _num_ctx_floor[model_name] = num_ctx
+        return num_ctx
+
+    def fit_prompt(
+        self,
+        model_name: str,
+        render: Callable[[Dict[str, Any]], Optional[str]],
+        prompt_variables: Dict[str, Any],
+        system_message_content: Optional[str] = None,
+        file_data: Optional[ChangedFile] = None,
+        output_tokens: Optional[int] = None,
+        label: str = ""
+    ) -> Optional[FittedPrompt]:
+        """
+        Renders the prompt with `render(prompt_variables)` and reduces it until it fits the model's
+        maximum context (see the class docstring). Returns None when the prompt cannot be rendered.
+        """
+        reserve = output_tokens or self.settings.output_reserve_tokens
+        budget = self.max_tokens(model_name) - reserve
+        variables = dict(prompt_variables)
+        prompt = render(variables)
+        if prompt is None:
+            return None
+        tokens = self.estimate_tokens(model_name, system_message_content, prompt)
+        dropped: List[str] = []
+
+        for step_name, reduce in (
+            ("few-shot examples", self._drop_examples),
+            ("PR description", self._drop_pr_description),
+            ("distant code", lambda v: self._drop_distant_code(v, model_name, render, system_message_content, file_data, budget)),
+        ):
+            if tokens <= budget:
+                break
+            reduced = reduce(variables)
+            if reduced is None:
+                continue
+            reduced_variables, detail = reduced
+            reduced_prompt = render(reduced_variables)
+            if reduced_prompt is None or len(reduced_prompt) >= len(prompt):
+                continue # Template không dùng phần này
+            variables, prompt = reduced_variables, reduced_prompt
+            tokens = self.estimate_tokens(model_name, system_message_content, prompt)
+            dropped.append(f"{step_name}{detail}")
+
+        fits = tokens <= budget
+        if dropped:
+            logger.warning(
+                f"Prompt{label} exceeded the context window of '{model_name}' ({self.max_tokens(model_name)} tokens, "
+                f"{reserve} reserved for output); dropped: {', '.join(dropped)}. Now ~{tokens} tokens."
+            )
+        if not fits:
+            logger.warning(
+                f"Prompt{label} still needs ~{tokens} tokens, more than the {budget} available for '{model_name}'; "
+                f"Ollama will truncate it. Raise `max_tokens` for this model in the context_window section of models.yml if it supports more."
+            )
+        return FittedPrompt(
+            prompt=prompt, num_ctx=self.select_num_ctx(model_name, tokens, reserve),
+            estimated_tokens=tokens, dropped=dropped, fits=fits,
+        )
+
+    @staticmethod
+    def _drop_examples(variables: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+        if variables.get("include_examples") is False:
+            return None
+        return {**variables, "include_examples": False}, ""
+
+    @staticmethod
+    def _drop_pr_description(variables: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], str]]:
+        if variables.get("pr_description") in (None, "", "Not available", PR_DESCRIPTION_OMITTED):
+            return None
+        return {**variables, "pr_description": PR_DESCRIPTION_OMITTED}, ""
+
+    def _drop_distant_code(
+        self,
+        variables: Dict[str, Any],
+        model_name: str,
+        render: Callable[[Dict[str, Any]], Optional[str]],
+        system_message_content: Optional[str],
+        file_data: Optional[ChangedFile],
+        budget: int
+    ) -> Optional[Tuple[Dict[str, Any], str]]:
+        if file_data is None or not file_data.content or "file_content" not in variables:
+            return None
+        # Token còn lại cho code = budget - phần prompt không chứa code
+        without_code = render({**variables, "file_content": "", "code_scope_note": TRUNCATED_CODE_NOTE})
+        if without_code is None:
+            return None
+        code_tokens = budget - self.estimate_tokens(model_name, system_message_content, without_code)
+        if code_tokens <= 0:
+            return None
+        chars_per_token = self.estimator.chars_per_token(model_name, self._configured_chars_per_token(model_name))
+        max_chars = int(code_tokens * chars_per_token / self.settings.safety_margin)
+        excerpt, omitted_lines = build_focused_excerpt(file_data.content, file_data.diff_hunks, max_chars)
+        if not omitted_lines:
+            return None
+        return {**variables, "file_content": excerpt, "code_scope_note": TRUNCATED_CODE_NOTE}, f" ({omitted_lines} lines)"
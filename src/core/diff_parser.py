@@ -0,0 +1,289 @@
+# NOVAGUARD-AI/src/core/diff_parser.py
+
+import os
+import re
+import logging
+from typing import Dict, List, Optional, Tuple, Any
+
+from pydantic import BaseModel, Field
+
+from .shared_context import DiffHunk
+
+logger = logging.getLogger(__name__)
+
+REVIEW_SCOPE_FULL = "full"
+REVIEW_SCOPE_HUNKS = "hunks"
+SUPPORTED_REVIEW_SCOPES = (REVIEW_SCOPE_FULL, REVIEW_SCOPE_HUNKS)
+DEFAULT_HUNK_CONTEXT_LINES = 10
+
+_HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$")
+_DEV_NULL = "/dev/null"
+
+# Status letters of `git diff --raw`/`--name-status` -> ChangedFile.change_type
+CHANGE_TYPES = {
+    "A": "added", "M": "modified", "D": "deleted", "R": "renamed",
+    "C": "copied", "T": "type_changed", "U": "unmerged", "X": "unknown",
+}
+
+
+def get_review_scope(config: Any) -> str:
+    """
+    Returns what the agents are shown for each changed file: `orchestration.review_scope` in models.yml
+    ("full" or "hunks"), overridable with the NOVAGUARD_REVIEW_SCOPE environment variable.
+    """
+    env_value = os.environ.get("NOVAGUARD_REVIEW_SCOPE")
+    scope = env_value.strip().lower() if env_value else config.get_orchestration_setting("review_scope", REVIEW_SCOPE_FULL)
+    if scope in SUPPORTED_REVIEW_SCOPES:
+        return scope
+    if isinstance(scope, str):
+        logger.warning(f"Unknown review scope '{scope}'. Using '{REVIEW_SCOPE_FULL}'.")
+    return REVIEW_SCOPE_FULL
+
+
+def get_hunk_context_lines(config: Any) -> int:
+    """Unchanged lines kept around each change (`git diff -U<n>`), from `orchestration.hunk_context_lines`."""
+    value = config.get_orchestration_setting("hunk_context_lines", DEFAULT_HUNK_CONTEXT_LINES)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        logger.warning(f"Invalid hunk_context_lines '{value}'. Using {DEFAULT_HUNK_CONTEXT_LINES}.")
+        return DEFAULT_HUNK_CONTEXT_LINES
+
+
+def _unquote_git_path(path: str) -> str:
+    """Undoes git's C-style quoting of unusual paths ("a/t\\303\\251st.py")."""
+    if len(path) >= 2 and path.startswith('"') and path.endswith('"'):
+        try:
+            return path[1:-1].encode("latin-1", "backslashreplace").decode("unicode_escape").encode("latin-1").decode("utf-8")
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            return path[1:-1]
+    return path
+
+
+def _strip_prefix(path: str, prefix: str) -> str:
+    path = _unquote_git_path(path.rstrip("\t"))
+    return path[len(prefix):] if path.startswith(prefix) else path
+
+
+def _path_from_diff_git_line(line: str) -> Optional[str]:
+    """Best-effort new path from `diff --git a/<old> b/<new>` (used when there are no ---/+++ lines, e.g. binary files)."""
+    rest = line[len("diff --git "):]
+    half = len(rest) // 2
+    if len(rest) % 2 == 1 and rest[half] == " " and rest[:half][2:] == rest[half + 1:][2:]:
+        return _strip_prefix(rest[half + 1:], "b/")
+    if " b/" in rest:
+        return _strip_prefix("b/" + rest.split(" b/", 1)[1], "b/")
+    return None
+
+
+class DiffFileStatus(BaseModel):
+    """One line of `git diff --raw --no-abbrev -M`: how a path changed and the blobs on each side."""
+    path: str = Field(description="The new (head) path, or the old path for deleted files.")
+    old_path: Optional[str] = Field(default=None, description="The base path for renames and copies.")
+    change_type: str = Field(description="One of the CHANGE_TYPES values, e.g. 'modified' or 'renamed'.")
+    similarity: Optional[int] = Field(default=None, description="Rename/copy similarity score in percent.")
+    old_mode: str = Field(default="000000")
+    new_mode: str = Field(default="000000")
+    old_blob: Optional[str] = Field(default=None, description="Base blob id; None when the path did not exist.")
+    new_blob: Optional[str] = Field(default=None, description="Head blob id; None for deleted files.")
+
+    @property
+    def is_regular_file(self) -> bool:
+        """Whether the head side is a regular file (not a symlink, submodule or deletion)."""
+        return self.new_blob is not None and self.new_mode in ("100644", "100755")
+
+
+def parse_raw_diff_status(diff_text: str) -> List[DiffFileStatus]:
+    """
+    Parses the `:<old mode> <new mode> <old blob> <new blob> <status>\t<path>[\t<new path>]` lines of
+    `git diff --raw` (also when followed by a patch, as with `--raw -p`). Other lines are ignored.
+    """
+    statuses: List[DiffFileStatus] = []
+    for line in diff_text.splitlines():
+        if not line.startswith(":"):
+            continue
+        meta, _, paths_part = line.partition("\t")
+        meta_fields = meta[1:].split()
+        paths = [_unquote_git_path(p) for p in paths_part.split("\t") if p]
+        if len(meta_fields) != 5 or not paths:
+            logger.warning(f"Skipping unparseable raw diff line: '{line[:120]}'")
+            continue
+        old_mode, new_mode, old_blob, new_blob, status = meta_fields
+        letter, score = status[:1], status[1:]
+        statuses.append(DiffFileStatus(
+            path=paths[-1],
+            old_path=paths[0] if len(paths) > 1 else None,
+            change_type=CHANGE_TYPES.get(letter, "unknown"),
+            similarity=int(score) if score.isdigit() else None,
+            old_mode=old_mode, new_mode=new_mode,
+            old_blob=None if old_blob.strip("0") == "" else old_blob,
+            new_blob=None if new_blob.strip("0") == "" else new_blob,
+        ))
+    return statuses
+
+
+def parse_unified_diff(diff_text: str) -> Dict[str, List[DiffHunk]]:
+    """
+    Parses the output of `git diff` (any -U value) into `{path: [DiffHunk, ...]}`.
+
+    Paths are the new (head) paths, or the old path for deleted files, in diff order.
+    Files without hunks (binary files, mode-only changes) map to an empty list.
+    Hunk bodies are consumed by their line counts, so removed lines that look like
+    `--- ...` headers are handled correctly.
+    """
+    files: Dict[str, List[DiffHunk]] = {}
+    current_path: Optional[str] = None
+    old_path: Optional[str] = None
+    current_hunk: Optional[DiffHunk] = None
+    old_remaining = new_remaining = 0
+    old_line = new_line = 0
+
+    for line in diff_text.splitlines():
+        marker = line[:1]
+        if current_hunk is not None and (old_remaining > 0 or new_remaining > 0) and marker in ("", " ", "+", "-", "\\"):
+            if marker == "\\":  # "\ No newline at end of file"
+                continue
+            if marker == "-":
+                current_hunk.line_map.append((old_line, None))
+                old_line += 1; old_remaining -= 1
+            elif marker == "+":
+                current_hunk.line_map.append((None, new_line))
+                new_line += 1; new_remaining -= 1
+            else:  # Context line (an empty line is a context line whose leading space was stripped)
+                current_hunk.line_map.append((old_line, new_line))
+                old_line += 1; new_line += 1
+                old_remaining -= 1; new_remaining -= 1
+            current_hunk.lines.append(line if line else " ")
+            continue
+
+        if line.startswith("diff --git "):
+            current_path = _path_from_diff_git_line(line)
+            old_path = None
+            current_hunk = None
+            if current_path is not None:
+                files.setdefault(current_path, [])
+        elif line.startswith("--- ") and current_hunk is None:
+            old_path = None if line[4:].rstrip("\t") == _DEV_NULL else _strip_prefix(line[4:], "a/")
+        elif line.startswith("+++ ") and current_hunk is None:
+            new_path = line[4:].rstrip("\t")
+            resolved_path = old_path if new_path == _DEV_NULL else _strip_prefix(new_path, "b/")
+            if resolved_path and resolved_path != current_path:
+                if current_path is not None and not files.get(current_path):
+                    files.pop(current_path, None)
+                current_path = resolved_path
+                files.setdefault(current_path, [])
+        elif line.startswith("@@"):
+            match = _HUNK_HEADER_RE.match(line)
+            if not match or current_path is None:
+                logger.warning(f"Skipping unparseable diff hunk header: '{line[:120]}'")
+                current_hunk = None
+                continue
+            old_start, old_count, new_start, new_count, section_header = match.groups()
+            current_hunk = DiffHunk(
+                old_start=int(old_start), old_count=int(old_count) if old_count is not None else 1,
+                new_start=int(new_start), new_count=int(new_count) if new_count is not None else 1,
+                section_header=section_header.strip() or None,
+            )
+            files[current_path].append(current_hunk)
+            old_line, new_line = current_hunk.old_start, current_hunk.new_start
+            old_remaining, new_remaining = current_hunk.old_count, current_hunk.new_count
+    return files
+
+
+def _merged_new_file_ranges(hunks: List[DiffHunk], total_lines: int) -> List[Tuple[int, int]]:
+    """1-based, inclusive new-file line ranges covered by the hunks, merged and clamped to the file."""
+    ranges: List[Tuple[int, int]] = []
+    for hunk in hunks:
+        if hunk.new_count > 0:
+            start, end = hunk.new_start, hunk.new_start + hunk.new_count - 1
+        else:  # Pure deletion: show the line the removed block followed (and the next one)
+            start, end = hunk.new_start, hunk.new_start + 1
+        start, end = max(1, start), min(total_lines, end)
+        if start <= end:
+            ranges.append((start, end))
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def build_hunk_excerpt(content: str, hunks: Optional[List[DiffHunk]]) -> Optional[str]:
+    """
+    Renders only the regions of `content` (the new file) covered by `hunks`, each line prefixed
+    with its real line number and added lines marked with '+'. Omitted regions become a single
+    `...` line. Returns None when there is nothing to excerpt (callers fall back to the full file).
+    """
+    if not hunks or not content:
+        return None
+    file_lines = content.splitlines()
+    ranges = _merged_new_file_ranges(hunks, len(file_lines))
+    if not ranges:
+        return None
+    added_lines = {line_no for hunk in hunks for line_no in hunk.added_lines}
+    width = len(str(ranges[-1][1]))
+    excerpt_lines: List[str] = []
+    previous_end = 0
+    for start, end in ranges:
+        if start > previous_end + 1:
+            excerpt_lines.append(f"{'.' * width}   ... (lines {previous_end + 1}-{start - 1} unchanged, omitted)")
+        for line_no in range(start, end + 1):
+            marker = "+" if line_no in added_lines else " "
+            excerpt_lines.append(f"{line_no:>{width}} {marker}| {file_lines[line_no - 1]}")
+        previous_end = end
+    if previous_end < len(file_lines):
+        excerpt_lines.append(f"{'.' * width}   ... (lines {previous_end + 1}-{len(file_lines)} unchanged, omitted)")
+    return "\n".join(excerpt_lines)
+
+
+def build_focused_excerpt(content: str, hunks: Optional[List[DiffHunk]], max_chars: int) -> Tuple[str, int]:
+    """
+    Renders the lines of `content` closest to the changes that fit in `max_chars`, in the format of
+    `build_hunk_excerpt` (real line numbers, '+' on added lines, `...` for omitted regions). Lines are
+    kept by distance to the nearest changed line, so code far from the diff is dropped first; without
+    hunks the start of the file is kept. Returns (excerpt, number of omitted lines).
+    """
+    file_lines = content.splitlines()
+    if not file_lines:
+        return content, 0
+    ranges = _merged_new_file_ranges(hunks or [], len(file_lines))
+    added_lines = {line_no for hunk in hunks or [] for line_no in hunk.added_lines}
+    anchors = sorted(added_lines) or [line_no for start, end in ranges for line_no in range(start, end + 1)] or [1]
+    width = len(str(len(file_lines)))
+
+    # Khoảng cách từ mỗi dòng tới dòng thay đổi gần nhất (hai lượt quét trái/phải)
+    distance = [len(file_lines)] * (len(file_lines) + 1)
+    anchor_set = set(anchors)
+    last = None
+    for line_no in range(1, len(file_lines) + 1):
+        if line_no in anchor_set: last = line_no
+        if last is not None: distance[line_no] = line_no - last
+    last = None
+    for line_no in range(len(file_lines), 0, -1):
+        if line_no in anchor_set: last = line_no
+        if last is not None: distance[line_no] = min(distance[line_no], last - line_no)
+
+    gap_marker_chars = width + 60
+    budget = max_chars - gap_marker_chars * (len(ranges) + 1)
+    kept: List[int] = []
+    for line_no in sorted(range(1, len(file_lines) + 1), key=lambda n: (distance[n], n)):
+        cost = width + 5 + len(file_lines[line_no - 1]) # "<số dòng> +| " và "\n"
+        if cost > budget:
+            break
+        budget -= cost
+        kept.append(line_no)
+    kept.sort()
+
+    excerpt_lines: List[str] = []
+    previous = 0
+    for line_no in kept:
+        if line_no > previous + 1:
+            excerpt_lines.append(f"{'.' * width}   ... (lines {previous + 1}-{line_no - 1} omitted)")
+        marker = "+" if line_no in added_lines else " "
+        excerpt_lines.append(f"{line_no:>{width}} {marker}| {file_lines[line_no - 1]}")
+        previous = line_no
+    if previous < len(file_lines):
+        excerpt_lines.append(f"{'.' * width}   ... (lines {previous + 1}-{len(file_lines)} omitted)")
+    return "\n".join(excerpt_lines), len(file_lines) - len(kept)
@@ -0,0 +1,118 @@
+# NOVAGUARD-AI/src/core/git_blob_reader.py
+
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class GitBlobReaderError(RuntimeError):
+    """Raised when the `git cat-file --batch` process fails or breaks the protocol."""
+
+
+class GitBlobReader:
+    """
+    Reads git objects through one long-lived `git cat-file --batch` process.
+
+    `read_blobs()` streams all requested object names into the process from a writer thread
+    while the responses are read back in order, so hundreds of blobs cost a single process
+    and no per-file filesystem round-trips. Object names can be blob ids or `<rev>:<path>`.
+    Use as a context manager (or call `close()`) to stop the process.
+    """
+
+    def __init__(self, repo_path: Union[str, Path]):
+        self.repo_path = Path(repo_path)
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _ensure_process(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self._process = subprocess.Popen(
+                ["git", "cat-file", "--batch"],
+                cwd=self.repo_path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+            logger.debug(f"Started git cat-file --batch (pid {self._process.pid}) in {self.repo_path}.")
+        return self._process
+
+    def read_blobs(self, object_names: List[str]) -> Dict[str, Optional[bytes]]:
+        """
+        Returns `{object_name: content}` for every requested name; missing objects map to None.
+        Duplicate names are only requested once.
+        """
+        unique_names = list(dict.fromkeys(object_names))
+        if not unique_names:
+            return {}
+        with self._lock:
+            process = self._ensure_process()
+            assert process.stdin is not None and process.stdout is not None
+            request_data = "".join(f"{name}\n" for name in unique_names).encode("utf-8")
+            write_errors: List[BaseException] = []
+
+            def _write_requests() -> None:
+                try:
+                    process.stdin.write(request_data)
+                    process.stdin.flush()
+                except (BrokenPipeError, OSError) as e:
+                    write_errors.append(e)
+
+            writer = threading.Thread(target=_write_requests, name="git-cat-file-writer", daemon=True)
+            writer.start()
+            blobs: Dict[str, Optional[bytes]] = {}
+            try:
+                for name in unique_names:
+                    header = process.stdout.readline()
+                    if not header:
+                        raise GitBlobReaderError(f"git cat-file --batch exited while reading '{name}'.")
+                    header_fields = header.decode("utf-8", errors="replace").rstrip("\n").split(" ")
+                    if header_fields[-1] in ("missing", "ambiguous"):
+                        logger.warning(f"git object '{name}' is {header_fields[-1]}.")
+                        blobs[name] = None
+                        continue
+                    if len(header_fields) != 3 or not header_fields[2].isdigit():
+                        raise GitBlobReaderError(f"Unexpected git cat-file header for '{name}': {header!r}")
+                    size = int(header_fields[2])
+                    content = process.stdout.read(size)
+                    process.stdout.read(1) # Dấu xuống dòng kết thúc mỗi object
+                    if len(content) != size:
+                        raise GitBlobReaderError(f"Truncated git cat-file output for '{name}'.")
+                    blobs[name] = content if header_fields[1] == "blob" else None
+            except GitBlobReaderError:
+                self._terminate()
+                raise
+            finally:
+                writer.join()
+            if write_errors:
+                self._terminate()
+                raise GitBlobReaderError(f"Could not write to git cat-file --batch: {write_errors[0]}")
+            return blobs
+
+    def _terminate(self) -> None:
+        if self._process is not None and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        self._process = None
+
+    def close(self) -> None:
+        """Ends the `git cat-file --batch` process (closing stdin lets it exit cleanly)."""
+        with self._lock:
+            if self._process is None:
+                return
+            try:
+                if self._process.stdin:
+                    self._process.stdin.close()
+                self._process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self._process.kill()
+                self._process.wait()
+            if self._process.stdout:
+                self._process.stdout.close()
+            self._process = None
+
+    def __enter__(self) -> "GitBlobReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
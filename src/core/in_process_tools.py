@@ -0,0 +1,116 @@
+# NOVAGUARD-AI/src/core/in_process_tools.py
+
+import logging
+import threading
+import importlib.metadata
+from pathlib import Path
+from typing import Dict, Any, List, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InProcessToolUnavailable(Exception):
+    """The tool's Python package cannot be imported; ToolRunner falls back to the CLI command."""
+
+
+class InProcessToolError(Exception):
+    """The tool was imported but failed while analyzing files."""
+    def __init__(self, message: str, return_code: Optional[int] = None):
+        super().__init__(message)
+        self.return_code = return_code
+
+
+def _run_pylint(file_paths: List[Path], args: List[str]) -> List[Dict[str, Any]]:
+    """
+    Runs pylint through `pylint.lint.Run` with a collecting reporter. Findings have the
+    same shape as `pylint --output-format=json`, with `path` absolute.
+    """
+    try:
+        from pylint.lint import Run
+        from pylint.reporters import CollectingReporter
+    except ImportError as e:
+        raise InProcessToolUnavailable(f"pylint is not importable: {e}")
+
+    effective_args: List[str] = []
+    for arg in args:
+        if arg.startswith("--rcfile=") and not Path(arg.split("=", 1)[1]).is_file():
+            # CLI sẽ thoát với code 32 nếu rcfile không tồn tại; ở đây dùng cấu hình mặc định của pylint
+            logger.info(f"pylint rcfile '{arg.split('=', 1)[1]}' not found, using pylint defaults.")
+            continue
+        if arg.startswith("--jobs"):
+            continue
+        effective_args.append(arg)
+    # Luôn --jobs=1: pylint song song dùng multiprocessing, không an toàn khi chạy trong thread của Tier 1 pool
+    effective_args.append("--jobs=1")
+
+    reporter = CollectingReporter()
+    try:
+        Run([*effective_args, *[str(p) for p in file_paths]], reporter=reporter, exit=False)
+    except SystemExit as e: # Lỗi cấu hình/argument: pylint gọi sys.exit kể cả khi exit=False
+        raise InProcessToolError(f"pylint exited with code {e.code} while parsing its configuration.", return_code=e.code if isinstance(e.code, int) else None)
+    return [
+        {
+            "type": message.category, "module": message.module, "obj": message.obj,
+            "line": message.line, "column": message.column, "endLine": message.end_line, "endColumn": message.end_column,
+            "path": message.abspath, "symbol": message.symbol, "message": message.msg, "message-id": message.msg_id,
+        }
+        for message in reporter.messages
+    ]
+
+
+def _run_bandit(file_paths: List[Path], args: List[str]) -> List[Dict[str, Any]]:
+    """
+    Runs bandit through `BanditManager`. Findings have the shape of the `results` items of
+    `bandit -f json`. `args` may contain `--configfile=<path>`.
+    """
+    try:
+        from bandit.core import config as bandit_config, manager as bandit_manager
+    except ImportError as e:
+        raise InProcessToolUnavailable(f"bandit is not importable: {e}")
+
+    config_file = next((a.split("=", 1)[1] for a in args if a.startswith("--configfile=") and Path(a.split("=", 1)[1]).is_file()), None)
+    try:
+        manager = bandit_manager.BanditManager(bandit_config.BanditConfig(config_file=config_file), "file", quiet=True)
+        manager.discover_files([str(p) for p in file_paths], False)
+        manager.run_tests()
+    except SystemExit as e:
+        raise InProcessToolError(f"bandit exited with code {e.code}.", return_code=e.code if isinstance(e.code, int) else None)
+    return [issue.as_dict() for issue in manager.get_issue_list()]
+
+
+# Tên dùng trong `in_process` của tools.yml -> (hàm chạy, distribution để lấy version)
+IN_PROCESS_RUNNERS: Dict[str, Callable[[List[Path], List[str]], List[Dict[str, Any]]]] = {
+    "pylint": _run_pylint,
+    "bandit": _run_bandit,
+}
+_DISTRIBUTIONS = {"pylint": "pylint", "bandit": "bandit"}
+# Các tool này dùng state toàn cục (sys.path, cache AST, ...) nên mỗi tool chỉ chạy một lần tại một thời điểm
+_runner_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in IN_PROCESS_RUNNERS}
+
+
+def get_in_process_tool_version(name: str) -> Optional[str]:
+    """Installed version of an in-process tool (for the result cache key), or None if it is not installed."""
+    distribution = _DISTRIBUTIONS.get(name)
+    if not distribution:
+        return None
+    try:
+        return f"{name} {importlib.metadata.version(distribution)} (in-process)"
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def run_in_process_tool(name: str, file_paths: List[Path], args: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Runs the named Python-native tool inside this process on `file_paths` and returns its
+    findings as dicts. There is no subprocess, no stdout JSON and no temp output file, so
+    the per-file cost is the analysis itself. Timeouts are not enforced for in-process runs.
+
+    Raises:
+        InProcessToolUnavailable: Unknown runner name or the tool package is not installed.
+        InProcessToolError: The tool failed (e.g. invalid configuration).
+    """
+    runner = IN_PROCESS_RUNNERS.get(name)
+    if runner is None:
+        raise InProcessToolUnavailable(f"Unknown in-process tool '{name}'. Available: {list(IN_PROCESS_RUNNERS)}")
+    with _runner_locks[name]:
+        return runner(file_paths, list(args or []))
@@ -0,0 +1,275 @@
+# NOVAGUARD-AI/src/core/json_recovery.py
+
+import re
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+# strict=False: LLM hay xuống dòng thật (không escape) bên trong chuỗi
+_decoder = json.JSONDecoder(strict=False)
+_WHITESPACE = " \t\n\r"
+# Code fence markdown, kể cả fence chưa đóng của một response bị cắt
+_FENCE_PATTERN = re.compile(r"```[A-Za-z0-9_+-]*[ \t]*\n?(.*?)(?:```|$)", re.DOTALL)
+_WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+JSON_REPAIR_SYSTEM_MESSAGE = "You fix malformed JSON. Reply with the corrected JSON only, without any explanation."
+
+
+class RecoveredJson(BaseModel):
+    """A JSON value recovered from a malformed LLM response."""
+    value: Any
+    repairs: List[str] # Mô tả các sửa đổi đã áp dụng (để log)
+    truncated: bool = False # True: chỉ giữ các giá trị hoàn chỉnh trước chỗ response bị cắt / lỗi
+
+
+def recover_json(text: str) -> Optional[RecoveredJson]:
+    """
+    Recovers the JSON value of an LLM response that `json.loads` rejects. In order:
+    the first fenced code block (or the text from the first '[' / '{'), ignoring text after the
+    value; then single-quoted strings, trailing commas and Python literals (True/False/None) fixed;
+    then, for a response cut off (num_predict) or broken part-way, the complete values before the
+    cut with the open lists/objects closed. Returns None when nothing usable is found.
+    """
+    for candidate, repairs in _candidates(text):
+        recovered = _recover_candidate(candidate, repairs)
+        if recovered is not None:
+            return recovered
+    return None
+
+
+def is_cut_off_json(text: str) -> bool:
+    """True if the JSON in `text` stops inside a list/object (generation cut off, e.g. by num_predict)."""
+    start = _first_bracket(text)
+    return start is not None and _close_truncated(_normalize(text[start:])[0]) is not None
+
+
+def describe_json_error(text: str) -> str:
+    """The `json.loads` error for `text` ("" if it is valid JSON)."""
+    try:
+        json.loads(text)
+    except json.JSONDecodeError as e:
+        return f"{e.msg} at line {e.lineno} column {e.colno}"
+    return ""
+
+
+def build_json_repair_prompt(text: str) -> str:
+    """Prompt of the follow-up call asking the model to fix its own malformed JSON output."""
+    error = describe_json_error(text.strip())
+    return (
+        f"The text below should be a single JSON document, but it is not valid JSON ({error or 'unknown error'}). "
+        "Return the same data as valid JSON. Do not add, remove or reword any entries; only fix the syntax "
+        "(quotes, commas, brackets, escaping).\n\n"
+        f"{text.strip()}"
+    )
+
+
+def _candidates(text: str) -> Iterator[Tuple[str, List[str]]]:
+    """Text fragments that may hold the JSON value, starting at their first '[' / '{'."""
+    for match in _FENCE_PATTERN.finditer(text):
+        start = _first_bracket(match.group(1))
+        if start is not None:
+            yield match.group(1)[start:], ["extracted the JSON from a code fence"]
+            break
+    start = _first_bracket(text)
+    if start is not None:
+        yield text[start:], (["skipped text before the JSON"] if text[:start].strip() else [])
+
+
+def _first_bracket(text: str) -> Optional[int]:
+    positions = [position for position in (text.find("["), text.find("{")) if position >= 0]
+    return min(positions) if positions else None
+
+
+def _recover_candidate(candidate: str, repairs: List[str]) -> Optional[RecoveredJson]:
+    try:
+        value, end = _decoder.raw_decode(candidate)
+        return RecoveredJson(value=value, repairs=repairs + _trailing_text_note(candidate, end))
+    except json.JSONDecodeError:
+        pass
+
+    normalized, fixes = _normalize(candidate)
+    repairs = repairs + fixes
+    try:
+        value, end = _decoder.raw_decode(normalized)
+        return RecoveredJson(value=value, repairs=repairs + _trailing_text_note(normalized, end))
+    except json.JSONDecodeError as e:
+        error_position = e.pos
+
+    # Response bị cắt (hoặc hỏng từ error_position): giữ các giá trị hoàn chỉnh trước đó
+    closed = _close_truncated(normalized[:error_position])
+    if closed is None:
+        return None
+    try:
+        value = _decoder.decode(closed)
+    except json.JSONDecodeError:
+        return None
+    if _close_truncated(normalized) is not None: # Cả response là một giá trị chưa đóng
+        note = "closed the JSON cut off after its last complete value"
+    else:
+        note = f"dropped the invalid JSON from character {error_position} on"
+    return RecoveredJson(value=value, repairs=repairs + [note], truncated=True)
+
+
+def _trailing_text_note(text: str, end: int) -> List[str]:
+    return ["ignored text after the JSON"] if text[end:].strip(_WHITESPACE + "`") else []
+
+
+def _normalize(text: str) -> Tuple[str, List[str]]:
+    """Rewrites single-quoted strings, trailing commas and Python literals outside of strings."""
+    parts: List[str] = []
+    fixes: List[str] = []
+    position, length = 0, len(text)
+    while position < length:
+        char = text[position]
+        if char == '"':
+            end = _string_end(text, position)
+            parts.append(text[position:end])
+            position = end
+        elif char == "'":
+            end, converted = _convert_single_quoted(text, position)
+            parts.append(converted)
+            position = end
+            _note(fixes, "replaced single quotes with double quotes")
+        elif char == ",":
+            next_position = position + 1
+            while next_position < length and text[next_position] in _WHITESPACE:
+                next_position += 1
+            if next_position < length and text[next_position] in "]}":
+                _note(fixes, "removed trailing commas")
+            else:
+                parts.append(char)
+            position += 1
+        elif char.isalpha() or char == "_":
+            word = _WORD_PATTERN.match(text, position).group(0)
+            if word in _PYTHON_LITERALS:
+                parts.append(_PYTHON_LITERALS[word])
+                _note(fixes, "replaced Python literals")
+            else:
+                parts.append(word)
+            position += len(word)
+        else:
+            parts.append(char)
+            position += 1
+    return "".join(parts), fixes
+
+
+def _note(fixes: List[str], fix: str) -> None:
+    if fix not in fixes:
+        fixes.append(fix)
+
+
+def _string_end(text: str, start: int) -> int:
+    """Index just after the double-quoted string starting at `start` (end of text if unterminated)."""
+    position = start + 1
+    while position < len(text):
+        if text[position] == "\\":
+            position += 2
+            continue
+        if text[position] == '"':
+            return position + 1
+        position += 1
+    return len(text)
+
+
+def _convert_single_quoted(text: str, start: int) -> Tuple[int, str]:
+    """Converts the single-quoted string at `start` to a JSON string; returns (end index, converted)."""
+    parts = ['"']
+    position = start + 1
+    while position < len(text) and text[position] != "'":
+        char = text[position]
+        if char == "\\" and position + 1 < len(text):
+            escaped = text[position + 1]
+            parts.append("'" if escaped == "'" else text[position:position + 2])
+            position += 2
+            continue
+        parts.append('\\"' if char == '"' else char)
+        position += 1
+    if position < len(text):
+        parts.append('"')
+        position += 1
+    return position, "".join(parts)
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    Cuts `text` after the last list/object that closed inside the still-open top-level value and
+    closes the lists/objects left open. None if no nested value closed before the cut.
+    """
+    stack: List[str] = []
+    in_string = escaped = False
+    last_cut: Optional[Tuple[int, List[str]]] = None
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            stack.append(char)
+        elif char in "]}":
+            if not stack or stack[-1] != ("[" if char == "]" else "{"):
+                break
+            stack.pop()
+            if not stack:
+                return None # Giá trị cấp cao nhất đã đóng: không phải JSON bị cắt
+            last_cut = (index + 1, list(stack))
+    if last_cut is None:
+        return None
+    end, open_brackets = last_cut
+    return text[:end] + "".join("]" if bracket == "[" else "}" for bracket in reversed(open_brackets))
+
+
+class JsonRepairSettings(BaseModel):
+    """The `json_repair` section of models.yml."""
+    enabled: bool = True
+    max_repairs_per_run: int = 3
+    max_response_chars: int = 12000
+
+    @classmethod
+    def from_config(cls, config: Any) -> "JsonRepairSettings":
+        """Reads the settings with `config.get_json_repair_setting`, ignoring values of the wrong type."""
+        values: Dict[str, Any] = {}
+        for name, field in cls.model_fields.items():
+            value = config.get_json_repair_setting(name, None)
+            if value is None:
+                continue
+            if not isinstance(value, field.annotation) or (field.annotation is not bool and isinstance(value, bool)):
+                if isinstance(value, (str, int, float, list, dict)): # Giá trị YAML sai kiểu
+                    logger.warning(f"Ignoring invalid json_repair setting {name}={value!r}.")
+                continue
+            values[name] = value
+        return cls(**values)
+
+
+# Số lần gọi LLM sửa JSON đã dùng trong lần chạy (một lần chạy = một process)
+_repairs_used = 0
+_repairs_lock = threading.Lock()
+
+
+def acquire_json_repair(settings: JsonRepairSettings) -> bool:
+    """Takes one repair call from the per-run budget; False when repairs are disabled or the budget is spent."""
+    global _repairs_used
+    if not settings.enabled:
+        return False
+    with _repairs_lock:
+        if _repairs_used >= settings.max_repairs_per_run:
+            return False
+        _repairs_used += 1
+        return True
+
+
+def reset_json_repair_state() -> None:
+    """Resets the per-run repair budget (used by tests)."""
+    global _repairs_used
+    with _repairs_lock:
+        _repairs_used = 0
@@ -0,0 +1,475 @@
+# NOVAGUARD-AI/src/core/json_stream.py
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, TextIO, Union
+
+from .json_recovery import recover_json
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+_WHITESPACE = " \t\n\r"
+
+
+class JSONStreamError(ValueError):
+    """The streamed document is not valid JSON (or not the expected shape) at the given offset."""
+
+
+class _JsonReader:
+    """Buffered reader over a text stream that decodes one JSON value at a time with `raw_decode`."""
+
+    def __init__(self, stream: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._offset = 0 # Số ký tự đã bỏ khỏi buffer (để báo vị trí lỗi)
+        self._eof = False
+
+    def _fill(self, size: int) -> bool:
+        """Appends up to `size` characters to the buffer (dropping the consumed prefix). False at EOF."""
+        if self._eof:
+            return False
+        if self._pos > self._chunk_size:
+            self._offset += self._pos
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        chunk = self._stream.read(size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+
+    def _error(self, message: str) -> JSONStreamError:
+        return JSONStreamError(f"{message} at character {self._offset + self._pos}")
+
+    def peek(self) -> Optional[str]:
+        """Skips whitespace and returns the next character without consuming it (None at EOF)."""
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self._chunk_size):
+                return None
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise self._error(f"Expected '{char}'")
+        self._pos += 1
+
+    def decode_value(self) -> Any:
+        """Decodes the next complete JSON value, reading more input until it fits in the buffer."""
+        if self.peek() is None:
+            raise self._error("Unexpected end of JSON input")
+        read_size = self._chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._fill(read_size):
+                    read_size *= 2 # Giá trị lớn: tăng kích thước đọc để tổng chi phí decode lại vẫn tuyến tính
+                    continue
+                raise self._error(f"Invalid JSON ({e.msg})") from e
+            # Số/literal nằm sát cuối buffer có thể bị cắt ("12" của "123"): đọc thêm rồi decode lại
+            if end == len(self._buffer) and self._fill(read_size):
+                continue
+            self._pos = end
+            return value
+
+
+def iter_json_items(
+    stream: TextIO,
+    item_path: Sequence[str] = ("results",),
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Any]:
+    """
+    Yields the items of one JSON array inside a (possibly very large) document, one at a time,
+    without loading the whole document. `item_path` is the chain of object keys leading to the
+    array (`("results",)` for Semgrep/Bandit); an empty path means the document itself is the
+    array (Ruff, pylint). A top-level array is also accepted when a path is given.
+
+    Only the current item (plus one read chunk) is held in memory. Members before the array are
+    decoded and discarded; reading stops at the end of the array.
+
+    Raises:
+        JSONStreamError: Malformed JSON, or the document does not have the expected shape.
+    """
+    reader = _JsonReader(stream, chunk_size)
+    first_char = reader.peek()
+    if first_char is None:
+        return
+    if first_char == "[":
+        yield from _iter_array(reader)
+        return
+    if not item_path:
+        raise reader._error("Expected a JSON array")
+
+    for depth, key in enumerate(item_path):
+        if not _seek_member(reader, key):
+            logger.debug(f"JSON document has no '{'.'.join(item_path[:depth + 1])}' member; no items streamed.")
+            return
+    if reader.peek() != "[":
+        raise reader._error(f"Expected '{'.'.join(item_path)}' to be a JSON array")
+    yield from _iter_array(reader)
+
+
+def _seek_member(reader: _JsonReader, key: str) -> bool:
+    """Positions the reader at the value of `key` in the object starting at the reader's position."""
+    reader.expect("{")
+    if reader.peek() == "}":
+        return False
+    while True:
+        member_key = reader.decode_value()
+        if not isinstance(member_key, str):
+            raise reader._error("Expected an object key")
+        reader.expect(":")
+        if member_key == key:
+            return True
+        reader.decode_value() # Bỏ qua giá trị của member khác
+        next_char = reader.peek()
+        if next_char == "}":
+            return False
+        reader.expect(",")
+
+
+def _iter_array(reader: _JsonReader) -> Iterator[Any]:
+    reader.expect("[")
+    if reader.peek() == "]":
+        return
+    while True:
+        yield reader.decode_value()
+        next_char = reader.peek()
+        if next_char == "]":
+            return
+        reader.expect(",")
+
+
+def parse_item_path(value: Optional[Union[str, Sequence[str]]]) -> List[str]:
+    """`stream_json_path` from tools.yml: "results", "a.b" or "" (top-level array); default "results"."""
+    if value is None:
+        return ["results"]
+    if isinstance(value, str):
+        return [part for part in value.split(".") if part]
+    return [str(part) for part in value]
+
+
+class StreamedJsonOutput:
+    """
+    A tool's JSON output file read lazily: iterating yields the items of the array at `item_path`.
+    It can be iterated once. The file is deleted when iteration finishes or on `close()`.
+
+    `on_complete` callbacks receive the list of all items after a complete, error-free iteration
+    (used to store the output in the result cache); items are only collected when one is registered.
+    """
+
+    def __init__(self, path: Path, item_path: Sequence[str], source: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.path = Path(path)
+        self.item_path = list(item_path)
+        self.source = source
+        self.chunk_size = chunk_size
+        self.item_count = 0
+        self._consumed = False
+        self._on_complete: List[Callable[[List[Any]], None]] = []
+
+    def peek_first_char(self) -> Optional[str]:
+        """First non-whitespace character of the output, or None if the file is empty or missing."""
+        try:
+            with self.path.open("r", encoding="utf-8") as stream:
+                return _JsonReader(stream, self.chunk_size).peek()
+        except OSError:
+            return None
+
+    def on_complete(self, callback: Callable[[List[Any]], None]) -> None:
+        self._on_complete.append(callback)
+
+    def wrap(self, items: List[Any]) -> Union[dict, list]:
+        """Rebuilds the document shape (`{"results": items}` etc.) around a list of items."""
+        document: Union[dict, list] = items
+        for key in reversed(self.item_path):
+            document = {key: document}
+        return document
+
+    def __iter__(self) -> Iterator[Any]:
+        if self._consumed:
+            logger.warning(f"Streamed output of '{self.source}' was already consumed.")
+            return
+        self._consumed = True
+        collected: Optional[List[Any]] = [] if self._on_complete else None
+        try:
+            size_bytes = self.path.stat().st_size
+            with self.path.open("r", encoding="utf-8") as stream:
+                for item in iter_json_items(stream, self.item_path, self.chunk_size):
+                    self.item_count += 1
+                    if collected is not None:
+                        collected.append(item)
+                    yield item
+            logger.info(f"Streamed {self.item_count} items from the output of '{self.source}' ({size_bytes / (1024 * 1024):.1f} MB file).")
+            for callback in self._on_complete:
+                callback(collected or [])
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Deletes the output file (safe to call more than once)."""
+        self._consumed = True
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to clean up streamed output file {self.path}: {e}")
+
+
+class JsonCompletionDetector:
+    """
+    Watches text arriving in pieces (an LLM response) and reports where the first top-level JSON
+    list or object closes, so generation can be stopped there instead of running on (JSON mode
+    models often keep emitting whitespace until `num_predict`). Leading text other than whitespace
+    means the output is not bare JSON; the detector then never reports completion.
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._started = False
+        self._gave_up = False
+
+    def feed(self, piece: str) -> Optional[int]:
+        """Returns the index in `piece` just after the closing bracket, or None if the value is not complete yet."""
+        if self._gave_up:
+            return None
+        for index, char in enumerate(piece):
+            if not self._started:
+                if char in _WHITESPACE:
+                    continue
+                if char not in "[{":
+                    self._gave_up = True
+                    return None
+                self._started = True
+                self._depth = 1
+                continue
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return index + 1
+        return None
+
+
+class JsonListStreamParser:
+    """
+    Incremental parser for an LLM response that should be a JSON list of findings, or an object
+    nesting that list under one of `list_keys` (`{"findings": [...]}`).
+
+    `feed()` takes the response as it streams and has the same contract as
+    `JsonCompletionDetector.feed()`: it returns the index in the piece where the generation should
+    stop, or None to continue. Each item of the list is decoded into `items` as soon as it closes.
+    The parser asks to stop when the top-level value is complete, when `max_items` items were read
+    (`capped`), or as soon as the output can no longer become the expected JSON
+    (`error`: leading prose, mismatched brackets, an item that does not decode, ...). A leading
+    markdown code fence is skipped, and an item with a small syntax error (single quotes, trailing
+    comma) is fixed with `recover_json()` instead of stopping the generation.
+
+    After the value is complete, `document` holds it decoded (used when the response is a single
+    finding object rather than a list). `reset()` restarts parsing for a retried request.
+    """
+
+    def __init__(
+        self,
+        list_keys: Sequence[str] = ("findings", "results"),
+        max_items: Optional[int] = None
+    ):
+        self.list_keys = tuple(list_keys)
+        self.max_items = max_items
+        self.reset()
+
+    def reset(self) -> None:
+        self.items: List[Any] = []
+        self.document: Any = None
+        self.error: Optional[str] = None
+        self.complete = False
+        self.capped = False
+        self.list_found = False
+        self.consumed = False
+        self._buffer = ""
+        self._stack: List[str] = [] # Các '[' / '{' đang mở
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._expect_key = False # Object cấp cao nhất: chuỗi tiếp theo là key
+        self._last_key: Optional[str] = None
+        self._pending_key: Optional[str] = None # Key của giá trị sắp bắt đầu trong object cấp cao nhất
+        self._list_depth: Optional[int] = None # Độ sâu của stack bên trong list finding
+        self._item_start: Optional[int] = None
+        self._scalar_item = False
+        self._after_item = False
+        self._after_comma = False
+        self._value_start = 0
+        self._fence_seen = False
+        self._in_fence_header = False
+
+    @property
+    def stop_reason(self) -> str:
+        if self.error:
+            return f"invalid JSON ({self.error})"
+        if self.capped:
+            return f"{len(self.items)} items read (limit)"
+        return "complete JSON emitted"
+
+    @property
+    def done(self) -> bool:
+        return self.complete or self.capped or self.error is not None
+
+    def feed(self, piece: str) -> Optional[int]:
+        """Returns the index in `piece` where the generation should stop, or None to continue."""
+        self.consumed = True
+        if self.done:
+            return 0
+        base = len(self._buffer)
+        self._buffer += piece
+        for index, char in enumerate(piece):
+            if self._step(base + index, char):
+                return index + 1
+        return None
+
+    def _fail(self, message: str, position: int) -> bool:
+        self.error = f"{message} at character {position}"
+        return True
+
+    def _in_list(self) -> bool:
+        return self._list_depth is not None and len(self._stack) == self._list_depth
+
+    def _step(self, position: int, char: str) -> bool:
+        """Processes one character; True when parsing is over."""
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif char == "\\":
+                self._escaped = True
+            elif char == '"':
+                self._in_string = False
+                if self._expect_key and len(self._stack) == 1:
+                    try:
+                        self._last_key = json.loads(self._buffer[self._string_start:position + 1])
+                    except ValueError:
+                        return self._fail("Invalid object key", position)
+                    self._expect_key = False
+                elif self._item_start is not None and self._in_list():
+                    return self._finish_item(position + 1)
+            return False
+
+        if self._in_fence_header: # Bỏ qua tới hết dòng ```json
+            self._in_fence_header = char != "\n"
+            return False
+        if self._scalar_item and (char in _WHITESPACE or char in ",]"):
+            self._scalar_item = False
+            if self._finish_item(position):
+                return True
+        if char in _WHITESPACE or self._scalar_item:
+            return False
+
+        if not self._stack: # Ký tự đầu tiên (parser dừng ngay khi giá trị cấp cao nhất đóng)
+            if char == "`" and not self._fence_seen: # Code fence markdown (```json) trước JSON
+                self._in_fence_header = self._fence_seen = True
+                return False
+            if char not in "[{":
+                return self._fail("Response is not a JSON list or object", position)
+            self._value_start = position
+            self._stack.append(char)
+            if char == "[":
+                self._list_depth, self.list_found = 1, True
+            else:
+                self._expect_key = True
+            return False
+
+        if self._in_list() and self._item_start is None:
+            if char == ",":
+                if not self._after_item:
+                    return self._fail("Unexpected ','", position)
+                self._after_item, self._after_comma = False, True
+                return False
+            if char == "]":
+                if self._after_comma:
+                    return self._fail("Trailing ',' in list", position)
+                return self._close(position, char)
+            if self._after_item or char in "}:":
+                return self._fail(f"Unexpected '{char}' in list", position)
+            self._after_comma = False
+            self._item_start = position
+            if char not in '[{"':
+                self._scalar_item = True
+                return False
+
+        if char == '"':
+            self._in_string, self._string_start = True, position
+        elif char in "[{":
+            if len(self._stack) == 1 and self._stack[0] == "{":
+                if char == "[" and not self.list_found and self._pending_key in self.list_keys:
+                    self._list_depth, self.list_found = 2, True
+                self._pending_key = None
+            self._stack.append(char)
+        elif char in "]}":
+            return self._close(position, char)
+        elif len(self._stack) == 1 and self._stack[0] == "{":
+            if char == ":":
+                self._pending_key = self._last_key
+            elif char == ",":
+                self._expect_key, self._pending_key = True, None
+        return False
+
+    def _close(self, position: int, char: str) -> bool:
+        opening = "[" if char == "]" else "{"
+        if self._stack[-1] != opening:
+            return self._fail(f"Mismatched '{char}'", position)
+        closing_list = self._in_list()
+        self._stack.pop()
+        if closing_list:
+            self._list_depth = None
+        elif self._item_start is not None and self._in_list():
+            if self._finish_item(position + 1):
+                return True
+        if self._stack:
+            return False
+        self.complete = True
+        text = self._buffer[self._value_start:position + 1]
+        try:
+            self.document = json.loads(text)
+        except ValueError as e:
+            recovered = recover_json(text)
+            if recovered is None or recovered.truncated:
+                return self._fail(f"Invalid JSON ({e.msg if isinstance(e, json.JSONDecodeError) else e})", position)
+            self.document = recovered.value
+        return True
+
+    def _finish_item(self, end: int) -> bool:
+        text = self._buffer[self._item_start:end]
+        self._item_start, self._after_item = None, True
+        try:
+            item = json.loads(text)
+        except ValueError:
+            # Lỗi cú pháp nhỏ trong item (nháy đơn, dấu phẩy thừa, ...) không làm dừng cả response
+            recovered = recover_json(text)
+            if recovered is None or recovered.truncated:
+                return self._fail(f"List item {len(self.items) + 1} is not valid JSON", end)
+            item = recovered.value
+        self.items.append(item)
+        if self.max_items and len(self.items) >= self.max_items:
+            self.capped = True
+            return True
+        return False
@@ -0,0 +1,213 @@
+# NOVAGUARD-AI/src/core/llm_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".novaguard_cache/llm_responses.sqlite"
+DEFAULT_MAX_SIZE_MB = 256
+DEFAULT_MAX_AGE_DAYS = 14
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+class LLMResponseCache:
+    """
+    Persistent, content-addressed cache of LLM responses stored in a local SQLite file.
+
+    Entries are keyed by `make_key()` (a SHA-256 over everything that determines the
+    response). Entries older than `max_age_seconds` are dropped, and when the stored
+    responses exceed `max_size_bytes` the least recently used ones are evicted.
+    With `bypass=True` lookups always miss but fresh responses are still stored,
+    so a forced re-run refreshes the cache.
+    """
+
+    def __init__(
+        self,
+        cache_path: Union[str, Path],
+        max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        max_age_seconds: float = DEFAULT_MAX_AGE_DAYS * 24 * 3600,
+        bypass: bool = False
+    ):
+        self.cache_path = Path(cache_path)
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Một connection dùng chung cho mọi thread (agent song song), được bảo vệ bởi self._lock
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_responses ("
+                " key TEXT PRIMARY KEY,"
+                " model_name TEXT NOT NULL,"
+                " response TEXT NOT NULL,"
+                " size_bytes INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_responses_last_accessed ON llm_responses(last_accessed_at)")
+            self._conn.commit()
+            self._evict_locked()
+        logger.info(
+            f"LLM response cache opened at {self.cache_path} (max {self.max_size_bytes / (1024 * 1024):.0f} MB, "
+            f"max age {self.max_age_seconds / 86400:.1f} days, bypass={self.bypass})."
+        )
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        model_digest: Optional[str],
+        system_message_content: Optional[str],
+        prompt: str,
+        temperature: float,
+        is_json_mode: bool,
+        options: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Returns the content address (hex SHA-256) of an LLM request."""
+        key_material = json.dumps({
+            "model_name": model_name,
+            "model_digest": model_digest or "",
+            "system": system_message_content or "",
+            "prompt": prompt,
+            "temperature": temperature,
+            "json_mode": bool(is_json_mode),
+            "options": options or {},
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key`, or None on a miss (always None when bypassing)."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.max_age_seconds:
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_responses SET last_accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return response
+
+    def put(self, key: str, model_name: str, response: str) -> None:
+        """Stores a response and evicts old / least recently used entries if needed."""
+        now = time.time()
+        size_bytes = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, model_name, response, size_bytes, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, response, size_bytes, now, now)
+            )
+            self.stores += 1
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """Drops expired entries, then least recently used ones until under the size limit. Caller holds the lock."""
+        cursor = self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        self.evictions += max(cursor.rowcount, 0)
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM llm_responses").fetchone()[0]
+        if total_size > self.max_size_bytes:
+            for key, size_bytes in self._conn.execute("SELECT key, size_bytes FROM llm_responses ORDER BY last_accessed_at ASC").fetchall():
+                if total_size <= self.max_size_bytes:
+                    break
+                self._conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                total_size -= size_bytes
+                self.evictions += 1
+        self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM llm_responses").fetchone()
+        return {
+            "hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+            "entries": entries, "size_bytes": total_size,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = (100.0 * stats["hits"] / lookups) if lookups else 0.0
+        logger.info(
+            f"LLM response cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+            f"{stats['stores']} stored, {stats['evictions']} evicted; {stats['entries']} entries, "
+            f"{stats['size_bytes'] / (1024 * 1024):.1f} MB at {self.cache_path}."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Cache dùng chung trong process, theo đường dẫn file (các node/agent tạo client riêng nhưng chung cache)
+_shared_caches: Dict[str, LLMResponseCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def _number_setting(value: Any, default: float) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return value
+    return default
+
+
+def get_llm_response_cache(config: Any) -> Optional[LLMResponseCache]:
+    """
+    Returns the process-wide LLMResponseCache configured by the `llm_cache` section of
+    models.yml, or None if caching is disabled or the cache cannot be opened.
+
+    Environment overrides: NOVAGUARD_LLM_CACHE_PATH, NOVAGUARD_LLM_CACHE_BYPASS.
+    """
+    if config.get_llm_cache_setting("enabled", False) is not True:
+        return None
+
+    path_setting = os.environ.get("NOVAGUARD_LLM_CACHE_PATH") or config.get_llm_cache_setting("path", DEFAULT_CACHE_PATH)
+    if not isinstance(path_setting, (str, Path)):
+        path_setting = DEFAULT_CACHE_PATH
+    cache_path = Path(path_setting).expanduser().resolve()
+
+    env_bypass = os.environ.get("NOVAGUARD_LLM_CACHE_BYPASS")
+    if env_bypass:
+        bypass = env_bypass.strip().lower() in _TRUE_VALUES
+    else:
+        bypass = config.get_llm_cache_setting("bypass", False) is True
+
+    with _shared_caches_lock:
+        cache = _shared_caches.get(str(cache_path))
+        if cache is None:
+            try:
+                cache = LLMResponseCache(
+                    cache_path,
+                    max_size_bytes=int(_number_setting(config.get_llm_cache_setting("max_size_mb"), DEFAULT_MAX_SIZE_MB) * 1024 * 1024),
+                    max_age_seconds=_number_setting(config.get_llm_cache_setting("max_age_days"), DEFAULT_MAX_AGE_DAYS) * 24 * 3600,
+                    bypass=bypass,
+                )
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Could not open LLM response cache at {cache_path}: {e}. Continuing without cache.")
+                return None
+            _shared_caches[str(cache_path)] = cache
+        cache.bypass = bypass
+    return cache
@@ -0,0 +1,195 @@
+# NOVAGUARD-AI/src/core/model_warmup.py
+
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+from pydantic import BaseModel
+
+from .context_window import ContextWindowManager
+from .ollama_balancer import get_ollama_endpoint_balancer
+from .ollama_client import fetch_model_digests, find_model_digest
+
+logger = logging.getLogger(__name__)
+
+# Option chỉ đọc lúc load model: request đầu tiên gửi giá trị khác với lúc preload sẽ làm Ollama load lại model
+_LOAD_TIME_OPTIONS = ("num_thread", "num_batch", "num_gpu", "main_gpu", "low_vram", "use_mmap", "use_mlock")
+
+
+class ModelWarmupSettings(BaseModel):
+    """The `ollama.warmup` section of models.yml."""
+    enabled: bool = True
+    preload: bool = True
+    keep_alive: str = "15m"
+    num_ctx: int = 4096
+    timeout_seconds: float = 600.0
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ModelWarmupSettings":
+        """Reads `ollama.warmup`, ignoring values of the wrong type; NOVAGUARD_MODEL_WARMUP overrides `enabled`."""
+        section = config.get_ollama_setting("warmup", None)
+        values: Dict[str, Any] = {}
+        if isinstance(section, dict):
+            for name, field in cls.model_fields.items():
+                value = section.get(name)
+                if value is None:
+                    continue
+                expected = {bool: bool, str: (str, int), int: int, float: (int, float)}[field.annotation]
+                if not isinstance(value, expected) or (field.annotation is not bool and isinstance(value, bool)):
+                    logger.warning(f"Ignoring invalid ollama.warmup setting {name}={value!r}.")
+                    continue
+                values[name] = str(value) if field.annotation is str else value
+        env_value = os.environ.get("NOVAGUARD_MODEL_WARMUP")
+        if env_value:
+            values["enabled"] = env_value.strip().lower() in ("1", "true", "yes", "on")
+        return cls(**values)
+
+
+class ModelWarmupResult(BaseModel):
+    """Outcome of warming up one model on one endpoint."""
+    model_name: str
+    base_url: str
+    present: Optional[bool] = None # None: /api/tags không trả lời, chưa biết model có sẵn hay không
+    loaded: bool = False
+    num_ctx: Optional[int] = None
+    load_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class ModelWarmup:
+    """
+    Checks and preloads the models a run will use in the background.
+
+    Started at the beginning of a run, it overlaps the model load time with diff acquisition
+    and the Tier 1 tools instead of paying it on the first agent request. For every endpoint it
+    checks that each model is present (/api/tags, which also primes the model digest cache) and
+    loads the ones to preload with an empty chat request (no token is generated) using the
+    `num_ctx` and load-time options the agents will send, so their first request does not
+    trigger a reload. Endpoints are warmed up concurrently, models of one endpoint one by one.
+    """
+
+    def __init__(
+        self,
+        config: Any,
+        settings: Optional[ModelWarmupSettings] = None,
+        models: Optional[Dict[str, List[str]]] = None,
+        preload_models: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            models: The models to check, mapped to the agents using them. Defaults to every
+                model referenced by the active mode (`config.get_active_models()`).
+            preload_models: The subset of `models` to load. Defaults to all of them.
+        """
+        self.config = config
+        self.settings = settings or ModelWarmupSettings.from_config(config)
+        self.base_urls: List[str] = list(getattr(config, "ollama_endpoints", None) or [config.ollama_base_url])
+        self.models: Dict[str, List[str]] = config.get_active_models() if models is None else dict(models)
+        self.preload_models: List[str] = list(self.models) if preload_models is None else [m for m in preload_models if m in self.models]
+        self.results: List[ModelWarmupResult] = []
+        self._results_lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "ModelWarmup":
+        """Starts one daemon thread per endpoint; returns immediately."""
+        if not self.settings.enabled or not self.models:
+            return self
+        logger.info(
+            f"Warming up {len(self.models)} model(s) on {len(self.base_urls)} Ollama endpoint(s) in the background: {', '.join(self.models)}"
+            + (f" (preloading {', '.join(self.preload_models) or 'none'})" if self.settings.preload and len(self.preload_models) < len(self.models) else "")
+        )
+        for base_url in self.base_urls:
+            thread = threading.Thread(target=self._warm_up_endpoint, args=(base_url,), name=f"novaguard-warmup-{base_url}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Waits up to `timeout` seconds in total; True if the warm-up has finished."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def missing_model_messages(self) -> List[str]:
+        """One message per model that is not available on an endpoint."""
+        with self._results_lock:
+            return [
+                f"Model '{r.model_name}' is not available on Ollama endpoint {r.base_url}. Run `ollama pull {r.model_name}` on that server."
+                for r in self.results if r.present is False
+            ]
+
+    def _record(self, result: ModelWarmupResult) -> None:
+        with self._results_lock:
+            self.results.append(result)
+
+    def _preload_options(self, model_name: str) -> Dict[str, Any]:
+        """num_ctx and load-time options the agents using `model_name` will send."""
+        generation_options = self.config.get_generation_options(self.models[model_name][0])
+        options = {key: generation_options[key] for key in _LOAD_TIME_OPTIONS if key in generation_options}
+        context_window = ContextWindowManager.from_config(self.config)
+        if context_window.enabled:
+            # Với sticky, mức này thành num_ctx tối thiểu của model nên request đầu tiên dùng đúng context đã load
+            options["num_ctx"] = context_window.select_num_ctx(model_name, 0, self.settings.num_ctx)
+        elif isinstance(generation_options.get("num_ctx"), int):
+            options["num_ctx"] = generation_options["num_ctx"]
+        return options
+
+    def _warm_up_endpoint(self, base_url: str) -> None:
+        digests = fetch_model_digests(base_url)
+        for model_name in self.models:
+            result = ModelWarmupResult(model_name=model_name, base_url=base_url)
+            if digests: # Danh sách rỗng: server không trả lời /api/tags (hoặc chưa có model nào), để preload quyết định
+                result.present = find_model_digest(digests, model_name) is not None
+            if result.present is False:
+                logger.warning(f"Model '{model_name}' (used by {', '.join(self.models[model_name])}) is not available on {base_url}.")
+            elif self.settings.preload and model_name in self.preload_models:
+                self._preload(result)
+            self._record(result)
+
+    def _preload(self, result: ModelWarmupResult) -> None:
+        options = self._preload_options(result.model_name)
+        result.num_ctx = options.get("num_ctx")
+        start = time.monotonic()
+        try:
+            # /api/chat với messages rỗng chỉ load model (không sinh token) và giữ nó trong bộ nhớ theo keep_alive
+            response = requests.post(
+                f"{result.base_url.rstrip('/')}/api/chat",
+                json={"model": result.model_name, "messages": [], "keep_alive": self.settings.keep_alive, "stream": False, "options": options},
+                timeout=self.settings.timeout_seconds,
+            )
+            if response.status_code == 404:
+                result.present = False
+                logger.warning(f"Model '{result.model_name}' is not available on {result.base_url}.")
+                return
+            response.raise_for_status()
+        except requests.RequestException as e:
+            result.error = str(e)
+            logger.warning(f"Could not preload model '{result.model_name}' on {result.base_url}: {e}")
+            return
+        result.present = True
+        result.loaded = True
+        result.load_seconds = round(time.monotonic() - start, 2)
+        logger.info(f"Preloaded model '{result.model_name}' on {result.base_url} in {result.load_seconds}s (num_ctx={result.num_ctx}, keep_alive={self.settings.keep_alive}).")
+        balancer = get_ollama_endpoint_balancer(self.config)
+        if balancer is not None:
+            balancer.mark_model_loaded(result.base_url, result.model_name)
+
+
+def start_model_warmup(
+    config: Any,
+    models: Optional[Dict[str, List[str]]] = None,
+    preload_models: Optional[List[str]] = None
+) -> Optional[ModelWarmup]:
+    """
+    Starts the background warm-up of `models` (default: the active mode's models), or returns
+    None when it is disabled. See ModelWarmup for `preload_models`.
+    """
+    warmup = ModelWarmup(config, models=models, preload_models=preload_models)
+    if not warmup.settings.enabled:
+        logger.info("Model warm-up is disabled.")
+        return None
+    return warmup.start()
@@ -0,0 +1,393 @@
+# NOVAGUARD-AI/src/core/ollama_balancer.py
+
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, List, Any, Optional, Set, Tuple, Iterator, AsyncIterator
+
+import requests
+
+from . import ollama_http
+from .ollama_http import OllamaAPIError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS = 30.0
+DEFAULT_FAILURE_THRESHOLD = 2
+DEFAULT_EJECT_SECONDS = 60.0
+# Endpoint chưa load model bị tính như đang có thêm chừng này request (chi phí load model vài GB)
+DEFAULT_MODEL_LOAD_PENALTY = 2
+DEFAULT_PROBE_TIMEOUT_SECONDS = 3.0
+# Số affinity key (prefix prompt) nhớ endpoint gần nhất, bỏ key dùng lâu nhất khi vượt quá
+MAX_AFFINITY_KEYS = 512
+DEFAULT_MAX_IN_FLIGHT_PER_ENDPOINT = 2
+# Request đang chờ slot kiểm tra lại định kỳ, vì endpoint bị eject có thể hết hạn eject mà không có release nào
+_CAPACITY_RECHECK_SECONDS = 1.0
+
+
+def _model_in(model_name: str, model_names: Set[str]) -> bool:
+    """Matches Ollama model names, treating "name" and "name:latest" as the same model."""
+    if model_name in model_names:
+        return True
+    return ":" not in model_name and f"{model_name}:latest" in model_names
+
+
+def is_endpoint_failure(exc: BaseException) -> bool:
+    """
+    Returns True if `exc` means the endpoint itself is unhealthy (connection error, timeout,
+    5xx, error in the response stream) rather than a bad request such as an unknown model.
+    """
+    status_code = getattr(exc, "status_code", None)
+    if isinstance(status_code, int):
+        return status_code >= 500
+    if isinstance(exc, (OllamaAPIError, ConnectionError, TimeoutError, OSError, requests.RequestException)):
+        return True
+    # Lỗi kết nối/timeout của httpx (backend native và thư viện ollama dưới langchain)
+    return ollama_http.httpx is not None and isinstance(exc, ollama_http.httpx.TransportError)
+
+
+class OllamaEndpointState:
+    """Routing and health state of one Ollama endpoint, owned by OllamaEndpointBalancer."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        self.healthy = True
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.available_models: Optional[Set[str]] = None # None: chưa probe được /api/tags
+        self.loaded_models: Set[str] = set()
+        self.last_selected_seq = 0
+        self.requests_started = 0
+        self.requests_failed = 0
+
+
+class OllamaEndpointBalancer:
+    """
+    Spreads LLM requests over several Ollama endpoints.
+
+    Each request goes to the eligible endpoint with the fewest outstanding requests, where an
+    endpoint that does not have the model loaded yet counts `model_load_penalty` extra requests
+    and endpoints known not to have the model pulled are skipped. An endpoint is ejected for
+    `eject_seconds` after `failure_threshold` consecutive failures (or a failed health probe)
+    and re-admitted by a successful `/api/tags` probe or a trial request once that time has passed.
+    A background thread probes every endpoint each `health_check_interval` seconds.
+    A request with an `affinity_key` (requests sharing a prompt prefix) goes back to the endpoint
+    that served the last request with that key while it is still eligible, so the prompt cache
+    of that endpoint is reused.
+    With `max_in_flight_per_endpoint`, an endpoint that already has that many requests outstanding
+    is skipped, and `acquire()` / `aacquire()` wait while every eligible endpoint is full, so no
+    single endpoint gets more (also when others are ejected or affinity favours one of them).
+    """
+
+    def __init__(
+        self,
+        endpoints: List[str],
+        health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        eject_seconds: float = DEFAULT_EJECT_SECONDS,
+        model_load_penalty: int = DEFAULT_MODEL_LOAD_PENALTY,
+        probe_timeout: float = DEFAULT_PROBE_TIMEOUT_SECONDS,
+        max_in_flight_per_endpoint: Optional[int] = None
+    ):
+        """
+        Args:
+            endpoints: Ollama base URLs, in order of preference for ties.
+            health_check_interval: Seconds between background probes; 0 disables the probe thread.
+            failure_threshold: Consecutive failures that eject an endpoint.
+            eject_seconds: How long an ejected endpoint is skipped before it may be retried.
+            model_load_penalty: Extra outstanding requests charged to endpoints without the model loaded.
+            probe_timeout: Timeout in seconds of each health probe request.
+            max_in_flight_per_endpoint: Requests allowed in flight on one endpoint; None for no limit.
+        """
+        if not endpoints:
+            raise ValueError("OllamaEndpointBalancer needs at least one endpoint.")
+        self.endpoints = [OllamaEndpointState(url) for url in endpoints]
+        self.health_check_interval = health_check_interval
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.model_load_penalty = model_load_penalty
+        self.probe_timeout = probe_timeout
+        self.max_in_flight_per_endpoint = max_in_flight_per_endpoint
+        self._lock = threading.Lock()
+        self._capacity = threading.Condition(self._lock) # Báo cho request đang chờ khi một slot được trả
+        self._async_waiters: List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = []
+        self._selection_seq = 0
+        self._affinity: "OrderedDict[str, OllamaEndpointState]" = OrderedDict()
+        self._stop_event = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def base_urls(self) -> List[str]:
+        return [endpoint.base_url for endpoint in self.endpoints]
+
+    # --- Health checks ---
+
+    def probe(self, endpoint: OllamaEndpointState) -> bool:
+        """
+        Probes `/api/tags` (health and pulled models) and `/api/ps` (loaded models) of one endpoint.
+        Returns True if the endpoint is healthy.
+        """
+        base_url = endpoint.base_url.rstrip("/")
+        try:
+            response = requests.get(f"{base_url}/api/tags", timeout=self.probe_timeout)
+            response.raise_for_status()
+            available = {m["name"] for m in response.json().get("models", []) if isinstance(m, dict) and m.get("name")}
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                self._eject_locked(endpoint, f"health probe failed: {e}")
+            return False
+
+        loaded: Optional[Set[str]] = None
+        try:
+            ps_response = requests.get(f"{base_url}/api/ps", timeout=self.probe_timeout)
+            if ps_response.ok:
+                loaded = {m.get("name") or m.get("model") for m in ps_response.json().get("models", []) if isinstance(m, dict)}
+                loaded.discard(None)
+        except (requests.RequestException, ValueError):
+            pass # /api/ps chỉ là thông tin thêm, server cũ có thể không hỗ trợ
+
+        with self._lock:
+            if not endpoint.healthy:
+                logger.info(f"Ollama endpoint {endpoint.base_url} passed health probe; re-admitted.")
+            endpoint.healthy = True
+            endpoint.consecutive_failures = 0
+            endpoint.ejected_until = 0.0
+            endpoint.available_models = available
+            if loaded is not None:
+                endpoint.loaded_models = loaded
+        return True
+
+    def probe_all(self) -> None:
+        for endpoint in self.endpoints:
+            self.probe(endpoint)
+
+    def start_health_checks(self) -> None:
+        """Starts the background probe thread (no-op if disabled or already running)."""
+        if self.health_check_interval <= 0 or (self._health_thread is not None and self._health_thread.is_alive()):
+            return
+        self._stop_event.clear()
+        self._health_thread = threading.Thread(target=self._health_check_loop, name="novaguard-ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_check_loop(self) -> None:
+        while True:
+            self.probe_all()
+            if self._stop_event.wait(self.health_check_interval):
+                return
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._health_thread is not None:
+            self._health_thread.join(timeout=self.probe_timeout * 2 + 1)
+            self._health_thread = None
+
+    def _eject_locked(self, endpoint: OllamaEndpointState, reason: str) -> None:
+        if endpoint.healthy:
+            logger.warning(f"Ejecting Ollama endpoint {endpoint.base_url} for {self.eject_seconds:.0f}s: {reason}")
+        endpoint.healthy = False
+        endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    # --- Routing ---
+
+    def _candidates_locked(self, model_name: str) -> List[OllamaEndpointState]:
+        now = time.monotonic()
+        # Endpoint bị eject được thử lại (half-open) sau khi hết thời gian eject
+        eligible = [e for e in self.endpoints if e.healthy or now >= e.ejected_until]
+        if not eligible:
+            soonest = min(self.endpoints, key=lambda e: e.ejected_until)
+            logger.warning(f"All Ollama endpoints are ejected; trying {soonest.base_url}.")
+            return [soonest]
+        with_model = [e for e in eligible if e.available_models is None or _model_in(model_name, e.available_models)]
+        return with_model or eligible
+
+    def _score_locked(self, endpoint: OllamaEndpointState, model_name: str) -> Tuple[int, int]:
+        load_penalty = 0 if _model_in(model_name, endpoint.loaded_models) else self.model_load_penalty
+        return (endpoint.outstanding + load_penalty, endpoint.last_selected_seq)
+
+    def _has_capacity_locked(self, endpoint: OllamaEndpointState) -> bool:
+        return self.max_in_flight_per_endpoint is None or endpoint.outstanding < self.max_in_flight_per_endpoint
+
+    def _pick_locked(self, model_name: str, affinity_key: Optional[str]) -> Optional[OllamaEndpointState]:
+        """The endpoint for the next request, or None while every eligible endpoint is at its in-flight limit."""
+        candidates = [e for e in self._candidates_locked(model_name) if self._has_capacity_locked(e)]
+        if not candidates:
+            return None
+        if affinity_key is None:
+            return min(candidates, key=lambda e: self._score_locked(e, model_name))
+        endpoint = self._affinity.get(affinity_key)
+        if endpoint is None or endpoint not in candidates:
+            endpoint = min(candidates, key=lambda e: self._score_locked(e, model_name))
+        self._affinity[affinity_key] = endpoint
+        self._affinity.move_to_end(affinity_key)
+        while len(self._affinity) > MAX_AFFINITY_KEYS:
+            self._affinity.popitem(last=False)
+        return endpoint
+
+    def _try_acquire_locked(self, model_name: str, affinity_key: Optional[str]) -> Optional[OllamaEndpointState]:
+        endpoint = self._pick_locked(model_name, affinity_key)
+        if endpoint is None:
+            return None
+        self._selection_seq += 1
+        endpoint.last_selected_seq = self._selection_seq
+        endpoint.outstanding += 1
+        endpoint.requests_started += 1
+        logger.debug(f"Routing '{model_name}' request to {endpoint.base_url} ({endpoint.outstanding} outstanding).")
+        return endpoint
+
+    def acquire(self, model_name: str, affinity_key: Optional[str] = None) -> OllamaEndpointState:
+        """
+        Picks the endpoint for a request and counts it as outstanding there, blocking while every
+        eligible endpoint is at `max_in_flight_per_endpoint`. Pair with `release()`.
+        Requests with the same `affinity_key` stick to one endpoint while it stays eligible and not full.
+        """
+        with self._capacity:
+            endpoint = self._try_acquire_locked(model_name, affinity_key)
+            while endpoint is None:
+                self._capacity.wait(timeout=_CAPACITY_RECHECK_SECONDS)
+                endpoint = self._try_acquire_locked(model_name, affinity_key)
+        return endpoint
+
+    async def aacquire(self, model_name: str, affinity_key: Optional[str] = None) -> OllamaEndpointState:
+        """Async variant of `acquire()`: waits for a free slot without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                endpoint = self._try_acquire_locked(model_name, affinity_key)
+                if endpoint is not None:
+                    return endpoint
+                waiter: "asyncio.Future[None]" = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await asyncio.wait({waiter}, timeout=_CAPACITY_RECHECK_SECONDS)
+            finally:
+                with self._lock:
+                    if (loop, waiter) in self._async_waiters:
+                        self._async_waiters.remove((loop, waiter))
+
+    def release(self, endpoint: OllamaEndpointState, model_name: str, error: Optional[BaseException] = None) -> None:
+        """Marks a request as finished; `error` (if it is an endpoint failure) counts towards ejection."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            self._release_outcome_locked(endpoint, model_name, error)
+            # Một slot vừa được trả: đánh thức các request đang chờ (thread và coroutine)
+            self._capacity.notify_all()
+            async_waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in async_waiters:
+            try:
+                loop.call_soon_threadsafe(_wake_waiter, waiter)
+            except RuntimeError: # Event loop đã đóng
+                pass
+
+    def _release_outcome_locked(self, endpoint: OllamaEndpointState, model_name: str, error: Optional[BaseException]) -> None:
+        if error is None:
+            endpoint.consecutive_failures = 0
+            endpoint.healthy = True
+            endpoint.loaded_models.add(model_name) # Model vừa chạy xong vẫn còn trong bộ nhớ (keep_alive)
+            return
+        if not is_endpoint_failure(error):
+            return
+        endpoint.requests_failed += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            self._eject_locked(endpoint, f"{endpoint.consecutive_failures} consecutive failures (last: {error})")
+
+    def mark_model_loaded(self, base_url: str, model_name: str) -> None:
+        """Records that `model_name` is loaded on `base_url` (preloaded outside a leased request)."""
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.base_url == base_url:
+                    endpoint.loaded_models.add(model_name)
+
+    def mark_model_unloaded(self, base_url: str, model_name: str) -> None:
+        """Forgets that `model_name` is loaded on `base_url` (after it was explicitly unloaded)."""
+        with self._lock:
+            for endpoint in self.endpoints:
+                if endpoint.base_url == base_url:
+                    endpoint.loaded_models.discard(model_name)
+
+    @contextmanager
+    def lease(self, model_name: str, affinity_key: Optional[str] = None) -> Iterator[str]:
+        """Context manager around `acquire()`/`release()` that yields the chosen base URL."""
+        endpoint = self.acquire(model_name, affinity_key=affinity_key)
+        try:
+            yield endpoint.base_url
+        except BaseException as e:
+            self.release(endpoint, model_name, error=e)
+            raise
+        self.release(endpoint, model_name)
+
+    @asynccontextmanager
+    async def alease(self, model_name: str, affinity_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Async variant of `lease()` (waits for a free slot with `aacquire()`)."""
+        endpoint = await self.aacquire(model_name, affinity_key=affinity_key)
+        try:
+            yield endpoint.base_url
+        except BaseException as e:
+            self.release(endpoint, model_name, error=e)
+            raise
+        self.release(endpoint, model_name)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "base_url": e.base_url, "healthy": e.healthy, "outstanding": e.outstanding,
+                    "requests": e.requests_started, "failures": e.requests_failed,
+                    "loaded_models": sorted(e.loaded_models),
+                }
+                for e in self.endpoints
+            ]
+
+    def log_stats(self) -> None:
+        for endpoint_stats in self.stats():
+            logger.info(
+                f"Ollama endpoint {endpoint_stats['base_url']}: {endpoint_stats['requests']} requests, "
+                f"{endpoint_stats['failures']} failures, healthy={endpoint_stats['healthy']}."
+            )
+
+
+def _wake_waiter(waiter: "asyncio.Future[None]") -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+# Một balancer cho mỗi tập endpoint, dùng chung trong process (các node tạo client nhưng chung trạng thái routing)
+_shared_balancers: Dict[Tuple[str, ...], OllamaEndpointBalancer] = {}
+_shared_balancers_lock = threading.Lock()
+
+
+def _number_setting(value: Any, default: float) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+        return value
+    return default
+
+
+def get_ollama_endpoint_balancer(config: Any) -> Optional[OllamaEndpointBalancer]:
+    """
+    Returns the process-wide balancer for `config.ollama_endpoints`, or None when only one
+    endpoint is configured. Tuned by the `ollama` section of models.yml; each endpoint is limited
+    to `orchestration.max_in_flight_per_endpoint` requests in flight.
+    """
+    endpoints = getattr(config, "ollama_endpoints", None)
+    if not isinstance(endpoints, list) or len(endpoints) < 2:
+        return None
+    key = tuple(endpoints)
+    with _shared_balancers_lock:
+        balancer = _shared_balancers.get(key)
+        if balancer is None:
+            balancer = OllamaEndpointBalancer(
+                endpoints,
+                health_check_interval=_number_setting(config.get_ollama_setting("health_check_interval_seconds"), DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS),
+                failure_threshold=max(1, int(_number_setting(config.get_ollama_setting("failure_threshold"), DEFAULT_FAILURE_THRESHOLD))),
+                eject_seconds=_number_setting(config.get_ollama_setting("eject_seconds"), DEFAULT_EJECT_SECONDS),
+                model_load_penalty=int(_number_setting(config.get_ollama_setting("model_load_penalty"), DEFAULT_MODEL_LOAD_PENALTY)),
+                max_in_flight_per_endpoint=max(1, int(_number_setting(config.get_orchestration_setting("max_in_flight_per_endpoint"), DEFAULT_MAX_IN_FLIGHT_PER_ENDPOINT))),
+            )
+            balancer.start_health_checks()
+            _shared_balancers[key] = balancer
+            logger.info(f"Load balancing LLM requests across {len(endpoints)} Ollama endpoints: {', '.join(endpoints)}")
+    return balancer
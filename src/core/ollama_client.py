@@ -1,44 +1,351 @@
 # NOVAGUARD-AI/src/core/ollama_client.py
 
+import os
+import asyncio
 import logging
-from typing import Optional, Dict, Any, Iterator, AsyncIterator, List
-
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
-from langchain_core.outputs import ChatGenerationChunk, GenerationChunk
-# Ensure langchain_ollama is installed and an appropriate version
-try:
-    from langchain_ollama import ChatOllama
-except ImportError:
-    logging.critical("langchain-ollama library not found. Please install it: pip install langchain-ollama")
-    # This is a critical dependency for this module to function.
-    # We'll let it raise an error at runtime if ChatOllama cannot be imported.
-    ChatOllama = None # To satisfy linters if the import fails, real error will happen at instantiation.
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, List, Tuple, Set
+
+import requests
 
 # Import Config for type hinting if OllamaClientWrapper takes it directly
 # from .config_loader import Config # Not strictly needed if base_url is passed explicitly
+from .llm_cache import LLMResponseCache
+from . import ollama_http
+from .ollama_http import build_chat_payload, get_ollama_http_client
+from .ollama_balancer import OllamaEndpointBalancer, is_endpoint_failure
+from .json_stream import JsonCompletionDetector
 
 logger = logging.getLogger(__name__)
 
+# langchain-ollama chỉ được import khi dùng backend "langchain" (fallback), không nằm trên hot path
+ChatOllama: Any = None
+
+BACKEND_NATIVE = "native"
+BACKEND_LANGCHAIN = "langchain"
+SUPPORTED_BACKENDS = (BACKEND_NATIVE, BACKEND_LANGCHAIN)
+
+# keep_alive cho model đang được pin (giữ trong bộ nhớ vô thời hạn cho tới khi release_model)
+PINNED_KEEP_ALIVE = "-1"
+
+# Tham số chỉ ảnh hưởng cách gọi (không ảnh hưởng nội dung response), không đưa vào cache key.
+# num_ctx chỉ quyết định kích thước KV cache: ContextWindowManager chọn giá trị đủ chứa prompt (prompt đã cắt nằm
+# trong key), và giá trị này thay đổi theo hiệu chỉnh token nên không được làm mất cache.
+_NON_GENERATION_KWARGS = ("request_timeout", "keep_alive", "num_ctx")
+
+# Digest của model theo base_url, lấy từ /api/tags một lần cho mỗi process
+_model_digests: Dict[str, Dict[str, str]] = {}
+# Một lock cho mỗi base_url: server chậm không chặn việc lấy digest của server khác
+_model_digests_locks: Dict[str, threading.Lock] = {}
+_model_digests_locks_guard = threading.Lock()
+
+# Base URL của các request Ollama trong context hiện tại (thread hoặc task), xem track_served_endpoints()
+_served_endpoints: contextvars.ContextVar[Optional[List[str]]] = contextvars.ContextVar("novaguard_served_endpoints", default=None)
+
+
+def _load_chat_ollama() -> Any:
+    """Imports ChatOllama on first use of the langchain backend. Returns None if unavailable."""
+    global ChatOllama
+    if ChatOllama is None:
+        try:
+            from langchain_ollama import ChatOllama as _ChatOllama
+            ChatOllama = _ChatOllama
+        except ImportError:
+            logger.critical("langchain-ollama library not found. Please install it: pip install langchain-ollama")
+    return ChatOllama
+
+
+def _collect_content(pieces: Iterator[str], monitor: Optional[Any], model_name: str) -> str:
+    """
+    Joins streamed content pieces. With a `monitor` (see `invoke()`) each piece is fed to it and the
+    stream is closed (which stops the generation on the server) as soon as it returns a stop index.
+    """
+    if monitor is None:
+        return "".join(pieces)
+    parts: List[str] = []
+    try:
+        for piece in pieces:
+            end = monitor.feed(piece)
+            if end is not None:
+                parts.append(piece[:end])
+                _log_early_stop(monitor, model_name, parts)
+                break
+            parts.append(piece)
+    finally:
+        close = getattr(pieces, "close", None)
+        if close is not None:
+            close()
+    return "".join(parts)
+
+
+async def _acollect_content(pieces: AsyncIterator[str], monitor: Optional[Any], model_name: str) -> str:
+    """Async variant of `_collect_content()`."""
+    parts: List[str] = []
+    try:
+        async for piece in pieces:
+            end = monitor.feed(piece) if monitor is not None else None
+            if end is not None:
+                parts.append(piece[:end])
+                _log_early_stop(monitor, model_name, parts)
+                break
+            parts.append(piece)
+    finally:
+        aclose = getattr(pieces, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return "".join(parts)
+
+
+def _log_early_stop(monitor: Any, model_name: str, parts: List[str]) -> None:
+    reason = getattr(monitor, "stop_reason", "complete JSON emitted")
+    logger.info(f"Stopped generation of '{model_name}' early: {reason} after {sum(len(p) for p in parts)} characters.")
+
+
+def _is_cacheable(monitor: Optional[Any]) -> bool:
+    """Whether a response read through `monitor` is complete and may be stored in the LLM response cache."""
+    # Response bị dừng vì không còn là JSON hợp lệ (error) hoặc bị cắt ở max_findings (capped) không được cache:
+    # lần chạy sau (có thể với max_findings khác) sẽ sinh lại
+    return not getattr(monitor, "error", None) and not getattr(monitor, "capped", False)
+
+
+def _new_stream_monitor(early_stop_json: bool, stream_monitor: Optional[Any]) -> Optional[Any]:
+    """The monitor of one attempt: the caller's (restarted for a retry) or a JSON completion detector."""
+    if stream_monitor is not None:
+        reset = getattr(stream_monitor, "reset", None)
+        if reset is not None:
+            reset()
+        return stream_monitor
+    return JsonCompletionDetector() if early_stop_json else None
+
+
+@contextmanager
+def track_served_endpoints() -> Iterator[List[str]]:
+    """
+    Collects the base URL of every Ollama request sent in the current thread or task (and the
+    tasks it starts) while the context is open, e.g. to log which endpoint served a work item.
+    """
+    served: List[str] = []
+    token = _served_endpoints.set(served)
+    try:
+        yield served
+    finally:
+        _served_endpoints.reset(token)
+
+
+def fetch_model_digests(base_url: str) -> Dict[str, str]:
+    """
+    Digests of the models available on `base_url` by name (/api/tags), fetched once per process
+    and shared by every client. Empty if the server could not be queried.
+    """
+    with _model_digests_locks_guard:
+        base_url_lock = _model_digests_locks.setdefault(base_url, threading.Lock())
+    with base_url_lock:
+        digests = _model_digests.get(base_url)
+        if digests is None:
+            digests = {}
+            try:
+                response = requests.get(f"{base_url.rstrip('/')}/api/tags", timeout=5)
+                response.raise_for_status()
+                for model_info in response.json().get("models", []):
+                    if isinstance(model_info, dict) and model_info.get("name") and model_info.get("digest"):
+                        digests[model_info["name"]] = model_info["digest"]
+            except (requests.RequestException, ValueError) as e:
+                logger.warning(f"Could not fetch model digests from {base_url}/api/tags: {e}. Cache keys will use model names only.")
+            _model_digests[base_url] = digests
+    return digests
+
+
+def find_model_digest(digests: Dict[str, str], model_name: str) -> Optional[str]:
+    """Digest of `model_name` in `digests`, treating "name" and "name:latest" as the same model."""
+    return digests.get(model_name) or digests.get(f"{model_name}:latest" if ":" not in model_name else model_name)
+
+
+def get_ollama_backend(config: Any) -> str:
+    """
+    Returns the Ollama client backend to use: `orchestration.ollama_backend` in models.yml
+    ("native" or "langchain"), overridable with the NOVAGUARD_OLLAMA_BACKEND environment variable.
+    """
+    env_value = os.environ.get("NOVAGUARD_OLLAMA_BACKEND")
+    backend = env_value.strip().lower() if env_value else config.get_orchestration_setting("ollama_backend", BACKEND_NATIVE)
+    if backend in SUPPORTED_BACKENDS:
+        return backend
+    if isinstance(backend, str):
+        logger.warning(f"Unknown Ollama backend '{backend}'. Using '{BACKEND_NATIVE}'.")
+    return BACKEND_NATIVE
+
+
 class OllamaClientWrapper:
     """
-    A wrapper class for interacting with an Ollama server using langchain-ollama.
-    Provides methods for synchronous and potentially asynchronous invocations.
+    A wrapper class for interacting with an Ollama server.
+
+    The default "native" backend talks to `/api/chat` directly over a keep-alive connection
+    pool shared per base URL (see `ollama_http.OllamaHttpClient`). The "langchain" backend
+    builds a langchain-ollama `ChatOllama` per call and is kept as a fallback.
+    Provides methods for synchronous and asynchronous invocations.
     """
 
-    def __init__(self, base_url: str):
+    def __init__(
+        self,
+        base_url: str,
+        response_cache: Optional[LLMResponseCache] = None,
+        backend: str = BACKEND_NATIVE,
+        balancer: Optional[OllamaEndpointBalancer] = None
+    ):
         """
         Initializes the OllamaClientWrapper.
 
         Args:
             base_url: The base URL of the Ollama server (e.g., "http://localhost:11434").
+            response_cache: Optional persistent cache consulted by `invoke`/`ainvoke` before calling Ollama.
+            backend: "native" (pooled HTTP client) or "langchain" (ChatOllama).
+            balancer: Optional balancer that picks the endpoint of each request among several
+                Ollama servers; `base_url` is then only used for model digests and logging.
         """
-        if ChatOllama is None:
+        if backend not in SUPPORTED_BACKENDS:
+            logger.warning(f"Unknown Ollama backend '{backend}'. Using '{BACKEND_NATIVE}'.")
+            backend = BACKEND_NATIVE
+        if backend == BACKEND_NATIVE and ollama_http.httpx is None:
+            logger.warning("httpx is not installed; using the langchain Ollama backend instead.")
+            backend = BACKEND_LANGCHAIN
+        if backend == BACKEND_LANGCHAIN and _load_chat_ollama() is None:
             msg = "ChatOllama could not be imported. Is langchain-ollama installed correctly?"
             logger.critical(msg)
             raise ImportError(msg)
 
         self.base_url = base_url
-        logger.info(f"OllamaClientWrapper initialized for Ollama server at: {self.base_url}")
+        self.response_cache = response_cache
+        self.backend = backend
+        self.balancer = balancer
+        self.model_switches = 0 # Số lần một endpoint phải chuyển sang model khác với request trước đó
+        self._pinned_models: Set[str] = set()
+        self._last_model_by_endpoint: Dict[str, str] = {}
+        self._model_usage_lock = threading.Lock()
+        if balancer is not None:
+            logger.info(f"OllamaClientWrapper initialized for Ollama servers: {', '.join(balancer.base_urls)} (backend: {self.backend})")
+        else:
+            logger.info(f"OllamaClientWrapper initialized for Ollama server at: {self.base_url} (backend: {self.backend})")
+
+    @property
+    def endpoint_count(self) -> int:
+        """Number of Ollama endpoints requests are spread over."""
+        return len(self.balancer.endpoints) if self.balancer is not None else 1
+
+    @contextmanager
+    def _endpoint(self, model_name: str, prompt_prefix_key: Optional[str] = None) -> Iterator[str]:
+        """
+        Yields the base URL for one request, leased from the balancer if there is one
+        (preferring the endpoint that served the last request with the same `prompt_prefix_key`).
+        """
+        if self.balancer is None:
+            self._record_model_use(self.base_url, model_name)
+            yield self.base_url
+            return
+        with self.balancer.lease(model_name, affinity_key=prompt_prefix_key) as base_url:
+            self._record_model_use(base_url, model_name)
+            yield base_url
+
+    @asynccontextmanager
+    async def _aendpoint(self, model_name: str, prompt_prefix_key: Optional[str] = None) -> AsyncIterator[str]:
+        """Async variant of `_endpoint()`: waiting for a free slot on the balancer does not block the event loop."""
+        if self.balancer is None:
+            self._record_model_use(self.base_url, model_name)
+            yield self.base_url
+            return
+        async with self.balancer.alease(model_name, affinity_key=prompt_prefix_key) as base_url:
+            self._record_model_use(base_url, model_name)
+            yield base_url
+
+    def _record_model_use(self, base_url: str, model_name: str) -> None:
+        served = _served_endpoints.get()
+        if served is not None:
+            served.append(base_url)
+        with self._model_usage_lock:
+            previous_model = self._last_model_by_endpoint.get(base_url)
+            if previous_model is not None and previous_model != model_name:
+                self.model_switches += 1
+                logger.info(f"Model switch on {base_url}: '{previous_model}' -> '{model_name}'.")
+            self._last_model_by_endpoint[base_url] = model_name
+
+    def pin_model(self, model_name: str) -> None:
+        """Keeps `model_name` loaded (keep_alive -1) for all following requests until `release_model()`."""
+        with self._model_usage_lock:
+            self._pinned_models.add(model_name)
+        logger.debug(f"Pinned model '{model_name}' in memory.")
+
+    def release_model(self, model_name: str) -> None:
+        """Unpins `model_name` and asks every endpoint to unload it now (keep_alive 0)."""
+        with self._model_usage_lock:
+            self._pinned_models.discard(model_name)
+        base_urls = self.balancer.base_urls if self.balancer is not None else [self.base_url]
+        for base_url in base_urls:
+            try:
+                # /api/chat với messages rỗng và keep_alive 0 chỉ unload model, không sinh token
+                response = requests.post(
+                    f"{base_url.rstrip('/')}/api/chat",
+                    json={"model": model_name, "messages": [], "keep_alive": 0, "stream": False},
+                    timeout=30,
+                )
+                response.raise_for_status()
+                logger.info(f"Released model '{model_name}' on {base_url}.")
+            except requests.RequestException as e:
+                logger.warning(f"Could not unload model '{model_name}' on {base_url}: {e}")
+            if self.balancer is not None:
+                self.balancer.mark_model_unloaded(base_url, model_name)
+
+    def _effective_keep_alive(self, model_name: str, keep_alive: str) -> str:
+        with self._model_usage_lock:
+            return PINNED_KEEP_ALIVE if model_name in self._pinned_models else keep_alive
+
+    def get_model_digest(self, model_name: str) -> Optional[str]:
+        """
+        Returns the digest of `model_name` as reported by /api/tags, so cache entries are invalidated
+        when a model tag is re-pulled. With a balancer every endpoint is asked (the response may come
+        from any of them) and the distinct digests are joined. None if it cannot be determined.
+        """
+        base_urls = self.balancer.base_urls if self.balancer is not None else [self.base_url]
+        digests = {find_model_digest(fetch_model_digests(base_url), model_name) for base_url in base_urls}
+        digests.discard(None)
+        return ",".join(sorted(digests)) if digests else None # type: ignore[arg-type]
+
+    def _cache_key(
+        self,
+        model_name: str,
+        prompt: str,
+        system_message_content: Optional[str],
+        temperature: float,
+        is_json_mode: bool,
+        kwargs: Dict[str, Any]
+    ) -> str:
+        options = {k: v for k, v in kwargs.items() if k not in _NON_GENERATION_KWARGS}
+        return LLMResponseCache.make_key(
+            model_name=model_name,
+            model_digest=self.get_model_digest(model_name),
+            system_message_content=system_message_content,
+            prompt=prompt,
+            temperature=temperature,
+            is_json_mode=is_json_mode,
+            options=options,
+        )
+
+    def _lookup_cache(
+        self,
+        model_name: str,
+        prompt: str,
+        system_message_content: Optional[str],
+        temperature: float,
+        is_json_mode: bool,
+        kwargs: Dict[str, Any]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """Returns (cache_key, cached_response); both None when no cache is configured."""
+        if self.response_cache is None:
+            return None, None
+        cache_key = self._cache_key(model_name, prompt, system_message_content, temperature, is_json_mode, kwargs)
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            logger.info(f"LLM cache hit for model '{model_name}' (key {cache_key[:12]}).")
+        return cache_key, cached_response
 
     def _get_chat_ollama_instance(
         self,
@@ -47,10 +354,11 @@ class OllamaClientWrapper:
         is_json_mode: bool = False,
         request_timeout: float = 120.0, # Default timeout for requests to Ollama
         keep_alive: str = "5m", # How long to keep the model loaded in memory
+        base_url: Optional[str] = None,
         **kwargs: Any
-    ) -> ChatOllama:
+    ) -> Any:
         """
-        Creates and configures a ChatOllama instance.
+        Creates and configures a ChatOllama instance (langchain backend only).
 
         Args:
             model_name: The name of the Ollama model to use.
@@ -59,6 +367,7 @@ class OllamaClientWrapper:
             request_timeout: Timeout for the Ollama API request in seconds.
             keep_alive: Controls how long the model stays loaded.
                         Examples: "5m", "1h", "-1" (load indefinitely), "0" (unload immediately).
+            base_url: Endpoint to use instead of `self.base_url` (chosen by the balancer).
             **kwargs: Additional parameters to pass to ChatOllama.
 
         Returns:
@@ -67,24 +376,102 @@ class OllamaClientWrapper:
         ollama_params: Dict[str, Any] = {
             "model": model_name,
             "temperature": temperature,
-            "base_url": self.base_url,
+            "base_url": base_url or self.base_url,
             "keep_alive": keep_alive,
             "request_timeout": request_timeout,
             **kwargs # Allows passing other ChatOllama params like top_k, top_p, num_ctx, etc.
         }
 
         if is_json_mode:
-            ollama_params["format"] = "json"
+            ollama_params.setdefault("format", "json") # Một JSON Schema truyền qua kwargs (structured output) được giữ nguyên
             logger.debug(f"Configuring ChatOllama for model '{model_name}' in JSON mode.")
         else:
             logger.debug(f"Configuring ChatOllama for model '{model_name}'.")
         
         try:
-            return ChatOllama(**ollama_params)
+            return _load_chat_ollama()(**ollama_params)
         except Exception as e:
             logger.error(f"Failed to initialize ChatOllama with params {ollama_params}: {e}", exc_info=True)
             raise  # Re-raise the exception as this is a critical failure
 
+    @staticmethod
+    def _build_langchain_messages(prompt: str, system_message_content: Optional[str]) -> List[Any]:
+        from langchain_core.messages import HumanMessage, SystemMessage
+        messages: List[Any] = []
+        if system_message_content:
+            messages.append(SystemMessage(content=system_message_content))
+        messages.append(HumanMessage(content=prompt))
+        return messages
+
+    def _invoke_on(
+        self,
+        base_url: str,
+        model_name: str,
+        prompt: str,
+        system_message_content: Optional[str],
+        temperature: float,
+        is_json_mode: bool,
+        request_timeout: float,
+        keep_alive: str,
+        kwargs: Dict[str, Any],
+        monitor: Optional[Any] = None
+    ) -> str:
+        """Sends one chat request to `base_url` with the configured backend and returns the content."""
+        if self.backend == BACKEND_NATIVE:
+            payload = build_chat_payload(
+                model_name, prompt, system_message_content, temperature, is_json_mode, keep_alive, stream=True, **kwargs
+            )
+            pieces = get_ollama_http_client(base_url).stream_chat(payload, request_timeout=request_timeout)
+            return _collect_content(pieces, monitor, model_name)
+        llm = self._get_chat_ollama_instance(
+            model_name=model_name, temperature=temperature, is_json_mode=is_json_mode,
+            request_timeout=request_timeout, keep_alive=keep_alive, base_url=base_url, **kwargs
+        )
+        if monitor is not None:
+            messages = self._build_langchain_messages(prompt, system_message_content)
+            return _collect_content((chunk.content for chunk in llm.stream(messages) if isinstance(chunk.content, str)), monitor, model_name)
+        content = llm.invoke(self._build_langchain_messages(prompt, system_message_content)).content
+        if not isinstance(content, str):
+            # Should not happen with standard ChatOllama usage returning AIMessage
+            logger.error(f"Unexpected response content type from model '{model_name}': {type(content)}")
+            raise ValueError("Ollama response content is not a string.")
+        return content
+
+    async def _ainvoke_on(
+        self,
+        base_url: str,
+        model_name: str,
+        prompt: str,
+        system_message_content: Optional[str],
+        temperature: float,
+        is_json_mode: bool,
+        request_timeout: float,
+        keep_alive: str,
+        kwargs: Dict[str, Any],
+        monitor: Optional[Any] = None
+    ) -> str:
+        """Async variant of `_invoke_on()`."""
+        if self.backend == BACKEND_NATIVE:
+            payload = build_chat_payload(
+                model_name, prompt, system_message_content, temperature, is_json_mode, keep_alive, stream=True, **kwargs
+            )
+            pieces = get_ollama_http_client(base_url).astream_chat(payload, request_timeout=request_timeout)
+            return await _acollect_content(pieces, monitor, model_name)
+        llm = self._get_chat_ollama_instance(
+            model_name=model_name, temperature=temperature, is_json_mode=is_json_mode,
+            request_timeout=request_timeout, keep_alive=keep_alive, base_url=base_url, **kwargs
+        )
+        if monitor is not None:
+            messages = self._build_langchain_messages(prompt, system_message_content)
+            async def _pieces() -> AsyncIterator[str]:
+                async for chunk in llm.astream(messages):
+                    if isinstance(chunk.content, str):
+                        yield chunk.content
+            return await _acollect_content(_pieces(), monitor, model_name)
+        content = (await llm.ainvoke(self._build_langchain_messages(prompt, system_message_content))).content
+        if not isinstance(content, str):
+            raise ValueError("Ollama async response content is not a string.")
+        return content
 
     def invoke(
         self,
@@ -95,6 +482,9 @@ class OllamaClientWrapper:
         is_json_mode: bool = False,
         request_timeout: float = 120.0,
         keep_alive: str = "5m",
+        early_stop_json: bool = False,
+        stream_monitor: Optional[Any] = None,
+        prompt_prefix_key: Optional[str] = None,
         **kwargs: Any
     ) -> str:
         """
@@ -108,7 +498,16 @@ class OllamaClientWrapper:
             is_json_mode: Whether to request JSON output from the model.
             request_timeout: Timeout for this specific request.
             keep_alive: Keep-alive setting for this request.
-            **kwargs: Additional parameters for ChatOllama.
+            early_stop_json: Stop the generation as soon as a complete top-level JSON list/object
+                has been emitted (the rest of the response is discarded).
+            stream_monitor: Object consuming the response while it streams instead, such as
+                `JsonListStreamParser`: `feed(piece)` returns the index where the generation should
+                stop (or None), and `reset()`, if present, is called before each attempt. It is not
+                fed on a cache hit; the returned content is then the cached response.
+            prompt_prefix_key: Requests with the same key start with the same prompt prefix; with
+                several endpoints they are routed to the same one so its prompt cache is reused.
+                Not sent to Ollama and not part of the response cache key.
+            **kwargs: Additional model options (num_ctx, num_predict, num_thread, top_k, stop, ...).
 
         Returns:
             The string content of the AI's response.
@@ -117,37 +516,37 @@ class OllamaClientWrapper:
             Exception: If the Ollama API call fails or returns an error.
         """
         logger.info(f"Invoking model '{model_name}' at {self.base_url}. JSON mode: {is_json_mode}.")
+        keep_alive = self._effective_keep_alive(model_name, keep_alive)
         logger.debug(f"System Message: '{system_message_content}'. Prompt: '{prompt[:100]}...'")
 
-        llm = self._get_chat_ollama_instance(
-            model_name=model_name,
-            temperature=temperature,
-            is_json_mode=is_json_mode,
-            request_timeout=request_timeout,
-            keep_alive=keep_alive,
-            **kwargs
-        )
+        cache_key, cached_response = self._lookup_cache(model_name, prompt, system_message_content, temperature, is_json_mode, kwargs)
+        if cached_response is not None:
+            return cached_response
 
-        messages: List[BaseMessage] = []
-        if system_message_content:
-            messages.append(SystemMessage(content=system_message_content))
-        messages.append(HumanMessage(content=prompt))
+        attempts = self.endpoint_count
+        for attempt in range(1, attempts + 1):
+            try:
+                monitor = _new_stream_monitor(early_stop_json, stream_monitor)
+                # Retry sau lỗi endpoint không giữ affinity, để balancer chọn endpoint khác
+                with self._endpoint(model_name, prompt_prefix_key if attempt == 1 else None) as base_url:
+                    content = self._invoke_on(
+                        base_url, model_name, prompt, system_message_content, temperature, is_json_mode,
+                        request_timeout, keep_alive, kwargs, monitor
+                    )
+                break
+            except Exception as e:
+                if attempt < attempts and is_endpoint_failure(e):
+                    logger.warning(f"Ollama request for '{model_name}' failed on one endpoint ({e}); retrying on another ({attempt}/{attempts}).")
+                    continue
+                # This could be a connection error, model not found, timeout, etc.
+                logger.error(f"Error invoking Ollama model '{model_name}': {e}", exc_info=True)
+                raise  # Re-raise the caught exception
 
-        try:
-            response_message = llm.invoke(messages)
-            if isinstance(response_message.content, str):
-                logger.info(f"Successfully received response from model '{model_name}'.")
-                logger.debug(f"Response content: {response_message.content[:200]}...")
-                return response_message.content
-            else:
-                # Should not happen with standard ChatOllama usage returning AIMessage
-                logger.error(f"Unexpected response content type from model '{model_name}': {type(response_message.content)}")
-                raise ValueError("Ollama response content is not a string.")
-        except Exception as e:
-            # This could be a connection error, model not found, timeout, etc.
-            logger.error(f"Error invoking Ollama model '{model_name}': {e}", exc_info=True)
-            # Consider specific error handling or custom exceptions if needed
-            raise  # Re-raise the caught exception
+        logger.info(f"Successfully received response from model '{model_name}'.")
+        logger.debug(f"Response content: {content[:200]}...")
+        if cache_key is not None and _is_cacheable(monitor):
+            self.response_cache.put(cache_key, model_name, content) # type: ignore[union-attr]
+        return content
 
 
     def stream(
@@ -172,38 +571,51 @@ class OllamaClientWrapper:
             is_json_mode: Whether to request JSON output (note: streaming JSON might require careful handling by the LLM).
             request_timeout: Timeout for the request.
             keep_alive: Keep-alive setting.
-            **kwargs: Additional parameters for ChatOllama.
+            **kwargs: Additional model options.
 
         Yields:
             String chunks of the AI's response.
         """
         logger.info(f"Streaming from model '{model_name}' at {self.base_url}. JSON mode: {is_json_mode}.")
-        llm = self._get_chat_ollama_instance(
-            model_name=model_name,
-            temperature=temperature,
-            is_json_mode=is_json_mode,
-            request_timeout=request_timeout,
-            keep_alive=keep_alive,
-            **kwargs
-        )
-
-        messages: List[BaseMessage] = []
-        if system_message_content:
-            messages.append(SystemMessage(content=system_message_content))
-        messages.append(HumanMessage(content=prompt))
-
+        keep_alive = self._effective_keep_alive(model_name, keep_alive)
         try:
-            for chunk in llm.stream(messages):
-                logger.info(f"RAW STREAM CHUNK (sync): type={type(chunk)}, value={chunk!r}") 
-                logger.debug(f"Raw stream chunk received: type={type(chunk)}, content={getattr(chunk, 'content', 'N/A')}, raw={chunk!r}") # Log chi tiết
-                if isinstance(chunk, (ChatGenerationChunk, GenerationChunk)) and isinstance(chunk.content, str):
-                    yield chunk.content
-                # else: (handle other chunk types if necessary, though ChatOllama usually yields AIMessageChunk with string content)
+            with self._endpoint(model_name) as base_url:
+                yield from self._stream_on(
+                    base_url, model_name, prompt, system_message_content, temperature, is_json_mode,
+                    request_timeout, keep_alive, kwargs
+                )
         except Exception as e:
             logger.error(f"Error streaming from Ollama model '{model_name}': {e}", exc_info=True)
             raise # Re-raise
 
-    # --- Placeholder for async methods ---
+    def _stream_on(
+        self,
+        base_url: str,
+        model_name: str,
+        prompt: str,
+        system_message_content: Optional[str],
+        temperature: float,
+        is_json_mode: bool,
+        request_timeout: float,
+        keep_alive: str,
+        kwargs: Dict[str, Any]
+    ) -> Iterator[str]:
+        if self.backend == BACKEND_NATIVE:
+            payload = build_chat_payload(
+                model_name, prompt, system_message_content, temperature, is_json_mode, keep_alive, stream=True, **kwargs
+            )
+            yield from get_ollama_http_client(base_url).stream_chat(payload, request_timeout=request_timeout)
+            return
+        llm = self._get_chat_ollama_instance(
+            model_name=model_name, temperature=temperature, is_json_mode=is_json_mode,
+            request_timeout=request_timeout, keep_alive=keep_alive, base_url=base_url, **kwargs
+        )
+        for chunk in llm.stream(self._build_langchain_messages(prompt, system_message_content)):
+            logger.debug(f"Raw stream chunk received: type={type(chunk)}, raw={chunk!r}")
+            # ChatOllama yield AIMessageChunk, content là str
+            if isinstance(getattr(chunk, "content", None), str):
+                yield chunk.content
+
     async def ainvoke(
         self,
         model_name: str,
@@ -213,34 +625,44 @@ class OllamaClientWrapper:
         is_json_mode: bool = False,
         request_timeout: float = 120.0,
         keep_alive: str = "5m",
+        early_stop_json: bool = False,
+        stream_monitor: Optional[Any] = None,
+        prompt_prefix_key: Optional[str] = None,
         **kwargs: Any
     ) -> str:
         """
-        Asynchronously invokes the Ollama model. (Not fully implemented, relies on ChatOllama.ainvoke)
+        Asynchronously invokes the Ollama model. Same arguments and result as `invoke()`.
         """
         logger.info(f"Asynchronously invoking model '{model_name}' (ainvoke).")
-        llm = self._get_chat_ollama_instance(
-            model_name=model_name,
-            temperature=temperature,
-            is_json_mode=is_json_mode,
-            request_timeout=request_timeout,
-            keep_alive=keep_alive,
-            **kwargs
+        keep_alive = self._effective_keep_alive(model_name, keep_alive)
+        # Tra cache (SQLite, và /api/tags lần đầu để lấy digest) chạy trong thread riêng, không chặn event loop
+        cache_key, cached_response = await asyncio.to_thread(
+            self._lookup_cache, model_name, prompt, system_message_content, temperature, is_json_mode, kwargs
         )
-        messages: List[BaseMessage] = []
-        if system_message_content:
-            messages.append(SystemMessage(content=system_message_content))
-        messages.append(HumanMessage(content=prompt))
+        if cached_response is not None:
+            return cached_response
 
-        try:
-            response_message = await llm.ainvoke(messages)
-            if isinstance(response_message.content, str):
-                return response_message.content
-            else:
-                raise ValueError("Ollama async response content is not a string.")
-        except Exception as e:
-            logger.error(f"Error asynchronously invoking Ollama model '{model_name}': {e}", exc_info=True)
-            raise
+        attempts = self.endpoint_count
+        for attempt in range(1, attempts + 1):
+            try:
+                monitor = _new_stream_monitor(early_stop_json, stream_monitor)
+                # Retry sau lỗi endpoint không giữ affinity, để balancer chọn endpoint khác
+                async with self._aendpoint(model_name, prompt_prefix_key if attempt == 1 else None) as base_url:
+                    content = await self._ainvoke_on(
+                        base_url, model_name, prompt, system_message_content, temperature, is_json_mode,
+                        request_timeout, keep_alive, kwargs, monitor
+                    )
+                break
+            except Exception as e:
+                if attempt < attempts and is_endpoint_failure(e):
+                    logger.warning(f"Ollama request for '{model_name}' failed on one endpoint ({e}); retrying on another ({attempt}/{attempts}).")
+                    continue
+                logger.error(f"Error asynchronously invoking Ollama model '{model_name}': {e}", exc_info=True)
+                raise
+
+        if cache_key is not None and _is_cacheable(monitor):
+            await asyncio.to_thread(self.response_cache.put, cache_key, model_name, content) # type: ignore[union-attr]
+        return content
 
     async def astream(
         self,
@@ -254,27 +676,26 @@ class OllamaClientWrapper:
         **kwargs: Any
     ) -> AsyncIterator[str]:
         """
-        Asynchronously streams responses from the Ollama model. (Not fully implemented, relies on ChatOllama.astream)
+        Asynchronously streams responses from the Ollama model. Same arguments as `stream()`.
         """
         logger.info(f"Asynchronously streaming from model '{model_name}' (astream).")
-        llm = self._get_chat_ollama_instance(
-            model_name=model_name,
-            temperature=temperature,
-            is_json_mode=is_json_mode,
-            request_timeout=request_timeout,
-            keep_alive=keep_alive,
-            **kwargs
-        )
-        messages: List[BaseMessage] = []
-        if system_message_content:
-            messages.append(SystemMessage(content=system_message_content))
-        messages.append(HumanMessage(content=prompt))
-
+        keep_alive = self._effective_keep_alive(model_name, keep_alive)
         try:
-            async for chunk in llm.astream(messages):
-                logger.info(f"RAW STREAM CHUNK (async): type={type(chunk)}, value={chunk!r}") 
-                if isinstance(chunk, (ChatGenerationChunk, GenerationChunk)) and isinstance(chunk.content, str):
-                    yield chunk.content
+            async with self._aendpoint(model_name) as base_url:
+                if self.backend == BACKEND_NATIVE:
+                    payload = build_chat_payload(
+                        model_name, prompt, system_message_content, temperature, is_json_mode, keep_alive, stream=True, **kwargs
+                    )
+                    async for piece in get_ollama_http_client(base_url).astream_chat(payload, request_timeout=request_timeout):
+                        yield piece
+                    return
+                llm = self._get_chat_ollama_instance(
+                    model_name=model_name, temperature=temperature, is_json_mode=is_json_mode,
+                    request_timeout=request_timeout, keep_alive=keep_alive, base_url=base_url, **kwargs
+                )
+                async for chunk in llm.astream(self._build_langchain_messages(prompt, system_message_content)):
+                    if isinstance(getattr(chunk, "content", None), str):
+                        yield chunk.content
         except Exception as e:
             logger.error(f"Error asynchronously streaming from Ollama model '{model_name}': {e}", exc_info=True)
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,278 @@
+# NOVAGUARD-AI/src/core/ollama_http.py
+
+import json
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Optional, Dict, Any, Iterator, AsyncIterator, Iterable, List
+
+from .context_window import record_prompt_eval
+
+try:
+    import httpx
+except ImportError:
+    logging.warning("httpx library not found. The native Ollama backend is unavailable; falling back to langchain-ollama.")
+    httpx = None # OllamaClientWrapper sẽ dùng backend langchain
+
+logger = logging.getLogger(__name__)
+
+# Số connection keep-alive tối đa trong pool của mỗi Ollama endpoint
+DEFAULT_POOL_CONNECTIONS = 16
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+# Các field của /api/chat nằm ở top-level payload; mọi kwarg khác là model option (num_ctx, top_k, stop, ...)
+_TOP_LEVEL_CHAT_FIELDS = ("format", "tools", "think")
+
+
+class OllamaAPIError(Exception):
+    """Raised when Ollama returns an HTTP error or an `error` object in the response stream."""
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def build_chat_payload(
+    model_name: str,
+    prompt: str,
+    system_message_content: Optional[str] = None,
+    temperature: float = 0.5,
+    is_json_mode: bool = False,
+    keep_alive: Optional[str] = "5m",
+    stream: bool = True,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Builds the JSON body of an Ollama `/api/chat` request.
+
+    Args:
+        model_name: The name of the Ollama model.
+        prompt: The user's prompt.
+        system_message_content: Optional system message.
+        temperature: The generation temperature (sent as `options.temperature`).
+        is_json_mode: If True, sets `format: "json"` (an explicit `format` kwarg takes precedence).
+        keep_alive: How long the model stays loaded after the request.
+        stream: Whether Ollama should stream the response as NDJSON.
+        **kwargs: `format`/`tools`/`think` go to the top level, everything else into `options`.
+
+    Returns:
+        The request body as a dict.
+    """
+    messages: List[Dict[str, str]] = []
+    if system_message_content:
+        messages.append({"role": "system", "content": system_message_content})
+    messages.append({"role": "user", "content": prompt})
+
+    payload: Dict[str, Any] = {"model": model_name, "messages": messages, "stream": stream}
+    options: Dict[str, Any] = {"temperature": temperature}
+    for key, value in kwargs.items():
+        if value is None:
+            continue
+        if key in _TOP_LEVEL_CHAT_FIELDS:
+            payload[key] = value
+        else:
+            options[key] = value
+    if is_json_mode and "format" not in payload:
+        payload["format"] = "json"
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    payload["options"] = options
+    return payload
+
+
+def parse_chat_stream_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    Parses one NDJSON line of an `/api/chat` stream.
+
+    Returns:
+        The decoded chunk, or None for blank lines.
+
+    Raises:
+        OllamaAPIError: If the line is not valid JSON or carries an `error` field.
+    """
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        chunk = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise OllamaAPIError(f"Invalid NDJSON line from Ollama: {line[:200]!r} ({e})") from e
+    if not isinstance(chunk, dict):
+        raise OllamaAPIError(f"Unexpected NDJSON value from Ollama: {line[:200]!r}")
+    if chunk.get("error"):
+        raise OllamaAPIError(str(chunk["error"]))
+    return chunk
+
+
+def _chat_chunk_content(line: str, state: Dict[str, Any]) -> Optional[str]:
+    """
+    Returns the content of one stream line; lines after the `done` chunk are ignored.
+    With `model`/`prompt_chars` in `state` (see `_stream_state`), the prompt token count of the
+    `done` chunk calibrates the context window token estimator.
+    """
+    if state.get("done"):
+        return None
+    chunk = parse_chat_stream_line(line)
+    if chunk is None:
+        return None
+    if chunk.get("done"):
+        state["done"] = True
+        _log_done_chunk(chunk)
+        if state.get("model"):
+            record_prompt_eval(state["model"], state.get("prompt_chars", 0), chunk.get("prompt_eval_count"))
+    return (chunk.get("message") or {}).get("content") or None
+
+
+def _stream_state(payload: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Per-response parsing state, remembering the model and prompt size of the request."""
+    if not payload:
+        return {}
+    prompt_chars = sum(len(message.get("content") or "") for message in payload.get("messages") or [] if isinstance(message, dict))
+    return {"model": payload.get("model"), "prompt_chars": prompt_chars}
+
+
+def iter_chat_content(lines: Iterable[str], payload: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Yields the `message.content` pieces of an `/api/chat` NDJSON stream up to the `done` chunk.
+    The input is read to the end so the HTTP connection can go back to the pool.
+    `payload` is the request body, used to calibrate prompt token estimates.
+    """
+    state = _stream_state(payload)
+    for line in lines:
+        content = _chat_chunk_content(line, state)
+        if content:
+            yield content
+
+
+def _log_done_chunk(chunk: Dict[str, Any]) -> None:
+    eval_count = chunk.get("eval_count")
+    eval_duration_ns = chunk.get("eval_duration")
+    if eval_count and eval_duration_ns:
+        logger.debug(
+            f"Ollama '{chunk.get('model')}' done ({chunk.get('done_reason')}): prompt {chunk.get('prompt_eval_count')} tokens, "
+            f"generated {eval_count} tokens at {eval_count / (eval_duration_ns / 1e9):.1f} tok/s."
+        )
+
+
+class OllamaHttpClient:
+    """
+    Minimal client for Ollama's `/api/chat` endpoint.
+
+    Keeps one keep-alive connection pool per base URL (a thread-safe `httpx.Client` for sync
+    calls and one `httpx.AsyncClient` per event loop for async calls) and reads responses as
+    NDJSON streams, yielding content as each line arrives. Use `get_ollama_http_client()` to
+    share one instance per base URL across agents and nodes.
+    """
+
+    def __init__(self, base_url: str, max_connections: int = DEFAULT_POOL_CONNECTIONS):
+        if httpx is None:
+            raise ImportError("httpx is required for the native Ollama backend. Install it: pip install httpx")
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self._client: Optional["httpx.Client"] = None
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _limits(self) -> "httpx.Limits":
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _timeout(self, request_timeout: float) -> "httpx.Timeout":
+        # request_timeout áp dụng cho từng lần đọc (chờ token đầu tiên có thể lâu khi model đang load)
+        return httpx.Timeout(request_timeout, connect=min(DEFAULT_CONNECT_TIMEOUT, request_timeout), pool=None)
+
+    def _get_client(self) -> "httpx.Client":
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, limits=self._limits())
+            return self._client
+
+    def _get_async_client(self) -> "httpx.AsyncClient":
+        # httpx.AsyncClient gắn với event loop tạo ra nó -> một client cho mỗi loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(base_url=self.base_url, limits=self._limits())
+                self._async_clients[loop] = client
+            return client
+
+    @staticmethod
+    def _raise_for_status(response: "httpx.Response", body: bytes) -> None:
+        if response.status_code < 400:
+            return
+        message = body.decode("utf-8", errors="replace")
+        try:
+            message = json.loads(message).get("error", message)
+        except (ValueError, AttributeError):
+            pass
+        raise OllamaAPIError(f"Ollama /api/chat returned HTTP {response.status_code}: {message}", status_code=response.status_code)
+
+    def stream_chat(self, payload: Dict[str, Any], request_timeout: float = 120.0) -> Iterator[str]:
+        """
+        Posts `payload` to `/api/chat` and yields content pieces as NDJSON lines arrive.
+        Closing the generator early closes the response (and stops generation on the server).
+        """
+        client = self._get_client()
+        with client.stream("POST", "/api/chat", json=payload, timeout=self._timeout(request_timeout)) as response:
+            if response.status_code >= 400:
+                self._raise_for_status(response, response.read())
+            yield from iter_chat_content(response.iter_lines(), payload)
+
+    def chat(self, payload: Dict[str, Any], request_timeout: float = 120.0) -> str:
+        """Posts `payload` to `/api/chat` and returns the full response content."""
+        return "".join(self.stream_chat(payload, request_timeout=request_timeout))
+
+    async def astream_chat(self, payload: Dict[str, Any], request_timeout: float = 120.0) -> AsyncIterator[str]:
+        """Async variant of `stream_chat()`."""
+        client = self._get_async_client()
+        async with client.stream("POST", "/api/chat", json=payload, timeout=self._timeout(request_timeout)) as response:
+            if response.status_code >= 400:
+                self._raise_for_status(response, await response.aread())
+            state = _stream_state(payload)
+            async for line in response.aiter_lines():
+                content = _chat_chunk_content(line, state)
+                if content:
+                    yield content
+
+    async def achat(self, payload: Dict[str, Any], request_timeout: float = 120.0) -> str:
+        """Async variant of `chat()`."""
+        return "".join([piece async for piece in self.astream_chat(payload, request_timeout=request_timeout)])
+
+    async def aclose(self) -> None:
+        """Closes the async connection pool of the running event loop, if one was opened."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self) -> None:
+        """Closes the sync connection pool. Async pools are released with their event loop."""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+# Một OllamaHttpClient (một connection pool) cho mỗi base URL, dùng chung trong process
+_shared_http_clients: Dict[str, OllamaHttpClient] = {}
+_shared_http_clients_lock = threading.Lock()
+
+
+def get_ollama_http_client(base_url: str) -> OllamaHttpClient:
+    """Returns the process-wide OllamaHttpClient for `base_url`, creating it on first use."""
+    key = base_url.rstrip("/")
+    with _shared_http_clients_lock:
+        client = _shared_http_clients.get(key)
+        if client is None:
+            client = OllamaHttpClient(key)
+            _shared_http_clients[key] = client
+            logger.debug(f"Created pooled Ollama HTTP client for {key}.")
+        return client
+
+
+def close_ollama_http_client(base_url: str) -> None:
+    """Closes and forgets the process-wide OllamaHttpClient for `base_url`, if one was created."""
+    with _shared_http_clients_lock:
+        client = _shared_http_clients.pop(base_url.rstrip("/"), None)
+    if client is not None:
+        client.close()
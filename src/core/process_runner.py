@@ -0,0 +1,205 @@
+# NOVAGUARD-AI/src/core/process_runner.py
+
+import os
+import sys
+import time
+import signal
+import logging
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional, IO
+
+from pydantic import BaseModel, Field
+
+try:
+    import resource # Chỉ có trên POSIX
+except ImportError: # pragma: no cover - Windows
+    resource = None # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_STDERR_KB = 256
+_KILL_GRACE_SECONDS = 5
+# Thông báo thường gặp khi tool hết bộ nhớ do RLIMIT_AS (Python, Rust, OCaml, C)
+_OUT_OF_MEMORY_MARKERS = ("MemoryError", "out of memory", "Out of memory", "Cannot allocate memory", "memory allocation of", "std::bad_alloc")
+
+
+class ToolResourceLimits(BaseModel):
+    """Per-tool limits from `resource_limits` in tools.yml. None (or 0) disables a limit."""
+    cpu_seconds: Optional[int] = Field(default=None, description="RLIMIT_CPU: CPU time of the tool process.")
+    memory_mb: Optional[int] = Field(default=None, description="RLIMIT_AS: address space of each tool process.")
+    max_output_mb: Optional[int] = Field(default=None, description="RLIMIT_FSIZE and cap on captured stdout.")
+    max_stderr_kb: int = Field(default=DEFAULT_MAX_STDERR_KB, description="Cap on captured stderr kept for logs/errors.")
+
+    @classmethod
+    def from_config(cls, settings: Optional[Dict[str, Any]]) -> "ToolResourceLimits":
+        values: Dict[str, Any] = {}
+        for name in cls.model_fields:
+            value = (settings or {}).get(name)
+            if value is None:
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                logger.warning(f"Ignoring invalid resource limit {name}={value!r} (expected a non-negative number).")
+                continue
+            if value > 0:
+                values[name] = int(value)
+        return cls(**values)
+
+
+class ToolResourceUsage(BaseModel):
+    """Resource usage of one tool run, reported in the Tier 1 diagnostics."""
+    tool_id: str
+    target: str
+    wall_seconds: float
+    user_cpu_seconds: Optional[float] = None
+    system_cpu_seconds: Optional[float] = None
+    max_rss_mb: Optional[float] = None # Linux tính cả RSS của tiến trình cha tại thời điểm fork (giá trị tối thiểu ~ RSS của NovaGuard)
+    return_code: Optional[int] = None
+    timed_out: bool = False
+    limit_exceeded: Optional[str] = None
+    stdout_truncated: bool = False
+    stderr_truncated: bool = False
+    in_process: bool = False
+
+
+class ToolProcessResult(subprocess.CompletedProcess):
+    """`CompletedProcess` plus the resource usage of the run."""
+    def __init__(self, args: List[str], returncode: int, stdout: Optional[str], stderr: str, usage: ToolResourceUsage):
+        super().__init__(args, returncode, stdout, stderr)
+        self.usage = usage
+
+
+class ToolProcessTimeout(subprocess.TimeoutExpired):
+    """Timeout of a tool run; the whole process group has been killed. Carries the usage."""
+    def __init__(self, cmd: List[str], timeout: float, usage: ToolResourceUsage, stderr: str = ""):
+        super().__init__(cmd, timeout, stderr=stderr)
+        self.usage = usage
+
+
+class _RusagePopen(subprocess.Popen):
+    """Popen that reaps the child with `os.wait4` to keep its rusage (POSIX)."""
+    rusage: Any = None
+
+    def _try_wait(self, wait_flags):
+        try:
+            pid, status, rusage = os.wait4(self.pid, wait_flags)
+        except ChildProcessError:
+            return self.pid, 0
+        if pid == self.pid:
+            self.rusage = rusage
+        return pid, status
+
+
+def _apply_limits(pid: int, limits: ToolResourceLimits) -> None:
+    """
+    Applies the limits to the started process with prlimit (Linux). This is used instead of a
+    preexec_fn, which is not safe while Tier 1 runs tools from several threads. Processes the tool
+    forks afterwards inherit the limits.
+    """
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    settings = []
+    if limits.cpu_seconds:
+        # Soft limit gửi SIGXCPU trước; hard limit (SIGKILL) cho tool bỏ qua SIGXCPU
+        settings.append((resource.RLIMIT_CPU, (limits.cpu_seconds, limits.cpu_seconds + _KILL_GRACE_SECONDS)))
+    if limits.memory_mb:
+        settings.append((resource.RLIMIT_AS, (limits.memory_mb * 1024 * 1024,) * 2))
+    if limits.max_output_mb:
+        settings.append((resource.RLIMIT_FSIZE, (limits.max_output_mb * 1024 * 1024,) * 2))
+    for limit_type, value in settings:
+        try:
+            resource.prlimit(pid, limit_type, value)
+        except (OSError, ValueError) as e: # Tiến trình đã kết thúc, hoặc giá trị vượt hard limit hiện tại
+            logger.debug(f"Could not apply resource limit {limit_type}={value} to pid {pid}: {e}")
+
+
+def _kill_process_group(process: subprocess.Popen) -> None:
+    """Kills every process of the tool's session (the tool and anything it spawned)."""
+    if sys.platform == "win32":
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _read_capped(handle: IO[bytes], max_bytes: Optional[int]) -> "tuple[str, bool]":
+    """Reads at most `max_bytes`; reaching the cap counts as truncated (RLIMIT_FSIZE stops writes exactly there)."""
+    handle.seek(0)
+    data = handle.read(max_bytes) if max_bytes else handle.read()
+    truncated = bool(max_bytes) and len(data) >= max_bytes
+    return data.decode("utf-8", errors="replace"), truncated
+
+
+def _limit_exceeded(returncode: int, usage: ToolResourceUsage, limits: ToolResourceLimits, stderr: str) -> Optional[str]:
+    """Best-effort name of the limit that ended the run."""
+    if returncode == -getattr(signal, "SIGXCPU", -1000) or (
+        limits.cpu_seconds and returncode == -signal.SIGKILL and (usage.user_cpu_seconds or 0) + (usage.system_cpu_seconds or 0) >= limits.cpu_seconds
+    ):
+        return "cpu_seconds"
+    # Python bỏ qua SIGXFSZ nên ghi quá giới hạn chỉ gây lỗi EFBIG ("File too large")
+    if returncode == -getattr(signal, "SIGXFSZ", -1000) or usage.stdout_truncated or (limits.max_output_mb and returncode != 0 and "File too large" in stderr):
+        return "max_output_mb"
+    if limits.memory_mb and returncode != 0 and any(marker in stderr for marker in _OUT_OF_MEMORY_MARKERS):
+        return "memory_mb"
+    return None
+
+
+def run_tool_process(
+    command_parts: List[str],
+    cwd: Path,
+    timeout_seconds: float,
+    limits: Optional[ToolResourceLimits] = None,
+    spool_dir: Optional[Path] = None,
+    stdout_path: Optional[Path] = None,
+    tool_id: str = "",
+    target: str = ""
+) -> ToolProcessResult:
+    """
+    Runs a tool command in its own process group with resource limits.
+
+    stdout and stderr go to files instead of pipes, so a tool printing without bound cannot grow
+    this process: stdout is written to `stdout_path` (returned `stdout` is then None) or to a
+    temporary file in `spool_dir` that is read back up to `max_output_mb`; only the first
+    `max_stderr_kb` of stderr are kept. On timeout the whole process group is killed.
+
+    Raises:
+        ToolProcessTimeout: The tool did not finish within `timeout_seconds` (a `TimeoutExpired`).
+        FileNotFoundError / OSError: The command could not be started.
+    """
+    limits = limits or ToolResourceLimits()
+    max_stdout_bytes = limits.max_output_mb * 1024 * 1024 if limits.max_output_mb else None
+    start = time.monotonic()
+    with tempfile.TemporaryFile(dir=spool_dir) as stderr_file, \
+            (open(stdout_path, "wb") if stdout_path else tempfile.TemporaryFile(dir=spool_dir)) as stdout_file:
+        process = _RusagePopen(
+            command_parts, cwd=cwd, stdin=subprocess.DEVNULL, stdout=stdout_file, stderr=stderr_file,
+            start_new_session=(sys.platform != "win32"),
+        )
+        _apply_limits(process.pid, limits)
+        timed_out = False
+        try:
+            process.wait(timeout=timeout_seconds)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill_process_group(process)
+            process.wait()
+        # Dọn các tiến trình con còn sót lại sau khi tool chính kết thúc (daemon, worker treo)
+        _kill_process_group(process)
+
+        usage = ToolResourceUsage(tool_id=tool_id, target=target, wall_seconds=round(time.monotonic() - start, 3), return_code=process.returncode, timed_out=timed_out)
+        if process.rusage is not None:
+            usage.user_cpu_seconds = round(process.rusage.ru_utime, 3)
+            usage.system_cpu_seconds = round(process.rusage.ru_stime, 3)
+            usage.max_rss_mb = round(process.rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        stderr, usage.stderr_truncated = _read_capped(stderr_file, limits.max_stderr_kb * 1024)
+        stdout: Optional[str] = None
+        if not stdout_path:
+            stdout, usage.stdout_truncated = _read_capped(stdout_file, max_stdout_bytes)
+
+    if timed_out:
+        raise ToolProcessTimeout(command_parts, timeout_seconds, usage, stderr=stderr)
+    usage.limit_exceeded = _limit_exceeded(process.returncode, usage, limits, stderr)
+    return ToolProcessResult(command_parts, process.returncode, stdout, stderr, usage)
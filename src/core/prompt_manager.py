@@ -1,5 +1,6 @@
 # NOVAGUARD-AI/src/core/prompt_manager.py
 
+import os
 import logging
 from typing import Dict, Any, Optional, List, Set
 
@@ -16,6 +17,32 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+PROMPT_LAYOUT_TEMPLATE = "template"
+PROMPT_LAYOUT_SHARED_PREFIX = "shared_prefix"
+SUPPORTED_PROMPT_LAYOUTS = (PROMPT_LAYOUT_TEMPLATE, PROMPT_LAYOUT_SHARED_PREFIX)
+# Template của phần đầu prompt dùng chung giữa các agent (PR context + code của file)
+SHARED_CONTEXT_PROMPT_NAME = "shared_review_context"
+# System message của mọi agent với layout shared_prefix: là phần đầu của prompt mà Ollama đánh giá
+SHARED_PREFIX_SYSTEM_MESSAGE = (
+    "You are an expert code reviewer. The pull request context and the code under review come first; "
+    "the instructions of the specific review you must perform follow them."
+)
+
+
+def get_prompt_layout(config: Any) -> str:
+    """
+    Returns how agent prompts are laid out: `orchestration.prompt_layout` in models.yml ("template" or
+    "shared_prefix"), overridable with the NOVAGUARD_PROMPT_LAYOUT environment variable.
+    """
+    env_value = os.environ.get("NOVAGUARD_PROMPT_LAYOUT")
+    layout = env_value.strip().lower() if env_value else config.get_orchestration_setting("prompt_layout", PROMPT_LAYOUT_TEMPLATE)
+    if layout in SUPPORTED_PROMPT_LAYOUTS:
+        return layout
+    if isinstance(layout, str):
+        logger.warning(f"Unknown prompt layout '{layout}'. Using '{PROMPT_LAYOUT_TEMPLATE}'.")
+    return PROMPT_LAYOUT_TEMPLATE
+
+
 class PromptManager:
     """
     Manages and renders prompt templates using Jinja2.
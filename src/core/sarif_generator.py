@@ -309,6 +309,12 @@ class SarifGenerator:
             })
 
 
+    def set_invocation_property(self, name: str, value: Any):
+        """Sets a custom entry in the invocation's `properties` bag (e.g. Tier 1 tool resource usage)."""
+        invocation = self.report["runs"][0]["invocations"][0]
+        invocation.setdefault("properties", {})[name] = value
+
+
     def get_sarif_report(self) -> Dict[str, Any]:
         """
         Finalizes and returns the complete SARIF report as a dictionary.
@@ -1,13 +1,54 @@
 # NOVAGUARD-AI/src/core/shared_context.py
 
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel, Field, ConfigDict # Import ConfigDict for Pydantic v2 style config
 
 # Import Config to use as a type hint
 from .config_loader import Config
 
 
+class DiffHunk(BaseModel):
+    """
+    One hunk of a unified git diff for a single file, with the line numbers of every hunk line.
+    """
+    old_start: int = Field(description="First line of the hunk in the old (base) file.")
+    old_count: int = Field(description="Number of old-file lines covered by the hunk.")
+    new_start: int = Field(description="First line of the hunk in the new (head) file.")
+    new_count: int = Field(description="Number of new-file lines covered by the hunk.")
+    section_header: Optional[str] = Field(
+        default=None,
+        description="The text after the closing '@@' of the hunk header (usually the enclosing function or class)."
+    )
+    lines: List[str] = Field(
+        default_factory=list,
+        description="The hunk body lines, each starting with ' ' (context), '+' (added) or '-' (removed)."
+    )
+    line_map: List[Tuple[Optional[int], Optional[int]]] = Field(
+        default_factory=list,
+        description="For each entry of `lines`, its (old_line, new_line) numbers; None on the side where the line does not exist."
+    )
+
+    @property
+    def added_lines(self) -> List[int]:
+        """New-file line numbers of the added lines."""
+        return [new_line for (old_line, new_line) in self.line_map if old_line is None and new_line is not None]
+
+    @property
+    def removed_lines(self) -> List[int]:
+        """Old-file line numbers of the removed lines."""
+        return [old_line for (old_line, new_line) in self.line_map if new_line is None and old_line is not None]
+
+    @property
+    def header(self) -> str:
+        header = f"@@ -{self.old_start},{self.old_count} +{self.new_start},{self.new_count} @@"
+        return f"{header} {self.section_header}" if self.section_header else header
+
+    def to_text(self) -> str:
+        """The hunk rendered back as unified diff text."""
+        return "\n".join([self.header, *self.lines])
+
+
 class ChangedFile(BaseModel):
     """
     Represents a changed file along with its content and related information.
@@ -19,16 +60,33 @@ class ChangedFile(BaseModel):
     content: str = Field(
         description="The full content of the file."
     )
-    diff_hunks: Optional[List[str]] = Field(
+    diff_hunks: Optional[List[DiffHunk]] = Field(
         default=None,
-        description="A list of 'hunk' sections from the git diff output, if available. Useful for focusing LLM attention on specific changes."
+        description="The structured 'hunk' sections of the git diff for this file, if available. Useful for focusing LLM attention on specific changes."
     )
     language: Optional[str] = Field(
         default=None,
         description="The programming language of the file (e.g., 'python', 'javascript'). This can be determined later in the pipeline."
     )
+    change_type: Optional[str] = Field(
+        default=None,
+        description="How the file changed: 'added', 'modified', 'renamed', 'copied' or 'type_changed' (from git diff)."
+    )
+    old_path: Optional[str] = Field(
+        default=None,
+        description="The previous path of a renamed or copied file."
+    )
+    similarity: Optional[int] = Field(
+        default=None,
+        description="Git's rename/copy similarity score in percent (100 means the content is unchanged)."
+    )
     model_config = ConfigDict(arbitrary_types_allowed=True) # Pydantic V2 config style
 
+    @property
+    def is_pure_rename(self) -> bool:
+        """A rename without any content change; there is nothing to review."""
+        return self.change_type == "renamed" and self.similarity == 100 and not self.diff_hunks
+
 
 class SharedReviewContext(BaseModel):
     """
@@ -0,0 +1,223 @@
+# NOVAGUARD-AI/src/core/tool_adapters.py
+
+import logging
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADAPTER = "generic"
+
+ToolOutput = Union[Dict[str, Any], List[Any]]
+
+
+def _get(item: Dict[str, Any], *path: str) -> Any:
+    """Nested lookup that tolerates missing / non-dict intermediate values."""
+    value: Any = item
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _first(*values: Any) -> Any:
+    return next((v for v in values if v is not None and v != ""), None)
+
+
+def _as_int(value: Any, default: Optional[int] = None) -> Optional[int]:
+    try: return int(value)
+    except (TypeError, ValueError): return default
+
+
+class ToolOutputAdapter:
+    """
+    Turns the parsed output of one tool into normalized findings: the original item plus
+    `file_path`, `line_start`, `line_end`, `col_start`, `col_end`, `rule_id`, `level`,
+    `message_text`, `code_snippet` and `tool_name`.
+
+    `iter_items()` and `adapt()` are generators, so output items can be normalized (and
+    dropped) one at a time as they are read instead of materializing the whole output.
+    """
+    name = DEFAULT_ADAPTER
+
+    def iter_items(self, tool_output: Any) -> Iterator[Any]:
+        """Yields the raw finding items of a tool output (a list, a `{"results": [...]}` dict, or an iterable of items)."""
+        if isinstance(tool_output, dict):
+            results = tool_output.get("results")
+            if isinstance(results, list):
+                yield from results
+            else:
+                yield tool_output
+        elif isinstance(tool_output, (list, tuple)) or (isinstance(tool_output, Iterable) and not isinstance(tool_output, (str, bytes))):
+            yield from tool_output
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Returns the tool-specific normalized fields of one item (without `tool_name`)."""
+        return {
+            "file_path": _first(item.get("file_path"), item.get("path"), item.get("filename")),
+            "line_start": _as_int(_first(item.get("line_start"), item.get("line"), _get(item, "start", "line"), item.get("line_number")), 1),
+            "line_end": _as_int(_first(item.get("line_end"), _get(item, "end", "line"))),
+            "col_start": _as_int(_first(item.get("col_start"), _get(item, "start", "col"))),
+            "col_end": _as_int(_first(item.get("col_end"), _get(item, "end", "col"))),
+            "rule_id": _first(item.get("rule_id"), item.get("symbol"), item.get("check_id")),
+            "level": _first(item.get("level"), item.get("severity"), _get(item, "extra", "severity")),
+            "message_text": _first(item.get("message_text"), item.get("message"), item.get("msg"), _get(item, "extra", "message")),
+            "code_snippet": _first(item.get("code_snippet"), _get(item, "extra", "lines")),
+        }
+
+    def adapt(
+        self,
+        tool_output: Any,
+        tool_id: str,
+        default_file_path: Optional[str] = None,
+        invalid_items: Optional[List[str]] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields normalized findings. `default_file_path` (the analyzed file of a per-file run)
+        wins over paths reported in the items; items that are not dicts are reported in
+        `invalid_items` and skipped.
+        """
+        tool_key = tool_id.split(".", 1)[-1]
+        for item in self.iter_items(tool_output):
+            if not isinstance(item, dict):
+                if invalid_items is not None: invalid_items.append(f"Invalid item type in findings list from {tool_id}: {type(item)}")
+                continue
+            adapted = item.copy()
+            normalized = self.normalize(item)
+            file_path = item.get("file_path") or default_file_path or normalized.get("file_path")
+            adapted.update(normalized)
+            adapted["file_path"] = file_path
+            adapted["tool_name"] = tool_id
+            adapted["line_start"] = normalized.get("line_start") or 1
+            adapted["rule_id"] = str(normalized.get("rule_id") or f"{tool_key}.unknown")
+            adapted["level"] = str(normalized.get("level") or "note").lower()
+            adapted["message_text"] = str(normalized.get("message_text") or "Message missing")
+            yield adapted
+
+
+class PylintAdapter(ToolOutputAdapter):
+    """`pylint --output-format=json` (or the in-process runner)."""
+    name = "pylint"
+    LEVELS = {"fatal": "error", "error": "error", "warning": "warning", "refactor": "note", "convention": "note", "info": "note"}
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        normalized = super().normalize(item)
+        normalized.update({
+            "line_end": _as_int(item.get("endLine")),
+            "col_start": _as_int(item.get("column")),
+            "col_end": _as_int(item.get("endColumn")),
+            "rule_id": _first(item.get("symbol"), item.get("message-id")),
+            "level": item.get("level") or self.LEVELS.get(str(item.get("type", "")).lower(), "note"),
+        })
+        return normalized
+
+
+class SemgrepAdapter(ToolOutputAdapter):
+    """`semgrep --json` (`results[]` items)."""
+    name = "semgrep"
+    LEVELS = {"error": "error", "warning": "warning", "info": "note", "inventory": "note", "experiment": "note"}
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        normalized = super().normalize(item)
+        normalized.update({
+            "rule_id": _first(item.get("check_id"), item.get("rule_id")),
+            "level": self.LEVELS.get(str(_get(item, "extra", "severity") or "").lower(), "note"),
+            "message_text": _first(_get(item, "extra", "message"), item.get("message")),
+        })
+        return normalized
+
+
+class RuffAdapter(ToolOutputAdapter):
+    """
+    `ruff check --output-format=json`. Ruff marks every violation as an error, so syntax errors
+    and undefined names are reported as `error` and all other rules as `warning`.
+    """
+    name = "ruff"
+    ERROR_CODES = ("invalid-syntax", "E9", "F821", "F822", "F823")
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        code = str(item.get("code") or "invalid-syntax") # Ruff cũ trả code null cho lỗi cú pháp
+        return {
+            "file_path": _first(item.get("file_path"), item.get("filename")),
+            "line_start": _as_int(_get(item, "location", "row"), 1),
+            "line_end": _as_int(_get(item, "end_location", "row")),
+            "col_start": _as_int(_get(item, "location", "column")),
+            "col_end": _as_int(_get(item, "end_location", "column")),
+            "rule_id": code,
+            "level": "error" if code.startswith(self.ERROR_CODES) else "warning",
+            "message_text": item.get("message"),
+            "code_snippet": None,
+        }
+
+
+class BanditAdapter(ToolOutputAdapter):
+    """`bandit -f json` (`results[]` items) or the in-process runner."""
+    name = "bandit"
+    LEVELS = {"high": "error", "medium": "warning", "low": "note"}
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        line_range = item.get("line_range") if isinstance(item.get("line_range"), list) else []
+        return {
+            "file_path": _first(item.get("file_path"), item.get("filename")),
+            "line_start": _as_int(item.get("line_number"), 1),
+            "line_end": _as_int(line_range[-1]) if line_range else None,
+            "col_start": _as_int(item.get("col_offset")),
+            "col_end": _as_int(item.get("end_col_offset")),
+            "rule_id": _first(item.get("test_id"), item.get("test_name")),
+            "level": self.LEVELS.get(str(item.get("issue_severity", "")).lower(), "note"),
+            "message_text": item.get("issue_text"),
+            "code_snippet": item.get("code"),
+        }
+
+
+class SarifAdapter(ToolOutputAdapter):
+    """Any tool emitting SARIF 2.1.0 (`runs[].results[]`)."""
+    name = "sarif"
+
+    def iter_items(self, tool_output: Any) -> Iterator[Any]:
+        if isinstance(tool_output, dict) and isinstance(tool_output.get("runs"), list):
+            for run in tool_output["runs"]:
+                yield from (_get(run, "results") or [])
+        else:
+            yield from super().iter_items(tool_output)
+
+    def normalize(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        location = (item.get("locations") or [{}])[0] if isinstance(item.get("locations"), list) else {}
+        uri = _get(location, "physicalLocation", "artifactLocation", "uri")
+        if isinstance(uri, str) and uri.startswith("file://"):
+            uri = uri[len("file://"):]
+        region = _get(location, "physicalLocation", "region") or {}
+        return {
+            "file_path": uri,
+            "line_start": _as_int(region.get("startLine"), 1),
+            "line_end": _as_int(region.get("endLine")),
+            "col_start": _as_int(region.get("startColumn")),
+            "col_end": _as_int(region.get("endColumn")),
+            "rule_id": item.get("ruleId"),
+            "level": item.get("level") or "warning", # Mặc định của SARIF khi không có level
+            "message_text": _get(item, "message", "text"),
+            "code_snippet": _get(region, "snippet", "text"),
+        }
+
+
+TOOL_OUTPUT_ADAPTERS: Dict[str, ToolOutputAdapter] = {
+    adapter.name: adapter
+    for adapter in (ToolOutputAdapter(), PylintAdapter(), SemgrepAdapter(), RuffAdapter(), BanditAdapter(), SarifAdapter())
+}
+
+
+def register_tool_adapter(adapter: ToolOutputAdapter) -> None:
+    """Registers (or replaces) an adapter under `adapter.name`, selectable with `adapter:` in tools.yml."""
+    TOOL_OUTPUT_ADAPTERS[adapter.name] = adapter
+
+
+def get_tool_adapter(tool_config_data: Optional[Union[str, Dict[str, Any]]]) -> ToolOutputAdapter:
+    """The adapter named by the tool's `adapter` key in tools.yml; the generic one when unset or unknown."""
+    name = tool_config_data.get("adapter") if isinstance(tool_config_data, dict) else None
+    if not name:
+        return TOOL_OUTPUT_ADAPTERS[DEFAULT_ADAPTER]
+    adapter = TOOL_OUTPUT_ADAPTERS.get(str(name).lower())
+    if adapter is None:
+        logger.warning(f"Unknown tool output adapter '{name}', using '{DEFAULT_ADAPTER}'. Available: {list(TOOL_OUTPUT_ADAPTERS)}")
+        return TOOL_OUTPUT_ADAPTERS[DEFAULT_ADAPTER]
+    return adapter
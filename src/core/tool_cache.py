@@ -0,0 +1,268 @@
+# NOVAGUARD-AI/src/core/tool_cache.py
+
+import os
+import json
+import time
+import shlex
+import sqlite3
+import hashlib
+import logging
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = ".novaguard_cache/tool_results.sqlite"
+DEFAULT_MAX_SIZE_MB = 128
+DEFAULT_MAX_AGE_DAYS = 7
+VERSION_PROBE_TIMEOUT_SECONDS = 30
+
+_TRUE_VALUES = ("1", "true", "yes", "on")
+_MISSING = "missing"
+
+
+class ToolResultCache:
+    """
+    Persistent cache of Tier 1 tool results (the parsed output of `ToolRunner.run`) stored in
+    a local SQLite file.
+
+    Entries are keyed by `make_key()`: tool id, command template, tool version, the content
+    hash of every target file and of the config files the tool reads. Expiry, LRU eviction
+    and `bypass` behave as in `LLMResponseCache`.
+    """
+
+    def __init__(
+        self,
+        cache_path: Union[str, Path],
+        max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 1024 * 1024,
+        max_age_seconds: float = DEFAULT_MAX_AGE_DAYS * 24 * 3600,
+        bypass: bool = False
+    ):
+        self.cache_path = Path(cache_path)
+        self.max_size_bytes = max_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Một connection dùng chung cho mọi thread (tool chạy song song), được bảo vệ bởi self._lock
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_results ("
+                " key TEXT PRIMARY KEY,"
+                " tool_id TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " size_bytes INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tool_results_last_accessed ON tool_results(last_accessed_at)")
+            self._conn.commit()
+            self._evict_locked()
+        logger.info(
+            f"Tool result cache opened at {self.cache_path} (max {self.max_size_bytes / (1024 * 1024):.0f} MB, "
+            f"max age {self.max_age_seconds / 86400:.1f} days, bypass={self.bypass})."
+        )
+
+    @staticmethod
+    def make_key(
+        tool_id: str,
+        command_template: str,
+        tool_version: str,
+        target_hashes: Dict[str, str],
+        config_hashes: Dict[str, str],
+        options: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Returns the content address (hex SHA-256) of a tool invocation."""
+        key_material = json.dumps({
+            "tool_id": tool_id,
+            "command_template": command_template,
+            "tool_version": tool_version,
+            "targets": target_hashes,
+            "config_files": config_hashes,
+            "options": options or {},
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached tool result for `key`, or None on a miss (always None when bypassing)."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result, created_at FROM tool_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result, created_at = row
+            if now - created_at > self.max_age_seconds:
+                self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+                self._conn.commit()
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE tool_results SET last_accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(result)
+
+    def put(self, key: str, tool_id: str, result: Any) -> None:
+        """Stores a (JSON-serializable) tool result and evicts old / least recently used entries if needed."""
+        try:
+            serialized = json.dumps(result, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Not caching result of '{tool_id}': not JSON-serializable ({e}).")
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_results (key, tool_id, result, size_bytes, created_at, last_accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, tool_id, serialized, len(serialized.encode("utf-8")), now, now)
+            )
+            self.stores += 1
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """Drops expired entries, then least recently used ones until under the size limit. Caller holds the lock."""
+        cursor = self._conn.execute("DELETE FROM tool_results WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        self.evictions += max(cursor.rowcount, 0)
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM tool_results").fetchone()[0]
+        if total_size > self.max_size_bytes:
+            for key, size_bytes in self._conn.execute("SELECT key, size_bytes FROM tool_results ORDER BY last_accessed_at ASC").fetchall():
+                if total_size <= self.max_size_bytes:
+                    break
+                self._conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+                total_size -= size_bytes
+                self.evictions += 1
+        self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total_size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM tool_results").fetchone()
+        return {
+            "hits": self.hits, "misses": self.misses, "stores": self.stores, "evictions": self.evictions,
+            "entries": entries, "size_bytes": total_size,
+        }
+
+    def log_stats(self) -> None:
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = (100.0 * stats["hits"] / lookups) if lookups else 0.0
+        logger.info(
+            f"Tool result cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0f}% hit rate), "
+            f"{stats['stores']} stored, {stats['evictions']} evicted; {stats['entries']} entries, "
+            f"{stats['size_bytes'] / (1024 * 1024):.1f} MB at {self.cache_path}."
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def hash_path(path: Path) -> str:
+    """
+    SHA-256 of a file's bytes, or of every file (relative path + content hash) under a
+    directory. Returns "missing" if the path does not exist.
+    """
+    try:
+        if path.is_file():
+            return hashlib.sha256(path.read_bytes()).hexdigest()
+        if path.is_dir():
+            digest = hashlib.sha256()
+            for file_path in sorted(p for p in path.rglob("*") if p.is_file()):
+                digest.update(str(file_path.relative_to(path)).encode("utf-8") + b"\0")
+                digest.update(hashlib.sha256(file_path.read_bytes()).hexdigest().encode("ascii") + b"\0")
+            return digest.hexdigest()
+    except OSError as e:
+        logger.warning(f"Could not hash '{path}' for the tool cache key: {e}")
+    return _MISSING
+
+
+# Version của tool theo version command, chỉ probe một lần mỗi process
+_tool_versions: Dict[str, Optional[str]] = {}
+_tool_versions_lock = threading.Lock()
+
+
+def get_tool_version(version_command: str, cwd: Optional[Path] = None) -> Optional[str]:
+    """
+    Output of the tool's version command (e.g. `pylint --version`), memoized per process.
+    Returns None when the command cannot be run, in which case the result is not cached.
+    """
+    with _tool_versions_lock:
+        if version_command in _tool_versions:
+            return _tool_versions[version_command]
+    version: Optional[str] = None
+    try:
+        completed = subprocess.run(
+            shlex.split(version_command), capture_output=True, text=True,
+            cwd=cwd, timeout=VERSION_PROBE_TIMEOUT_SECONDS, check=False
+        )
+        output = (completed.stdout or "").strip() or (completed.stderr or "").strip()
+        if completed.returncode == 0 and output:
+            version = output
+        else:
+            logger.warning(f"Version probe '{version_command}' failed (exit code {completed.returncode}); tool results will not be cached.")
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Version probe '{version_command}' failed: {e}; tool results will not be cached.")
+    with _tool_versions_lock:
+        _tool_versions[version_command] = version
+    return version
+
+
+# Cache dùng chung trong process, theo đường dẫn file
+_shared_caches: Dict[str, ToolResultCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def _number_setting(value: Any, default: float) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0:
+        return value
+    return default
+
+
+def get_tool_result_cache(config: Any) -> Optional[ToolResultCache]:
+    """
+    Returns the process-wide ToolResultCache configured by the `tool_cache` section of
+    models.yml, or None if caching is disabled or the cache cannot be opened.
+
+    Environment overrides: NOVAGUARD_TOOL_CACHE_PATH, NOVAGUARD_TOOL_CACHE_BYPASS.
+    """
+    if config.get_tool_cache_setting("enabled", False) is not True:
+        return None
+
+    path_setting = os.environ.get("NOVAGUARD_TOOL_CACHE_PATH") or config.get_tool_cache_setting("path", DEFAULT_CACHE_PATH)
+    if not isinstance(path_setting, (str, Path)):
+        path_setting = DEFAULT_CACHE_PATH
+    cache_path = Path(path_setting).expanduser().resolve()
+
+    env_bypass = os.environ.get("NOVAGUARD_TOOL_CACHE_BYPASS")
+    if env_bypass:
+        bypass = env_bypass.strip().lower() in _TRUE_VALUES
+    else:
+        bypass = config.get_tool_cache_setting("bypass", False) is True
+
+    with _shared_caches_lock:
+        cache = _shared_caches.get(str(cache_path))
+        if cache is None:
+            try:
+                cache = ToolResultCache(
+                    cache_path,
+                    max_size_bytes=int(_number_setting(config.get_tool_cache_setting("max_size_mb"), DEFAULT_MAX_SIZE_MB) * 1024 * 1024),
+                    max_age_seconds=_number_setting(config.get_tool_cache_setting("max_age_days"), DEFAULT_MAX_AGE_DAYS) * 24 * 3600,
+                    bypass=bypass,
+                )
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Could not open tool result cache at {cache_path}: {e}. Continuing without cache.")
+                return None
+            _shared_caches[str(cache_path)] = cache
+        cache.bypass = bypass
+    return cache
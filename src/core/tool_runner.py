@@ -1,14 +1,23 @@
 # NOVAGUARD-AI/src/core/tool_runner.py
 
+import re
 import json
+import time
+import uuid
 import shlex
+import hashlib
 import logging
+import threading
 import subprocess
 from pathlib import Path
 from typing import Dict, Any, Optional, Union, Tuple, List # Thêm List
 
 # Assuming Config is in the same 'core' directory
 from .config_loader import Config
+from .tool_cache import ToolResultCache, get_tool_version, hash_path
+from .in_process_tools import InProcessToolUnavailable, InProcessToolError, run_in_process_tool, get_in_process_tool_version
+from .json_stream import StreamedJsonOutput, JSONStreamError, parse_item_path
+from .process_runner import ToolResourceLimits, ToolResourceUsage, ToolProcessResult, ToolProcessTimeout, run_tool_process
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +37,7 @@ class ToolRunner:
     and captures their output.
     """
 
-    def __init__(self, config: Config, workspace_path: Path):
+    def __init__(self, config: Config, workspace_path: Path, result_cache: Optional[ToolResultCache] = None):
         """
         Initializes the ToolRunner.
 
@@ -36,11 +45,18 @@ class ToolRunner:
             config: The Config object containing tool command templates.
             workspace_path: The absolute path to the GitHub workspace, used as
                             the primary CWD for tool execution and for resolving paths.
+            result_cache: Optional cache of tool results; runs on unchanged files are served from it.
         """
         self.config = config
+        self.result_cache = result_cache
         # Ensure workspace_path is absolute and resolved
         self.workspace_path = workspace_path.resolve() 
         self.tool_output_dir = self.workspace_path / TOOL_OUTPUT_SUBDIR
+        # Các lần chạy bị timeout hoặc vượt resource limit; node Tier 1 đưa chúng vào error_messages
+        self._timeout_messages: List[str] = []
+        # Resource usage (rusage) của từng lần chạy, cho diagnostics của Tier 1
+        self._resource_usage: List[ToolResourceUsage] = []
+        self._timeout_lock = threading.Lock()
         
         try:
             self.tool_output_dir.mkdir(parents=True, exist_ok=True)
@@ -55,10 +71,13 @@ class ToolRunner:
         tool_category: str,
         tool_key: str,
         target_file_relative_path: Optional[str] = None, # Path to a specific file being analyzed
-        additional_context_vars: Optional[Dict[str, str]] = None
+        additional_context_vars: Optional[Dict[str, str]] = None,
+        target_file_relative_paths: Optional[List[str]] = None # All files of a batch run ({file_paths})
     ) -> Tuple[Optional[str], Optional[Path]]:
         """
         Prepares the command string and identifies if an output file is used.
+        For batch runs, `{file_paths}`/`{relative_file_paths}` expand to the shell-quoted,
+        space-separated list of `target_file_relative_paths`.
 
         Returns:
             A tuple: (formatted_command_string, path_to_temporary_output_file_if_any)
@@ -92,6 +111,10 @@ class ToolRunner:
         else:
              context_vars["file_path"] = "" # Provide empty string if no target file
 
+        batch_relative_paths = [p.lstrip('/') for p in (target_file_relative_paths or [])]
+        context_vars["file_paths"] = " ".join(shlex.quote(str((self.workspace_path / p).resolve())) for p in batch_relative_paths)
+        context_vars["relative_file_paths"] = " ".join(shlex.quote(p) for p in batch_relative_paths)
+        context_vars["jobs"] = "1"
         
         if additional_context_vars:
             context_vars.update(additional_context_vars)
@@ -99,11 +122,15 @@ class ToolRunner:
         temp_output_file: Optional[Path] = None
         if "{output_file}" in command_template:
             # Generate a unique name for the temporary output file
-            safe_target_name = Path(target_file_relative_path).name if target_file_relative_path else "project"
+            safe_target_name = Path(target_file_relative_path).name if target_file_relative_path else ("batch" if batch_relative_paths else "project")
             safe_target_name = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in safe_target_name)
             safe_tool_key = "".join(c if c.isalnum() or c in ('_', '-') else '_' for c in tool_key)
 
-            temp_output_filename = f"{tool_category}_{safe_tool_key}_{safe_target_name}.output"
+            # Hash của (các) đường dẫn tương đối phân biệt file cùng basename ở thư mục khác nhau;
+            # suffix ngẫu nhiên tránh đụng độ khi cùng một tool chạy song song nhiều lần.
+            target_identity = target_file_relative_path or "\n".join(batch_relative_paths) or "project"
+            target_digest = hashlib.sha1(target_identity.encode("utf-8")).hexdigest()[:10]
+            temp_output_filename = f"{tool_category}_{safe_tool_key}_{safe_target_name}_{target_digest}_{uuid.uuid4().hex[:8]}.output"
             temp_output_file = (self.tool_output_dir / temp_output_filename).resolve()
             context_vars["output_file"] = str(temp_output_file)
             logger.debug(f"Tool '{tool_category}.{tool_key}' configured to write to temporary output file: {temp_output_file}")
@@ -130,7 +157,8 @@ class ToolRunner:
         target_file_relative_path: Optional[str] = None,
         additional_context_vars: Optional[Dict[str, str]] = None,
         expect_json_output: bool = False,
-        timeout_seconds: int = 120
+        timeout_seconds: int = 120,
+        target_file_relative_paths: Optional[List[str]] = None
     ) -> Optional[Union[Dict[str, Any], List[Any], str]]:
         """
         Runs a configured CLI tool.
@@ -142,16 +170,63 @@ class ToolRunner:
             additional_context_vars: Optional dictionary of additional variables to format the command string.
             expect_json_output: If True, attempts to parse the tool's output (from stdout or file) as JSON.
             timeout_seconds: Maximum time to wait for the tool to complete.
+            target_file_relative_paths: Optional relative paths of all files analyzed by one batch invocation.
 
         Returns:
             The parsed output (JSON as dict/list, or raw text as str), or None if the tool failed critically
-            or ran successfully but produced no output.
+            or ran successfully but produced no output. Tools with `stream_output: true` in tools.yml return
+            a `StreamedJsonOutput` (iterate it to get the output items) instead of a parsed dict/list.
         
         Raises:
             ToolExecutionError: If the tool runs but returns a non-zero exit code AND produces no output.
         """
+        cache_key = self._result_cache_key(
+            tool_category, tool_key, target_file_relative_path, additional_context_vars, expect_json_output, target_file_relative_paths
+        )
+        if cache_key:
+            cached_output = self.result_cache.get(cache_key)
+            if cached_output is not None:
+                logger.info(f"Tool '{tool_category}.{tool_key}' result for {target_file_relative_path or f'{len(target_file_relative_paths or [])} files'} served from cache.")
+                return cached_output
+        tool_output = self._execute(
+            tool_category, tool_key, target_file_relative_path, additional_context_vars,
+            expect_json_output, timeout_seconds, target_file_relative_paths
+        )
+        if cache_key and isinstance(tool_output, StreamedJsonOutput):
+            # Chỉ lưu cache khi output đã được đọc hết mà không lỗi
+            streamed_output = tool_output
+            streamed_output.on_complete(lambda items: self.result_cache.put(cache_key, f"{tool_category}.{tool_key}", streamed_output.wrap(items)))
+        elif cache_key and tool_output is not None:
+            self.result_cache.put(cache_key, f"{tool_category}.{tool_key}", tool_output)
+        return tool_output
+
+    def _execute(
+        self,
+        tool_category: str,
+        tool_key: str,
+        target_file_relative_path: Optional[str],
+        additional_context_vars: Optional[Dict[str, str]],
+        expect_json_output: bool,
+        timeout_seconds: int,
+        target_file_relative_paths: Optional[List[str]]
+    ) -> Optional[Union[Dict[str, Any], List[Any], str]]:
+        """Runs the tool without consulting the result cache. Arguments and return value as `run()`."""
+        tool_cfg = self.config.get_tool_config(tool_category, tool_key)
+        if isinstance(tool_cfg, dict) and tool_cfg.get("in_process"):
+            try:
+                return self._execute_in_process(
+                    tool_category, tool_key, tool_cfg, target_file_relative_path, target_file_relative_paths
+                )
+            except InProcessToolUnavailable as e:
+                logger.warning(f"In-process runner for '{tool_category}.{tool_key}' unavailable ({e}); falling back to its command.")
+        if isinstance(tool_cfg, dict) and tool_cfg.get("stream_output") is True and expect_json_output:
+            return self._execute_streamed(
+                tool_category, tool_key, tool_cfg, target_file_relative_path, additional_context_vars,
+                timeout_seconds, target_file_relative_paths
+            )
+
         formatted_command, temp_output_file = self._prepare_command_and_context(
-            tool_category, tool_key, target_file_relative_path, additional_context_vars
+            tool_category, tool_key, target_file_relative_path, additional_context_vars, target_file_relative_paths
         )
 
         if not formatted_command:
@@ -168,13 +243,8 @@ class ToolRunner:
 
         try:
             logger.info(f"Executing: {' '.join(command_parts)} in CWD: {self.workspace_path}")
-            process_completed = subprocess.run(
-                command_parts,
-                capture_output=True,
-                text=True,
-                cwd=self.workspace_path,
-                timeout=timeout_seconds,
-                check=False # Check returncode manually
+            process_completed = self._run_process(
+                tool_category, tool_key, command_parts, timeout_seconds, target_file_relative_path, target_file_relative_paths
             )
 
             logger.debug(f"Tool '{tool_category}.{tool_key}' finished. Return code: {process_completed.returncode}")
@@ -182,7 +252,7 @@ class ToolRunner:
                 logger.debug(f"Tool '{tool_category}.{tool_key}' Stderr:\n{process_completed.stderr.strip()}")
 
         except subprocess.TimeoutExpired:
-            logger.error(f"Tool '{tool_category}.{tool_key}' timed out after {timeout_seconds} seconds.")
+            self._record_timeout(tool_category, tool_key, timeout_seconds, target_file_relative_path, target_file_relative_paths)
             return None # Timeout is treated as None result
         except FileNotFoundError:
             logger.error(f"Command not found for tool '{tool_category}.{tool_key}'. "
@@ -233,6 +303,17 @@ class ToolRunner:
             # --- Kết thúc xác định output thô ---
 
 
+        return self._interpret_output(tool_category, tool_key, process_completed, raw_output_text, expect_json_output)
+
+    def _interpret_output(
+        self,
+        tool_category: str,
+        tool_key: str,
+        process_completed: Optional[subprocess.CompletedProcess],
+        raw_output_text: Optional[str],
+        expect_json_output: bool
+    ) -> Optional[Union[Dict[str, Any], List[Any], str]]:
+        """Applies the exit-code / empty-output rules of `run()` to the raw output and parses JSON if expected."""
         # --- Kiểm tra các điều kiện lỗi và output ---
         # Trường hợp 1: Tool chạy lỗi VÀ không có output nào cả (raw_output_text là None hoặc rỗng)
         if process_completed and process_completed.returncode != 0 and not raw_output_text:
@@ -278,4 +359,369 @@ class ToolRunner:
         
         # Trả về text nếu không yêu cầu JSON, parse JSON lỗi, hoặc các trường hợp khác
         # Đảm bảo trả về string, không phải None ở đây nếu đã có output
-        return raw_output_text if raw_output_text is not None else ""
\ No newline at end of file
+        return raw_output_text if raw_output_text is not None else ""
+
+    def _execute_streamed(
+        self,
+        tool_category: str,
+        tool_key: str,
+        tool_cfg: Dict[str, Any],
+        target_file_relative_path: Optional[str],
+        additional_context_vars: Optional[Dict[str, str]],
+        timeout_seconds: int,
+        target_file_relative_paths: Optional[List[str]]
+    ) -> Optional[Union[StreamedJsonOutput, Dict[str, Any], List[Any], str]]:
+        """
+        Runs a tool with `stream_output: true`. Its JSON output is left on disk and returned as a
+        `StreamedJsonOutput` that yields the items at `stream_json_path` (default "results") one at a
+        time. Tools printing to stdout have it written to a spool file in the tool output directory
+        instead of a pipe, so the output is never held in memory as one string. Timeouts, exit codes
+        and non-JSON output are handled as in `_execute`.
+        """
+        formatted_command, temp_output_file = self._prepare_command_and_context(
+            tool_category, tool_key, target_file_relative_path, additional_context_vars, target_file_relative_paths
+        )
+        if not formatted_command:
+            return None
+        try:
+            command_parts = shlex.split(formatted_command)
+        except Exception as e:
+            logger.error(f"Failed to parse command string '{formatted_command}' with shlex: {e}. ")
+            return None
+
+        spool_file: Optional[Path] = None
+        if temp_output_file is None:
+            spool_file = (self.tool_output_dir / f"{tool_category}_{re.sub(r'[^a-zA-Z0-9_.-]', '_', tool_key)}_stdout_{uuid.uuid4().hex[:8]}.output").resolve()
+        output_path = temp_output_file or spool_file
+        try:
+            logger.info(f"Executing (streamed output): {' '.join(command_parts)} in CWD: {self.workspace_path}")
+            process_completed = self._run_process(
+                tool_category, tool_key, command_parts, timeout_seconds, target_file_relative_path, target_file_relative_paths,
+                stdout_path=spool_file
+            )
+        except subprocess.TimeoutExpired:
+            self._record_timeout(tool_category, tool_key, timeout_seconds, target_file_relative_path, target_file_relative_paths)
+            StreamedJsonOutput(output_path, [], f"{tool_category}.{tool_key}").close()
+            return None
+        except FileNotFoundError:
+            logger.error(f"Command not found for tool '{tool_category}.{tool_key}'. "
+                         f"Command started with: '{command_parts[0]}'. Ensure it's installed and in PATH.")
+            StreamedJsonOutput(output_path, [], f"{tool_category}.{tool_key}").close()
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error executing tool '{tool_category}.{tool_key}': {e}", exc_info=True)
+            StreamedJsonOutput(output_path, [], f"{tool_category}.{tool_key}").close()
+            return None
+
+        logger.debug(f"Tool '{tool_category}.{tool_key}' finished. Return code: {process_completed.returncode}")
+        if process_completed.stderr:
+            logger.debug(f"Tool '{tool_category}.{tool_key}' Stderr:\n{process_completed.stderr.strip()}")
+
+        streamed_output = StreamedJsonOutput(output_path, parse_item_path(tool_cfg.get("stream_json_path")), f"{tool_category}.{tool_key}")
+        if streamed_output.peek_first_char() in ("{", "["):
+            if process_completed.returncode != 0:
+                logger.warning(f"Tool '{tool_category}.{tool_key}' exited with code {process_completed.returncode}, but attempting to process its output.")
+            return streamed_output
+
+        # Output rỗng hoặc không phải JSON: xử lý như _execute (đọc text, fallback sang stdout)
+        raw_output_text: Optional[str] = None
+        try:
+            if output_path.exists():
+                raw_output_text = output_path.read_text(encoding='utf-8').strip()
+            elif temp_output_file:
+                logger.warning(f"Temporary output file {temp_output_file} was expected but not found after execution.")
+        except OSError as read_e:
+            logger.error(f"Failed to read output file {output_path}: {read_e}")
+        finally:
+            streamed_output.close()
+        if not raw_output_text and temp_output_file and process_completed.stdout:
+            raw_output_text = process_completed.stdout.strip()
+        return self._interpret_output(tool_category, tool_key, process_completed, raw_output_text, True)
+
+    def _execute_in_process(
+        self,
+        tool_category: str,
+        tool_key: str,
+        tool_cfg: Dict[str, Any],
+        target_file_relative_path: Optional[str],
+        target_file_relative_paths: Optional[List[str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Runs a Python-native tool (`in_process: pylint|bandit` in tools.yml) inside this process.
+        Returns the structured findings directly (same items as the tool's JSON output).
+
+        Raises:
+            InProcessToolUnavailable: The tool cannot be imported (caller falls back to `command`).
+            ToolExecutionError: No target files, or the tool failed.
+        """
+        targets = [target_file_relative_path] if target_file_relative_path else list(target_file_relative_paths or [])
+        if not targets:
+            raise ToolExecutionError(f"In-process tool '{tool_category}.{tool_key}' needs target files; project-wide runs are not supported.")
+        file_paths = [(self.workspace_path / p.lstrip('/')).resolve() for p in targets]
+        args = [str(arg).replace("{project_root}", str(self.workspace_path)) for arg in (tool_cfg.get("in_process_args") or [])]
+        start, cpu_start = time.monotonic(), time.thread_time()
+        usage: Optional[ToolResourceUsage] = ToolResourceUsage(
+            tool_id=f"{tool_category}.{tool_key}", target=self._target_description(target_file_relative_path, target_file_relative_paths),
+            wall_seconds=0.0, in_process=True,
+        )
+        try:
+            findings = run_in_process_tool(str(tool_cfg["in_process"]), file_paths, args)
+        except InProcessToolUnavailable:
+            usage = None # Sẽ chạy command; usage được ghi khi chạy tiến trình
+            raise
+        except InProcessToolError as e:
+            usage.return_code = e.return_code
+            raise ToolExecutionError(f"In-process tool '{tool_category}.{tool_key}' failed: {e}", return_code=e.return_code)
+        finally:
+            # Resource limit không áp dụng cho tool in-process; chỉ ghi nhận thời gian và CPU của thread
+            if usage is not None:
+                usage.wall_seconds = round(time.monotonic() - start, 3)
+                usage.user_cpu_seconds = round(time.thread_time() - cpu_start, 3)
+                self._record_usage(usage)
+        logger.info(
+            f"In-process tool '{tool_category}.{tool_key}' analyzed {len(file_paths)} files in {time.monotonic() - start:.2f}s "
+            f"({len(findings)} findings)."
+        )
+        return findings
+
+    def _result_cache_key(
+        self,
+        tool_category: str,
+        tool_key: str,
+        target_file_relative_path: Optional[str],
+        additional_context_vars: Optional[Dict[str, str]],
+        expect_json_output: bool,
+        target_file_relative_paths: Optional[List[str]],
+        batch_split: bool = False
+    ) -> Optional[str]:
+        """
+        Cache key of an invocation, or None when it must not be cached: no cache configured,
+        `cache: false` on the tool, a project-wide scan (no target files), a missing target file,
+        or a tool whose version cannot be determined.
+        """
+        if self.result_cache is None:
+            return None
+        targets = [target_file_relative_path] if target_file_relative_path else list(target_file_relative_paths or [])
+        if not targets:
+            return None # Tool quét toàn project phụ thuộc vào mọi file, không cache được
+        command_template = self.config.get_tool_command_template(tool_category, tool_key)
+        tool_cfg = self.config.get_tool_config(tool_category, tool_key)
+        tool_cfg = tool_cfg if isinstance(tool_cfg, dict) else {}
+        if not command_template or tool_cfg.get("cache") is False:
+            return None
+
+        # Tool in-process: version của package đang được import; nếu không cài thì sẽ chạy command nên probe CLI
+        tool_version = get_in_process_tool_version(str(tool_cfg["in_process"])) if tool_cfg.get("in_process") else None
+        if tool_version is None:
+            version_command = tool_cfg.get("version_command")
+            if not version_command:
+                try: version_command = f"{shlex.split(command_template)[0]} --version"
+                except (ValueError, IndexError): return None
+            tool_version = get_tool_version(version_command, cwd=self.workspace_path)
+        if tool_version is None:
+            return None
+
+        target_hashes: Dict[str, str] = {}
+        for target in targets:
+            relative_path = target.lstrip('/')
+            target_hash = hash_path(self.workspace_path / relative_path)
+            if target_hash == "missing":
+                return None
+            target_hashes[relative_path] = target_hash
+
+        # File config tool đọc: `{project_root}/...` trong command (vd. --rcfile) và `cache_config_files` trong tools.yml
+        config_files = set(re.findall(r"\{project_root\}/([^\s'\"]+)", command_template)) | set(tool_cfg.get("cache_config_files") or [])
+        config_hashes = {name: hash_path(self.workspace_path / name) for name in sorted(config_files)}
+        options: Dict[str, Any] = {
+            "expect_json": bool(expect_json_output), "batch_split": batch_split,
+            "in_process_args": tool_cfg.get("in_process_args") if tool_cfg.get("in_process") else None,
+        }
+        for name, value in sorted((additional_context_vars or {}).items()):
+            if name == "jobs":
+                continue # Số tiến trình không ảnh hưởng kết quả
+            options[name] = str(value)
+            value_path = Path(str(value)) if Path(str(value)).is_absolute() else self.workspace_path / str(value)
+            if value_path.exists(): # Ví dụ rules_path của Semgrep: nội dung ruleset là một phần của key
+                config_hashes[f"{{{name}}}"] = hash_path(value_path)
+        return ToolResultCache.make_key(
+            f"{tool_category}.{tool_key}", command_template, tool_version, target_hashes, config_hashes, options
+        )
+
+    def _run_process(
+        self,
+        tool_category: str,
+        tool_key: str,
+        command_parts: List[str],
+        timeout_seconds: int,
+        target_file_relative_path: Optional[str],
+        target_file_relative_paths: Optional[List[str]],
+        stdout_path: Optional[Path] = None
+    ) -> ToolProcessResult:
+        """
+        Runs the command in its own process group with the tool's `resource_limits` and records
+        its resource usage (also when it times out). Raises like `run_tool_process`.
+        """
+        tool_id = f"{tool_category}.{tool_key}"
+        limits = ToolResourceLimits.from_config(self.config.get_tool_resource_limits(tool_category, tool_key))
+        try:
+            process_completed = run_tool_process(
+                command_parts, cwd=self.workspace_path, timeout_seconds=timeout_seconds, limits=limits,
+                spool_dir=self.tool_output_dir, stdout_path=stdout_path, tool_id=tool_id,
+                target=self._target_description(target_file_relative_path, target_file_relative_paths),
+            )
+        except ToolProcessTimeout as e:
+            self._record_usage(e.usage)
+            raise
+        usage = getattr(process_completed, "usage", None)
+        if not isinstance(usage, ToolResourceUsage):
+            return process_completed
+        self._record_usage(usage)
+        if usage.limit_exceeded:
+            message = f"Tool '{tool_id}' exceeded its {usage.limit_exceeded} limit ({getattr(limits, usage.limit_exceeded)}) for {usage.target} (exit code {usage.return_code})."
+            logger.error(message)
+            with self._timeout_lock:
+                self._timeout_messages.append(message)
+        elif usage.stderr_truncated:
+            logger.debug(f"Stderr of '{tool_id}' truncated to {limits.max_stderr_kb} KB.")
+        return process_completed
+
+    @staticmethod
+    def _target_description(target_file_relative_path: Optional[str], target_file_relative_paths: Optional[List[str]]) -> str:
+        return target_file_relative_path or (f"{len(target_file_relative_paths)} files" if target_file_relative_paths else "project")
+
+    def _record_timeout(
+        self, tool_category: str, tool_key: str, timeout_seconds: int,
+        target_file_relative_path: Optional[str], target_file_relative_paths: Optional[List[str]]
+    ) -> None:
+        logger.error(f"Tool '{tool_category}.{tool_key}' timed out after {timeout_seconds} seconds; its process group was killed.")
+        target_desc = self._target_description(target_file_relative_path, target_file_relative_paths)
+        with self._timeout_lock:
+            self._timeout_messages.append(f"Tool '{tool_category}.{tool_key}' timed out after {timeout_seconds} seconds for {target_desc}.")
+
+    def _record_usage(self, usage: ToolResourceUsage) -> None:
+        with self._timeout_lock:
+            self._resource_usage.append(usage)
+
+    def pop_timeout_messages(self) -> List[str]:
+        """Returns and clears the messages recorded for runs that timed out or hit a resource limit (thread-safe)."""
+        with self._timeout_lock:
+            messages, self._timeout_messages = self._timeout_messages, []
+        return messages
+
+    def pop_resource_usage(self) -> List[ToolResourceUsage]:
+        """Returns and clears the resource usage recorded for every tool run since the last call (thread-safe)."""
+        with self._timeout_lock:
+            usage, self._resource_usage = self._resource_usage, []
+        return usage
+
+    def run_batch(
+        self,
+        tool_category: str,
+        tool_key: str,
+        target_file_relative_paths: List[str],
+        expect_json_output: bool = True,
+        jobs: Optional[int] = None,
+        timeout_seconds: Optional[int] = None
+    ) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """
+        Runs a batch tool (`{file_paths}` in its command) once for all given files and splits
+        its JSON output back into per-file findings.
+
+        Args:
+            target_file_relative_paths: The files to analyze, relative to the workspace.
+            jobs: Value for the `{jobs}` placeholder (e.g. pylint `--jobs`); defaults to 1.
+            timeout_seconds: Defaults to 120 seconds, plus 5 seconds per file beyond the 24th.
+
+        Returns:
+            `{relative_file_path: [finding, ...]}` (every requested file has an entry), or None when the
+            tool produced no output. Findings reported for other files are kept under their own path.
+
+        Raises:
+            ToolExecutionError: As `run()`, or when the output is not JSON and cannot be split per file.
+        """
+        if not target_file_relative_paths:
+            return {}
+        extra_vars = {"jobs": str(jobs)} if jobs is not None else None
+
+        # Cache theo từng file: chỉ chạy tool cho các file có nội dung (hoặc config) thay đổi
+        cached_by_file: Dict[str, List[Dict[str, Any]]] = {}
+        file_cache_keys: Dict[str, str] = {}
+        for path in (target_file_relative_paths if self.result_cache is not None else []):
+            cache_key = self._result_cache_key(tool_category, tool_key, path, None, expect_json_output, None, batch_split=True)
+            if not cache_key:
+                continue
+            file_cache_keys[path] = cache_key
+            cached_findings = self.result_cache.get(cache_key)
+            if cached_findings is not None:
+                cached_by_file[str(Path(path.lstrip('/')))] = cached_findings
+        paths_to_run = [p for p in target_file_relative_paths if str(Path(p.lstrip('/'))) not in cached_by_file]
+        if cached_by_file:
+            logger.info(
+                f"Batch tool '{tool_category}.{tool_key}': {len(cached_by_file)} of {len(target_file_relative_paths)} files "
+                f"served from cache, running on {len(paths_to_run)}."
+            )
+        if not paths_to_run:
+            return cached_by_file
+
+        tool_output = self._execute(
+            tool_category, tool_key, None, extra_vars, expect_json_output,
+            timeout_seconds or max(120, 5 * len(paths_to_run)), paths_to_run,
+        )
+        if tool_output is None or (isinstance(tool_output, str) and not tool_output.strip()):
+            return cached_by_file or None
+        if isinstance(tool_output, str):
+            raise ToolExecutionError(
+                f"Batch tool '{tool_category}.{tool_key}' returned non-JSON output that cannot be split per file: '{tool_output[:100]}'"
+            )
+        try:
+            findings_by_file = self.split_findings_by_file(tool_output, paths_to_run)
+        except JSONStreamError as e:
+            raise ToolExecutionError(f"Batch tool '{tool_category}.{tool_key}' produced invalid streamed JSON: {e}")
+        for path in paths_to_run:
+            if path in file_cache_keys:
+                self.result_cache.put(file_cache_keys[path], f"{tool_category}.{tool_key}", findings_by_file.get(str(Path(path.lstrip('/'))), []))
+        findings_by_file.update(cached_by_file)
+        return findings_by_file
+
+    def split_findings_by_file(
+        self,
+        tool_output: Union[Dict[str, Any], List[Any], StreamedJsonOutput],
+        target_file_relative_paths: List[str]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Groups the items of a linter's JSON output by file, matched on their `file_path`/`path`/
+        `filename`/`filePath` (relative or absolute). ESLint-style items (`filePath` + `messages`)
+        are flattened. Each returned finding carries the workspace-relative `file_path`.
+        A `StreamedJsonOutput` is consumed item by item.
+        """
+        targets = [str(Path(p.lstrip('/'))) for p in target_file_relative_paths]
+        findings_by_file: Dict[str, List[Dict[str, Any]]] = {path: [] for path in targets}
+        if isinstance(tool_output, (list, StreamedJsonOutput)):
+            items = tool_output
+        else:
+            items = tool_output.get("results") if isinstance(tool_output.get("results"), list) else [tool_output]
+        for item in items:
+            if not isinstance(item, dict):
+                logger.warning(f"Ignoring non-object item in batch tool output: {str(item)[:100]}")
+                continue
+            reported_path = next((item[k] for k in ("file_path", "path", "filename", "filePath", "file") if isinstance(item.get(k), str) and item.get(k)), None)
+            relative_path = self._workspace_relative_path(reported_path) if reported_path else None
+            if relative_path is None and len(targets) == 1:
+                relative_path = targets[0]
+            if relative_path is None:
+                logger.warning(f"Cannot attribute batch tool finding to a file, skipping: {str(item)[:100]}")
+                continue
+            nested_messages = item.get("messages") if "filePath" in item and isinstance(item.get("messages"), list) else None
+            for finding in (nested_messages if nested_messages is not None else [item]):
+                if isinstance(finding, dict):
+                    findings_by_file.setdefault(relative_path, []).append({**finding, "file_path": relative_path})
+        return findings_by_file
+
+    def _workspace_relative_path(self, reported_path: str) -> str:
+        """Normalizes a path reported by a tool (absolute or relative to the workspace) to a workspace-relative one."""
+        path = Path(reported_path)
+        abs_path = (path if path.is_absolute() else self.workspace_path / path).resolve()
+        try:
+            return str(abs_path.relative_to(self.workspace_path))
+        except ValueError:
+            return str(path)
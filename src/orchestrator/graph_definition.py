@@ -1,7 +1,8 @@
 # NOVAGUARD-AI/src/orchestrator/graph_definition.py
 
+import os
 import logging
-from typing import Literal
+from typing import Dict, List, Literal
 
 from langgraph.graph import StateGraph, END
 # Assuming state.py and nodes.py are in the same 'orchestrator' directory
@@ -10,6 +11,8 @@ from . import nodes # Import the nodes module
 
 # Import Config for type hinting the parameter, though it's used by nodes via GraphState
 from ..core.config_loader import Config
+from ..agents.combined_review_agent import AGENT_MODE_COMBINED, get_agent_mode
+from .scheduler import MODEL_AFFINITY_SCHEDULER
 
 
 logger = logging.getLogger(__name__)
@@ -51,6 +54,68 @@ def initial_check_for_files(state: GraphState) -> Literal["proceed_to_tier1", "n
         return "no_files_to_review_end" # This will go to a direct SARIF generation
 
 
+def is_parallel_agents_enabled(app_config: Config) -> bool:
+    """
+    Whether the specialist agent nodes should run as parallel branches.
+    Controlled by `orchestration.parallel_agents` in models.yml; the
+    NOVAGUARD_PARALLEL_AGENTS environment variable overrides it when set.
+    """
+    env_value = os.environ.get("NOVAGUARD_PARALLEL_AGENTS")
+    if env_value:
+        return env_value.strip().lower() in ("1", "true", "yes", "on")
+    return app_config.get_orchestration_setting("parallel_agents", False) is True
+
+
+def is_agent_work_queue_enabled(app_config: Config) -> bool:
+    """
+    Whether the specialist agents run through the (file, agent) work queue scheduler
+    (`orchestration.agent_scheduler: work_queue` or `model_affinity` in models.yml)
+    instead of one node per agent.
+    """
+    return app_config.get_orchestration_setting("agent_scheduler", "graph") in ("work_queue", "model_affinity")
+
+
+def get_run_models(app_config: Config) -> Dict[str, List[str]]:
+    """
+    The models the review graph calls for `app_config`, mapped to the agents using them, in call
+    order: the review agents of the active `orchestration.agent_mode`, then MetaReviewer when
+    the graph includes it. Models of other agents and of `tasks` are left out.
+    """
+    agent_names = [agent_name for agent_name, _ in nodes.get_review_agent_classes(app_config)]
+    # Cùng điều kiện với node meta_reviewer; đọc trực tiếp để không log warning khi không cấu hình
+    if (app_config.current_mode_models.get("agents") or {}).get("meta_reviewer"):
+        agent_names.append("MetaReviewer")
+    models: Dict[str, List[str]] = {}
+    for agent_name in agent_names:
+        model_name = (app_config.current_mode_models.get("agents") or {}).get(agent_name)
+        if isinstance(model_name, str) and model_name:
+            models.setdefault(model_name, []).append(agent_name)
+    return models
+
+
+def get_preload_models(app_config: Config, run_models: Dict[str, List[str]]) -> List[str]:
+    """
+    The models to load before the review starts. With `agent_scheduler: model_affinity` the
+    scheduler loads and unloads one model per batch, so only the first batch's model (the model of
+    the first review agent) is preloaded; otherwise every model of `run_models`.
+    """
+    if app_config.get_orchestration_setting("agent_scheduler") == MODEL_AFFINITY_SCHEDULER:
+        return list(run_models)[:1]
+    return list(run_models)
+
+
+def is_async_pipeline_enabled(app_config: Config) -> bool:
+    """
+    Whether the review runs on the async path: agent/meta nodes await `areview()` and the
+    entrypoint drives the graph with `ainvoke`. Controlled by `orchestration.async_pipeline`
+    in models.yml; the NOVAGUARD_ASYNC_PIPELINE environment variable overrides it when set.
+    """
+    env_value = os.environ.get("NOVAGUARD_ASYNC_PIPELINE")
+    if env_value:
+        return env_value.strip().lower() in ("1", "true", "yes", "on")
+    return app_config.get_orchestration_setting("async_pipeline", False) is True
+
+
 def get_compiled_graph(
     # The config_obj is passed to allow graph construction decisions if needed,
     # but nodes will access it primarily via `state["shared_context"].config_obj` at runtime.
@@ -73,15 +138,33 @@ def get_compiled_graph(
     workflow.add_node("run_tier1_tools", nodes.run_tier1_tools_node)
     
     # Agent Nodes
-    workflow.add_node("style_guardian", nodes.activate_style_guardian_node)
-    workflow.add_node("bug_hunter", nodes.activate_bug_hunter_node)
-    workflow.add_node("securi_sense", nodes.activate_securi_sense_node)
-    workflow.add_node("opti_tune", nodes.activate_opti_tune_node)
+    # On the async path the LLM-bound nodes are coroutines; the other nodes stay
+    # synchronous and are run in an executor by LangGraph's `ainvoke`.
+    use_async = is_async_pipeline_enabled(app_config)
+    if use_async:
+        logger.info("Async pipeline enabled: agent nodes will await areview() (graph must be run with ainvoke).")
+    use_work_queue = is_agent_work_queue_enabled(app_config)
+    use_combined_agent = get_agent_mode(app_config) == AGENT_MODE_COMBINED
+    if use_work_queue:
+        workflow.add_node("agent_work_queue", nodes.arun_agent_work_queue_node if use_async else nodes.run_agent_work_queue_node)
+    elif use_combined_agent:
+        logger.info("Combined agent mode: a single CombinedReviewer node reviews each file in one LLM call.")
+        workflow.add_node("combined_reviewer", nodes.aactivate_combined_reviewer_node if use_async else nodes.activate_combined_reviewer_node)
+    elif use_async:
+        workflow.add_node("style_guardian", nodes.aactivate_style_guardian_node)
+        workflow.add_node("bug_hunter", nodes.aactivate_bug_hunter_node)
+        workflow.add_node("securi_sense", nodes.aactivate_securi_sense_node)
+        workflow.add_node("opti_tune", nodes.aactivate_opti_tune_node)
+    else:
+        workflow.add_node("style_guardian", nodes.activate_style_guardian_node)
+        workflow.add_node("bug_hunter", nodes.activate_bug_hunter_node)
+        workflow.add_node("securi_sense", nodes.activate_securi_sense_node)
+        workflow.add_node("opti_tune", nodes.activate_opti_tune_node)
     
     # Optional Meta Reviewer Node
     if app_config.get_model_for_agent("meta_reviewer"): # Conditionally add node based on config
         logger.info("Meta Reviewer is configured. Adding meta_reviewer node.")
-        workflow.add_node("meta_reviewer", nodes.run_meta_review_node)
+        workflow.add_node("meta_reviewer", nodes.arun_meta_review_node if use_async else nodes.run_meta_review_node)
     else:
         logger.info("Meta Reviewer is not configured. Node will not be added.")
 
@@ -104,26 +187,38 @@ def get_compiled_graph(
         }
     )
 
-    workflow.add_edge("run_tier1_tools", "style_guardian")
-    
-    # Sequential agent execution for simplicity.
-    # In a more advanced setup, a router node could decide which agents to run
-    # based on file types, configuration, or previous findings.
-    # Or, if agents are independent, they could potentially be parallelized
-    # (LangGraph has ways to manage parallel execution, though it's more complex).
-    workflow.add_edge("style_guardian", "bug_hunter")
-    workflow.add_edge("bug_hunter", "securi_sense")
-    workflow.add_edge("securi_sense", "opti_tune")
-
-    # Conditional edge for Meta Reviewer
-    if app_config.get_model_for_agent("meta_reviewer"):
-        # If meta_reviewer node was added, route to it
-        workflow.add_edge("opti_tune", "meta_reviewer")
+    agent_node_names = ["combined_reviewer"] if use_combined_agent else ["style_guardian", "bug_hunter", "securi_sense", "opti_tune"]
+    after_agents_node = "meta_reviewer" if app_config.get_model_for_agent("meta_reviewer") else "generate_sarif"
+
+    if use_work_queue:
+        # A single node runs every (file, agent) pair on a bounded worker pool
+        workflow.add_edge("run_tier1_tools", "agent_work_queue")
+        workflow.add_edge("agent_work_queue", after_agents_node)
+        logger.info(f"Agents configured to run through the work queue scheduler, ending at '{after_agents_node}'.")
+    elif is_parallel_agents_enabled(app_config) and len(agent_node_names) > 1:
+        # The specialist agents are independent (they only read files_to_review and
+        # tier1_tool_results), so they fan out from Tier 1 and join before the next step.
+        # agent_findings/error_messages use appending reducers (see state.py), so the
+        # concurrent branches do not overwrite each other's results.
+        for agent_node_name in agent_node_names:
+            workflow.add_edge("run_tier1_tools", agent_node_name)
+        workflow.add_edge(agent_node_names, after_agents_node)
+        logger.info(f"Agent nodes configured to run in parallel, joining at '{after_agents_node}'.")
+    else:
+        # Sequential agent execution (or the single combined reviewer node).
+        # In a more advanced setup, a router node could decide which agents to run
+        # based on file types, configuration, or previous findings.
+        workflow.add_edge("run_tier1_tools", agent_node_names[0])
+        for current_node_name, next_node_name in zip(agent_node_names, agent_node_names[1:]):
+            workflow.add_edge(current_node_name, next_node_name)
+        workflow.add_edge(agent_node_names[-1], after_agents_node)
+        logger.debug(f"Agent nodes configured to run sequentially, ending at '{after_agents_node}'.")
+
+    if after_agents_node == "meta_reviewer":
+        # If meta_reviewer node was added, it runs after the agents and before SARIF generation
         workflow.add_edge("meta_reviewer", "generate_sarif")
         logger.debug("Edges configured to run through Meta Reviewer.")
     else:
-        # If no meta_reviewer, opti_tune goes directly to SARIF generation
-        workflow.add_edge("opti_tune", "generate_sarif")
         logger.debug("Edges configured to skip Meta Reviewer and go directly to SARIF generation.")
 
     # Final step: generate SARIF report and end
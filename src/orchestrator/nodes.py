@@ -1,15 +1,24 @@
 # NOVAGUARD-AI/src/orchestrator/nodes.py
 import logging
-from typing import Dict, List, Any, Optional, Literal, Union
+from typing import Dict, List, Any, Optional, Literal, Union, Tuple
 from pathlib import Path
 import traceback
+import threading
+import functools
 
 # Import các thành phần từ các module khác trong project
-from .state import GraphState
+from .state import GraphState, OverwriteList
+from .scheduler import AgentWorkQueueScheduler, get_async_request_semaphore
+from .tool_executor import Tier1ToolExecutor, ToolJob, get_tier1_max_workers, get_tool_concurrency_class
 from ..core.config_loader import Config
 from ..core.tool_runner import ToolRunner, ToolExecutionError
+from ..core.json_stream import StreamedJsonOutput, JSONStreamError
+from ..core.tool_adapters import ToolOutputAdapter, get_tool_adapter
 from ..core.sarif_generator import SarifGenerator
-from ..core.ollama_client import OllamaClientWrapper
+from ..core.ollama_client import OllamaClientWrapper, get_ollama_backend
+from ..core.llm_cache import get_llm_response_cache
+from ..core.tool_cache import get_tool_result_cache
+from ..core.ollama_balancer import get_ollama_endpoint_balancer
 from ..core.prompt_manager import PromptManager
 from ..core.shared_context import ChangedFile, SharedReviewContext
 
@@ -19,6 +28,7 @@ from ..agents.bug_hunter_agent import BugHunterAgent
 from ..agents.securi_sense_agent import SecuriSenseAgent
 from ..agents.opti_tune_agent import OptiTuneAgent
 from ..agents.meta_reviewer_agent import MetaReviewerAgent
+from ..agents.combined_review_agent import CombinedReviewAgent, AGENT_MODE_COMBINED, get_agent_mode
 
 logger = logging.getLogger(__name__)
 
@@ -43,10 +53,72 @@ def _infer_expect_json(tool_config_data: Optional[Union[str, Dict]], command_tem
             return True
     return False
 
+# --- Helper: Batch tool detection ---
+def _is_batch_tool(tool_config_data: Optional[Union[str, Dict]], command_template: Optional[str]) -> bool:
+    """A batch tool runs once for all matching files: `target_type: batch` or a `{file_paths}` placeholder."""
+    if isinstance(tool_config_data, dict) and tool_config_data.get("target_type") in ("batch", "project"): return tool_config_data["target_type"] == "batch"
+    return bool(command_template) and "{file_paths}" in command_template
+
+# Ruleset Semgrep tối thiểu đi kèm mã nguồn NovaGuard: phương án cuối khi không có registry pack
+BUNDLED_SEMGREP_RULES_PATH = Path(__file__).resolve().parents[2] / "config" / "semgrep_fallback_rules"
+
+def _project_tool_extra_vars(tool_config_data: Dict[str, Any], repo_path: Path) -> Optional[Dict[str, str]]:
+    """
+    `{rules_path}` for a project tool: its `rules_path` (absolute, or relative to the repository), so rule
+    packs can be bundled in the image or pre-cached. If the path is missing (e.g. when running outside the
+    image or after a typo in a project override), `rules_fallback` is used. Semgrep tools (`adapter: semgrep`)
+    default it to "p/default", resolved over the network, and only when it is set to empty fall back to the
+    minimal ruleset bundled with NovaGuard. Other tools keep the missing path unless they set `rules_fallback`.
+    """
+    rules_path = tool_config_data.get("rules_path")
+    if not rules_path: return None
+    resolved_rules_path = Path(rules_path) if Path(rules_path).is_absolute() else (repo_path / rules_path)
+    if resolved_rules_path.exists(): return {"rules_path": str(resolved_rules_path)}
+    is_semgrep_tool = get_tool_adapter(tool_config_data).name == "semgrep"
+    # Không dùng "auto": Semgrep từ chối '--config auto' khi chạy với --metrics=off
+    fallback = tool_config_data.get("rules_fallback", "p/default" if is_semgrep_tool else None)
+    if fallback:
+        logger.warning(f"Ruleset path '{resolved_rules_path}' not found. Falling back to '{fallback}' (may need network access).")
+        return {"rules_path": str(fallback)}
+    if is_semgrep_tool and BUNDLED_SEMGREP_RULES_PATH.exists():
+        logger.warning(f"Ruleset path '{resolved_rules_path}' not found and no rules_fallback is set. Using the minimal bundled Semgrep ruleset '{BUNDLED_SEMGREP_RULES_PATH}' (a few Python and JS/TS rules).")
+        return {"rules_path": str(BUNDLED_SEMGREP_RULES_PATH)}
+    logger.warning(f"Ruleset path '{resolved_rules_path}' not found and no rules_fallback is set. Passing it to the tool unchanged.")
+    return {"rules_path": str(resolved_rules_path)}
+
+def _repo_relative_path(file_path: str, repo_path: Path) -> str:
+    """Normalizes a path reported by a tool (absolute or relative) to the repository-relative form used by ChangedFile.path."""
+    path = Path(file_path)
+    if path.is_absolute():
+        try: return str(path.relative_to(repo_path))
+        except ValueError: return str(path)
+    return str(path)
+
+def _tool_enabled(tool_config_data: Optional[Union[str, Dict]]) -> bool:
+    """Tools stay configured but are skipped with `enabled: false` in tools.yml."""
+    return not (isinstance(tool_config_data, dict) and tool_config_data.get("enabled") is False)
+
+def _tool_applies_to_file(category: str, tool_key: str, lang: str, tool_config_data: Optional[Union[str, Dict]] = None) -> bool:
+    """Whether a per-file or batch tool should analyze a file of language `lang`."""
+    # `languages: [python, ...]` trong tools.yml cho tool có key không phải tên ngôn ngữ (vd. linters.bandit)
+    if isinstance(tool_config_data, dict) and isinstance(tool_config_data.get("languages"), list):
+        return lang in [str(l).lower() for l in tool_config_data["languages"]]
+    if category == "linters" and tool_key == lang: return True
+    # Add other file-specific conditions here
+    return False
+
+def _standardize_file_tool_findings(
+    findings_list: List[Any], category: str, tool_key: str, default_file_path: str, error_messages: List[str],
+    adapter: Optional[ToolOutputAdapter] = None
+) -> List[Dict[str, Any]]:
+    """Normalizes the findings of a per-file (or batch, already split per file) tool with its output adapter."""
+    adapter = adapter or get_tool_adapter(None)
+    return list(adapter.adapt(findings_list, f"{category}.{tool_key}", default_file_path, error_messages))
+
 # --- Node Functions ---
 def prepare_review_files_node(state: GraphState) -> Dict[str, Any]:
     # ... (Logic đã pass test, giữ nguyên) ...
-    logger.info("--- Running: Prepare Review Files Node ---"); files_from_context: List[Any] = state.get("files_to_review", []); error_messages = list(state.get("error_messages", [])); updated_files_to_review: List[ChangedFile] = [];
+    logger.info("--- Running: Prepare Review Files Node ---"); files_from_context: List[Any] = state.get("files_to_review", []); error_messages: List[str] = []; updated_files_to_review: List[ChangedFile] = [];
     if files_from_context:
         logger.debug(f"Processing {len(files_from_context)} items from initial 'files_to_review'.")
         for idx, file_data in enumerate(files_from_context):
@@ -56,27 +128,163 @@ def prepare_review_files_node(state: GraphState) -> Dict[str, Any]:
                 try: file_obj = ChangedFile(**file_data)
                 except Exception as e: logger.warning(f"Item {idx} failed ChangedFile validation: {file_data}. Error: {e}"); error_messages.append(f"Invalid file data format at index {idx}: {str(file_data)[:100]}"); continue
             else: logger.warning(f"Unexpected data type at index {idx}: {type(file_data)}. Skipping."); error_messages.append(f"Unexpected data type at index {idx}: {type(file_data)}"); continue
+            if file_obj.is_pure_rename: logger.info(f"Skipping pure rename '{file_obj.old_path}' -> '{file_obj.path}' (content unchanged)."); continue
             if file_obj.language is None: file_obj.language = guess_language(file_obj.path); log_lang = f"'{file_obj.language}'" if file_obj.language else "unknown"; logger.debug(f"Language for '{file_obj.path}' guessed as: {log_lang}.")
             updated_files_to_review.append(file_obj)
     else: logger.info("Initial 'files_to_review' list was empty. No files to prepare.")
     logger.info(f"Node finished. Prepared {len(updated_files_to_review)} files for review."); return {"files_to_review": updated_files_to_review, "error_messages": error_messages}
 
 
+def _run_batch_tool_job(
+    tool_runner: ToolRunner, category: str, tool_key: str, batch_paths: List[str], jobs: Optional[Any],
+    adapter: ToolOutputAdapter, error_messages: List[str]
+) -> List[Dict[str, Any]]:
+    """Tier 1 job: one invocation of a batch tool for every matching file."""
+    standardized_findings: List[Dict[str, Any]] = []
+    logger.info(f"Running batch tool '{category}.{tool_key}' once for {len(batch_paths)} files (jobs={jobs if jobs is not None else 1})")
+    try:
+        findings_by_file = tool_runner.run_batch(
+            tool_category=category, tool_key=tool_key,
+            target_file_relative_paths=batch_paths, jobs=jobs, # Output JSON được tách lại theo từng file
+        )
+        if not findings_by_file:
+            logger.info(f"Batch tool '{category}.{tool_key}' ran for {len(batch_paths)} files but produced no output."); return standardized_findings
+        for file_path, file_findings in findings_by_file.items():
+            standardized_findings.extend(_standardize_file_tool_findings(file_findings, category, tool_key, file_path, error_messages, adapter))
+        logger.info(f"Batch tool '{category}.{tool_key}' completed, added {sum(len(v) for v in findings_by_file.values())} findings for {len(batch_paths)} files.")
+    except ToolExecutionError as e:
+        msg = f"Batch tool '{category}.{tool_key}' execution failed for {len(batch_paths)} files: {str(e)}"
+        logger.error(f"{msg} (stderr: {e.stderr})")
+        error_messages.append(msg)
+    except Exception as e:
+        msg = f"Unexpected error running batch tool '{category}.{tool_key}': {e}"; logger.error(msg, exc_info=True); error_messages.append(msg)
+    return standardized_findings
+
+
+def _run_file_tool_job(
+    tool_runner: ToolRunner, category: str, tool_key: str, file_path: str, expect_json: bool,
+    adapter: ToolOutputAdapter, error_messages: List[str]
+) -> List[Dict[str, Any]]:
+    """Tier 1 job: one per-file tool on one file."""
+    standardized_findings: List[Dict[str, Any]] = []
+    logger.info(f"Running tool '{category}.{tool_key}' for file {file_path} (expect_json={expect_json})")
+    try:
+        tool_output = tool_runner.run(
+            tool_category=category, tool_key=tool_key,
+            target_file_relative_path=file_path,
+            expect_json_output=expect_json,
+        )
+        if tool_output is not None:
+            findings_output: Any = []
+            if isinstance(tool_output, (list, dict, StreamedJsonOutput)): findings_output = tool_output # Adapter tự lấy các item (vd. `results`, SARIF `runs`)
+            elif isinstance(tool_output, str) and tool_output.strip(): findings_output = [{"message_text": tool_output[:500], "rule_id": f"{category}.{tool_key}.raw", "level": "note", "line_start":1}]
+            
+            standardized_findings = _standardize_file_tool_findings(findings_output, category, tool_key, file_path, error_messages, adapter)
+            logger.info(f"Tool '{category}.{tool_key}' completed for {file_path}, added {len(standardized_findings)} findings.")
+        else: logger.info(f"Tool '{category}.{tool_key}' ran for {file_path} but produced no output.")
+    except ToolExecutionError as e:
+        # <<< SỬA LỖI AttributeError: dùng str(e) >>>
+        msg = f"Tool '{category}.{tool_key}' execution failed for {file_path}: {str(e)}" 
+        logger.error(f"{msg} (stderr: {e.stderr})")
+        error_messages.append(msg)
+    except Exception as e:
+        msg = f"Unexpected error running tool '{category}.{tool_key}' for {file_path}: {e}"; logger.error(msg, exc_info=True); error_messages.append(msg)
+    return standardized_findings
+
+
+def _run_project_tool_job(
+    tool_runner: ToolRunner, category: str, tool_key: str, expect_json: bool, run_kwargs: Dict[str, Any],
+    changed_paths: Optional[List[str]], repo_path: Path, adapter: ToolOutputAdapter, error_messages: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Tier 1 job: one project-level tool. `changed_paths` is set for `changed_files_only` tools;
+    findings outside those files are dropped.
+    """
+    tool_id = f"{category}.{tool_key}"
+    changed_files_only = changed_paths is not None
+    standardized_findings: List[Dict[str, Any]] = []
+    tool_output: Any = None
+    logger.info(f"Running project-level tool: '{tool_id}' (expect_json={expect_json}" + (f", {len(changed_paths)} changed files only)" if changed_files_only else ")"))
+    try:
+        tool_output = tool_runner.run(
+            tool_category=category, tool_key=tool_key,
+            target_file_relative_path=None, expect_json_output=expect_json, **run_kwargs
+        )
+        if tool_output is not None: 
+            findings_output: Any = []
+            # Adapter tự lấy các item (vd. `results`, SARIF `runs`); output stream được đọc từng item một
+            if isinstance(tool_output, (list, dict, StreamedJsonOutput)): findings_output = tool_output
+            elif isinstance(tool_output, str) and tool_output.strip(): findings_output = [{"message_text": tool_output[:500], "rule_id": f"{tool_id}.raw", "level": "note", "tool_name": tool_id, "line_start":1, "file_path": "project-wide"}]
+            
+            # Chuẩn hóa và lọc từng finding ngay khi adapter trả ra, chỉ giữ lại finding thuộc các file thay đổi
+            changed_path_set = {str(Path(p)) for p in changed_paths} if changed_files_only else None
+            dropped_count = 0
+            for adapted in adapter.adapt(findings_output, tool_id, None, error_messages):
+                if not adapted.get("file_path"):
+                    logger.warning(f"Skipping finding from project tool '{tool_id}' due to missing file_path: {str(adapted)[:100]}"); continue
+                adapted["file_path"] = _repo_relative_path(str(adapted["file_path"]), repo_path)
+                if changed_path_set is not None and str(Path(adapted["file_path"])) not in changed_path_set:
+                    dropped_count += 1; continue
+                standardized_findings.append(adapted)
+            if dropped_count:
+                logger.info(f"Project tool '{tool_id}': dropped {dropped_count} findings outside the changed files.")
+            logger.info(f"Project tool '{tool_id}' completed, added {len(standardized_findings)} findings.")
+        else:
+            logger.info(f"Project tool '{tool_id}' ran but produced no output.")
+
+    except ToolExecutionError as e:
+        # <<< SỬA LỖI AttributeError: dùng str(e) >>>
+        msg = f"Project tool '{tool_id}' execution failed: {str(e)}" 
+        logger.error(f"{msg} (stderr: {e.stderr})")
+        error_messages.append(msg)
+    except JSONStreamError as e:
+        # Các finding đã đọc được trước vị trí lỗi vẫn được giữ lại
+        msg = f"Project tool '{tool_id}' produced invalid JSON output ({e}); kept {len(standardized_findings)} findings read before the error."
+        logger.error(msg); error_messages.append(msg)
+    except Exception as e:
+        msg = f"Unexpected error running project tool '{tool_id}': {e}"; logger.error(msg, exc_info=True); error_messages.append(msg)
+    finally:
+        if isinstance(tool_output, StreamedJsonOutput): tool_output.close()
+    return standardized_findings
+
+
 def run_tier1_tools_node(state: GraphState) -> Dict[str, Any]:
     logger.info("--- Running: Tier 1 Tools Node ---")
     shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
     files_to_review: List[ChangedFile] = state.get("files_to_review", [])
-    error_messages = list(state.get("error_messages", []))
+    error_messages: List[str] = [] # Chỉ lỗi của node này (state.error_messages được append)
     tier1_results: Dict[str, Dict[str, List[Dict[str, Any]]]] = {} 
 
     if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
         error_messages.append("Config object missing in run_tier1_tools_node."); logger.error("Config object missing."); return {"tier1_tool_results": tier1_results, "error_messages": error_messages}
 
     config_obj: Config = shared_ctx.config_obj
-    tool_runner = ToolRunner(config_obj, shared_ctx.repo_local_path)
+    tool_runner = ToolRunner(config_obj, shared_ctx.repo_local_path, result_cache=get_tool_result_cache(config_obj))
     configured_tools = config_obj.tools_config
+    # Mỗi lần gọi tool là một ToolJob; thứ tự job (batch -> từng file -> project) quyết định thứ tự gộp kết quả
+    tool_jobs: List[ToolJob] = []
+    job_keys: List[Tuple[str, str]] = []
+
+    def add_job(category: str, tool_key: str, target: str, concurrency: str, run) -> None:
+        # <<< Đảm bảo khởi tạo key trước khi chạy tool >>>
+        tier1_results.setdefault(category, {}).setdefault(tool_key, [])
+        tool_jobs.append(ToolJob(index=len(tool_jobs), tool_id=f"{category}.{tool_key}", target=target, concurrency=concurrency, run=run))
+        job_keys.append((category, tool_key))
+
+    # --- Batch tools (one invocation for all matching files) ---
+    for category, tools_in_category in configured_tools.items():
+        if not isinstance(tools_in_category, dict): continue
+        for tool_key, tool_config_data in tools_in_category.items():
+            command_template = tool_config_data if isinstance(tool_config_data, str) else (tool_config_data.get("command") if isinstance(tool_config_data, dict) else None)
+            if not command_template or not _tool_enabled(tool_config_data) or not _is_batch_tool(tool_config_data, command_template): continue
+            batch_paths = [f.path for f in files_to_review if f.language and _tool_applies_to_file(category, tool_key, f.language.lower(), tool_config_data)]
+            if not batch_paths: continue
 
-    # --- Run tools per file ---
+            jobs = tool_config_data.get("jobs") if isinstance(tool_config_data, dict) else None
+            add_job(category, tool_key, f"{len(batch_paths)} files", get_tool_concurrency_class(tool_config_data, is_project_tool=False),
+                    functools.partial(_run_batch_tool_job, tool_runner, category, tool_key, batch_paths, jobs, get_tool_adapter(tool_config_data)))
+
+    # --- Tools per file ---
     for file_obj in files_to_review:
         if not file_obj.language: continue
         lang = file_obj.language.lower()
@@ -92,57 +300,14 @@ def run_tier1_tools_node(state: GraphState) -> Dict[str, Any]:
                     if tool_config_data.get("target_type") == "project": is_project_tool = True
                     elif command_template and "{project_root}" in command_template and "{file_path}" not in command_template: is_project_tool = True
                 
-                if is_project_tool or not command_template: continue 
-
-                run_this_tool = False
-                if category == "linters" and tool_key == lang: run_this_tool = True
-                # Add other file-specific conditions here
-
-                if run_this_tool:
-                    # <<< Đảm bảo khởi tạo key trước khi gọi run >>>
-                    if category not in tier1_results: tier1_results[category] = {}
-                    if tool_key not in tier1_results[category]: tier1_results[category][tool_key] = []
-                            
-                    expect_json = _infer_expect_json(tool_config_data, command_template) # <<< Đã sửa _infer_expect_json
-                    logger.info(f"Running tool '{category}.{tool_key}' for file {file_obj.path} (expect_json={expect_json})")
-                    try:
-                        tool_output = tool_runner.run(
-                            tool_category=category, tool_key=tool_key,
-                            target_file_relative_path=file_obj.path,
-                            expect_json_output=expect_json,
-                        )
-                        if tool_output is not None:
-                            findings_list = []
-                            if isinstance(tool_output, list): findings_list = tool_output
-                            elif isinstance(tool_output, dict): findings_list = [tool_output] 
-                            elif isinstance(tool_output, str) and tool_output.strip(): findings_list = [{"message_text": tool_output[:500], "rule_id": f"{category}.{tool_key}.raw", "level": "note", "line_start":1}]
-                            
-                            standardized_findings = []
-                            for finding_dict in findings_list:
-                                if isinstance(finding_dict, dict):
-                                    adapted = finding_dict.copy() # Tạo bản sao để không sửa dict gốc
-                                    adapted["file_path"] = adapted.get("file_path", file_obj.path)
-                                    adapted["tool_name"] = f"{category}.{tool_key}"
-                                    adapted["line_start"] = int(adapted.get("line_start", adapted.get("line", 1)))
-                                    adapted["rule_id"] = str(adapted.get("rule_id", adapted.get("symbol", adapted.get("check_id", f"{tool_key}.unknown"))))
-                                    adapted["level"] = str(adapted.get("level", adapted.get("severity", "note"))).lower()
-                                    # <<< Sửa logic lấy message >>>
-                                    adapted["message_text"] = str(adapted.get("message_text") or adapted.get("message") or adapted.get("msg") or "Message missing")
-                                    standardized_findings.append(adapted)
-                                else: error_messages.append(f"Invalid item type in findings list from {category}.{tool_key}: {type(finding_dict)}")
-                            
-                            tier1_results[category][tool_key].extend(standardized_findings)
-                            logger.info(f"Tool '{category}.{tool_key}' completed for {file_obj.path}, added {len(standardized_findings)} findings.")
-                        else: logger.info(f"Tool '{category}.{tool_key}' ran for {file_obj.path} but produced no output.")
-                    except ToolExecutionError as e:
-                        # <<< SỬA LỖI AttributeError: dùng str(e) >>>
-                        msg = f"Tool '{category}.{tool_key}' execution failed for {file_obj.path}: {str(e)}" 
-                        logger.error(f"{msg} (stderr: {e.stderr})")
-                        error_messages.append(msg)
-                    except Exception as e:
-                        msg = f"Unexpected error running tool '{category}.{tool_key}' for {file_obj.path}: {e}"; logger.error(msg, exc_info=True); error_messages.append(msg)
-
-    # --- Run project-wide tools ---
+                if is_project_tool or not command_template or not _tool_enabled(tool_config_data) or _is_batch_tool(tool_config_data, command_template): continue 
+                if not _tool_applies_to_file(category, tool_key, lang, tool_config_data): continue
+
+                expect_json = _infer_expect_json(tool_config_data, command_template) # <<< Đã sửa _infer_expect_json
+                add_job(category, tool_key, file_obj.path, get_tool_concurrency_class(tool_config_data, is_project_tool=False),
+                        functools.partial(_run_file_tool_job, tool_runner, category, tool_key, file_obj.path, expect_json, get_tool_adapter(tool_config_data)))
+
+    # --- Project-wide tools ---
     project_tool_keys_run = set()
     for category, tools_in_category in configured_tools.items():
         if not isinstance(tools_in_category, dict): continue
@@ -154,65 +319,139 @@ def run_tier1_tools_node(state: GraphState) -> Dict[str, Any]:
                 command_template = tool_config_data.get("command")
                 if tool_config_data.get("target_type") == "project": is_project_tool = True
                 elif command_template and "{project_root}" in command_template and "{file_path}" not in command_template: is_project_tool = True
+            if _is_batch_tool(tool_config_data, command_template): is_project_tool = False
 
-            if is_project_tool and command_template:
-                # <<< Đảm bảo khởi tạo key trước khi gọi run >>>
-                if category not in tier1_results: tier1_results[category] = {}
-                if tool_key not in tier1_results[category]: tier1_results[category][tool_key] = []
-                            
+            if is_project_tool and command_template and _tool_enabled(tool_config_data):
                 expect_json = _infer_expect_json(tool_config_data, command_template) # <<< Đã sửa _infer_expect_json
-                logger.info(f"Running project-level tool: '{tool_id}' (expect_json={expect_json})")
                 project_tool_keys_run.add(tool_id)
-                try:
-                    tool_output = tool_runner.run(
-                        tool_category=category, tool_key=tool_key,
-                        target_file_relative_path=None, expect_json_output=expect_json,
-                    )
-                    if tool_output is not None: 
-                        findings_list = []
-                        if isinstance(tool_output, list): findings_list = tool_output
-                        elif isinstance(tool_output, dict):
-                            if "results" in tool_output and isinstance(tool_output["results"], list): findings_list = tool_output["results"]
-                            else: logger.warning(f"Dict output from '{tool_id}' lacks 'results' list."); findings_list = [tool_output]
-                        elif isinstance(tool_output, str) and tool_output.strip(): findings_list = [{"message_text": tool_output[:500], "rule_id": f"{tool_id}.raw", "level": "note", "tool_name": tool_id, "line_start":1, "file_path": "project-wide"}]
-                        
-                        standardized_findings = []
-                        for finding_dict in findings_list:
-                            if isinstance(finding_dict, dict):
-                                # <<< SỬA LỖI: Chuẩn hóa finding Semgrep >>>
-                                adapted = finding_dict.copy()
-                                adapted["tool_name"] = tool_id
-                                adapted["line_start"] = int(adapted.get("line_start", adapted.get("start", {}).get("line", 1)))
-                                adapted["rule_id"] = str(adapted.get("rule_id", adapted.get("check_id", f"{tool_key}.unknown")))
-                                adapted["level"] = str(adapted.get("level", adapted.get("extra", {}).get("severity", "note"))).lower()
-                                adapted["message_text"] = str(adapted.get("message_text") or adapted.get("message") or adapted.get("msg") or adapted.get("extra", {}).get("message") or "Message missing")
-                                adapted["file_path"] = adapted.get("file_path") or adapted.get("path") # <<< Lấy từ 'path' nếu 'file_path' không có
-                                adapted["line_end"] = adapted.get("line_end") or adapted.get("end", {}).get("line")
-                                adapted["col_start"] = adapted.get("col_start") or adapted.get("start", {}).get("col")
-                                adapted["col_end"] = adapted.get("col_end") or adapted.get("end", {}).get("col")
-                                adapted["code_snippet"] = adapted.get("code_snippet") or adapted.get("extra", {}).get("lines")
-
-                                if adapted.get("file_path"):
-                                    standardized_findings.append(adapted)
-                                else: logger.warning(f"Skipping finding from project tool '{tool_id}' due to missing file_path: {str(adapted)[:100]}")
-                            else: error_messages.append(f"Invalid item type in findings list from project tool {tool_id}: {type(finding_dict)}")
-
-                        tier1_results[category][tool_key].extend(standardized_findings)
-                        logger.info(f"Project tool '{tool_id}' completed, added {len(standardized_findings)} findings.")
-                    else:
-                        logger.info(f"Project tool '{tool_id}' ran but produced no output.")
-
-                except ToolExecutionError as e:
-                    # <<< SỬA LỖI AttributeError: dùng str(e) >>>
-                    msg = f"Project tool '{tool_id}' execution failed: {str(e)}" 
-                    logger.error(f"{msg} (stderr: {e.stderr})")
-                    error_messages.append(msg)
-                except Exception as e:
-                    msg = f"Unexpected error running project tool '{tool_id}': {e}"; logger.error(msg, exc_info=True); error_messages.append(msg)
+                # changed_files_only: quét (qua {file_paths}/{relative_file_paths}) và giữ kết quả chỉ cho các file thay đổi
+                changed_files_only = isinstance(tool_config_data, dict) and tool_config_data.get("changed_files_only") is True
+                changed_paths = [f.path for f in files_to_review]
+                run_kwargs: Dict[str, Any] = {}
+                if isinstance(tool_config_data, dict):
+                    extra_vars = _project_tool_extra_vars(tool_config_data, shared_ctx.repo_local_path)
+                    if extra_vars: run_kwargs["additional_context_vars"] = extra_vars
+                if changed_files_only:
+                    if not changed_paths:
+                        tier1_results.setdefault(category, {}).setdefault(tool_key, [])
+                        logger.info(f"Skipping project-level tool '{tool_id}': no changed files to scan."); continue
+                    run_kwargs["target_file_relative_paths"] = changed_paths
+                add_job(category, tool_key, "project", get_tool_concurrency_class(tool_config_data, is_project_tool=True),
+                        functools.partial(_run_project_tool_job, tool_runner, category, tool_key, expect_json, run_kwargs,
+                                          changed_paths if changed_files_only else None, shared_ctx.repo_local_path,
+                                          get_tool_adapter(tool_config_data)))
+
+    # --- Chạy các job theo concurrency class và gộp kết quả theo thứ tự job ---
+    executor = Tier1ToolExecutor(max_workers=get_tier1_max_workers(config_obj))
+    for job_result in executor.run(tool_jobs):
+        category, tool_key = job_keys[job_result.index]
+        tier1_results[category][tool_key].extend(job_result.findings)
+        error_messages.extend(job_result.error_messages)
+    error_messages.extend(tool_runner.pop_timeout_messages())
+    tool_diagnostics = [usage.model_dump() for usage in tool_runner.pop_resource_usage()]
+    _log_tool_resource_usage(tool_diagnostics)
 
     logger.info(f"Tier 1 tools phase completed. Results keys: {list(tier1_results.keys())}")
-    return {"tier1_tool_results": tier1_results, "error_messages": error_messages}
+    return {"tier1_tool_results": tier1_results, "tier1_tool_diagnostics": tool_diagnostics, "error_messages": error_messages}
+
+
+def _log_tool_resource_usage(tool_diagnostics: List[Dict[str, Any]]) -> None:
+    """Logs one line per Tier 1 tool run, most CPU-hungry first."""
+    if not tool_diagnostics:
+        return
+    cpu_seconds = lambda usage: (usage.get("user_cpu_seconds") or 0) + (usage.get("system_cpu_seconds") or 0)
+    logger.info(f"Tier 1 tool resource usage ({len(tool_diagnostics)} runs):")
+    for usage in sorted(tool_diagnostics, key=cpu_seconds, reverse=True):
+        status = "timed out" if usage.get("timed_out") else (f"{usage['limit_exceeded']} limit exceeded" if usage.get("limit_exceeded") else f"exit {usage.get('return_code')}")
+        logger.info(
+            f"  {usage['tool_id']} [{usage['target']}]: wall {usage['wall_seconds']:.2f}s, cpu {cpu_seconds(usage):.2f}s, "
+            f"max RSS {usage.get('max_rss_mb') if usage.get('max_rss_mb') is not None else '-'} MB, {status}"
+            + (" (in-process)" if usage.get("in_process") else "")
+        )
+
+
+# OllamaClientWrapper dùng chung giữa các node/agent trong process.
+# Key gồm cả class để việc thay thế OllamaClientWrapper (vd. patch trong test) không dùng lại client cũ.
+_shared_ollama_clients: Dict[Tuple[Any, str, str, int, int], OllamaClientWrapper] = {}
+_shared_ollama_clients_lock = threading.Lock()
+
+def _create_ollama_client(config_obj: Config) -> OllamaClientWrapper:
+    """
+    Returns the Ollama client shared by all nodes for this base URL, backend, LLM response
+    cache and endpoint balancer (the native backend also shares one connection pool per base URL).
+    """
+    response_cache = get_llm_response_cache(config_obj)
+    backend = get_ollama_backend(config_obj)
+    balancer = get_ollama_endpoint_balancer(config_obj)
+    client_key = (OllamaClientWrapper, config_obj.ollama_base_url, backend, id(response_cache), id(balancer))
+    with _shared_ollama_clients_lock:
+        client = _shared_ollama_clients.get(client_key)
+        if client is None:
+            client = OllamaClientWrapper(
+                base_url=config_obj.ollama_base_url, response_cache=response_cache, backend=backend, balancer=balancer
+            )
+            _shared_ollama_clients[client_key] = client
+    return client
+
+def _build_agent_review_call(
+    agent_class: type,
+    agent_name_log: str,
+    state: GraphState,
+    config_obj: Config,
+    extra_agent_input: Optional[Dict[str, Any]] = None
+) -> Tuple[Any, Dict[str, Any]]:
+    """Creates the agent and the keyword arguments for its `review()`/`areview()` call."""
+    shared_ctx: SharedReviewContext = state["shared_context"]
+    files_to_review: List[ChangedFile] = state.get("files_to_review", [])
+    ollama_client = _create_ollama_client(config_obj)
+    prompt_manager = PromptManager(config=config_obj)
+    agent_instance = agent_class(config=config_obj, ollama_client=ollama_client, prompt_manager=prompt_manager)
+
+    # Chuẩn bị input cho agent.review()
+    agent_review_kwargs: Dict[str, Any] = {
+        "files_data": files_to_review,
+        "pr_context": shared_ctx # <<< THÊM NGỮ CẢNH PR VÀO ĐÂY
+    }
+
+    # Thêm tier1_tool_results nếu agent cần
+    if agent_name_log in ["StyleGuardian", "SecuriSense", "CombinedReviewer"]: # Tên agent được truyền bởi các activate_*_node
+        agent_review_kwargs["tier1_tool_results"] = state.get("tier1_tool_results")
 
+    # Thêm các input phụ trợ khác nếu có
+    if extra_agent_input:
+        agent_review_kwargs.update(extra_agent_input)
+
+    # Đặc biệt cho MetaReviewer, input có thể khác
+    if agent_name_log == "MetaReviewerAgent": # Sử dụng tên class
+        agent_review_kwargs = { # Ghi đè kwargs cho MetaReviewer
+            "all_agent_findings": list(state.get("agent_findings", [])), # MetaReviewer nhận list finding hiện tại
+            "files_data": files_to_review, # Vẫn cần files_data cho context
+            "pr_context": shared_ctx
+        }
+        # Với MetaReviewer, chúng ta muốn thay thế agent_findings, không phải append
+        # Nên kết quả được trả về dạng OverwriteList, không được append
+    return agent_instance, agent_review_kwargs
+
+def _agent_review_update(
+    agent_name_log: str,
+    new_findings: Any,
+    previous_findings_count: int,
+    error_messages: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    The `agent_findings` update for an agent's result: its findings (appended by the state reducer)
+    or, for MetaReviewer, an `OverwriteList` replacing them. Records an error if the agent did not return a list.
+    """
+    if not isinstance(new_findings, list):
+        msg = f"{agent_name_log} review method did not return a list. Got: {type(new_findings)}"
+        logger.error(msg)
+        error_messages.append(msg)
+        return []
+    if agent_name_log == "MetaReviewerAgent":
+        logger.info(f"{agent_name_log} processed {previous_findings_count} findings, resulted in {len(new_findings)} refined findings.")
+        return OverwriteList(new_findings) # Gán lại, không append
+    logger.info(f"{agent_name_log} contributed {len(new_findings)} findings. Total now: {previous_findings_count + len(new_findings)}")
+    return new_findings
 
 def _activate_agent_node(
     agent_class: type, 
@@ -222,61 +461,20 @@ def _activate_agent_node(
 ) -> Dict[str, Any]:
     logger.info(f"--- Running: Activate {agent_name_log} Node ---")
     shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
-    files_to_review: List[ChangedFile] = state.get("files_to_review", [])
-    current_agent_findings = list(state.get("agent_findings", [])) # Đảm bảo lấy bản copy để append
-    error_messages = list(state.get("error_messages", [])) # Đảm bảo lấy bản copy
+    # Node chỉ trả về finding/lỗi mới; reducer của GraphState append chúng vào state
+    new_agent_findings: List[Dict[str, Any]] = []
+    error_messages: List[str] = []
 
     if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
         msg = f"Config object not found for {agent_name_log}."
         logger.error(msg)
         error_messages.append(msg)
-        return {"agent_findings": current_agent_findings, "error_messages": error_messages}
-
-    config_obj: Config = shared_ctx.config_obj
-    ollama_client = OllamaClientWrapper(base_url=config_obj.ollama_base_url)
-    prompt_manager = PromptManager(config=config_obj)
+        return {"agent_findings": new_agent_findings, "error_messages": error_messages}
 
     try:
-        agent_instance = agent_class(config=config_obj, ollama_client=ollama_client, prompt_manager=prompt_manager)
-        
-        # Chuẩn bị input cho agent.review()
-        agent_review_kwargs: Dict[str, Any] = {
-            "files_data": files_to_review,
-            "pr_context": shared_ctx # <<< THÊM NGỮ CẢNH PR VÀO ĐÂY
-        }
-
-        # Thêm tier1_tool_results nếu agent cần
-        if agent_name_log in ["StyleGuardianAgent", "SecuriSenseAgent"]: # Sử dụng tên class hoặc một định danh khác
-            agent_review_kwargs["tier1_tool_results"] = state.get("tier1_tool_results")
-        
-        # Thêm các input phụ trợ khác nếu có
-        if extra_agent_input:
-            agent_review_kwargs.update(extra_agent_input)
-            
-        # Đặc biệt cho MetaReviewer, input có thể khác
-        if agent_name_log == "MetaReviewerAgent": # Sử dụng tên class
-            agent_review_kwargs = { # Ghi đè kwargs cho MetaReviewer
-                "all_agent_findings": current_agent_findings, # MetaReviewer nhận list finding hiện tại
-                "files_data": files_to_review, # Vẫn cần files_data cho context
-                "pr_context": shared_ctx
-            }
-            # Với MetaReviewer, chúng ta muốn thay thế agent_findings, không phải append
-            # Nên kết quả sẽ được gán trực tiếp, không phải current_agent_findings.extend()
-
+        agent_instance, agent_review_kwargs = _build_agent_review_call(agent_class, agent_name_log, state, shared_ctx.config_obj, extra_agent_input)
         new_findings = agent_instance.review(**agent_review_kwargs)
-
-        if isinstance(new_findings, list):
-            if agent_name_log == "MetaReviewerAgent":
-                logger.info(f"{agent_name_log} processed {len(current_agent_findings)} findings, resulted in {len(new_findings)} refined findings.")
-                current_agent_findings = new_findings # Gán lại, không extend
-            else:
-                current_agent_findings.extend(new_findings)
-                logger.info(f"{agent_name_log} contributed {len(new_findings)} findings. Total now: {len(current_agent_findings)}")
-        else:
-            msg = f"{agent_name_log} review method did not return a list. Got: {type(new_findings)}"
-            logger.error(msg)
-            error_messages.append(msg)
-            
+        new_agent_findings = _agent_review_update(agent_name_log, new_findings, len(state.get("agent_findings", [])), error_messages)
     except NotImplementedError:
         msg = f"{agent_name_log} 'review' method is not implemented."
         logger.warning(msg) # Không thêm vào error_messages vì đây là lỗi cấu trúc code
@@ -284,28 +482,194 @@ def _activate_agent_node(
         msg = f"Error during {agent_name_log} execution: {e}"
         logger.error(msg, exc_info=True)
         error_messages.append(msg)
-        # Nếu agent lỗi, giữ nguyên current_agent_findings
+        # Nếu agent lỗi, không thêm finding nào
         
-    return {"agent_findings": current_agent_findings, "error_messages": error_messages}
+    return {"agent_findings": new_agent_findings, "error_messages": error_messages}
+
+async def _aactivate_agent_node(
+    agent_class: type,
+    agent_name_log: str,
+    state: GraphState,
+    extra_agent_input: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Async variant of `_activate_agent_node` used by the async pipeline: awaits the
+    agent's `areview()` so the per-file LLM calls of all agents overlap on one event loop.
+    """
+    logger.info(f"--- Running: Activate {agent_name_log} Node (async) ---")
+    shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
+    new_agent_findings: List[Dict[str, Any]] = []
+    error_messages: List[str] = []
+
+    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
+        msg = f"Config object not found for {agent_name_log}."
+        logger.error(msg)
+        error_messages.append(msg)
+        return {"agent_findings": new_agent_findings, "error_messages": error_messages}
+
+    try:
+        config_obj: Config = shared_ctx.config_obj
+        agent_instance, agent_review_kwargs = _build_agent_review_call(agent_class, agent_name_log, state, config_obj, extra_agent_input)
+        if agent_name_log != "MetaReviewerAgent":
+            # Giới hạn số request đồng thời tới endpoint Ollama, dùng chung cho mọi agent node trong event loop
+            # (nhiều endpoint: balancer của client giới hạn từng endpoint, không cần semaphore)
+            agent_review_kwargs["request_semaphore"] = get_async_request_semaphore(config_obj)
+        new_findings = await agent_instance.areview(**agent_review_kwargs)
+        new_agent_findings = _agent_review_update(agent_name_log, new_findings, len(state.get("agent_findings", [])), error_messages)
+    except NotImplementedError:
+        logger.warning(f"{agent_name_log} 'review' method is not implemented.")
+    except Exception as e:
+        msg = f"Error during {agent_name_log} execution: {e}"
+        logger.error(msg, exc_info=True)
+        error_messages.append(msg)
+
+    return {"agent_findings": new_agent_findings, "error_messages": error_messages}
 
 def activate_style_guardian_node(state: GraphState) -> Dict[str, Any]: return _activate_agent_node(StyleGuardianAgent, "StyleGuardian", state)
 def activate_bug_hunter_node(state: GraphState) -> Dict[str, Any]: return _activate_agent_node(BugHunterAgent, "BugHunter", state)
 def activate_securi_sense_node(state: GraphState) -> Dict[str, Any]: return _activate_agent_node(SecuriSenseAgent, "SecuriSense", state)
 def activate_opti_tune_node(state: GraphState) -> Dict[str, Any]: return _activate_agent_node(OptiTuneAgent, "OptiTune", state)
+
+async def aactivate_style_guardian_node(state: GraphState) -> Dict[str, Any]: return await _aactivate_agent_node(StyleGuardianAgent, "StyleGuardian", state)
+async def aactivate_bug_hunter_node(state: GraphState) -> Dict[str, Any]: return await _aactivate_agent_node(BugHunterAgent, "BugHunter", state)
+async def aactivate_securi_sense_node(state: GraphState) -> Dict[str, Any]: return await _aactivate_agent_node(SecuriSenseAgent, "SecuriSense", state)
+async def aactivate_opti_tune_node(state: GraphState) -> Dict[str, Any]: return await _aactivate_agent_node(OptiTuneAgent, "OptiTune", state)
+
+# agent_mode combined: một LLM call cho mỗi file thay cho 4 agent chuyên biệt
+def activate_combined_reviewer_node(state: GraphState) -> Dict[str, Any]: return _activate_agent_node(CombinedReviewAgent, "CombinedReviewer", state)
+async def aactivate_combined_reviewer_node(state: GraphState) -> Dict[str, Any]: return await _aactivate_agent_node(CombinedReviewAgent, "CombinedReviewer", state)
+
+def get_review_agent_classes(config_obj: Config) -> List[Tuple[str, type]]:
+    """The (agent_name, agent_class) pairs reviewing every file, for the active `orchestration.agent_mode`."""
+    if get_agent_mode(config_obj) == AGENT_MODE_COMBINED:
+        return [("CombinedReviewer", CombinedReviewAgent)]
+    # Cùng thứ tự với các agent node khi chạy tuần tự
+    return [
+        ("StyleGuardian", StyleGuardianAgent),
+        ("BugHunter", BugHunterAgent),
+        ("SecuriSense", SecuriSenseAgent),
+        ("OptiTune", OptiTuneAgent),
+    ]
+
+def _build_agent_work_queue_scheduler(config_obj: Config) -> AgentWorkQueueScheduler:
+    return AgentWorkQueueScheduler(
+        config=config_obj,
+        agent_classes=get_review_agent_classes(config_obj),
+        ollama_client=_create_ollama_client(config_obj),
+        prompt_manager=PromptManager(config=config_obj),
+    )
+
+def run_agent_work_queue_node(state: GraphState) -> Dict[str, Any]:
+    """
+    Runs all specialist agents as (file, agent) work items on a bounded worker pool
+    (see AgentWorkQueueScheduler) instead of one node per agent.
+    """
+    logger.info("--- Running: Agent Work Queue Node ---")
+    shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
+    files_to_review: List[ChangedFile] = state.get("files_to_review", [])
+    new_findings: List[Dict[str, Any]] = []
+    error_messages: List[str] = []
+
+    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
+        msg = "Config object not found for agent work queue."
+        logger.error(msg)
+        error_messages.append(msg)
+        return {"agent_findings": new_findings, "error_messages": error_messages}
+
+    try:
+        scheduler = _build_agent_work_queue_scheduler(shared_ctx.config_obj)
+        new_findings, work_errors = scheduler.run(
+            files_data=files_to_review,
+            tier1_tool_results=state.get("tier1_tool_results"),
+            pr_context=shared_ctx
+        )
+        error_messages.extend(work_errors)
+        logger.info(f"Agent work queue contributed {len(new_findings)} findings. Total now: {len(state.get('agent_findings', [])) + len(new_findings)}")
+    except Exception as e:
+        msg = f"Error during agent work queue execution: {e}"
+        logger.error(msg, exc_info=True)
+        error_messages.append(msg)
+
+    return {"agent_findings": new_findings, "error_messages": error_messages}
+
+async def arun_agent_work_queue_node(state: GraphState) -> Dict[str, Any]:
+    """Async variant of `run_agent_work_queue_node` (work items are coroutines, see `AgentWorkQueueScheduler.arun`)."""
+    logger.info("--- Running: Agent Work Queue Node (async) ---")
+    shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
+    files_to_review: List[ChangedFile] = state.get("files_to_review", [])
+    new_findings: List[Dict[str, Any]] = []
+    error_messages: List[str] = []
+
+    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
+        msg = "Config object not found for agent work queue."
+        logger.error(msg)
+        error_messages.append(msg)
+        return {"agent_findings": new_findings, "error_messages": error_messages}
+
+    try:
+        scheduler = _build_agent_work_queue_scheduler(shared_ctx.config_obj)
+        new_findings, work_errors = await scheduler.arun(
+            files_data=files_to_review,
+            tier1_tool_results=state.get("tier1_tool_results"),
+            pr_context=shared_ctx
+        )
+        error_messages.extend(work_errors)
+        logger.info(f"Async agent work queue contributed {len(new_findings)} findings. Total now: {len(state.get('agent_findings', [])) + len(new_findings)}")
+    except Exception as e:
+        msg = f"Error during agent work queue execution: {e}"
+        logger.error(msg, exc_info=True)
+        error_messages.append(msg)
+
+    return {"agent_findings": new_findings, "error_messages": error_messages}
+
 def run_meta_review_node(state: GraphState) -> Dict[str, Any]:
-    logger.info(f"--- Running: Meta Reviewer Node ---"); shared_ctx: Optional[SharedReviewContext] = state.get("shared_context"); all_previous_findings = list(state.get("agent_findings", [])); files_to_review = state.get("files_to_review", []); error_messages = list(state.get("error_messages", []));
-    if not all_previous_findings: logger.info("No previous agent findings to meta-review. Skipping."); return {"agent_findings": all_previous_findings, "error_messages": error_messages}
-    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'): msg = f"Config object not found for MetaReviewer."; logger.error(msg); error_messages.append(msg); return {"agent_findings": all_previous_findings, "error_messages": error_messages}
-    config_obj: Config = shared_ctx.config_obj; ollama_client = OllamaClientWrapper(base_url=config_obj.ollama_base_url); prompt_manager = PromptManager(config=config_obj)
+    # Khi bỏ qua hoặc lỗi: agent_findings rỗng (không append gì), giữ nguyên các finding hiện có
+    logger.info(f"--- Running: Meta Reviewer Node ---"); shared_ctx: Optional[SharedReviewContext] = state.get("shared_context"); all_previous_findings = list(state.get("agent_findings", [])); files_to_review = state.get("files_to_review", []); error_messages: List[str] = [];
+    if not all_previous_findings: logger.info("No previous agent findings to meta-review. Skipping."); return {"agent_findings": [], "error_messages": error_messages}
+    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'): msg = f"Config object not found for MetaReviewer."; logger.error(msg); error_messages.append(msg); return {"agent_findings": [], "error_messages": error_messages}
+    config_obj: Config = shared_ctx.config_obj; ollama_client = _create_ollama_client(config_obj); prompt_manager = PromptManager(config=config_obj)
     try:
         meta_reviewer = MetaReviewerAgent(config=config_obj, ollama_client=ollama_client, prompt_manager=prompt_manager); refined_findings = meta_reviewer.review(all_agent_findings=all_previous_findings, files_data=files_to_review);
-        if isinstance(refined_findings, list): logger.info(f"MetaReviewer processed {len(all_previous_findings)}, resulted in {len(refined_findings)}."); return {"agent_findings": refined_findings, "error_messages": error_messages}
-        else: msg = "MetaReviewer review did not return a list."; logger.error(msg); error_messages.append(msg); return {"agent_findings": all_previous_findings, "error_messages": error_messages}
-    except NotImplementedError: logger.warning("MetaReviewerAgent 'review' method is not implemented."); return {"agent_findings": all_previous_findings, "error_messages": error_messages}
-    except Exception as e: msg = f"Error during MetaReviewer execution: {e}"; logger.error(msg, exc_info=True); error_messages.append(msg); return {"agent_findings": all_previous_findings, "error_messages": error_messages}
+        if isinstance(refined_findings, list): logger.info(f"MetaReviewer processed {len(all_previous_findings)}, resulted in {len(refined_findings)}."); return {"agent_findings": OverwriteList(refined_findings), "error_messages": error_messages}
+        else: msg = "MetaReviewer review did not return a list."; logger.error(msg); error_messages.append(msg); return {"agent_findings": [], "error_messages": error_messages}
+    except NotImplementedError: logger.warning("MetaReviewerAgent 'review' method is not implemented."); return {"agent_findings": [], "error_messages": error_messages}
+    except Exception as e: msg = f"Error during MetaReviewer execution: {e}"; logger.error(msg, exc_info=True); error_messages.append(msg); return {"agent_findings": [], "error_messages": error_messages}
+
+async def arun_meta_review_node(state: GraphState) -> Dict[str, Any]:
+    """Async variant of `run_meta_review_node`."""
+    logger.info("--- Running: Meta Reviewer Node (async) ---")
+    shared_ctx: Optional[SharedReviewContext] = state.get("shared_context")
+    all_previous_findings = list(state.get("agent_findings", []))
+    files_to_review = state.get("files_to_review", [])
+    error_messages: List[str] = []
+    if not all_previous_findings:
+        logger.info("No previous agent findings to meta-review. Skipping.")
+        return {"agent_findings": [], "error_messages": error_messages}
+    if not shared_ctx or not hasattr(shared_ctx, 'config_obj'):
+        msg = "Config object not found for MetaReviewer."
+        logger.error(msg)
+        error_messages.append(msg)
+        return {"agent_findings": [], "error_messages": error_messages}
+    config_obj: Config = shared_ctx.config_obj
+    try:
+        meta_reviewer = MetaReviewerAgent(config=config_obj, ollama_client=_create_ollama_client(config_obj), prompt_manager=PromptManager(config=config_obj))
+        refined_findings = await meta_reviewer.areview(all_agent_findings=all_previous_findings, files_data=files_to_review)
+        if isinstance(refined_findings, list):
+            logger.info(f"MetaReviewer processed {len(all_previous_findings)}, resulted in {len(refined_findings)}.")
+            return {"agent_findings": OverwriteList(refined_findings), "error_messages": error_messages}
+        msg = "MetaReviewer review did not return a list."
+        logger.error(msg)
+        error_messages.append(msg)
+    except NotImplementedError:
+        logger.warning("MetaReviewerAgent 'review' method is not implemented.")
+    except Exception as e:
+        msg = f"Error during MetaReviewer execution: {e}"
+        logger.error(msg, exc_info=True)
+        error_messages.append(msg)
+    return {"agent_findings": [], "error_messages": error_messages}
 
 def generate_sarif_report_node(state: GraphState) -> Dict[str, Any]:
-    logger.info("--- Running: Generate SARIF Report Node ---"); shared_ctx: Optional[SharedReviewContext] = state.get("shared_context"); tier1_results = state.get("tier1_tool_results", {}); agent_findings = state.get("agent_findings", []); error_messages = list(state.get("error_messages", []));
+    logger.info("--- Running: Generate SARIF Report Node ---"); shared_ctx: Optional[SharedReviewContext] = state.get("shared_context"); tier1_results = state.get("tier1_tool_results", {}); agent_findings = state.get("agent_findings", []); error_messages: List[str] = [];
     if not shared_ctx or not hasattr(shared_ctx, 'config_obj'): error_messages.append("Config unavailable for SARIF generation."); logger.error("Config unavailable for SARIF."); sarif_generator = SarifGenerator(tool_name="NovaGuardAI", tool_version="unknown"); sarif_generator.set_invocation_status(successful=False, error_message="Configuration unavailable."); return {"final_sarif_report": sarif_generator.get_sarif_report(), "error_messages": error_messages}
     config_obj: Config = shared_ctx.config_obj; TOOL_NAME = getattr(config_obj, 'tool_name', "NovaGuardAI"); TOOL_VERSION = getattr(config_obj, 'tool_version', "0.1.0"); TOOL_INFO_URI = getattr(config_obj, 'tool_info_uri', None);
     sarif_generator = SarifGenerator(tool_name=TOOL_NAME, tool_version=TOOL_VERSION, tool_information_uri=TOOL_INFO_URI, repo_uri_for_artifacts=f"https://github.com/{shared_ctx.repository_name}", commit_sha_for_artifacts=shared_ctx.sha, workspace_root_for_relative_paths=shared_ctx.repo_local_path)
@@ -331,6 +695,7 @@ def generate_sarif_report_node(state: GraphState) -> Dict[str, Any]:
              except (ValueError, TypeError) as e: msg = f"Failed adding Agent finding to SARIF: {str(finding)[:200]}. Error: {e}"; logger.warning(msg); error_messages.append(msg)
         else: logger.warning(f"Invalid finding type in agent_findings: {type(finding)}"); error_messages.append(f"Invalid data type {type(finding)} in agent_findings list.")
     execution_successful = not bool(state.get("error_messages")); final_error_message = "Errors occurred during analysis." if not execution_successful else None;
-    if error_messages != state.get("error_messages", []): execution_successful = False; final_error_message = "Errors occurred during analysis or report generation."
+    if error_messages: execution_successful = False; final_error_message = "Errors occurred during analysis or report generation."
+    if state.get("tier1_tool_diagnostics"): sarif_generator.set_invocation_property("tier1ToolResourceUsage", state["tier1_tool_diagnostics"])
     sarif_generator.set_invocation_status(successful=execution_successful, error_message=final_error_message); final_report = sarif_generator.get_sarif_report();
     logger.info(f"SARIF report generated with {findings_added_count} findings added."); return {"final_sarif_report": final_report, "error_messages": error_messages}
\ No newline at end of file
@@ -0,0 +1,456 @@
+# NOVAGUARD-AI/src/orchestrator/scheduler.py
+
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from contextlib import contextmanager, nullcontext, AsyncExitStack
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, Iterator
+
+from pydantic import BaseModel, ConfigDict
+
+from ..core.config_loader import Config
+from ..core.ollama_client import OllamaClientWrapper, get_ollama_backend, track_served_endpoints
+from ..core.llm_cache import get_llm_response_cache
+from ..core.ollama_balancer import get_ollama_endpoint_balancer
+from ..core.prompt_manager import PromptManager, PROMPT_LAYOUT_SHARED_PREFIX, get_prompt_layout
+from ..core.shared_context import ChangedFile, SharedReviewContext
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_IN_FLIGHT_PER_ENDPOINT = 2
+MODEL_AFFINITY_SCHEDULER = "model_affinity"
+
+
+def _positive_int_setting(value: Any, default: int) -> int:
+    """Returns `value` if it is a positive int (bools excluded), otherwise `default`."""
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return default
+
+
+class AgentWorkItem(BaseModel):
+    """
+    One unit of LLM work: a single agent reviewing a single file.
+    `index` is the item's position in the deterministic (agent order, file order) sequence.
+    """
+    index: int
+    agent_name: str
+    agent: Any
+    file: ChangedFile
+    model_name: Optional[str] = None # Model Ollama agent sẽ dùng, để gom nhóm theo model
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+
+class EndpointConcurrencyLimiter:
+    """
+    Caps the number of requests in flight per Ollama endpoint (base URL),
+    independently of how many worker threads the scheduler runs. Only used with a
+    single endpoint: with several, the balancer enforces the limit on the endpoint it picks.
+    """
+
+    def __init__(self, max_in_flight_per_endpoint: int):
+        self.max_in_flight_per_endpoint = max_in_flight_per_endpoint
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _get_semaphore(self, base_url: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if base_url not in self._semaphores:
+                self._semaphores[base_url] = threading.BoundedSemaphore(self.max_in_flight_per_endpoint)
+            return self._semaphores[base_url]
+
+    @contextmanager
+    def slot(self, base_url: str) -> Iterator[None]:
+        semaphore = self._get_semaphore(base_url)
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+
+class AsyncEndpointConcurrencyLimiter:
+    """
+    asyncio counterpart of EndpointConcurrencyLimiter for the async pipeline.
+    Semaphores belong to the event loop they are used on; use
+    `get_async_endpoint_limiter` to get the limiter of the running loop.
+    """
+
+    def __init__(self, max_in_flight_per_endpoint: int):
+        self.max_in_flight_per_endpoint = max_in_flight_per_endpoint
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def semaphore(self, base_url: str) -> asyncio.Semaphore:
+        if base_url not in self._semaphores:
+            self._semaphores[base_url] = asyncio.Semaphore(self.max_in_flight_per_endpoint)
+        return self._semaphores[base_url]
+
+
+# Một limiter cho mỗi event loop, để các node async chạy song song dùng chung giới hạn theo endpoint
+_async_endpoint_limiters: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncEndpointConcurrencyLimiter]" = weakref.WeakKeyDictionary()
+
+
+def get_async_endpoint_limiter(config: Config) -> AsyncEndpointConcurrencyLimiter:
+    """
+    Returns the AsyncEndpointConcurrencyLimiter shared by all coroutines of the running
+    event loop, created with `orchestration.max_in_flight_per_endpoint` on first use.
+    """
+    loop = asyncio.get_running_loop()
+    limiter = _async_endpoint_limiters.get(loop)
+    if limiter is None:
+        limiter = AsyncEndpointConcurrencyLimiter(_positive_int_setting(
+            config.get_orchestration_setting("max_in_flight_per_endpoint"),
+            DEFAULT_MAX_IN_FLIGHT_PER_ENDPOINT
+        ))
+        _async_endpoint_limiters[loop] = limiter
+    return limiter
+
+
+def get_async_request_semaphore(config: Config) -> Optional[asyncio.Semaphore]:
+    """
+    The semaphore bounding the async requests sent to the single Ollama endpoint, or None when
+    requests are load-balanced over several endpoints (the balancer then limits each endpoint).
+    """
+    if get_ollama_endpoint_balancer(config) is not None:
+        return None
+    return get_async_endpoint_limiter(config).semaphore(config.ollama_base_url)
+
+
+class AgentWorkQueueScheduler:
+    """
+    Expands a review run into (file, agent) work items and executes them on a bounded
+    worker pool, instead of each agent looping over all files one LLM call at a time.
+
+    Results are merged back in the same order the sequential graph would produce
+    (agent order first, then file order), regardless of completion order.
+
+    With model affinity (`orchestration.agent_scheduler: model_affinity`), items are grouped
+    by the agent's model and one model's group is drained before the next one starts: the
+    model is pinned in memory while its group runs and unloaded once the group is done, so
+    each model is loaded at most once per run.
+
+    With `orchestration.prompt_layout: shared_prefix`, the items of one file that use the same
+    model form a chain run back-to-back by one worker (agent order), so the agents' requests,
+    which start with the same prompt prefix, follow each other on the endpoint that holds the
+    prefix in its prompt cache. Chains of different files still run in parallel.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        agent_classes: List[Tuple[str, type]],
+        ollama_client: Optional[OllamaClientWrapper] = None,
+        prompt_manager: Optional[PromptManager] = None,
+        max_workers: Optional[int] = None,
+        max_in_flight_per_endpoint: Optional[int] = None,
+        model_affinity: Optional[bool] = None,
+    ):
+        """
+        Args:
+            config: The application Config.
+            agent_classes: Ordered list of (agent_name, agent_class) to run for each file.
+            ollama_client: Shared client; created from `config.ollama_base_url` if omitted.
+            prompt_manager: Shared PromptManager; created from `config` if omitted.
+            max_workers: Worker threads. Defaults to `orchestration.max_workers` in models.yml.
+            max_in_flight_per_endpoint: Concurrent LLM requests allowed on the Ollama endpoint.
+                Defaults to `orchestration.max_in_flight_per_endpoint` in models.yml. With several
+                endpoints the client's balancer enforces its own limit (the same setting) on the
+                endpoint each request is routed to, and this value is not used.
+            model_affinity: Drain work one model at a time. Defaults to
+                `orchestration.agent_scheduler == "model_affinity"` in models.yml.
+        """
+        self.config = config
+        self.agent_classes = agent_classes
+        self.ollama_client = ollama_client or OllamaClientWrapper(
+            base_url=config.ollama_base_url, response_cache=get_llm_response_cache(config),
+            backend=get_ollama_backend(config), balancer=get_ollama_endpoint_balancer(config)
+        )
+        self.prompt_manager = prompt_manager or PromptManager(config=config)
+        self.max_workers = _positive_int_setting(
+            max_workers if max_workers is not None else config.get_orchestration_setting("max_workers"),
+            DEFAULT_MAX_WORKERS
+        )
+        self.max_in_flight_per_endpoint = _positive_int_setting(
+            max_in_flight_per_endpoint if max_in_flight_per_endpoint is not None
+            else config.get_orchestration_setting("max_in_flight_per_endpoint"),
+            DEFAULT_MAX_IN_FLIGHT_PER_ENDPOINT
+        )
+        # Client có balancer phân phối request ra nhiều endpoint: balancer giới hạn từng endpoint nó chọn
+        self.endpoint_count = _positive_int_setting(getattr(self.ollama_client, "endpoint_count", 1), 1)
+        self.limiter = EndpointConcurrencyLimiter(self.max_in_flight_per_endpoint)
+        self.model_affinity = (
+            model_affinity if model_affinity is not None
+            else config.get_orchestration_setting("agent_scheduler") == MODEL_AFFINITY_SCHEDULER
+        )
+        # prompt_layout shared_prefix: các item cùng file + model chạy nối tiếp nhau (prompt cache của Ollama)
+        self.chain_by_file = get_prompt_layout(config) == PROMPT_LAYOUT_SHARED_PREFIX
+        self.model_switches = 0 # Số lần chuyển model trong lần chạy gần nhất
+        self.item_latencies: List[Tuple[str, str, float]] = []
+        self._latencies_lock = threading.Lock()
+
+    def build_work_items(self, files_data: List[ChangedFile]) -> List[AgentWorkItem]:
+        """Creates one work item per (agent, file) pair the agent supports."""
+        work_items: List[AgentWorkItem] = []
+        for agent_name, agent_class in self.agent_classes:
+            agent = agent_class(config=self.config, ollama_client=self.ollama_client, prompt_manager=self.prompt_manager)
+            supported_languages = getattr(agent, "supported_languages", None)
+            model_name = self.config.get_model_for_agent(getattr(agent, "agent_name", agent_name))
+            if not isinstance(model_name, str):
+                model_name = None
+            for file_data in files_data:
+                if supported_languages is not None:
+                    if not file_data.language or file_data.language.lower() not in [lang.lower() for lang in supported_languages]:
+                        continue
+                work_items.append(AgentWorkItem(
+                    index=len(work_items), agent_name=agent_name, agent=agent, file=file_data, model_name=model_name
+                ))
+        logger.info(f"Work queue expanded to {len(work_items)} (file, agent) items for {len(files_data)} files and {len(self.agent_classes)} agents.")
+        return work_items
+
+    def _run_item(
+        self,
+        item: AgentWorkItem,
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext],
+        enqueued_at: float
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        with self._endpoint_slot(), track_served_endpoints() as served_endpoints:
+            started_at = time.monotonic()
+            queue_wait = started_at - enqueued_at
+            try:
+                findings = item.agent.review(files_data=[item.file], tier1_tool_results=tier1_tool_results, pr_context=pr_context)
+                error = None
+                if not isinstance(findings, list):
+                    error = f"{item.agent_name} review method did not return a list for {item.file.path}. Got: {type(findings)}"
+                    findings = []
+            except Exception as e:
+                logger.error(f"Work item {item.agent_name}:{item.file.path} failed: {e}", exc_info=True)
+                findings, error = [], f"Error during {item.agent_name} execution for {item.file.path}: {e}"
+            elapsed = time.monotonic() - started_at
+
+        self._record_item_latency(item, elapsed, queue_wait, served_endpoints, len(findings))
+        return findings, error
+
+    def _per_endpoint_limit(self) -> int:
+        """The in-flight limit actually applied per endpoint (the balancer's with several endpoints)."""
+        if self.endpoint_count > 1:
+            limit = getattr(getattr(self.ollama_client, "balancer", None), "max_in_flight_per_endpoint", None)
+            if isinstance(limit, int):
+                return limit
+        return self.max_in_flight_per_endpoint
+
+    def _endpoint_slot(self) -> Any:
+        """Slot of the single endpoint; with several endpoints the balancer limits the one it picks."""
+        if self.endpoint_count > 1:
+            return nullcontext()
+        return self.limiter.slot(getattr(self.ollama_client, "base_url", self.config.ollama_base_url))
+
+    async def _arun_item(
+        self,
+        item: AgentWorkItem,
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext],
+        enqueued_at: float,
+        worker_slots: asyncio.Semaphore,
+        endpoint_limiter: AsyncEndpointConcurrencyLimiter
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        async with AsyncExitStack() as slots:
+            await slots.enter_async_context(worker_slots)
+            if self.endpoint_count == 1: # Nhiều endpoint: balancer giới hạn endpoint được chọn
+                await slots.enter_async_context(endpoint_limiter.semaphore(getattr(self.ollama_client, "base_url", self.config.ollama_base_url)))
+            served_endpoints = slots.enter_context(track_served_endpoints())
+            started_at = time.monotonic()
+            queue_wait = started_at - enqueued_at
+            try:
+                findings = await item.agent.areview(files_data=[item.file], tier1_tool_results=tier1_tool_results, pr_context=pr_context)
+                error = None
+                if not isinstance(findings, list):
+                    error = f"{item.agent_name} review method did not return a list for {item.file.path}. Got: {type(findings)}"
+                    findings = []
+            except Exception as e:
+                logger.error(f"Work item {item.agent_name}:{item.file.path} failed: {e}", exc_info=True)
+                findings, error = [], f"Error during {item.agent_name} execution for {item.file.path}: {e}"
+            elapsed = time.monotonic() - started_at
+
+        self._record_item_latency(item, elapsed, queue_wait, served_endpoints, len(findings))
+        return findings, error
+
+    def _run_chain(
+        self,
+        chain: List[AgentWorkItem],
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext],
+        enqueued_at: float
+    ) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        chain_results = []
+        for item in chain:
+            chain_results.append(self._run_item(item, tier1_tool_results, pr_context, enqueued_at))
+            enqueued_at = time.monotonic() # Item tiếp theo của chain bắt đầu ngay, không chờ trong queue
+        return chain_results
+
+    async def _arun_chain(
+        self,
+        chain: List[AgentWorkItem],
+        tier1_tool_results: Optional[Dict[str, Any]],
+        pr_context: Optional[SharedReviewContext],
+        enqueued_at: float,
+        worker_slots: asyncio.Semaphore,
+        endpoint_limiter: AsyncEndpointConcurrencyLimiter
+    ) -> List[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        chain_results = []
+        for item in chain:
+            chain_results.append(await self._arun_item(item, tier1_tool_results, pr_context, enqueued_at, worker_slots, endpoint_limiter))
+            enqueued_at = time.monotonic() # Item tiếp theo của chain bắt đầu ngay, không chờ trong queue
+        return chain_results
+
+    def _record_item_latency(self, item: AgentWorkItem, elapsed: float, queue_wait: float, served_endpoints: List[str], findings_count: int) -> None:
+        with self._latencies_lock:
+            self.item_latencies.append((item.agent_name, item.file.path, elapsed))
+        # Endpoint thực sự phục vụ các request của item (không có: cache hit hoặc file bị bỏ qua)
+        endpoints = ", ".join(dict.fromkeys(served_endpoints)) or "none"
+        logger.info(
+            f"Work item {item.index} {item.agent_name}:{item.file.path} finished in {elapsed:.2f}s "
+            f"(queue wait {queue_wait:.2f}s, endpoint {endpoints}, {findings_count} findings)."
+        )
+
+    def run(
+        self,
+        files_data: List[ChangedFile],
+        tier1_tool_results: Optional[Dict[str, Any]] = None,
+        pr_context: Optional[SharedReviewContext] = None
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Executes all work items and returns (findings, error_messages), both in deterministic order.
+        """
+        work_items = self.build_work_items(files_data)
+        if not work_items:
+            return [], []
+
+        run_started_at = time.monotonic()
+        switches_before = self._client_model_switches()
+        results: List[Optional[Tuple[List[Dict[str, Any]], Optional[str]]]] = [None] * len(work_items)
+        logger.info(f"Running work queue with {self.max_workers} workers, max {self._per_endpoint_limit()} in flight per endpoint ({self.endpoint_count} endpoints).")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="novaguard-agent") as executor:
+            for model_name, group in self._group_work_items(work_items):
+                with self._pinned(model_name):
+                    futures = {
+                        executor.submit(self._run_chain, chain, tier1_tool_results, pr_context, time.monotonic()): chain
+                        for chain in self._chain_work_items(group)
+                    }
+                    for future, chain in futures.items():
+                        for item, item_result in zip(chain, future.result()):
+                            results[item.index] = item_result
+
+        self._log_latency_summary(time.monotonic() - run_started_at)
+        self._report_model_switches(switches_before)
+        return self._merge_results(results)
+
+    async def arun(
+        self,
+        files_data: List[ChangedFile],
+        tier1_tool_results: Optional[Dict[str, Any]] = None,
+        pr_context: Optional[SharedReviewContext] = None
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Async variant of `run()`: work items are coroutines on the running event loop
+        (agents' `areview`), bounded by `max_workers` and the per-endpoint limit.
+        """
+        work_items = self.build_work_items(files_data)
+        if not work_items:
+            return [], []
+
+        run_started_at = time.monotonic()
+        worker_slots = asyncio.Semaphore(self.max_workers)
+        endpoint_limiter = AsyncEndpointConcurrencyLimiter(self.max_in_flight_per_endpoint)
+        switches_before = self._client_model_switches()
+        results: List[Optional[Tuple[List[Dict[str, Any]], Optional[str]]]] = [None] * len(work_items)
+        logger.info(f"Running async work queue with {self.max_workers} concurrent items, max {self._per_endpoint_limit()} in flight per endpoint ({self.endpoint_count} endpoints).")
+        for model_name, group in self._group_work_items(work_items):
+            chains = self._chain_work_items(group)
+            with self._pinned(model_name):
+                chain_results = await asyncio.gather(*[
+                    self._arun_chain(chain, tier1_tool_results, pr_context, time.monotonic(), worker_slots, endpoint_limiter)
+                    for chain in chains
+                ])
+            for chain, chain_result in zip(chains, chain_results):
+                for item, item_result in zip(chain, chain_result):
+                    results[item.index] = item_result
+
+        self._log_latency_summary(time.monotonic() - run_started_at)
+        self._report_model_switches(switches_before)
+        return self._merge_results(results)
+
+    def _group_work_items(self, work_items: List[AgentWorkItem]) -> List[Tuple[Optional[str], List[AgentWorkItem]]]:
+        """
+        Returns the batches to run one after another: a single batch with every item, or with
+        model affinity one batch per model in order of first use.
+        """
+        if not self.model_affinity:
+            return [(None, work_items)]
+        groups: Dict[Optional[str], List[AgentWorkItem]] = {}
+        for item in work_items:
+            groups.setdefault(item.model_name, []).append(item)
+        logger.info(
+            f"Model affinity: {len(work_items)} items in {len(groups)} model batches: "
+            + ", ".join(f"{model or 'unknown'} ({len(items)})" for model, items in groups.items())
+        )
+        return list(groups.items())
+
+    def _chain_work_items(self, group: List[AgentWorkItem]) -> List[List[AgentWorkItem]]:
+        """
+        Splits a batch into chains, each run sequentially by one worker: one chain per item, or with
+        `chain_by_file` one chain per (file, model) in order of first use, items in agent order.
+        """
+        if not self.chain_by_file:
+            return [[item] for item in group]
+        chains: Dict[Tuple[str, Optional[str]], List[AgentWorkItem]] = {}
+        for item in group:
+            chains.setdefault((item.file.path, item.model_name), []).append(item)
+        logger.info(f"Shared prompt prefix: {len(group)} items in {len(chains)} per-file chains.")
+        return list(chains.values())
+
+    @contextmanager
+    def _pinned(self, model_name: Optional[str]) -> Iterator[None]:
+        """Pins `model_name` while its batch runs and releases (unloads) it afterwards."""
+        if model_name is None:
+            yield
+            return
+        self.ollama_client.pin_model(model_name)
+        try:
+            yield
+        finally:
+            self.ollama_client.release_model(model_name)
+
+    def _client_model_switches(self) -> int:
+        switches = getattr(self.ollama_client, "model_switches", 0)
+        return switches if isinstance(switches, int) else 0
+
+    def _report_model_switches(self, switches_before: int) -> None:
+        self.model_switches = self._client_model_switches() - switches_before
+        logger.info(f"Work queue run caused {self.model_switches} model switches (model affinity: {self.model_affinity}).")
+
+    def _merge_results(
+        self, results: List[Optional[Tuple[List[Dict[str, Any]], Optional[str]]]]
+    ) -> Tuple[List[Dict[str, Any]], List[str]]:
+        all_findings: List[Dict[str, Any]] = []
+        error_messages: List[str] = []
+        for item_result in results:
+            findings, error = item_result  # type: ignore[misc]
+            all_findings.extend(findings)
+            if error:
+                error_messages.append(error)
+        return all_findings, error_messages
+
+    def _log_latency_summary(self, wall_clock_seconds: float) -> None:
+        latencies = sorted(latency for _, _, latency in self.item_latencies)
+        if not latencies:
+            return
+        p95 = latencies[min(len(latencies) - 1, int(round(0.95 * (len(latencies) - 1))))]
+        logger.info(
+            f"Work queue finished {len(latencies)} items in {wall_clock_seconds:.2f}s wall clock "
+            f"(sum {sum(latencies):.2f}s, mean {sum(latencies) / len(latencies):.2f}s, p95 {p95:.2f}s, max {latencies[-1]:.2f}s)."
+        )
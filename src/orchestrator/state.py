@@ -1,6 +1,7 @@
 # NOVAGUARD-AI/src/orchestrator/state.py
 
 from typing import TypedDict, List, Dict, Any, Optional
+from typing_extensions import Annotated
 
 # Assuming ChangedFile and SharedReviewContext are in src/core/
 # Adjust the import path if your structure is different.
@@ -25,6 +26,26 @@ from ..core.shared_context import SharedReviewContext, ChangedFile
 #     raw_tool_output: Optional[Any]
 
 
+class OverwriteList(list):
+    """
+    Marks a list update that must replace the accumulated value of a field
+    instead of being merged into it (e.g. MetaReviewer's refined findings).
+    """
+
+
+def append_list_update(existing: Optional[List[Any]], update: Optional[List[Any]]) -> List[Any]:
+    """
+    Reducer for list fields that nodes accumulate (`agent_findings`, `error_messages`).
+
+    Nodes return only the items they add, which are appended to the current value, so
+    nodes running in the same step (parallel agent fan-out) do not overwrite each other.
+    An `OverwriteList` replaces the value outright.
+    """
+    if isinstance(update, OverwriteList):
+        return list(update)
+    return list(existing or []) + list(update or [])
+
+
 class GraphState(TypedDict):
     """
     Represents the shared state of the code review graph.
@@ -56,12 +77,20 @@ class GraphState(TypedDict):
     Example: {"pylint": [{"file_path": "...", "line_start": ..., "message_text": ..., ...}]}
     """
 
-    agent_findings: List[Dict[str, Any]]
+    tier1_tool_diagnostics: List[Dict[str, Any]]
+    """
+    Resource usage of every Tier 1 tool run (wall time, CPU time, peak RSS, exit code, and
+    whether it timed out or hit a `resource_limits` limit); see `ToolResourceUsage`.
+    Written by 'run_tier1_tools_node' and reported in the SARIF invocation properties.
+    """
+
+    agent_findings: Annotated[List[Dict[str, Any]], append_list_update]
     """
     A consolidated list of all findings (observations, suggestions, errors)
     generated by the specialized LLM agents (StyleGuardian, BugHunter, etc.).
     Each item in the list is a dictionary representing a single finding.
-    This list is typically appended to by each agent node.
+    Each agent node returns only the findings it adds; `append_list_update` appends
+    them, so parallel agent branches do not overwrite each other.
     """
 
     # --- Final Output ---
@@ -73,10 +102,11 @@ class GraphState(TypedDict):
     """
 
     # --- Operational Data ---
-    error_messages: List[str]
+    error_messages: Annotated[List[str], append_list_update]
     """
     A list to accumulate any error messages encountered during the
     execution of graph nodes. Helps in debugging and reporting issues.
+    Nodes return only their new messages, appended with `append_list_update` like `agent_findings`.
     """
 
     # Optional: Could be useful for tracking or conditional logic, initialize to 0.
@@ -85,11 +115,7 @@ class GraphState(TypedDict):
     # Note on state updates in LangGraph:
     # By default, when a node returns a dictionary with keys matching GraphState,
     # the values for those keys in the state are replaced.
-    # For fields that need to be accumulated (e.g., `agent_findings`, `error_messages`),
-    # this accumulation logic is typically handled either:
-    # 1. Within the node itself (node reads current list, appends, returns new list).
-    # 2. Using `Annotated` from `typing_extensions` with an operator like `operator.add`
-    #    when defining the StateGraph, to specify how updates to a field should be merged.
-    #    Example: `agent_findings: Annotated[List[Dict[str, Any]], operator.add]`
-    #    This requires `StateGraph(GraphState)` definition and edge configuration.
-    #    This file only defines the TypedDict, not the graph execution logic.
\ No newline at end of file
+    # `agent_findings` and `error_messages` are accumulated instead: nodes return only the
+    # items they add and `append_list_update` appends them. This makes the same node
+    # functions safe to run both sequentially and as parallel branches (see `get_compiled_graph`).
+    # A node that wants to replace the list (MetaReviewer) returns an `OverwriteList`.
\ No newline at end of file
@@ -0,0 +1,129 @@
+# NOVAGUARD-AI/src/orchestrator/tool_executor.py
+
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Union, Callable
+
+from pydantic import BaseModel, ConfigDict
+
+from ..core.config_loader import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIER1_MAX_WORKERS = 4
+CONCURRENCY_PARALLEL = "parallel"   # Tool nhẹ (linter từng file): chạy song song tối đa N job
+CONCURRENCY_EXCLUSIVE = "exclusive" # Tool nặng (scanner toàn project): chạy một mình, không chung với job nào khác
+CONCURRENCY_CLASSES = (CONCURRENCY_PARALLEL, CONCURRENCY_EXCLUSIVE)
+
+
+def get_tier1_max_workers(config: Config) -> int:
+    """
+    Number of Tier 1 tool processes allowed to run at once for `parallel` tools.
+    Controlled by `orchestration.tier1_max_workers` in models.yml; the
+    NOVAGUARD_TIER1_MAX_WORKERS environment variable overrides it when set.
+    """
+    value: Any = config.get_orchestration_setting("tier1_max_workers")
+    env_value = os.environ.get("NOVAGUARD_TIER1_MAX_WORKERS")
+    if env_value:
+        try: value = int(env_value.strip())
+        except ValueError: logger.warning(f"Ignoring invalid NOVAGUARD_TIER1_MAX_WORKERS='{env_value}'.")
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return DEFAULT_TIER1_MAX_WORKERS
+
+
+def get_tool_concurrency_class(tool_config_data: Optional[Union[str, Dict[str, Any]]], is_project_tool: bool) -> str:
+    """
+    Concurrency class of a tool from its `concurrency` key in tools.yml.
+    Without the key, project-wide tools are `exclusive` and everything else is `parallel`.
+    """
+    default = CONCURRENCY_EXCLUSIVE if is_project_tool else CONCURRENCY_PARALLEL
+    if not isinstance(tool_config_data, dict) or tool_config_data.get("concurrency") is None:
+        return default
+    concurrency = str(tool_config_data.get("concurrency")).strip().lower()
+    if concurrency not in CONCURRENCY_CLASSES:
+        logger.warning(f"Unknown tool concurrency class '{concurrency}', using '{default}'. Valid: {CONCURRENCY_CLASSES}")
+        return default
+    return concurrency
+
+
+class ToolJob(BaseModel):
+    """
+    One Tier 1 tool invocation. `run` receives a list to append error messages to and
+    returns the standardized findings. `index` fixes the order results are merged in.
+    """
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    index: int
+    tool_id: str
+    target: str # Mô tả đối tượng được quét (file, "N files", "project") để log
+    concurrency: str = CONCURRENCY_PARALLEL
+    run: Callable[[List[str]], Optional[List[Dict[str, Any]]]]
+
+
+class ToolJobResult(BaseModel):
+    index: int
+    tool_id: str
+    findings: List[Dict[str, Any]] = []
+    error_messages: List[str] = []
+    duration_seconds: float = 0.0
+
+
+class Tier1ToolExecutor:
+    """
+    Runs Tier 1 tool jobs by concurrency class: `parallel` jobs share a pool of
+    `max_workers` threads (each thread only waits on its own tool subprocess), then
+    `exclusive` jobs run one at a time with nothing else in flight.
+    Results are returned in job index order, so the merged output does not depend on scheduling.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_TIER1_MAX_WORKERS):
+        self.max_workers = max(1, max_workers)
+
+    def run(self, jobs: List[ToolJob]) -> List[ToolJobResult]:
+        parallel_jobs = [job for job in jobs if job.concurrency != CONCURRENCY_EXCLUSIVE]
+        exclusive_jobs = [job for job in jobs if job.concurrency == CONCURRENCY_EXCLUSIVE]
+        results: Dict[int, ToolJobResult] = {}
+        started_at = time.monotonic()
+
+        workers = min(self.max_workers, len(parallel_jobs))
+        if workers > 1:
+            logger.info(f"Running {len(parallel_jobs)} parallel Tier 1 tool jobs on {workers} workers.")
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tier1-tool") as pool:
+                for result in pool.map(self._run_job, parallel_jobs):
+                    results[result.index] = result
+        else:
+            for job in parallel_jobs:
+                results[job.index] = self._run_job(job)
+
+        if exclusive_jobs:
+            logger.info(f"Running {len(exclusive_jobs)} exclusive Tier 1 tool jobs one at a time.")
+        for job in exclusive_jobs:
+            results[job.index] = self._run_job(job)
+
+        ordered = [results[index] for index in sorted(results)]
+        if ordered:
+            busy_seconds = sum(r.duration_seconds for r in ordered)
+            logger.info(
+                f"Tier 1 tool jobs finished: {len(ordered)} jobs in {time.monotonic() - started_at:.2f}s wall time "
+                f"({busy_seconds:.2f}s total tool time, max_workers={self.max_workers})."
+            )
+        return ordered
+
+    @staticmethod
+    def _run_job(job: ToolJob) -> ToolJobResult:
+        errors: List[str] = []
+        findings: List[Dict[str, Any]] = []
+        start = time.monotonic()
+        try:
+            findings = job.run(errors) or []
+        except Exception as e:
+            # Job tự xử lý ToolExecutionError; đây là lưới an toàn để một job lỗi không làm hỏng cả pool
+            msg = f"Unexpected error running Tier 1 job '{job.tool_id}' for {job.target}: {e}"
+            logger.error(msg, exc_info=True)
+            errors.append(msg)
+        duration = time.monotonic() - start
+        logger.debug(f"Tier 1 job '{job.tool_id}' for {job.target} took {duration:.2f}s ({len(findings)} findings).")
+        return ToolJobResult(index=job.index, tool_id=job.tool_id, findings=findings, error_messages=errors, duration_seconds=duration)
@@ -0,0 +1,325 @@
+# NOVAGUARD-AI/tests/agents/test_base_agent.py
+
+import os
+import sys
+import json
+import asyncio
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, AsyncMock
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.shared_context import ChangedFile, SharedReviewContext
+from src.core.diff_parser import parse_unified_diff
+from src.core.prompt_manager import PromptManager, SHARED_PREFIX_SYSTEM_MESSAGE
+from src.core.context_window import reset_context_window_state
+from src.core.json_recovery import reset_json_repair_state
+from src.agents.base_agent import BaseAgent
+from src.agents.bug_hunter_agent import BugHunterAgent
+from src.agents.meta_reviewer_agent import MetaReviewerAgent
+from src.agents.opti_tune_agent import OptiTuneAgent
+from src.agents.securi_sense_agent import SecuriSenseAgent
+from src.agents.style_guardian_agent import StyleGuardianAgent
+
+
+class TestBaseAgentReviewFlow(unittest.TestCase):
+
+    def setUp(self):
+        reset_json_repair_state()
+        self.addCleanup(reset_json_repair_state)
+        self.mock_config = MagicMock(spec=Config)
+        self.mock_config.get_prompt_template.return_value = None # Luôn dùng prompt mặc định
+        self.mock_config.get_model_for_agent.return_value = "bug-model"
+        self.mock_prompt_manager = MagicMock()
+        self.mock_prompt_manager.get_prompt.side_effect = lambda name, variables: f"PROMPT {name} {variables['file_path']}"
+        self.mock_client = MagicMock()
+        self.files = [
+            ChangedFile(path="a.py", content="x = 1", language="python"),
+            ChangedFile(path="README.md", content="# doc", language="markdown"),
+            ChangedFile(path="b.py", content="y = 2", language="python"),
+        ]
+        self.responses = {
+            "a.py": json.dumps([{"line_start": 1, "message": "Bug in a", "bug_type": "Logic Error", "severity": "high"}]),
+            "b.py": json.dumps({"bugs": [{"line_start": 2, "message": "Bug in b", "severity": "low", "confidence": "medium"}]}),
+        }
+
+    def _response_for(self, **kwargs) -> str:
+        return self.responses[kwargs["prompt"].split()[-1]]
+
+    def _make_agent(self) -> BugHunterAgent:
+        return BugHunterAgent(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=self.mock_prompt_manager)
+
+    def test_review_formats_findings_per_file(self):
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        findings = self._make_agent().review(files_data=self.files)
+
+        self.assertEqual(self.mock_client.invoke.call_count, 2) # README.md bị lọc theo ngôn ngữ
+        first_call = self.mock_client.invoke.call_args_list[0].kwargs
+        self.assertEqual(first_call["model_name"], "bug-model")
+        self.assertTrue(first_call["is_json_mode"])
+        self.assertEqual(first_call["temperature"], 0.4)
+        self.assertEqual([(f["file_path"], f["rule_id"], f["level"]) for f in findings], [
+            ("a.py", "BugHunter.llm_bug_logic_error", "error"),
+            ("b.py", "BugHunter.llm_bug_general_bug", "note"),
+        ])
+        self.assertEqual(findings[1]["confidence"], "medium")
+
+    def test_findings_without_line_or_message_are_kept_with_fallbacks(self):
+        self.responses["a.py"] = json.dumps([{"message": "No line"}, {"line_start": 4}])
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        findings = self._make_agent().review(files_data=self.files[:1])
+        self.assertEqual([(f["line_start"], f["message_text"]) for f in findings], [
+            (1, "No line"),
+            (4, "LLM provided no specific message for this bug."),
+        ])
+
+    def test_areview_matches_review_and_overlaps_calls(self):
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        sync_findings = self._make_agent().review(files_data=self.files)
+
+        in_flight = {"now": 0, "max": 0}
+        async def fake_ainvoke(**kwargs):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return self._response_for(**kwargs)
+        self.mock_client.ainvoke = AsyncMock(side_effect=fake_ainvoke)
+
+        async_findings = asyncio.run(self._make_agent().areview(files_data=self.files))
+        self.assertEqual(async_findings, sync_findings)
+        self.assertEqual(in_flight["max"], 2)
+
+    def test_areview_respects_request_semaphore_and_isolates_errors(self):
+        in_flight = {"now": 0, "max": 0}
+        async def fake_ainvoke(**kwargs):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            if kwargs["prompt"].endswith("a.py"):
+                raise RuntimeError("connection reset")
+            return self._response_for(**kwargs)
+        self.mock_client.ainvoke = AsyncMock(side_effect=fake_ainvoke)
+
+        async def run():
+            return await self._make_agent().areview(files_data=self.files, request_semaphore=asyncio.Semaphore(1))
+        findings = asyncio.run(run())
+        self.assertEqual(in_flight["max"], 1)
+        self.assertEqual([f["file_path"] for f in findings], ["b.py"])
+
+    def test_invalid_json_yields_no_findings(self):
+        self.mock_client.invoke.return_value = "not json"
+        self.assertEqual(self._make_agent().review(files_data=self.files), [])
+
+    def test_hunk_review_scope_sends_only_changed_regions(self):
+        content = "\n".join(f"v{i} = {i}" for i in range(1, 201))
+        hunks = parse_unified_diff("diff --git a/a.py b/a.py\n--- a/a.py\n+++ b/a.py\n@@ -100 +100 @@\n-v100 = 0\n+v100 = 100\n")["a.py"]
+        file_data = ChangedFile(path="a.py", content=content, diff_hunks=hunks, language="python")
+        agent = self._make_agent()
+
+        self.mock_config.get_orchestration_setting.side_effect = lambda name, default=None: "hunks" if name == "review_scope" else default
+        prompt_context = agent._get_code_prompt_context(file_data)
+        self.assertEqual(prompt_context["file_content"].splitlines()[1], "100 +| v100 = 100")
+        self.assertIn("line number", prompt_context["code_scope_note"])
+        # File không có hunk vẫn gửi nguyên nội dung
+        self.assertEqual(agent._get_code_prompt_context(self.files[0]), {"file_content": "x = 1", "code_scope_note": ""})
+
+        self.mock_config.get_orchestration_setting.side_effect = lambda name, default=None: default
+        self.assertEqual(agent._get_code_prompt_context(file_data)["file_content"], content)
+
+    def test_requests_are_fitted_to_the_context_window(self):
+        reset_context_window_state()
+        self.addCleanup(reset_context_window_state)
+        template = (project_root / "config" / "prompts" / "bug_hunter_generic.md").read_text(encoding="utf-8")
+        self.mock_config.prompt_templates = {"bug_hunter_generic": template}
+        settings = {"models": {"bug-model": {"max_tokens": 4096}}, "sticky": False}
+        self.mock_config.get_context_window_setting.side_effect = lambda name, default=None: settings.get(name, default)
+        agent = BugHunterAgent(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=PromptManager(self.mock_config))
+
+        small_request = agent._prepare_file_request(self.files[0], None, None)
+        self.assertEqual(small_request["num_ctx"], 4096) # Prompt ~1.5k token + 1024 token cho output
+        self.assertIn("Examples of Bug Hunting", small_request["prompt"])
+
+        big_file = ChangedFile(path="big.py", content="\n".join(f"value_{i} = {i}" for i in range(600)), language="python")
+        with self.assertLogs("src.core.context_window", level="WARNING"):
+            big_request = agent._prepare_file_request(big_file, None, None)
+        self.assertEqual(big_request["num_ctx"], 4096)
+        self.assertNotIn("Examples of Bug Hunting", big_request["prompt"])
+        # Không có hunk: giữ phần đầu file, bỏ phần cuối
+        self.assertIn("  1  | value_0 = 0", big_request["prompt"])
+        self.assertNotIn("value_599 = 599", big_request["prompt"])
+
+        settings["enabled"] = False
+        agent = BugHunterAgent(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=PromptManager(self.mock_config))
+        self.assertNotIn("num_ctx", agent._prepare_file_request(big_file, None, None))
+
+    def test_generation_options_from_config_are_sent(self):
+        reset_context_window_state()
+        self.addCleanup(reset_context_window_state)
+        self.mock_config.get_generation_options.return_value = {
+            "num_predict": 3000, "top_k": 20, "stop": ["```"], "temperature": 0.0, "early_stop_json": True, "prompt": "ignored",
+        }
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        self._make_agent().review(files_data=self.files[:1])
+
+        request = self.mock_client.invoke.call_args.kwargs
+        self.assertEqual(request["temperature"], 0.0) # Ghi đè 0.4 của BugHunter
+        self.assertEqual((request["num_predict"], request["top_k"], request["stop"], request["early_stop_json"]), (3000, 20, ["```"], True))
+        self.assertEqual(request["prompt"], "PROMPT bug_hunter_generic a.py")
+        self.assertEqual(request["num_ctx"], 4096) # num_predict là phần dành cho output
+        self.mock_config.get_generation_options.assert_called_with("BugHunter")
+
+    def test_streamed_findings_stop_the_generation_at_max_findings(self):
+        self.mock_config.get_generation_options.return_value = {"stream_findings": True, "max_findings": 2, "num_predict": 512}
+        self.responses["a.py"] = json.dumps([{"line_start": n, "message": f"Bug {n}"} for n in (1, 2, 3)])
+        generated = []
+
+        def fake_invoke(stream_monitor=None, **kwargs):
+            self.assertNotIn("max_findings", kwargs)
+            self.assertNotIn("stream_findings", kwargs)
+            response = self._response_for(**kwargs)
+            end = stream_monitor.feed(response) # Như OllamaClientWrapper: dừng sinh ở vị trí parser trả về
+            generated.append(response[:end] if end is not None else response)
+            return generated[-1]
+
+        agent = self._make_agent()
+        self.mock_client.invoke.side_effect = fake_invoke
+        findings = agent.review(files_data=self.files[:1])
+        self.assertEqual([f["line_start"] for f in findings], [1, 2])
+        self.assertNotIn('"Bug 3"', generated[0]) # Finding thứ ba không được sinh
+
+        # Response từ LLM cache không đi qua stream: vẫn được parse như thường, kể cả dạng {"bugs": [...]}
+        self.mock_client.invoke.side_effect = lambda stream_monitor=None, **kwargs: self._response_for(**kwargs)
+        findings = agent.review(files_data=self.files[2:])
+        self.assertEqual([f["message_text"] for f in findings], ["Bug in b"])
+
+    def test_streamed_prose_response_yields_no_findings(self):
+        self.mock_config.get_generation_options.return_value = {"stream_findings": True}
+        self.mock_client.invoke.return_value = "I could not find any bugs in this file."
+        self.assertEqual(self._make_agent().review(files_data=self.files[:1]), [])
+
+    def test_structured_output_sends_the_finding_schema(self):
+        self.mock_config.get_generation_options.return_value = {"structured_output": True}
+        self.mock_prompt_manager.get_prompt.side_effect = lambda name, variables: f"{variables['output_format_instructions']}\nPROMPT {name} {variables['file_path']}"
+        self.responses["a.py"] = json.dumps({"findings": [
+            {"line_start": 1, "message": "Bug in a", "bug_type": "Logic Error", "severity": "high"},
+            {"line_start": "unknown", "message": "Invalid line"},
+        ]})
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        findings = self._make_agent().review(files_data=self.files[:1])
+
+        request = self.mock_client.invoke.call_args.kwargs
+        self.assertNotIn("structured_output", request)
+        self.assertEqual(request["format"]["required"], ["findings"])
+        self.assertIn("bug_type", request["format"]["properties"]["findings"]["items"]["properties"])
+        self.assertTrue(request["prompt"].startswith('Return a JSON object whose "findings" key'))
+        # Finding không hợp lệ bị bỏ qua thay vì làm hỏng cả file
+        self.assertEqual([(f["line_start"], f["rule_id"]) for f in findings], [(1, "BugHunter.llm_bug_logic_error")])
+
+    def test_shared_prefix_layout_gives_every_agent_the_same_prompt_prefix(self):
+        prompts_dir = project_root / "config" / "prompts"
+        self.mock_config.prompt_templates = {path.stem: path.read_text(encoding="utf-8") for path in prompts_dir.glob("*.md")}
+        layout = {"prompt_layout": "shared_prefix"}
+        self.mock_config.get_orchestration_setting.side_effect = lambda name, default=None: layout.get(name, default)
+        prompt_manager = PromptManager(self.mock_config)
+        pr_context = SharedReviewContext(
+            repository_name="o/r", repo_local_path=Path("."), sha="abc", pr_title="Add parser", pr_body="Parses input.", config_obj=self.mock_config
+        )
+        requests = [
+            agent_class(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=prompt_manager)._prepare_file_request(self.files[0], {}, pr_context)
+            for agent_class in (StyleGuardianAgent, BugHunterAgent, SecuriSenseAgent, OptiTuneAgent)
+        ]
+
+        self.assertEqual({request["system_message_content"] for request in requests}, {SHARED_PREFIX_SYSTEM_MESSAGE})
+        self.assertEqual({request["prompt_prefix_key"] for request in requests}, {"bug-model:a.py"})
+        prefix = os.path.commonprefix([request["prompt"] for request in requests])
+        self.assertTrue(prefix.startswith("**Pull Request Context:**"))
+        self.assertIn("Parses input.", prefix)
+        self.assertIn("```python\nx = 1\n```", prefix)
+        for request in requests:
+            # Code và PR context chỉ xuất hiện một lần, trong prefix chung
+            self.assertEqual(request["prompt"].count("x = 1"), 1)
+            self.assertEqual(request["prompt"].count("Parses input."), 1)
+
+        layout["prompt_layout"] = "template"
+        request = BugHunterAgent(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=prompt_manager)._prepare_file_request(self.files[0], {}, pr_context)
+        self.assertNotIn("prompt_prefix_key", request)
+        self.assertTrue(request["prompt"].startswith("You are BugHunter"))
+
+    def test_malformed_json_is_recovered_without_another_call(self):
+        self.responses["a.py"] = "Here are the bugs:\n```json\n[{'line_start': 1, 'message': 'Bug in a', 'severity': 'high'},]\n```"
+        self.responses["b.py"] = '{"bugs": [{"line_start": 2, "message": "Bug in b"}, {"line_start": 3, "message": "Cut o'
+        self.mock_client.invoke.side_effect = lambda **kwargs: self._response_for(**kwargs)
+        findings = self._make_agent().review(files_data=self.files)
+        self.assertEqual(self.mock_client.invoke.call_count, 2)
+        self.assertEqual([(f["file_path"], f["line_start"]) for f in findings], [("a.py", 1), ("b.py", 2)])
+
+    def test_unrecoverable_json_is_repaired_within_the_run_budget(self):
+        self.mock_config.get_json_repair_setting.side_effect = lambda name, default=None: {"max_repairs_per_run": 1}.get(name, default)
+        broken = '[{"line_start": 1 "message": "Missing comma"}]'
+        repaired = '[{"line_start": 1, "message": "Missing comma"}]'
+
+        def fake_invoke(**kwargs):
+            return repaired if kwargs["prompt"].endswith(broken) else broken
+
+        self.mock_client.invoke.side_effect = fake_invoke
+        findings = self._make_agent().review(files_data=self.files)
+
+        prompts = [call.kwargs["prompt"] for call in self.mock_client.invoke.call_args_list]
+        self.assertEqual(len(prompts), 3) # a.py, repair của a.py, b.py (hết budget)
+        repair_call = self.mock_client.invoke.call_args_list[1].kwargs
+        self.assertEqual((repair_call["model_name"], repair_call["temperature"]), ("bug-model", 0.0))
+        self.assertIn("not valid JSON", repair_call["prompt"])
+        self.assertNotIn("x = 1", repair_call["prompt"]) # Không gửi lại code
+        self.assertEqual([(f["file_path"], f["message_text"]) for f in findings], [("a.py", "Missing comma")])
+
+    def test_base_agent_without_hooks_raises_not_implemented(self):
+        agent = BaseAgent("Plain", self.mock_config, self.mock_client, self.mock_prompt_manager)
+        with self.assertRaises(NotImplementedError):
+            agent.review(files_data=self.files)
+
+
+class TestMetaReviewerAsync(unittest.TestCase):
+
+    def setUp(self):
+        reset_json_repair_state()
+        self.addCleanup(reset_json_repair_state)
+
+    def test_areview_falls_back_to_original_findings_on_invalid_json(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.get_model_for_agent.return_value = "meta-model"
+        mock_prompt_manager = MagicMock()
+        mock_prompt_manager.get_prompt.return_value = "META PROMPT"
+        mock_client = MagicMock()
+        mock_client.ainvoke = AsyncMock(return_value="{broken")
+        original = [{"file_path": "a.py", "line_start": 1, "message_text": "m", "rule_id": "X.y", "level": "note", "tool_name": "X"}]
+
+        agent = MetaReviewerAgent(config=mock_config, ollama_client=mock_client, prompt_manager=mock_prompt_manager)
+        result = asyncio.run(agent.areview(all_agent_findings=original, files_data=[]))
+        self.assertEqual(result, original)
+        meta_call, repair_call = [call.kwargs for call in mock_client.ainvoke.await_args_list]
+        self.assertEqual(meta_call["temperature"], 0.1)
+        self.assertTrue(repair_call["prompt"].endswith("{broken")) # Lần sửa JSON cũng thất bại
+
+    def test_truncated_refined_list_is_not_used(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.get_model_for_agent.return_value = "meta-model"
+        mock_prompt_manager = MagicMock()
+        mock_prompt_manager.get_prompt.return_value = "META PROMPT"
+        mock_client = MagicMock()
+        mock_client.invoke.return_value = '[{"file_path": "a.py", "line_start": 1, "message": "kept"}, {"file_path": "a.py", "line_sta'
+        original = [{"file_path": "a.py", "line_start": n, "message_text": "m", "rule_id": "X.y", "level": "note", "tool_name": "X"} for n in (1, 2)]
+
+        agent = MetaReviewerAgent(config=mock_config, ollama_client=mock_client, prompt_manager=mock_prompt_manager)
+        self.assertEqual(agent.review(all_agent_findings=original, files_data=[]), original)
+        self.assertEqual(mock_client.invoke.call_count, 1) # Response bị cắt: không gọi sửa JSON
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# NOVAGUARD-AI/tests/agents/test_combined_review_agent.py
+
+import os
+import sys
+import json
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.shared_context import ChangedFile
+from src.core.prompt_manager import PromptManager
+from src.core.json_recovery import reset_json_repair_state
+from src.agents.combined_review_agent import CombinedReviewAgent, get_agent_mode
+
+
+class TestCombinedReviewAgent(unittest.TestCase):
+
+    def setUp(self):
+        reset_json_repair_state()
+        self.addCleanup(reset_json_repair_state)
+        self.mock_config = MagicMock(spec=Config)
+        self.mock_config.get_prompt_template.return_value = None # Luôn dùng prompt mặc định
+        self.mock_config.get_model_for_agent.return_value = "combined-model"
+        prompts_dir = project_root / "config" / "prompts"
+        self.mock_config.prompt_templates = {path.stem: path.read_text(encoding="utf-8") for path in prompts_dir.glob("*.md")}
+        self.mock_client = MagicMock()
+        self.agent = CombinedReviewAgent(config=self.mock_config, ollama_client=self.mock_client, prompt_manager=PromptManager(self.mock_config))
+        self.py_file = ChangedFile(path="app.py", content="import os\nquery = 'SELECT ' + name\n", language="python")
+
+    def test_one_call_per_file_routes_findings_to_specialist_namespaces(self):
+        self.mock_client.invoke.return_value = json.dumps([
+            {"category": "style", "line_start": 1, "message": "Unused import", "issue_type": "unused import", "severity": "critical"},
+            {"category": "bug", "line_start": 2, "message": "'name' is undefined"},
+            {"category": "security", "line_start": 2, "message": "SQL injection", "issue_type": "SQLInjection", "severity": "high",
+             "suggestion": "Use a parameterized query.", "cwe_id": "CWE-89"},
+            {"category": "performance", "line_start": 2, "message": "String concatenation", "issue_type": "StringBuilding", "severity": "critical",
+             "suggestion": "Use a template."},
+            {"category": "docs", "line_start": 1, "message": "Unknown category"},
+        ])
+        tier1 = {"linters": {"python": [{"file_path": "app.py", "tool_name": "pylint", "rule_id": "W0611", "line_start": 1, "message_text": "unused-import"}]}}
+        findings = self.agent.review(files_data=[self.py_file], tier1_tool_results=tier1)
+
+        self.assertEqual(self.mock_client.invoke.call_count, 1)
+        request = self.mock_client.invoke.call_args.kwargs
+        self.assertEqual(request["model_name"], "combined-model")
+        self.assertIn("W0611", request["prompt"]) # Linter feedback của Tier 1
+        self.assertIn("`style`, `bug`, `security`, `performance`", request["prompt"])
+        self.assertEqual([(f["rule_id"], f["level"], f["tool_name"]) for f in findings], [
+            ("StyleGuardian.llm_style_unused_import", "error", "StyleGuardian"),
+            ("BugHunter.llm_bug_general_bug", "warning", "BugHunter"),
+            ("SecuriSense.llm_sec_sqlinjection", "error", "SecuriSense"),
+            ("OptiTune.llm_opt_stringbuilding", "note", "OptiTune"),
+        ])
+        self.assertEqual(findings[2]["suggestion"], "Use a parameterized query.")
+        self.assertEqual((findings[3]["suggestion"], findings[3]["estimated_impact"]), ("Use a template.", "significant"))
+
+    def test_categories_follow_the_specialists_languages(self):
+        ruby_file = ChangedFile(path="app.rb", content="puts 1", language="ruby")
+        self.assertEqual(self.agent._categories_for(ruby_file), ["bug", "security"])
+        finding = self.agent._format_llm_finding(ruby_file, {"category": "style", "line_start": 1, "message": "Style", "severity": "low"})
+        self.assertIsNone(finding) # StyleGuardian không review Ruby
+        self.assertEqual(self.agent._get_relevant_files([ChangedFile(path="notes.md", content="", language="markdown")]), [])
+
+    def test_agent_mode_from_config_and_env(self):
+        self.mock_config.get_orchestration_setting.side_effect = lambda name, default=None: {"agent_mode": "combined"}.get(name, default)
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_AGENT_MODE", None)
+            self.assertEqual(get_agent_mode(self.mock_config), "combined")
+        with patch.dict(os.environ, {"NOVAGUARD_AGENT_MODE": "specialists"}):
+            self.assertEqual(get_agent_mode(self.mock_config), "specialists")
+        self.mock_config.get_orchestration_setting.side_effect = lambda name, default=None: {"agent_mode": "solo"}.get(name, default)
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_AGENT_MODE", None)
+            with self.assertLogs("src.agents.combined_review_agent", level="WARNING"):
+                self.assertEqual(get_agent_mode(self.mock_config), "specialists")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# NOVAGUARD-AI/tests/agents/test_finding_schema.py
+
+import sys
+import unittest
+from pathlib import Path
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.agents.finding_schema import (
+    BugFinding, CombinedFinding, MetaReviewFinding, SecurityFinding,
+    findings_response_schema, structured_output_instructions, validate_findings,
+)
+
+
+class TestFindingSchema(unittest.TestCase):
+
+    def test_response_schema_wraps_a_list_of_findings(self):
+        schema = findings_response_schema(BugFinding)
+        self.assertEqual(schema["required"], ["findings"])
+        items = schema["properties"]["findings"]["items"]
+        self.assertFalse(items["additionalProperties"])
+        # Field bắt buộc và field có default khác None là required để model luôn điền
+        self.assertEqual(set(items["required"]), {"line_start", "message", "bug_type", "severity"})
+        self.assertEqual(items["properties"]["line_start"]["type"], "integer")
+        self.assertEqual(items["properties"]["severity"]["enum"], ["critical", "high", "medium", "low"])
+        # Optional[X] rút về X, không còn title/default/anyOf
+        self.assertEqual(items["properties"]["line_end"], {"type": "integer", "description": "Line number where the issue ends."})
+        self.assertEqual(items["properties"]["explanation_steps"]["items"], {"type": "string"})
+
+    def test_instructions_list_every_key(self):
+        instructions = structured_output_instructions(SecurityFinding)
+        self.assertIn('"findings"', instructions)
+        self.assertIn('- "line_start" (integer):', instructions)
+        self.assertIn('- "cwe_id" (string, optional):', instructions)
+        self.assertIn("One of: critical, high, medium, low.", instructions)
+
+    def test_validation_coerces_defaults_and_skips_invalid_items(self):
+        items = [
+            {"line_start": "12", "message": "Off by one", "line_end": None, "extra_key": 1},
+            {"line_start": "twelve", "message": "Bad line"},
+            {"message": "No line"},
+            {"line_start": 7},
+            "not an object",
+        ]
+        findings = validate_findings(items, BugFinding, "test")
+        self.assertEqual(findings, [
+            {"line_start": 12, "message": "Off by one", "bug_type": "general_bug", "severity": "medium", "extra_key": 1},
+            # line_start / message thiếu: dùng giá trị fallback thay vì loại finding
+            {"line_start": 1, "message": "No line", "bug_type": "general_bug", "severity": "medium"},
+            {"line_start": 7, "message": "", "bug_type": "general_bug", "severity": "medium"},
+        ])
+
+    def test_meta_review_finding_accepts_message_text(self):
+        findings = validate_findings([{"file_path": "a.py", "line_start": 3, "message_text": "Merged"}], MetaReviewFinding, "meta")
+        self.assertEqual(findings[0]["message"], "Merged")
+        self.assertEqual((findings[0]["rule_id"], findings[0]["level"]), ("meta.refined", "note"))
+        self.assertEqual(validate_findings([{"line_start": 3, "message": "No path"}], MetaReviewFinding, "meta"), [])
+
+    def test_combined_finding_requires_a_known_category(self):
+        items = [
+            {"category": "Optimization", "line_start": 4, "message": "Quadratic loop"},
+            {"category": "docs", "line_start": 5, "message": "Unknown category"},
+            {"line_start": 6, "message": "No category"},
+        ]
+        findings = validate_findings(items, CombinedFinding, "combined")
+        self.assertEqual([(f["category"], f["severity"], f["issue_type"]) for f in findings], [("performance", "medium", "general")])
+        self.assertEqual(findings_response_schema(CombinedFinding)["properties"]["findings"]["items"]["properties"]["category"]["enum"],
+                         ["style", "bug", "security", "performance"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# NOVAGUARD-AI/tests/core/ollama_stand_in.py
+"""Stand-in Ollama server shared by the balancer and warm-up tests."""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.core.ollama_http import close_ollama_http_client
+
+
+class StandInOllamaHandler(BaseHTTPRequestHandler):
+    """Minimal stand-in for an Ollama host: /api/tags, /api/ps and /api/chat.
+
+    A chat request with no messages only preloads the model, like Ollama does. Models that
+    were not pulled answer 404; a `broken` server answers every request with an error.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, data) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.server.broken:
+            self._send_json(503, {"error": "unavailable"})
+        elif self.path == "/api/tags" and not self.server.tags_broken:
+            self._send_json(200, {"models": [{"name": name, "digest": f"sha-{name}"} for name in self.server.models]})
+        elif self.path == "/api/ps":
+            self._send_json(200, {"models": [{"name": name} for name in self.server.loaded]})
+        else:
+            self._send_json(500, {"error": "unavailable"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.chat_requests.append(body)
+        self.server.chat_count += 1
+        if self.server.broken:
+            self._send_json(500, {"error": "model runner crashed"})
+            return
+        if body["model"] not in self.server.models:
+            self._send_json(404, {"error": f"model '{body['model']}' not found"})
+            return
+        time.sleep(self.server.delay)
+        self.server.loaded.add(body["model"])
+        if not body.get("messages"):
+            # messages rỗng: Ollama chỉ load model, không sinh token
+            self._send_json(200, {"model": body["model"], "message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "load"})
+            return
+        self._send_json(200, {"message": {"role": "assistant", "content": f"[\"{self.server.name}\"]"}, "done": True}) # Một dòng NDJSON duy nhất
+
+
+def start_server(models, name: str = "stand-in", loaded=(), delay: float = 0.0, tags_broken: bool = False) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInOllamaHandler)
+    server.daemon_threads = True
+    server.name, server.models, server.loaded = name, set(models), set(loaded)
+    server.delay, server.broken, server.tags_broken = delay, False, tags_broken
+    server.chat_count, server.chat_requests = 0, []
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    return server
+
+
+def stop_server(server: ThreadingHTTPServer) -> None:
+    """Stops the server and closes the pooled client connections that still point at it."""
+    server.shutdown()
+    server.server_close()
+    close_ollama_http_client(server_url(server))
+
+
+def server_url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}"
@@ -216,6 +216,96 @@ class TestConfigLoader(unittest.TestCase):
         self.assertEqual(config.models_config_full, {}) # hoặc giá trị mặc định nếu có merge
         self.assertIsNone(config.get_model_for_agent("AnyAgent"))
 
+    def test_orchestration_settings_mode_overrides_top_level(self):
+        """Kiểm tra section `orchestration` của mode ghi đè giá trị top-level."""
+        models_data = {
+            "default_active_mode": "test",
+            "orchestration": {"parallel_agents": False, "other_setting": 1},
+            "modes": {
+                "production": {"agents": {"StyleGuardian": "prod_model"}},
+                "test": {"agents": {"StyleGuardian": "test_model"}, "orchestration": {"parallel_agents": True}}
+            }
+        }
+        self._write_yaml(self.default_config_path / "models.yml", models_data)
+        config = load_config(self.default_config_path, None, "url", self.workspace_path)
+
+        self.assertTrue(config.get_orchestration_setting("parallel_agents"))
+        self.assertEqual(config.get_orchestration_setting("other_setting"), 1)
+        self.assertEqual(config.get_orchestration_setting("missing", "fallback"), "fallback")
+
+    def test_llm_cache_settings_mode_overrides_top_level(self):
+        """Kiểm tra section `llm_cache` của mode ghi đè giá trị top-level."""
+        models_data = {
+            "default_active_mode": "test",
+            "llm_cache": {"enabled": True, "path": "cache.sqlite"},
+            "modes": {"test": {"agents": {"StyleGuardian": "test_model"}, "llm_cache": {"enabled": False}}}
+        }
+        self._write_yaml(self.default_config_path / "models.yml", models_data)
+        config = load_config(self.default_config_path, None, "url", self.workspace_path)
+
+        self.assertFalse(config.get_llm_cache_setting("enabled"))
+        self.assertEqual(config.get_llm_cache_setting("path"), "cache.sqlite")
+        self.assertEqual(config.get_llm_cache_setting("max_size_mb", 256), 256)
+
+    def test_context_window_settings_mode_overrides_top_level(self):
+        models_data = {
+            "default_active_mode": "test",
+            "context_window": {"buckets": [2048, 4096], "models": {"codellama": {"max_tokens": 16384}}},
+            "modes": {"test": {"agents": {}, "context_window": {"enabled": False}}}
+        }
+        self._write_yaml(self.default_config_path / "models.yml", models_data)
+        config = load_config(self.default_config_path, None, "url", self.workspace_path)
+
+        self.assertFalse(config.get_context_window_setting("enabled"))
+        self.assertEqual(config.get_context_window_setting("buckets"), [2048, 4096])
+        self.assertEqual(config.get_context_window_setting("models"), {"codellama": {"max_tokens": 16384}})
+
+    def test_generation_options_merge_defaults_agent_and_mode(self):
+        models_data = {
+            "default_active_mode": "test",
+            "generation": {"defaults": {"num_predict": 2048, "early_stop_json": True}, "agents": {"MetaReviewer": {"num_predict": 4096}}},
+            "modes": {"test": {"agents": {}, "generation": {"defaults": {"num_predict": 512}, "agents": {"BugHunter": {"temperature": 0.0, "stop": ["```"]}}}}}
+        }
+        self._write_yaml(self.default_config_path / "models.yml", models_data)
+        config = load_config(self.default_config_path, None, "url", self.workspace_path)
+
+        self.assertEqual(config.get_generation_options("StyleGuardian"), {"num_predict": 512, "early_stop_json": True})
+        self.assertEqual(config.get_generation_options("MetaReviewer"), {"num_predict": 4096, "early_stop_json": True})
+        self.assertEqual(config.get_generation_options("BugHunter"), {"num_predict": 512, "early_stop_json": True, "temperature": 0.0, "stop": ["```"]})
+
+    def test_tool_resource_limits_defaults_and_per_tool_override(self):
+        """`resource_limits` cấp cao nhất của tools.yml là mặc định, không phải một category tool."""
+        self._write_yaml(self.default_config_path / "models.yml", {"default_active_mode": "test", "modes": {"test": {}}})
+        tools_data = {
+            "resource_limits": {"cpu_seconds": 600, "memory_mb": 4096},
+            "sast": {"semgrep": {"command": "semgrep", "resource_limits": {"memory_mb": 8192}}, "plain": "tool {file_path}"},
+        }
+        self._write_yaml(self.default_config_path / "tools.yml", tools_data)
+        config = load_config(self.default_config_path, None, "url", self.workspace_path)
+
+        self.assertEqual(list(config.tools_config), ["sast"])
+        self.assertEqual(config.get_tool_resource_limits("sast", "semgrep"), {"cpu_seconds": 600, "memory_mb": 8192})
+        self.assertEqual(config.get_tool_resource_limits("sast", "plain"), {"cpu_seconds": 600, "memory_mb": 4096})
+
+    def test_ollama_endpoints_from_input_and_models_yml(self):
+        """Kiểm tra danh sách Ollama endpoint gộp từ input và section `ollama` (bỏ trùng, giữ thứ tự)."""
+        models_data = {
+            "default_active_mode": "test",
+            "ollama": {"endpoints": ["http://gpu-2:11434", "http://gpu-1:11434/"], "failure_threshold": 3},
+            "modes": {"test": {"agents": {"StyleGuardian": "test_model"}}}
+        }
+        self._write_yaml(self.default_config_path / "models.yml", models_data)
+        config = load_config(
+            self.default_config_path, None, "http://gpu-1:11434, http://gpu-3:11434", self.workspace_path,
+            ollama_endpoints=["http://gpu-3:11434", "http://gpu-4:11434"]
+        )
+
+        self.assertEqual(config.ollama_base_url, "http://gpu-1:11434")
+        self.assertEqual(config.ollama_endpoints, [
+            "http://gpu-1:11434", "http://gpu-3:11434", "http://gpu-4:11434", "http://gpu-2:11434",
+        ])
+        self.assertEqual(config.get_ollama_setting("failure_threshold"), 3)
+
     def test_empty_prompts_dir(self):
         """Kiểm tra trường hợp thư mục prompts rỗng."""
         # Thư mục prompts đã được tạo trong setUp, nhưng không có file nào trong đó.
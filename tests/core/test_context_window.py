@@ -0,0 +1,120 @@
+# NOVAGUARD-AI/tests/core/test_context_window.py
+
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.shared_context import ChangedFile
+from src.core.diff_parser import parse_unified_diff
+from src.core.context_window import (
+    ContextWindowManager, ContextWindowSettings, TokenEstimator, PR_DESCRIPTION_OMITTED, TRUNCATED_CODE_NOTE,
+    reset_context_window_state,
+)
+
+
+def _render(variables):
+    """Template nhỏ giống các prompt của agent: ví dụ few-shot, PR description và code."""
+    examples = "EXAMPLES " * 300 if variables.get("include_examples", True) else ""
+    return f"{examples}\nPR: {variables['pr_description']}\nNOTE: {variables['code_scope_note']}\nCODE:\n{variables['file_content']}"
+
+
+class TestContextWindowManager(unittest.TestCase):
+
+    def setUp(self):
+        reset_context_window_state()
+        self.addCleanup(reset_context_window_state)
+        # 1 token = 4 ký tự, không có margin, để con số dễ kiểm tra
+        self.settings = ContextWindowSettings(
+            buckets=[1024, 2048, 4096, 8192], default_chars_per_token=4.0, safety_margin=1.0,
+            output_reserve_tokens=256, models={"small": {"max_tokens": 2048}, "small:tiny": {"max_tokens": 1024}},
+        )
+
+    def test_settings_from_config_ignore_invalid_values(self):
+        config = MagicMock(spec=Config)
+        values = {"buckets": [8192, 2048, 0], "sticky": "yes", "default_chars_per_token": 3}
+        config.get_context_window_setting.side_effect = lambda name, default=None: values.get(name, default)
+        settings = ContextWindowSettings.from_config(config)
+        self.assertEqual(settings.buckets, [2048, 8192])
+        self.assertTrue(settings.sticky)
+        self.assertEqual(settings.default_chars_per_token, 3)
+
+    def test_smallest_bucket_capped_at_model_maximum(self):
+        manager = ContextWindowManager(self.settings.model_copy(update={"sticky": False}), TokenEstimator())
+        self.assertEqual(manager.select_num_ctx("big", 500), 1024)
+        self.assertEqual(manager.select_num_ctx("big", 3000), 4096)
+        self.assertEqual(manager.select_num_ctx("small:7b", 3000), 2048) # max_tokens của "small"
+        self.assertEqual(manager.max_tokens("small:tiny-q4"), 1024) # Tiền tố dài nhất thắng
+        self.assertEqual(manager.max_tokens("other"), 8192)
+
+    def test_sticky_num_ctx_never_shrinks_for_a_model(self):
+        manager = ContextWindowManager(self.settings, TokenEstimator())
+        self.assertEqual(manager.select_num_ctx("big", 500), 1024)
+        self.assertEqual(manager.select_num_ctx("big", 3000), 4096)
+        self.assertEqual(manager.select_num_ctx("big", 500), 4096)
+        self.assertEqual(manager.select_num_ctx("other", 500), 1024)
+
+    def test_estimator_calibrates_and_ignores_prompt_cache_hits(self):
+        estimator = TokenEstimator()
+        self.assertEqual(estimator.estimate("m", 1200, configured=3.0), 400)
+        self.assertTrue(estimator.observe("m", 1000, 250, configured=3.0))
+        self.assertFalse(estimator.observe("m", 5000, 40, configured=3.0)) # Chỉ đếm token mới (cache hit)
+        self.assertFalse(estimator.observe("m", 50, 20, configured=3.0)) # Prompt quá ngắn
+        self.assertEqual(estimator.chars_per_token("m"), 4.0)
+        self.assertEqual(estimator.estimate("m", 1200, configured=3.0, safety_margin=1.1), 330)
+
+    def test_prompt_that_fits_is_unchanged(self):
+        manager = ContextWindowManager(self.settings, TokenEstimator())
+        variables = {"pr_description": "Adds X", "code_scope_note": "", "file_content": "x = 1"}
+        fitted = manager.fit_prompt("big", _render, variables, "system")
+        self.assertEqual(fitted.prompt, _render(variables))
+        self.assertEqual(fitted.dropped, [])
+        self.assertEqual(fitted.num_ctx, 1024)
+
+    def test_reductions_applied_in_priority_order(self):
+        manager = ContextWindowManager(self.settings, TokenEstimator())
+        content = "\n".join(f"value_{n} = compute({n})" for n in range(1, 601))
+        hunks = parse_unified_diff("diff --git a/f.py b/f.py\n--- a/f.py\n+++ b/f.py\n@@ -300 +300 @@\n-old\n+value_300 = compute(300)\n")["f.py"]
+        file_data = ChangedFile(path="f.py", content=content, language="python", diff_hunks=hunks)
+        variables = {"pr_description": "Long description " * 50, "code_scope_note": "", "file_content": content}
+
+        with self.assertLogs("src.core.context_window", level="WARNING") as logs:
+            fitted = manager.fit_prompt("small", _render, variables, "system", file_data=file_data, label=" of Test for f.py")
+
+        self.assertTrue(fitted.fits)
+        self.assertEqual([step.split(" (")[0] for step in fitted.dropped], ["few-shot examples", "PR description", "distant code"])
+        self.assertNotIn("EXAMPLES", fitted.prompt)
+        self.assertIn(PR_DESCRIPTION_OMITTED, fitted.prompt)
+        self.assertIn(TRUNCATED_CODE_NOTE, fitted.prompt)
+        self.assertIn("300 +| value_300 = compute(300)", fitted.prompt)
+        self.assertNotIn("value_1 = compute(1)\n", fitted.prompt)
+        self.assertLessEqual(fitted.estimated_tokens, 2048 - 256)
+        self.assertEqual(fitted.num_ctx, 2048)
+        self.assertIn("dropped: few-shot examples, PR description, distant code", logs.output[0])
+
+    def test_stops_at_first_sufficient_reduction(self):
+        manager = ContextWindowManager(self.settings, TokenEstimator())
+        variables = {"pr_description": "Adds X", "code_scope_note": "", "file_content": "x = 1\n" * 200}
+        fitted = manager.fit_prompt("small:tiny", _render, variables)
+        self.assertEqual(fitted.dropped, ["few-shot examples"])
+        self.assertIn("Adds X", fitted.prompt)
+
+    def test_prompt_that_cannot_fit_is_sent_with_warning(self):
+        manager = ContextWindowManager(self.settings, TokenEstimator())
+        variables = {"pr_description": "Not available", "code_scope_note": "", "file_content": "x" * 20000}
+        with self.assertLogs("src.core.context_window", level="WARNING") as logs:
+            fitted = manager.fit_prompt("small:tiny", _render, {**variables, "include_examples": False})
+        self.assertFalse(fitted.fits)
+        self.assertEqual(fitted.num_ctx, 1024)
+        self.assertIn("Ollama will truncate it", logs.output[-1])
+        self.assertIsNone(manager.fit_prompt("small", lambda variables: None, variables))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+# NOVAGUARD-AI/tests/core/test_diff_parser.py
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.shared_context import ChangedFile
+from src.core.diff_parser import (
+    parse_unified_diff, parse_raw_diff_status, build_hunk_excerpt, build_focused_excerpt, get_review_scope, get_hunk_context_lines,
+    REVIEW_SCOPE_FULL, REVIEW_SCOPE_HUNKS
+)
+
+SAMPLE_DIFF = """diff --git a/app/main.py b/app/main.py
+index 1111111..2222222 100644
+--- a/app/main.py
++++ b/app/main.py
+@@ -2,3 +2,4 @@ def main():
+ a = 1
+-b = 2
++b = 3
++c = 4
+ d = 5
+@@ -10 +11,0 @@ def helper():
+--- old comment
+diff --git a/old_name.py b/new_name.py
+similarity index 90%
+rename from old_name.py
+rename to new_name.py
+--- a/old_name.py
++++ b/new_name.py
+@@ -1 +1 @@
+-x = 1
++x = 2
+\\ No newline at end of file
+diff --git a/gone.py b/gone.py
+deleted file mode 100644
+--- a/gone.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-print(1)
+-
+diff --git a/logo.png b/logo.png
+index 3333333..4444444 100644
+Binary files a/logo.png and b/logo.png differ
+"""
+
+
+class TestParseUnifiedDiff(unittest.TestCase):
+
+    def test_files_hunks_and_line_map(self):
+        parsed = parse_unified_diff(SAMPLE_DIFF)
+        self.assertEqual(list(parsed.keys()), ["app/main.py", "new_name.py", "gone.py", "logo.png"])
+        first, second = parsed["app/main.py"]
+        self.assertEqual((first.old_start, first.old_count, first.new_start, first.new_count), (2, 3, 2, 4))
+        self.assertEqual(first.section_header, "def main():")
+        self.assertEqual(first.line_map, [(2, 2), (3, None), (None, 3), (None, 4), (4, 5)])
+        self.assertEqual(first.added_lines, [3, 4])
+        self.assertEqual(first.removed_lines, [3])
+        # Dòng bị xóa trông giống header "---" vẫn thuộc hunk
+        self.assertEqual(second.lines, ["--- old comment"])
+        self.assertEqual(second.removed_lines, [10])
+        self.assertEqual(second.to_text(), "@@ -10,1 +11,0 @@ def helper():\n--- old comment")
+
+    def test_rename_delete_and_binary(self):
+        parsed = parse_unified_diff(SAMPLE_DIFF)
+        self.assertEqual(parsed["new_name.py"][0].line_map, [(1, None), (None, 1)])
+        self.assertEqual(parsed["gone.py"][0].removed_lines, [1, 2])
+        self.assertEqual(parsed["logo.png"], [])
+        self.assertEqual(parse_unified_diff(""), {})
+
+
+class TestParseRawDiffStatus(unittest.TestCase):
+
+    def test_status_letters_paths_and_blobs(self):
+        blob_a, blob_b, null = "a" * 40, "b" * 40, "0" * 40
+        statuses = parse_raw_diff_status(
+            f":100644 100644 {blob_a} {blob_b} M\tsrc/app.py\n"
+            f":100644 100644 {blob_a} {blob_a} R100\told.py\tnew.py\n"
+            f":100644 000000 {blob_a} {null} D\tgone.py\n"
+            f":000000 120000 {null} {blob_b} A\tlink\n"
+            "diff --git a/src/app.py b/src/app.py\n"
+        )
+        self.assertEqual([(s.path, s.change_type) for s in statuses], [
+            ("src/app.py", "modified"), ("new.py", "renamed"), ("gone.py", "deleted"), ("link", "added"),
+        ])
+        self.assertEqual((statuses[1].old_path, statuses[1].similarity), ("old.py", 100))
+        self.assertIsNone(statuses[2].new_blob)
+        self.assertEqual([s.is_regular_file for s in statuses], [True, True, False, False])
+
+
+class TestBuildHunkExcerpt(unittest.TestCase):
+
+    def test_excerpt_keeps_real_line_numbers(self):
+        content = "\n".join(f"line {i}" for i in range(1, 21))
+        hunks = parse_unified_diff(
+            "diff --git a/f.py b/f.py\n--- a/f.py\n+++ b/f.py\n"
+            "@@ -4,3 +4,3 @@\n line 4\n-old 5\n+line 5\n line 6\n"
+            "@@ -15,2 +15,2 @@\n line 15\n-old 16\n+line 16\n"
+        )["f.py"]
+        self.assertEqual(build_hunk_excerpt(content, hunks).splitlines(), [
+            "..   ... (lines 1-3 unchanged, omitted)",
+            " 4  | line 4",
+            " 5 +| line 5",
+            " 6  | line 6",
+            "..   ... (lines 7-14 unchanged, omitted)",
+            "15  | line 15",
+            "16 +| line 16",
+            "..   ... (lines 17-20 unchanged, omitted)",
+        ])
+
+    def test_no_hunks_means_no_excerpt(self):
+        self.assertIsNone(build_hunk_excerpt("x = 1", None))
+        self.assertIsNone(build_hunk_excerpt("x = 1", []))
+
+
+class TestFocusedExcerpt(unittest.TestCase):
+
+    def test_keeps_lines_nearest_to_changes_within_budget(self):
+        content = "\n".join(f"line{n:02d}" for n in range(1, 41))
+        hunks = parse_unified_diff("diff --git a/f.py b/f.py\n--- a/f.py\n+++ b/f.py\n@@ -20 +20 @@\n-old\n+line20\n")["f.py"]
+        excerpt, omitted = build_focused_excerpt(content, hunks, max_chars=300)
+
+        kept = [int(line.split()[0]) for line in excerpt.splitlines() if not line.startswith(".")]
+        self.assertEqual(kept, list(range(kept[0], kept[-1] + 1))) # Một vùng liền quanh dòng 20
+        self.assertIn(20, kept)
+        self.assertLessEqual(abs((20 - kept[0]) - (kept[-1] - 20)), 1)
+        self.assertEqual(omitted, 40 - len(kept))
+        self.assertIn("20 +| line20", excerpt)
+        self.assertTrue(excerpt.startswith("..   ... (lines 1-"))
+        self.assertLessEqual(len(excerpt), 300)
+
+    def test_without_hunks_keeps_start_of_file(self):
+        excerpt, omitted = build_focused_excerpt("a\nb\nc\nd", None, max_chars=80)
+        self.assertTrue(excerpt.startswith("1  | a"))
+        self.assertGreater(omitted, 0)
+        self.assertEqual(build_focused_excerpt("a\nb", None, max_chars=1000), ("1  | a\n2  | b", 0))
+
+
+class TestReviewScopeSettings(unittest.TestCase):
+
+    def _config(self, **orchestration) -> Config:
+        return Config(ollama_base_url="http://localhost:11434", models_config={"orchestration": orchestration},
+                      tools_config={}, prompt_templates={}, active_mode="production")
+
+    def test_scope_from_config_and_env(self):
+        self.assertEqual(get_review_scope(self._config()), REVIEW_SCOPE_FULL)
+        self.assertEqual(get_review_scope(self._config(review_scope="hunks")), REVIEW_SCOPE_HUNKS)
+        self.assertEqual(get_review_scope(self._config(review_scope="bogus")), REVIEW_SCOPE_FULL)
+        with patch.dict(os.environ, {"NOVAGUARD_REVIEW_SCOPE": "hunks"}):
+            self.assertEqual(get_review_scope(self._config(review_scope="full")), REVIEW_SCOPE_HUNKS)
+
+    def test_hunk_context_lines(self):
+        self.assertEqual(get_hunk_context_lines(self._config()), 10)
+        self.assertEqual(get_hunk_context_lines(self._config(hunk_context_lines=3)), 3)
+        self.assertEqual(get_hunk_context_lines(self._config(hunk_context_lines="x")), 10)
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class TestGetChangedFilesWithHunks(unittest.TestCase):
+
+    def _git(self, *args: str) -> str:
+        return subprocess.run(["git", *args], cwd=self.repo, check=True, capture_output=True, text=True).stdout.strip()
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir_manager.name)
+        self._git("init", "-q")
+        self._git("config", "user.email", "test@example.com")
+        self._git("config", "user.name", "Test")
+        (self.repo / "big.py").write_text("\n".join(f"v{i} = {i}" for i in range(1, 101)) + "\n")
+        (self.repo / "gone.py").write_text("print(1)\n")
+        (self.repo / "old_name.py").write_text("\n".join(f"keep_{i} = {i}" for i in range(20)) + "\n")
+        self._git("add", "-A"); self._git("commit", "-q", "-m", "base")
+        self.base_sha = self._git("rev-parse", "HEAD")
+        lines = (self.repo / "big.py").read_text().splitlines()
+        lines[49] = "v50 = 'changed'"
+        (self.repo / "big.py").write_text("\n".join(lines) + "\n")
+        (self.repo / "gone.py").unlink()
+        self._git("mv", "old_name.py", "new_name.py")
+        self._git("add", "-A"); self._git("commit", "-q", "-m", "head")
+        self.head_sha = self._git("rev-parse", "HEAD")
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_single_diff_call_populates_hunks(self):
+        from src.action_entrypoint import get_changed_files
+        real_run = subprocess.run
+        # Bỏ qua `git config --global --add safe.directory` để test không sửa gitconfig của máy
+        def _run(command, *args, **kwargs):
+            return MagicMock(returncode=0) if "--global" in command else real_run(command, *args, **kwargs)
+        with patch("src.action_entrypoint.subprocess.run", side_effect=_run) as mock_run:
+            changed_files = get_changed_files(self.repo, self.head_sha, self.base_sha, context_lines=2)
+        diff_calls = [c for c in mock_run.call_args_list if "diff" in c.args[0]]
+        self.assertEqual(len(diff_calls), 1)
+        self.assertIn("-U2", diff_calls[0].args[0])
+
+        # gone.py đã bị xóa; new_name.py chỉ đổi tên nên được đánh dấu để bỏ qua
+        self.assertEqual([(f.path, f.change_type) for f in changed_files], [("big.py", "modified"), ("new_name.py", "renamed")])
+        self.assertTrue(changed_files[1].is_pure_rename)
+        self.assertEqual(changed_files[1].old_path, "old_name.py")
+        big_file: ChangedFile = changed_files[0]
+        self.assertEqual(len(big_file.diff_hunks), 1)
+        self.assertEqual(big_file.diff_hunks[0].added_lines, [50])
+        excerpt = build_hunk_excerpt(big_file.content, big_file.diff_hunks)
+        self.assertIn("50 +| v50 = 'changed'", excerpt)
+        self.assertLess(len(excerpt) * 5, len(big_file.content))
+
+
+if __name__ == '__main__':
+    unittest.main()
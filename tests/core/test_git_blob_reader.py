@@ -0,0 +1,56 @@
+# NOVAGUARD-AI/tests/core/test_git_blob_reader.py
+
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+from pathlib import Path
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.git_blob_reader import GitBlobReader
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class TestGitBlobReader(unittest.TestCase):
+
+    def _git(self, *args: str) -> str:
+        return subprocess.run(["git", *args], cwd=self.repo, check=True, capture_output=True, text=True).stdout.strip()
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.repo = Path(self.temp_dir_manager.name)
+        self._git("init", "-q")
+        self._git("config", "user.email", "test@example.com")
+        self._git("config", "user.name", "Test")
+        (self.repo / "big.py").write_text("\n".join(f"v{i} = {i}" for i in range(1, 101)) + "\n")
+        (self.repo / "gone.py").write_text("print(1)\n")
+        self._git("add", "-A"); self._git("commit", "-q", "-m", "base")
+        self.base_sha = self._git("rev-parse", "HEAD")
+        lines = (self.repo / "big.py").read_text().splitlines()
+        lines[49] = "v50 = 'changed'"
+        (self.repo / "big.py").write_text("\n".join(lines) + "\n")
+        (self.repo / "gone.py").unlink()
+        self._git("add", "-A"); self._git("commit", "-q", "-m", "head")
+        self.head_sha = self._git("rev-parse", "HEAD")
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_blob_reader_streams_many_objects_through_one_process(self):
+        names = [f"{self.head_sha}:big.py", f"{self.base_sha}:gone.py", f"{self.head_sha}:gone.py"] * 500
+        with GitBlobReader(self.repo) as reader:
+            blobs = reader.read_blobs(names)
+            self.assertEqual(reader.read_blobs([f"{self.base_sha}:big.py"])[f"{self.base_sha}:big.py"].splitlines()[49], b"v50 = 50")
+        self.assertEqual(len(blobs), 3)
+        self.assertIn(b"v50 = 'changed'", blobs[f"{self.head_sha}:big.py"])
+        self.assertEqual(blobs[f"{self.base_sha}:gone.py"], b"print(1)\n")
+        self.assertIsNone(blobs[f"{self.head_sha}:gone.py"])
+
+
+if __name__ == '__main__':
+    unittest.main()
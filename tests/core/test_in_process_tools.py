@@ -0,0 +1,101 @@
+# NOVAGUARD-AI/tests/core/test_in_process_tools.py
+
+import sys
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+from unittest.mock import patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.in_process_tools import (
+    run_in_process_tool, get_in_process_tool_version, InProcessToolUnavailable
+)
+from src.core.tool_runner import ToolRunner, ToolExecutionError
+
+PYLINT_INSTALLED = importlib.util.find_spec("pylint") is not None
+BANDIT_INSTALLED = importlib.util.find_spec("bandit") is not None
+
+
+class MockConfig:
+    def __init__(self, tools_cfg):
+        self.tools_config = tools_cfg
+
+    def get_tool_command_template(self, tool_category, tool_key):
+        tool_cfg = self.tools_config.get(tool_category, {}).get(tool_key)
+        return tool_cfg.get("command") if isinstance(tool_cfg, dict) else tool_cfg
+
+    def get_tool_config(self, tool_category, tool_key):
+        return self.tools_config.get(tool_category, {}).get(tool_key)
+
+    def get_tool_resource_limits(self, tool_category, tool_key):
+        return {}
+
+
+class TestInProcessTools(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.workspace_path = Path(self.temp_dir_manager.name).resolve()
+        (self.workspace_path / "pkg").mkdir()
+        (self.workspace_path / "pkg" / "a.py").write_text("import os\n")
+        (self.workspace_path / "pkg" / "b.py").write_text('"""Doc."""\nimport subprocess\nsubprocess.call("ls", shell=True)\n')
+        self.tools_config = {"linters": {"python": {
+            "target_type": "batch", "in_process": "pylint", "in_process_args": ["--rcfile={project_root}/.pylintrc"],
+            "command": "pylint --output-format=json {file_paths}",
+        }}}
+        self.runner = ToolRunner(MockConfig(self.tools_config), self.workspace_path)
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_unknown_tool_is_unavailable(self):
+        with self.assertRaises(InProcessToolUnavailable):
+            run_in_process_tool("no-such-tool", [])
+        self.assertIsNone(get_in_process_tool_version("no-such-tool"))
+
+    @unittest.skipUnless(PYLINT_INSTALLED, "pylint is not installed")
+    @patch("src.core.tool_runner.run_tool_process")
+    def test_pylint_batch_runs_in_process_with_json_shape(self, mock_subprocess_run):
+        result = self.runner.run_batch("linters", "python", ["pkg/a.py", "pkg/b.py"], jobs=0)
+
+        mock_subprocess_run.assert_not_called()
+        symbols = {f["symbol"] for f in result["pkg/a.py"]}
+        self.assertIn("unused-import", symbols)
+        finding = result["pkg/a.py"][0]
+        for key in ("type", "module", "obj", "line", "column", "path", "symbol", "message", "message-id"):
+            self.assertIn(key, finding) # Giống `pylint --output-format=json`
+        self.assertEqual(finding["file_path"], "pkg/a.py")
+        self.assertNotIn("unused-import", {f["symbol"] for f in result["pkg/b.py"]})
+        self.assertFalse(any(self.runner.tool_output_dir.iterdir())) # Không có file tạm
+
+    @unittest.skipUnless(PYLINT_INSTALLED, "pylint is not installed")
+    def test_pylint_invalid_option_raises_tool_execution_error(self):
+        self.tools_config["linters"]["python"]["in_process_args"] = ["--no-such-option"]
+        with self.assertRaises(ToolExecutionError):
+            self.runner.run("linters", "python", "pkg/a.py", expect_json_output=True)
+
+    @unittest.skipUnless(BANDIT_INSTALLED, "bandit is not installed")
+    def test_bandit_returns_json_results_shape(self):
+        findings = run_in_process_tool("bandit", [self.workspace_path / "pkg" / "b.py"])
+        self.assertTrue(any(f["test_id"] == "B602" and f["line_number"] == 3 for f in findings))
+
+    @patch("src.core.tool_runner.run_in_process_tool", side_effect=InProcessToolUnavailable("pylint is not importable"))
+    @patch("src.core.tool_runner.run_tool_process")
+    def test_falls_back_to_command_when_unavailable(self, mock_subprocess_run, _mock_in_process):
+        mock_subprocess_run.return_value.stdout = '[{"path": "pkg/a.py", "line": 1, "symbol": "unused-import"}]'
+        mock_subprocess_run.return_value.stderr = ""
+        mock_subprocess_run.return_value.returncode = 4
+        result = self.runner.run_batch("linters", "python", ["pkg/a.py"])
+
+        mock_subprocess_run.assert_called_once()
+        self.assertEqual(mock_subprocess_run.call_args.args[0][0], "pylint")
+        self.assertEqual(result["pkg/a.py"][0]["symbol"], "unused-import")
+
+
+if __name__ == '__main__':
+    unittest.main()
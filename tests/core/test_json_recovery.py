@@ -0,0 +1,82 @@
+# NOVAGUARD-AI/tests/core/test_json_recovery.py
+
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.json_recovery import (
+    JsonRepairSettings, acquire_json_repair, build_json_repair_prompt, is_cut_off_json,
+    recover_json, reset_json_repair_state,
+)
+
+
+class TestRecoverJson(unittest.TestCase):
+
+    def test_fenced_block_with_surrounding_prose(self):
+        recovered = recover_json('Sure! Here are the findings:\n```json\n[{"line_start": 1, "message": "a"}]\n```\nLet me know.')
+        self.assertEqual(recovered.value, [{"line_start": 1, "message": "a"}])
+        self.assertFalse(recovered.truncated)
+        self.assertEqual(recovered.repairs, ["extracted the JSON from a code fence"])
+
+    def test_trailing_commas_single_quotes_and_python_literals(self):
+        recovered = recover_json("{'findings': [{'line_start': 2, 'message': 'it\\'s \"odd\"', 'fixed': False},],}")
+        self.assertEqual(recovered.value, {"findings": [{"line_start": 2, "message": 'it\'s "odd"', "fixed": False}]})
+        self.assertEqual(recovered.repairs, ["replaced single quotes with double quotes", "replaced Python literals", "removed trailing commas"])
+        # Dấu phẩy và nháy bên trong chuỗi không bị đổi
+        self.assertEqual(recover_json('[{"message": "a, ] b \'c\'"},]').value, [{"message": "a, ] b 'c'"}])
+
+    def test_complete_items_of_a_cut_off_list_are_salvaged(self):
+        recovered = recover_json('{"findings": [{"line_start": 1, "message": "a"}, {"line_start": 2, "message": "b"}, {"line_start": 3, "mess')
+        self.assertEqual(recovered.value, {"findings": [{"line_start": 1, "message": "a"}, {"line_start": 2, "message": "b"}]})
+        self.assertTrue(recovered.truncated)
+        self.assertIn("cut off", recovered.repairs[-1])
+        self.assertTrue(is_cut_off_json("```json\n[{'a': 1}, {'b"))
+
+    def test_items_before_a_syntax_error_are_salvaged(self):
+        recovered = recover_json('[{"line_start": 1, "message": "a"} {"line_start": 2, "message": "b"}]')
+        self.assertEqual(recovered.value, [{"line_start": 1, "message": "a"}])
+        self.assertTrue(recovered.truncated)
+        self.assertFalse(is_cut_off_json('[{"line_start": 1, "message": "a"} {"line_start": 2, "message": "b"}]'))
+
+    def test_nothing_usable(self):
+        for text in ("No issues found.", '[{"line_start": 1 "message": "a"}]', "{broken", ""):
+            self.assertIsNone(recover_json(text), text)
+
+    def test_repair_prompt_names_the_error(self):
+        prompt = build_json_repair_prompt('  [{"line_start": 1 "message": "a"}]  ')
+        self.assertIn("Expecting ',' delimiter at line 1 column 19", prompt)
+        self.assertTrue(prompt.endswith('[{"line_start": 1 "message": "a"}]'))
+
+
+class TestJsonRepairBudget(unittest.TestCase):
+
+    def setUp(self):
+        reset_json_repair_state()
+        self.addCleanup(reset_json_repair_state)
+
+    def test_budget_is_shared_by_the_run(self):
+        settings = JsonRepairSettings(max_repairs_per_run=2)
+        self.assertEqual([acquire_json_repair(settings) for _ in range(3)], [True, True, False])
+        reset_json_repair_state()
+        self.assertFalse(acquire_json_repair(JsonRepairSettings(enabled=False)))
+
+    def test_settings_from_config(self):
+        config = Config(
+            ollama_base_url="http://localhost:11434", tools_config={}, prompt_templates={}, active_mode="test",
+            models_config={"json_repair": {"max_repairs_per_run": 5, "max_response_chars": "big"}, "modes": {"test": {"json_repair": {"enabled": False}}}},
+        )
+        settings = JsonRepairSettings.from_config(config)
+        self.assertEqual((settings.enabled, settings.max_repairs_per_run, settings.max_response_chars), (False, 5, 12000))
+        # Config giả (MagicMock) dùng giá trị mặc định
+        self.assertTrue(JsonRepairSettings.from_config(MagicMock(spec=Config)).enabled)
+
+
+if __name__ == '__main__':
+    unittest.main()
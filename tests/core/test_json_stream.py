@@ -0,0 +1,188 @@
+# NOVAGUARD-AI/tests/core/test_json_stream.py
+
+import io
+import json
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.json_stream import iter_json_items, parse_item_path, StreamedJsonOutput, JSONStreamError, JsonCompletionDetector, JsonListStreamParser
+
+
+class TrackingStream(io.StringIO):
+    """StringIO that records how many characters have been read."""
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.chars_read = getattr(self, "chars_read", 0) + len(chunk)
+        return chunk
+
+
+class TestIterJsonItems(unittest.TestCase):
+
+    def test_yields_results_items_after_skipping_other_members(self):
+        document = {"version": "1.2.3", "paths": {"scanned": [f"f{i}.py" for i in range(200)]}, "results": [{"id": 1}, {"id": 2.5, "s": "a,]}"}, 12345, None], "errors": []}
+        for chunk_size in (3, 7, 64 * 1024): # Chunk rất nhỏ: giá trị và số bị cắt giữa các lần đọc
+            items = list(iter_json_items(io.StringIO(json.dumps(document)), ["results"], chunk_size=chunk_size))
+            self.assertEqual(items, document["results"], chunk_size)
+
+    def test_top_level_array_and_nested_path(self):
+        self.assertEqual(list(iter_json_items(io.StringIO('[{"code": "F401"}, 1]'), [])), [{"code": "F401"}, 1])
+        self.assertEqual(list(iter_json_items(io.StringIO('[1, 2]'), ["results"])), [1, 2])
+        self.assertEqual(list(iter_json_items(io.StringIO('{"a": {"x": 0, "b": [true]}}'), ["a", "b"])), [True])
+
+    def test_missing_member_and_empty_input_yield_nothing(self):
+        self.assertEqual(list(iter_json_items(io.StringIO('{"errors": [1]}'), ["results"])), [])
+        self.assertEqual(list(iter_json_items(io.StringIO('  \n'), ["results"])), [])
+        self.assertEqual(list(iter_json_items(io.StringIO('{"results": []}'), ["results"])), [])
+
+    def test_stops_reading_at_end_of_array(self):
+        tail = json.dumps({"errors": ["x" * 1000] * 1000})
+        stream = TrackingStream('{"results": [1, 2]' + ", " + tail[1:])
+        self.assertEqual(list(iter_json_items(stream, ["results"], chunk_size=1024)), [1, 2])
+        self.assertLess(stream.chars_read, 4096)
+
+    def test_malformed_json_raises_after_valid_items(self):
+        items = []
+        with self.assertRaises(JSONStreamError):
+            for item in iter_json_items(io.StringIO('{"results": [{"a": 1}, {"a": 2}, {"a": '), ["results"], chunk_size=4):
+                items.append(item)
+        self.assertEqual(items, [{"a": 1}, {"a": 2}])
+        with self.assertRaises(JSONStreamError):
+            list(iter_json_items(io.StringIO('{"results": {"a": 1}}'), ["results"]))
+        with self.assertRaises(JSONStreamError):
+            list(iter_json_items(io.StringIO('{"a": 1}'), []))
+
+    def test_parse_item_path(self):
+        self.assertEqual(parse_item_path(None), ["results"])
+        self.assertEqual(parse_item_path(""), [])
+        self.assertEqual(parse_item_path("a.b"), ["a", "b"])
+
+
+class TestJsonCompletionDetector(unittest.TestCase):
+
+    def test_reports_end_of_top_level_value_across_pieces(self):
+        detector = JsonCompletionDetector()
+        pieces = ["  \n[", '{"msg": "a ] } [ \\"q\\" "', ', "n": [1, {"x": 2}]}', "]\n\n", "   "]
+        self.assertEqual([detector.feed(piece) for piece in pieces[:3]], [None, None, None])
+        self.assertEqual(detector.feed(pieces[3]), 1)
+        self.assertEqual(json.loads("".join(pieces[:3]) + pieces[3][:1]), [{"msg": 'a ] } [ "q" ', "n": [1, {"x": 2}]}])
+
+    def test_object_and_non_json_output(self):
+        self.assertEqual(JsonCompletionDetector().feed('{"findings": []} trailing'), 16)
+        prose = JsonCompletionDetector()
+        self.assertIsNone(prose.feed("Here are the findings: ["))
+        self.assertIsNone(prose.feed("]"))
+
+
+class TestJsonListStreamParser(unittest.TestCase):
+
+    @staticmethod
+    def _feed(parser: JsonListStreamParser, text: str, size: int = 3) -> str:
+        """Feeds `text` in small pieces; returns what was kept before the parser asked to stop."""
+        for start in range(0, len(text), size):
+            end = parser.feed(text[start:start + size])
+            if end is not None:
+                return text[:start + end]
+        return text
+
+    def test_decodes_each_item_as_it_closes_and_stops_at_the_end(self):
+        parser = JsonListStreamParser()
+        self.assertIsNone(parser.feed('[{"m": "a ]} b"}, {"n": [1,'))
+        self.assertEqual(parser.items, [{"m": "a ]} b"}]) # Item đã đóng được decode ngay
+        parser.reset()
+        kept = self._feed(parser, '[{"m": "a ]} b"}, {"n": [1, 2]}, "s", 3]\n\n\n   ')
+        self.assertEqual(kept, '[{"m": "a ]} b"}, {"n": [1, 2]}, "s", 3]')
+        self.assertEqual(parser.items, [{"m": "a ]} b"}, {"n": [1, 2]}, "s", 3])
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.document, [{"m": "a ]} b"}, {"n": [1, 2]}, "s", 3])
+
+    def test_list_nested_under_a_known_key(self):
+        parser = JsonListStreamParser(list_keys=("findings",))
+        self._feed(parser, '{"summary": "x", "findings": [{"a": 1}, {"b": {"c": []}}], "n": 2}')
+        self.assertEqual(parser.items, [{"a": 1}, {"b": {"c": []}}])
+        self.assertEqual(parser.document["n"], 2)
+        single = JsonListStreamParser()
+        self._feed(single, '{"line_start": 3, "message": "m"}')
+        self.assertTrue(single.complete)
+        self.assertFalse(single.list_found)
+
+    def test_stops_as_soon_as_output_cannot_be_valid_json(self):
+        cases = {
+            "Here are the bugs: [": "H",
+            '[{"a": 1} {"b": 2}]': '[{"a": 1} {',
+            '[{"a": 1}, {"b": 2]': '[{"a": 1}, {"b": 2]',
+            '[{"a": 1},]': '[{"a": 1},]',
+            '[{"a": tru}, {"b": 2}]': '[{"a": tru}',
+        }
+        for text, expected_kept in cases.items():
+            parser = JsonListStreamParser()
+            self.assertEqual(self._feed(parser, text, size=1), expected_kept, text)
+            self.assertIsNotNone(parser.error, text)
+        self.assertEqual(parser.items, [])
+
+    def test_code_fence_and_small_item_errors_do_not_stop_the_generation(self):
+        parser = JsonListStreamParser()
+        self._feed(parser, "```json\n[{'a': 1}, {\"b\": [2,],}, {\"c\": True}]\n```")
+        self.assertEqual(parser.items, [{"a": 1}, {"b": [2]}, {"c": True}])
+        self.assertIsNone(parser.error)
+        self.assertTrue(parser.complete)
+        self.assertEqual(parser.document, parser.items)
+
+    def test_max_items_caps_the_generation(self):
+        parser = JsonListStreamParser(max_items=2)
+        self.assertEqual(self._feed(parser, '[{"a": 1}, {"b": 2}, {"c": 3}]'), '[{"a": 1}, {"b": 2}')
+        self.assertTrue(parser.capped)
+        self.assertIn("limit", parser.stop_reason)
+
+    def test_reset_for_a_retry_does_not_keep_items_twice(self):
+        parser = JsonListStreamParser()
+        parser.feed('[{"a": 1}, {"b"')
+        parser.reset()
+        self._feed(parser, '[{"a": 1}, {"b": 2}]')
+        self.assertEqual(parser.items, [{"a": 1}, {"b": 2}])
+
+
+class TestStreamedJsonOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.output_path = Path(self.temp_dir_manager.name) / "tool.output"
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_iterates_once_then_deletes_file_and_reports_items(self):
+        self.output_path.write_text(json.dumps({"results": [{"id": 1}, {"id": 2}]}))
+        output = StreamedJsonOutput(self.output_path, ["results"], "sast.semgrep")
+        completed = []
+        output.on_complete(completed.append)
+        self.assertEqual(output.peek_first_char(), "{")
+        self.assertEqual(list(output), [{"id": 1}, {"id": 2}])
+        self.assertFalse(self.output_path.exists())
+        self.assertEqual(completed, [[{"id": 1}, {"id": 2}]])
+        self.assertEqual(output.wrap(completed[0]), {"results": [{"id": 1}, {"id": 2}]})
+        self.assertEqual(list(output), []) # Chỉ đọc được một lần
+
+    def test_no_completion_callback_on_error_or_early_close(self):
+        self.output_path.write_text('{"results": [{"id": 1}, oops]}')
+        output = StreamedJsonOutput(self.output_path, ["results"], "sast.semgrep")
+        completed = []
+        output.on_complete(completed.append)
+        with self.assertRaises(JSONStreamError):
+            list(output)
+        self.assertEqual(completed, [])
+        self.assertFalse(self.output_path.exists())
+
+        self.output_path.write_text('[1]')
+        StreamedJsonOutput(self.output_path, [], "linters.ruff").close()
+        self.assertFalse(self.output_path.exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+# NOVAGUARD-AI/tests/core/test_llm_cache.py
+
+import os
+import sys
+import time
+import threading
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.llm_cache import LLMResponseCache, get_llm_response_cache
+from src.core.ollama_client import OllamaClientWrapper
+from src.core.ollama_balancer import OllamaEndpointBalancer
+from src.core.json_stream import JsonListStreamParser
+
+
+def _key(prompt: str = "review this", **overrides) -> str:
+    params = dict(
+        model_name="coder:7b", model_digest="sha256:abc", system_message_content="You are a reviewer.",
+        prompt=prompt, temperature=0.2, is_json_mode=True, options={"num_ctx": 8192},
+    )
+    params.update(overrides)
+    return LLMResponseCache.make_key(**params)
+
+
+class TestLLMResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.cache_path = Path(self.temp_dir_manager.name) / "cache" / "llm.sqlite"
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_key_depends_on_every_request_field(self):
+        base = _key()
+        self.assertEqual(base, _key())
+        for overrides in [
+            {"model_name": "coder:14b"}, {"model_digest": "sha256:def"}, {"system_message_content": "Other"},
+            {"prompt": "review that"}, {"temperature": 0.3}, {"is_json_mode": False}, {"options": {"num_ctx": 4096}},
+        ]:
+            self.assertNotEqual(base, _key(**overrides), f"Key should change for {overrides}")
+
+    def test_hit_miss_counters_and_persistence(self):
+        cache = LLMResponseCache(self.cache_path)
+        self.assertIsNone(cache.get(_key()))
+        cache.put(_key(), "coder:7b", "[]")
+        self.assertEqual(cache.get(_key()), "[]")
+        self.assertEqual((cache.hits, cache.misses, cache.stores), (1, 1, 1))
+        cache.close()
+
+        reopened = LLMResponseCache(self.cache_path)
+        self.assertEqual(reopened.get(_key()), "[]")
+        self.assertEqual(reopened.stats()["entries"], 1)
+        reopened.close()
+
+    def test_entries_older_than_max_age_are_dropped(self):
+        cache = LLMResponseCache(self.cache_path, max_age_seconds=60)
+        with patch("src.core.llm_cache.time.time", return_value=time.time() - 120):
+            cache.put(_key(), "coder:7b", "old")
+        self.assertIsNone(cache.get(_key()))
+        self.assertEqual(cache.stats()["entries"], 0)
+        cache.close()
+
+    def test_size_limit_evicts_least_recently_used(self):
+        cache = LLMResponseCache(self.cache_path, max_size_bytes=25)
+        cache.put(_key("a"), "coder:7b", "a" * 10)
+        time.sleep(0.01)
+        cache.put(_key("b"), "coder:7b", "b" * 10)
+        time.sleep(0.01)
+        self.assertIsNotNone(cache.get(_key("a"))) # "a" vừa được dùng, "b" thành LRU
+        time.sleep(0.01)
+        cache.put(_key("c"), "coder:7b", "c" * 10)
+        self.assertIsNotNone(cache.get(_key("a")))
+        self.assertIsNone(cache.get(_key("b")))
+        self.assertIsNotNone(cache.get(_key("c")))
+        self.assertEqual(cache.evictions, 1)
+        cache.close()
+
+    def test_bypass_skips_lookup_but_still_stores(self):
+        cache = LLMResponseCache(self.cache_path, bypass=True)
+        cache.put(_key(), "coder:7b", "fresh")
+        self.assertIsNone(cache.get(_key()))
+        cache.bypass = False
+        self.assertEqual(cache.get(_key()), "fresh")
+        cache.close()
+
+    def test_get_llm_response_cache_from_config(self):
+        mock_config = MagicMock(spec=Config)
+        settings = {"enabled": True, "path": str(self.cache_path), "max_size_mb": 1}
+        mock_config.get_llm_cache_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_LLM_CACHE_PATH", None)
+            os.environ["NOVAGUARD_LLM_CACHE_BYPASS"] = "true"
+            cache = get_llm_response_cache(mock_config)
+            self.assertIsNotNone(cache)
+            self.assertIs(get_llm_response_cache(mock_config), cache) # Dùng chung trong process
+            self.assertTrue(cache.bypass)
+            self.assertEqual(cache.max_size_bytes, 1024 * 1024)
+
+        settings["enabled"] = False
+        self.assertIsNone(get_llm_response_cache(mock_config))
+        # Giá trị không phải bool (vd. MagicMock) -> không bật cache
+        self.assertIsNone(get_llm_response_cache(MagicMock(spec=Config)))
+
+
+class TestOllamaClientWrapperCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.cache = LLMResponseCache(Path(self.temp_dir_manager.name) / "llm.sqlite")
+
+    def tearDown(self):
+        self.cache.close()
+        self.temp_dir_manager.cleanup()
+
+    def _make_client(self, mock_chat_ollama_cls) -> OllamaClientWrapper:
+        mock_chat_ollama_cls.return_value.invoke.return_value = MagicMock(content='[{"line_start": 1}]')
+        client = OllamaClientWrapper(base_url="http://mock-ollama:11434", response_cache=self.cache, backend="langchain")
+        client.get_model_digest = MagicMock(return_value="sha256:abc")
+        return client
+
+    @patch("src.core.ollama_client.ChatOllama")
+    def test_invoke_returns_cached_response_without_calling_ollama(self, MockChatOllama):
+        client = self._make_client(MockChatOllama)
+        first = client.invoke(model_name="coder:7b", prompt="p", system_message_content="s", is_json_mode=True, temperature=0.2, keep_alive="10m")
+        second = client.invoke(model_name="coder:7b", prompt="p", system_message_content="s", is_json_mode=True, temperature=0.2, keep_alive="1m")
+        self.assertEqual(first, second)
+        self.assertEqual(MockChatOllama.return_value.invoke.call_count, 1) # keep_alive không thuộc cache key
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+        client.invoke(model_name="coder:7b", prompt="p", system_message_content="s", is_json_mode=True, temperature=0.3)
+        self.assertEqual(MockChatOllama.return_value.invoke.call_count, 2)
+
+    @patch("src.core.ollama_client.ChatOllama")
+    async def test_ainvoke_shares_cache_with_invoke(self, MockChatOllama):
+        client = self._make_client(MockChatOllama)
+        client.invoke(model_name="coder:7b", prompt="p", is_json_mode=True)
+        result = await client.ainvoke(model_name="coder:7b", prompt="p", is_json_mode=True)
+        self.assertEqual(result, '[{"line_start": 1}]')
+        MockChatOllama.return_value.ainvoke.assert_not_called()
+
+    @patch("src.core.ollama_client.ChatOllama")
+    async def test_ainvoke_reads_and_writes_cache_off_the_event_loop(self, MockChatOllama):
+        client = self._make_client(MockChatOllama)
+        MockChatOllama.return_value.ainvoke = AsyncMock(return_value=MagicMock(content="[]"))
+        cache_threads = []
+        original_get, original_put = self.cache.get, self.cache.put
+        def tracked_get(key):
+            cache_threads.append(threading.get_ident())
+            return original_get(key)
+        def tracked_put(*args):
+            cache_threads.append(threading.get_ident())
+            return original_put(*args)
+        with patch.object(self.cache, "get", side_effect=tracked_get), patch.object(self.cache, "put", side_effect=tracked_put):
+            await client.ainvoke(model_name="coder:7b", prompt="p", is_json_mode=True)
+        self.assertEqual(len(cache_threads), 2)
+        self.assertNotIn(threading.get_ident(), cache_threads) # SQLite I/O không chạy trên thread của event loop
+
+    @patch("src.core.ollama_client.ChatOllama")
+    async def test_response_capped_at_max_findings_is_not_cached(self, MockChatOllama):
+        client = self._make_client(MockChatOllama)
+        chunks = [MagicMock(content=piece) for piece in ('[{"line_start": 1},', ' {"line_start": 2}]')]
+        MockChatOllama.return_value.stream.return_value = iter(chunks)
+        async def astream(messages):
+            for chunk in chunks:
+                yield chunk
+        MockChatOllama.return_value.astream = astream
+
+        capped = JsonListStreamParser(max_items=1)
+        client.invoke(model_name="coder:7b", prompt="p", is_json_mode=True, stream_monitor=capped)
+        await client.ainvoke(model_name="coder:7b", prompt="p", is_json_mode=True, stream_monitor=JsonListStreamParser(max_items=1))
+        self.assertTrue(capped.capped)
+        # Response bị cắt ở max_findings không được lưu: request không giới hạn vẫn gọi Ollama
+        self.assertEqual(self.cache.misses, 2)
+        client.invoke(model_name="coder:7b", prompt="p", is_json_mode=True)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 3))
+        MockChatOllama.return_value.invoke.assert_called_once()
+
+    def test_model_digest_covers_every_balanced_endpoint(self):
+        balancer = OllamaEndpointBalancer(["http://a:11434", "http://b:11434"], health_check_interval=0)
+        client = OllamaClientWrapper(base_url="http://a:11434", backend="langchain", balancer=balancer)
+        digests_by_url = {"http://a:11434": {"coder:7b": "sha-a"}, "http://b:11434": {"coder:7b": "sha-b"}}
+        with patch("src.core.ollama_client.fetch_model_digests", side_effect=lambda url: digests_by_url[url]):
+            self.assertEqual(client.get_model_digest("coder:7b"), "sha-a,sha-b")
+            digests_by_url["http://b:11434"] = {"coder:7b": "sha-a"}
+            self.assertEqual(client.get_model_digest("coder:7b"), "sha-a")
+            self.assertIsNone(client.get_model_digest("other:1b"))
+
+
+if __name__ == '__main__':
+    unittest.main()
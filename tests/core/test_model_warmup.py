@@ -0,0 +1,110 @@
+# NOVAGUARD-AI/tests/core/test_model_warmup.py
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core import ollama_client
+from src.core.context_window import ContextWindowManager, reset_context_window_state
+from src.core.model_warmup import ModelWarmup, ModelWarmupSettings, start_model_warmup
+from tests.core.ollama_stand_in import start_server, stop_server, server_url
+
+
+def _config(base_url: str, warmup=None, generation=None) -> Config:
+    models_config = {
+        "ollama": {"warmup": warmup or {}},
+        "generation": generation or {},
+        "modes": {"test": {
+            "agents": {"StyleGuardian": "coder:7b", "BugHunter": "coder:7b", "SecuriSense": "sec:13b"},
+            "tasks": {"summarize": "coder:7b"},
+        }},
+    }
+    return Config(ollama_base_url=base_url, models_config=models_config, tools_config={}, prompt_templates={}, active_mode="test")
+
+
+class TestModelWarmup(unittest.TestCase):
+
+    def setUp(self):
+        reset_context_window_state()
+        ollama_client._model_digests.clear()
+        self.server = start_server(models={"coder:7b"})
+
+    def tearDown(self):
+        stop_server(self.server)
+        ollama_client._model_digests.clear()
+        reset_context_window_state()
+
+    def test_active_models_are_unique_and_list_their_users(self):
+        config = _config(server_url(self.server))
+        self.assertEqual(config.get_active_models(), {"coder:7b": ["StyleGuardian", "BugHunter", "summarize"], "sec:13b": ["SecuriSense"]})
+
+    def test_preloads_present_models_and_reports_missing_ones(self):
+        config = _config(server_url(self.server), warmup={"keep_alive": "20m"}, generation={"defaults": {"num_thread": 8, "num_predict": 512}})
+        warmup = ModelWarmup(config).start()
+        self.assertTrue(warmup.wait(timeout=10))
+
+        # Chỉ model có trong /api/tags được load; model thiếu không tốn một request load
+        self.assertEqual(len(self.server.chat_requests), 1)
+        request = self.server.chat_requests[0]
+        self.assertEqual(request["model"], "coder:7b")
+        self.assertEqual(request["messages"], [])
+        self.assertEqual(request["keep_alive"], "20m")
+        # Chỉ option load-time, num_ctx làm tròn lên bucket
+        self.assertEqual(request["options"], {"num_thread": 8, "num_ctx": 4096})
+
+        results = {r.model_name: r for r in warmup.results}
+        self.assertTrue(results["coder:7b"].loaded)
+        self.assertFalse(results["sec:13b"].present)
+        messages = warmup.missing_model_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertIn("ollama pull sec:13b", messages[0])
+        # /api/tags đã được cache cho digest của LLM cache
+        self.assertEqual(ollama_client.fetch_model_digests(server_url(self.server))["coder:7b"], "sha-coder:7b")
+
+    def test_preloaded_num_ctx_becomes_the_sticky_floor(self):
+        config = _config(server_url(self.server))
+        warmup = ModelWarmup(config).start()
+        self.assertTrue(warmup.wait(timeout=10))
+        # Prompt nhỏ vẫn dùng num_ctx đã load, không làm Ollama load lại model
+        self.assertEqual(ContextWindowManager.from_config(config).select_num_ctx("coder:7b", 10, 100), 4096)
+
+    def test_missing_model_detected_by_preload_when_tags_unavailable(self):
+        self.server.tags_broken = True
+        warmup = ModelWarmup(_config(server_url(self.server))).start()
+        self.assertTrue(warmup.wait(timeout=10))
+        self.assertEqual({r.model_name: r.present for r in warmup.results}, {"coder:7b": True, "sec:13b": False})
+        self.assertEqual(len(self.server.chat_requests), 2)
+
+    def test_checks_only_the_given_models_and_preloads_the_subset(self):
+        self.server.models.add("other:3b")
+        models = {"coder:7b": ["StyleGuardian"], "other:3b": ["BugHunter"]}
+        warmup = start_model_warmup(_config(server_url(self.server)), models=models, preload_models=["other:3b"])
+        self.assertTrue(warmup.wait(timeout=10))
+        # sec:13b không được lần chạy dùng nên không bị báo thiếu
+        self.assertEqual({r.model_name: r.loaded for r in warmup.results}, {"coder:7b": False, "other:3b": True})
+        self.assertEqual([request["model"] for request in self.server.chat_requests], ["other:3b"])
+        self.assertEqual(warmup.missing_model_messages(), [])
+
+    def test_disabled_by_config_or_environment(self):
+        self.assertIsNone(start_model_warmup(_config(server_url(self.server), warmup={"enabled": False})))
+        with patch.dict(os.environ, {"NOVAGUARD_MODEL_WARMUP": "false"}):
+            self.assertIsNone(start_model_warmup(_config(server_url(self.server))))
+        self.assertEqual(self.server.chat_requests, [])
+
+    def test_invalid_settings_are_ignored(self):
+        settings = ModelWarmupSettings.from_config(_config(server_url(self.server), warmup={"num_ctx": "big", "keep_alive": 300, "preload": False}))
+        self.assertEqual(settings.num_ctx, 4096)
+        self.assertEqual(settings.keep_alive, "300")
+        self.assertFalse(settings.preload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+# NOVAGUARD-AI/tests/core/test_ollama_balancer.py
+
+import sys
+import time
+import socket
+import asyncio
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.ollama_http import OllamaAPIError, get_ollama_http_client
+from src.core.ollama_client import OllamaClientWrapper
+from src.core.ollama_balancer import OllamaEndpointBalancer, get_ollama_endpoint_balancer, is_endpoint_failure
+from tests.core.ollama_stand_in import start_server, stop_server, server_url
+
+
+def _unused_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+class TestOllamaEndpointBalancer(unittest.TestCase):
+
+    def setUp(self):
+        self.server_a = start_server(name="a", models={"coder:7b", "small:1b"})
+        self.server_b = start_server(name="b", models={"coder:7b"}, loaded={"coder:7b"})
+        self.urls = [server_url(self.server_a), server_url(self.server_b)]
+
+    def tearDown(self):
+        for server in (self.server_a, self.server_b):
+            stop_server(server)
+
+    def _balancer(self, urls=None, **kwargs) -> OllamaEndpointBalancer:
+        params = dict(health_check_interval=0, failure_threshold=2, eject_seconds=60, model_load_penalty=2, probe_timeout=1)
+        params.update(kwargs)
+        return OllamaEndpointBalancer(urls or self.urls, **params)
+
+    def test_least_outstanding_routing_prefers_loaded_model(self):
+        balancer = self._balancer()
+        balancer.probe_all()
+        # b đã load coder:7b -> nhận request cho tới khi số request đang chạy vượt penalty
+        picks = [balancer.acquire("coder:7b").base_url for _ in range(5)]
+        self.assertEqual(picks[:3], [self.urls[1], self.urls[1], self.urls[0]])
+        self.assertEqual(sorted(picks), sorted([self.urls[0]] * 2 + [self.urls[1]] * 3))
+        # Chỉ a đã pull small:1b, dù a đang bận hơn
+        self.assertEqual(balancer.acquire("small:1b").base_url, self.urls[0])
+
+    def test_release_updates_outstanding_and_loaded_models(self):
+        balancer = self._balancer(model_load_penalty=0)
+        first = balancer.acquire("coder:7b")
+        second = balancer.acquire("coder:7b")
+        self.assertNotEqual(first.base_url, second.base_url)
+        balancer.release(first, "coder:7b")
+        self.assertEqual(first.outstanding, 0)
+        self.assertIn("coder:7b", first.loaded_models)
+        self.assertEqual(balancer.acquire("coder:7b").base_url, first.base_url)
+
+    def test_affinity_key_sticks_to_one_endpoint_while_eligible(self):
+        balancer = self._balancer(model_load_penalty=0)
+        first = balancer.acquire("coder:7b", affinity_key="coder:7b:a.py")
+        # Endpoint kia rảnh hơn nhưng request cùng prefix vẫn quay lại endpoint cũ (prompt cache)
+        self.assertEqual(balancer.acquire("coder:7b", affinity_key="coder:7b:a.py").base_url, first.base_url)
+        self.assertNotEqual(balancer.acquire("coder:7b").base_url, first.base_url)
+        for _ in range(2):
+            balancer.release(first, "coder:7b", error=ConnectionError("refused"))
+        self.assertFalse(first.healthy)
+        self.assertNotEqual(balancer.acquire("coder:7b", affinity_key="coder:7b:a.py").base_url, first.base_url)
+
+    def test_in_flight_limit_is_enforced_on_the_chosen_endpoint(self):
+        balancer = self._balancer(model_load_penalty=0, max_in_flight_per_endpoint=1)
+        first = balancer.acquire("coder:7b", affinity_key="coder:7b:a.py")
+        # Endpoint của affinity đã đầy -> request cùng prefix sang endpoint kia
+        second = balancer.acquire("coder:7b", affinity_key="coder:7b:a.py")
+        self.assertNotEqual(second.base_url, first.base_url)
+
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(balancer.acquire("coder:7b")))
+        waiter.start()
+        time.sleep(0.1)
+        self.assertEqual(acquired, []) # Cả hai endpoint đều đầy: chờ, không vượt giới hạn
+        balancer.release(first, "coder:7b")
+        waiter.join(timeout=2)
+        self.assertEqual([endpoint.base_url for endpoint in acquired], [first.base_url])
+        self.assertEqual([e.outstanding for e in balancer.endpoints], [1, 1])
+
+    def test_ejected_endpoint_does_not_raise_the_limit_of_the_others(self):
+        balancer = self._balancer(model_load_penalty=0, max_in_flight_per_endpoint=2, failure_threshold=1)
+        balancer.release(balancer.acquire("coder:7b"), "coder:7b", error=ConnectionError("refused"))
+        healthy = [e for e in balancer.endpoints if e.healthy]
+        self.assertEqual(len(healthy), 1)
+
+        async def run():
+            held = [await balancer.aacquire("coder:7b") for _ in range(2)]
+            third = asyncio.create_task(balancer.aacquire("coder:7b"))
+            await asyncio.sleep(0.1)
+            self.assertFalse(third.done()) # Endpoint còn lại đã có 2 request
+            self.assertEqual(healthy[0].outstanding, 2)
+            # Slot được trả từ một thread khác vẫn đánh thức coroutine đang chờ
+            threading.Thread(target=balancer.release, args=(held[0], "coder:7b")).start()
+            return held, await asyncio.wait_for(third, timeout=2)
+        held, third = asyncio.run(run())
+        self.assertEqual({e.base_url for e in held + [third]}, {healthy[0].base_url})
+        self.assertEqual(healthy[0].outstanding, 2)
+
+    def test_failing_endpoint_is_ejected_and_readmitted_by_probe(self):
+        balancer = self._balancer()
+        balancer.probe_all()
+        endpoint_a = balancer.endpoints[0]
+        for _ in range(2): # Chỉ a có small:1b
+            balancer.release(balancer.acquire("small:1b"), "small:1b", error=ConnectionError("refused"))
+        self.assertFalse(endpoint_a.healthy)
+        self.assertEqual({balancer.acquire("coder:7b").base_url for _ in range(3)}, {self.urls[1]})
+
+        self.assertTrue(balancer.probe(endpoint_a))
+        self.assertTrue(endpoint_a.healthy)
+        self.assertEqual(balancer.stats()[0]["failures"], 2)
+
+    def test_client_errors_do_not_eject(self):
+        self.assertFalse(is_endpoint_failure(OllamaAPIError("model 'x' not found", status_code=404)))
+        self.assertTrue(is_endpoint_failure(OllamaAPIError("crashed", status_code=500)))
+        self.assertTrue(is_endpoint_failure(ConnectionError("refused")))
+        self.assertFalse(is_endpoint_failure(ValueError("bad json")))
+
+    def test_failed_probe_ejects_and_ejected_endpoint_is_retried_after_timeout(self):
+        dead_url = _unused_url()
+        balancer = self._balancer(urls=[dead_url, self.urls[1]], eject_seconds=0.05)
+        self.assertFalse(balancer.probe(balancer.endpoints[0]))
+        self.assertEqual(balancer.acquire("coder:7b").base_url, self.urls[1])
+        time.sleep(0.06)
+        self.assertIn(dead_url, {balancer.acquire("coder:7b").base_url for _ in range(4)}) # Half-open sau eject_seconds
+
+    def test_background_health_checks_run_and_stop(self):
+        balancer = self._balancer(health_check_interval=0.05)
+        balancer.start_health_checks()
+        deadline = time.time() + 2
+        while balancer.endpoints[1].available_models is None and time.time() < deadline:
+            time.sleep(0.01)
+        balancer.stop()
+        self.assertEqual(balancer.endpoints[1].available_models, {"coder:7b"})
+
+    def test_wrapper_spreads_requests_and_fails_over(self):
+        self.server_a.delay = self.server_b.delay = 0.05
+        balancer = self._balancer(model_load_penalty=0, failure_threshold=1)
+        client = OllamaClientWrapper(base_url=self.urls[0], balancer=balancer)
+        self.assertEqual(client.endpoint_count, 2)
+
+        async def run_concurrently():
+            try:
+                return await asyncio.gather(*[client.ainvoke("coder:7b", f"p{i}") for i in range(4)])
+            finally:
+                for url in self.urls: # Đóng pool async trước khi event loop đóng
+                    await get_ollama_http_client(url).aclose()
+        answers = asyncio.run(run_concurrently())
+        self.assertEqual(sorted(answers), ['["a"]', '["a"]', '["b"]', '["b"]'])
+
+        self.server_b.broken = True
+        results = [client.invoke("coder:7b", "p") for _ in range(3)] # Lỗi 500 trên b -> thử lại trên a
+        self.assertEqual(results, ['["a"]'] * 3)
+        self.assertFalse(balancer.endpoints[1].healthy)
+
+
+class TestOllamaEndpointBalancerFactory(unittest.TestCase):
+
+    def test_single_endpoint_has_no_balancer_and_settings_are_read(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.ollama_endpoints = ["http://only:11434"]
+        self.assertIsNone(get_ollama_endpoint_balancer(mock_config))
+
+        settings = {"health_check_interval_seconds": 0, "failure_threshold": 3, "eject_seconds": 5}
+        mock_config.ollama_endpoints = ["http://one:11434", "http://two:11434"]
+        mock_config.get_ollama_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        mock_config.get_orchestration_setting.side_effect = lambda key, default=None: {"max_in_flight_per_endpoint": 3}.get(key, default)
+        balancer = get_ollama_endpoint_balancer(mock_config)
+        self.assertEqual(balancer.base_urls, ["http://one:11434", "http://two:11434"])
+        self.assertEqual((balancer.failure_threshold, balancer.eject_seconds, balancer.health_check_interval), (3, 5, 0))
+        self.assertEqual(balancer.max_in_flight_per_endpoint, 3)
+        self.assertIs(get_ollama_endpoint_balancer(mock_config), balancer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+# NOVAGUARD-AI/tests/core/test_ollama_http.py
+
+import sys
+import json
+import asyncio
+import threading
+import unittest
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Any
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.ollama_http import (
+    OllamaAPIError, OllamaHttpClient, build_chat_payload, iter_chat_content, get_ollama_http_client,
+)
+from src.core.ollama_client import OllamaClientWrapper
+from src.core.json_stream import JsonListStreamParser
+from src.core.context_window import reset_context_window_state, shared_token_estimator
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Stand-in for Ollama's /api/chat: streams the reply as NDJSON, one word per line."""
+    protocol_version = "HTTP/1.1" # Keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(body)
+        self.server.client_ports.add(self.client_address[1])
+        if body["model"] == "missing":
+            error = json.dumps({"error": "model 'missing' not found"}).encode()
+            self.send_response(404)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(error)))
+            self.end_headers()
+            self.wfile.write(error)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = ["[", '{"line_start": 1}', "]"]
+        if body["model"] == "runaway": # Model ở JSON mode sinh khoảng trắng mãi sau JSON
+            words = ["[", '{"msg": "]"}', "]\n"] + ["\n"] * 200
+        if body["model"] == "chatty": # Model trả lời bằng văn xuôi thay vì JSON
+            words = ["Sure", "!"] + [" Here is a long explanation."] * 200
+        lines = [{"message": {"role": "assistant", "content": word}, "done": False} for word in words]
+        if body["model"] == "broken":
+            lines.append({"error": "out of memory"})
+        lines.append({"message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop", "eval_count": 3, "eval_duration": 1000})
+        try:
+            for line in lines:
+                data = (json.dumps(line) + "\n").encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError): # Client đã đóng stream (dừng sinh sớm)
+            self.close_connection = True
+
+
+class TestOllamaHttpClient(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeOllamaHandler)
+        cls.server.daemon_threads = True
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.requests: List[Dict[str, Any]] = []
+        self.server.client_ports = set()
+
+    def test_build_chat_payload_splits_options(self):
+        payload = build_chat_payload(
+            "coder:7b", "review", system_message_content="sys", temperature=0.2, is_json_mode=True,
+            keep_alive="10m", num_ctx=8192, top_k=20, stop=["\n\n"], think=False,
+        )
+        self.assertEqual(payload["messages"], [{"role": "system", "content": "sys"}, {"role": "user", "content": "review"}])
+        self.assertEqual(payload["format"], "json")
+        self.assertEqual(payload["keep_alive"], "10m")
+        self.assertIs(payload["think"], False)
+        self.assertEqual(payload["options"], {"temperature": 0.2, "num_ctx": 8192, "top_k": 20, "stop": ["\n\n"]})
+        self.assertEqual(build_chat_payload("m", "p", is_json_mode=True, format={"type": "array"})["format"], {"type": "array"})
+
+    def test_iter_chat_content_stops_at_done_and_raises_on_error_line(self):
+        lines = ['{"message": {"content": "a"}, "done": false}', "", '{"message": {"content": "b"}, "done": true}', '{"message": {"content": "ignored"}}']
+        self.assertEqual(list(iter_chat_content(lines)), ["a", "b"])
+        with self.assertRaises(OllamaAPIError):
+            list(iter_chat_content(['{"error": "boom"}']))
+
+    def test_done_chunk_calibrates_token_estimator(self):
+        reset_context_window_state()
+        self.addCleanup(reset_context_window_state)
+        payload = build_chat_payload("coder:7b", "x" * 990, system_message_content="s" * 10)
+        lines = ['{"message": {"content": "[]"}, "done": true, "prompt_eval_count": 250}']
+        self.assertEqual(list(iter_chat_content(lines, payload)), ["[]"])
+        self.assertEqual(shared_token_estimator.chars_per_token("coder:7b"), 4.0)
+
+    def test_chat_streams_and_reuses_one_connection(self):
+        client = OllamaHttpClient(self.base_url)
+        pieces = list(client.stream_chat(build_chat_payload("coder:7b", "p", is_json_mode=True)))
+        self.assertEqual(pieces, ["[", '{"line_start": 1}', "]"])
+        for _ in range(3):
+            self.assertEqual(client.chat(build_chat_payload("coder:7b", "p")), '[{"line_start": 1}]')
+        client.close()
+        self.assertEqual(len(self.server.requests), 4)
+        self.assertTrue(all(request["stream"] for request in self.server.requests))
+        self.assertEqual(len(self.server.client_ports), 1) # Cùng một keep-alive connection
+
+    def test_http_and_stream_errors_raise_ollama_api_error(self):
+        client = OllamaHttpClient(self.base_url)
+        with self.assertRaises(OllamaAPIError) as ctx:
+            client.chat(build_chat_payload("missing", "p"))
+        self.assertEqual(ctx.exception.status_code, 404)
+        self.assertIn("not found", str(ctx.exception))
+        with self.assertRaisesRegex(OllamaAPIError, "out of memory"):
+            client.chat(build_chat_payload("broken", "p"))
+        client.close()
+
+    def test_achat_reuses_connection_within_event_loop(self):
+        client = OllamaHttpClient(self.base_url)
+        async def run():
+            return await asyncio.gather(*[client.achat(build_chat_payload("coder:7b", "p")) for _ in range(3)])
+        self.assertEqual(asyncio.run(run()), ['[{"line_start": 1}]'] * 3)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_get_ollama_http_client_is_shared_per_base_url(self):
+        self.assertIs(get_ollama_http_client(self.base_url), get_ollama_http_client(self.base_url + "/"))
+        self.assertIsNot(get_ollama_http_client(self.base_url), get_ollama_http_client("http://127.0.0.1:1"))
+
+    def test_wrapper_native_backend_invoke_and_ainvoke(self):
+        wrapper = OllamaClientWrapper(base_url=self.base_url)
+        self.assertEqual(wrapper.backend, "native")
+        result = wrapper.invoke("coder:7b", "p", system_message_content="s", is_json_mode=True, temperature=0.1, num_ctx=4096)
+        self.assertEqual(json.loads(result), [{"line_start": 1}])
+        self.assertEqual(asyncio.run(wrapper.ainvoke("coder:7b", "p")), result)
+        first_request = self.server.requests[0]
+        self.assertEqual(first_request["options"], {"temperature": 0.1, "num_ctx": 4096})
+        self.assertEqual(first_request["format"], "json")
+        self.assertEqual(first_request["keep_alive"], "5m")
+
+    def test_wrapper_early_stop_json_ends_generation_after_complete_list(self):
+        wrapper = OllamaClientWrapper(base_url=self.base_url)
+        self.assertEqual(wrapper.invoke("runaway", "p", is_json_mode=True, early_stop_json=True), '[{"msg": "]"}]')
+        self.assertEqual(asyncio.run(wrapper.ainvoke("runaway", "p", is_json_mode=True, early_stop_json=True)), '[{"msg": "]"}]')
+        self.assertNotIn("early_stop_json", self.server.requests[0]["options"])
+        self.assertEqual(wrapper.invoke("runaway", "p", is_json_mode=True).strip(), '[{"msg": "]"}]')
+        self.assertTrue(wrapper.invoke("runaway", "p", is_json_mode=True).endswith("\n" * 200))
+
+    def test_wrapper_stream_monitor_aborts_non_json_output(self):
+        wrapper = OllamaClientWrapper(base_url=self.base_url)
+        parser = JsonListStreamParser()
+        self.assertEqual(wrapper.invoke("chatty", "p", stream_monitor=parser), "S")
+        self.assertIsNotNone(parser.error)
+        parser = JsonListStreamParser()
+        self.assertEqual(asyncio.run(wrapper.ainvoke("runaway", "p", stream_monitor=parser)), '[{"msg": "]"}]')
+        self.assertEqual(parser.items, [{"msg": "]"}])
+
+    def test_wrapper_pins_releases_and_counts_model_switches(self):
+        wrapper = OllamaClientWrapper(base_url=self.base_url)
+        wrapper.pin_model("coder:7b")
+        wrapper.invoke("coder:7b", "p")
+        wrapper.invoke("coder:7b", "p")
+        wrapper.release_model("coder:7b")
+        wrapper.invoke("other:1b", "p", keep_alive="1m")
+        self.assertEqual(
+            [(r["model"], r.get("keep_alive"), len(r["messages"])) for r in self.server.requests],
+            [("coder:7b", "-1", 1), ("coder:7b", "-1", 1), ("coder:7b", 0, 0), ("other:1b", "1m", 1)]
+        )
+        self.assertEqual(wrapper.model_switches, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# NOVAGUARD-AI/tests/core/test_process_runner.py
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+from pathlib import Path
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.process_runner import run_tool_process, ToolResourceLimits, ToolProcessTimeout
+
+try:
+    import resource
+    PRLIMIT_AVAILABLE = hasattr(resource, "prlimit")
+except ImportError:
+    PRLIMIT_AVAILABLE = False
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@unittest.skipIf(sys.platform == "win32", "process groups and rusage are POSIX-only")
+class TestRunToolProcess(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.work_dir = Path(self.temp_dir_manager.name)
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def _python(self, code: str):
+        return [sys.executable, "-c", code]
+
+    def test_captures_output_and_reports_usage(self):
+        result = run_tool_process(self._python("import sys; print('out'); print('err', file=sys.stderr); sys.exit(3)"), self.work_dir, 30, tool_id="t.x", target="a.py")
+        self.assertEqual((result.returncode, result.stdout.strip(), result.stderr.strip()), (3, "out", "err"))
+        usage = result.usage
+        self.assertEqual((usage.tool_id, usage.target, usage.return_code), ("t.x", "a.py", 3))
+        self.assertIsNotNone(usage.user_cpu_seconds)
+        self.assertGreater(usage.max_rss_mb, 0)
+        self.assertIsNone(usage.limit_exceeded)
+
+    def test_stdout_path_receives_output(self):
+        stdout_path = self.work_dir / "out.json"
+        result = run_tool_process(self._python("print('[1]')"), self.work_dir, 30, stdout_path=stdout_path)
+        self.assertIsNone(result.stdout)
+        self.assertEqual(stdout_path.read_text().strip(), "[1]")
+
+    def test_timeout_kills_whole_process_group(self):
+        pid_file = self.work_dir / "child.pid"
+        command = ["sh", "-c", f"sleep 60 & echo $! > {pid_file}; sleep 60"]
+        start = time.monotonic()
+        with self.assertRaises(ToolProcessTimeout) as ctx:
+            run_tool_process(command, self.work_dir, 1)
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertTrue(ctx.exception.usage.timed_out)
+        background_pid = int(pid_file.read_text())
+        for _ in range(50): # Tiến trình con có thể cần chút thời gian để bị init thu hồi
+            if not _pid_alive(background_pid):
+                break
+            time.sleep(0.05)
+        self.assertFalse(_pid_alive(background_pid))
+
+    def test_output_caps(self):
+        limits = ToolResourceLimits(max_output_mb=1, max_stderr_kb=1)
+        result = run_tool_process(self._python("import sys; sys.stderr.write('e' * 5000); sys.stdout.write('x' * (3 * 1024 * 1024))"), self.work_dir, 30, limits)
+        self.assertLessEqual(len(result.stdout), 1024 * 1024)
+        self.assertEqual(len(result.stderr), 1024)
+        self.assertTrue(result.usage.stdout_truncated and result.usage.stderr_truncated)
+        self.assertEqual(result.usage.limit_exceeded, "max_output_mb")
+
+    @unittest.skipUnless(PRLIMIT_AVAILABLE, "resource.prlimit is not available")
+    def test_cpu_and_memory_limits(self):
+        result = run_tool_process(self._python("while True: pass"), self.work_dir, 30, ToolResourceLimits(cpu_seconds=1))
+        self.assertEqual(result.usage.limit_exceeded, "cpu_seconds")
+        result = run_tool_process(self._python("b = bytearray(1024 * 1024 * 1024)"), self.work_dir, 30, ToolResourceLimits(memory_mb=256))
+        self.assertNotEqual(result.returncode, 0)
+        self.assertEqual(result.usage.limit_exceeded, "memory_mb")
+
+    def test_limits_from_config(self):
+        limits = ToolResourceLimits.from_config({"cpu_seconds": 60, "memory_mb": 0, "max_output_mb": "big", "max_stderr_kb": -1})
+        self.assertEqual((limits.cpu_seconds, limits.memory_mb, limits.max_output_mb, limits.max_stderr_kb), (60, None, None, 256))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -260,6 +260,12 @@ class TestSarifGenerator(unittest.TestCase):
         self.assertEqual(notifications[0]["level"], "error")
         self.assertEqual(notifications[0]["message"]["text"], "A major error occurred")
 
+    def test_set_invocation_property(self):
+        usage = [{"tool_id": "linters.python", "wall_seconds": 0.2}]
+        self.generator.set_invocation_property("tier1ToolResourceUsage", usage)
+        invocation = self.generator.get_sarif_report()["runs"][0]["invocations"][0]
+        self.assertEqual(invocation["properties"], {"tier1ToolResourceUsage": usage})
+
     def test_empty_report_structure(self):
         """Test that an empty report (no findings) still has valid basic structure."""
         # setUp already creates a generator. Just get the report.
@@ -0,0 +1,106 @@
+# NOVAGUARD-AI/tests/core/test_tool_adapters.py
+
+import sys
+import unittest
+from pathlib import Path
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.tool_adapters import (
+    ToolOutputAdapter, get_tool_adapter, register_tool_adapter, TOOL_OUTPUT_ADAPTERS
+)
+
+NORMALIZED_KEYS = ("file_path", "line_start", "line_end", "col_start", "col_end", "rule_id", "level", "message_text", "code_snippet", "tool_name")
+
+
+def _adapt(adapter_name, output, tool_id="cat.tool", default_file_path=None):
+    return list(get_tool_adapter({"adapter": adapter_name}).adapt(output, tool_id, default_file_path))
+
+
+class TestToolAdapters(unittest.TestCase):
+
+    def assertNormalized(self, finding, **expected):
+        for key in NORMALIZED_KEYS:
+            self.assertIn(key, finding)
+        for key, value in expected.items():
+            self.assertEqual(finding[key], value, key)
+
+    def test_generic_keeps_existing_heuristics(self):
+        findings = _adapt(None, [{"line": 10, "symbol": "C0114", "message": "Missing docstring"}], "linters.python", "src/main.py")
+        self.assertNormalized(findings[0], file_path="src/main.py", line_start=10, rule_id="C0114", level="note", message_text="Missing docstring", tool_name="linters.python")
+        semgrep_like = {"results": [{"check_id": "X", "path": "a.py", "start": {"line": 3, "col": 2}, "extra": {"severity": "ERROR", "message": "m"}}]}
+        self.assertNormalized(_adapt("generic", semgrep_like)[0], file_path="a.py", line_start=3, col_start=2, rule_id="X", level="error", message_text="m")
+        self.assertNormalized(_adapt("generic", [{}], "cat.tool")[0], rule_id="tool.unknown", message_text="Message missing", line_start=1)
+
+    def test_pylint_maps_message_type_to_level(self):
+        output = [
+            {"type": "error", "line": 4, "column": 0, "endLine": 4, "endColumn": 9, "path": "/ws/a.py", "symbol": "undefined-variable", "message": "Undefined variable 'x'", "message-id": "E0602"},
+            {"type": "convention", "line": 1, "column": 0, "path": "/ws/a.py", "symbol": "missing-module-docstring", "message": "Missing module docstring", "message-id": "C0114"},
+        ]
+        findings = _adapt("pylint", output, "linters.pylint", "a.py")
+        self.assertNormalized(findings[0], file_path="a.py", line_start=4, line_end=4, col_start=0, col_end=9, rule_id="undefined-variable", level="error")
+        self.assertEqual(findings[1]["level"], "note")
+        self.assertEqual(findings[0]["message-id"], "E0602") # Giữ nguyên các key gốc
+
+    def test_semgrep(self):
+        output = {"results": [{"check_id": "py.eval", "path": "src/x.py", "start": {"line": 5, "col": 1}, "end": {"line": 6, "col": 8},
+                               "extra": {"severity": "INFO", "message": "eval", "lines": "eval(x)"}}]}
+        self.assertNormalized(_adapt("semgrep", output)[0], file_path="src/x.py", line_start=5, line_end=6, col_end=8, rule_id="py.eval", level="note", message_text="eval", code_snippet="eval(x)")
+
+    def test_ruff(self):
+        output = [
+            {"code": "F401", "filename": "/ws/a.py", "location": {"row": 1, "column": 8}, "end_location": {"row": 1, "column": 10}, "message": "`os` imported but unused"},
+            {"code": "F821", "filename": "/ws/a.py", "location": {"row": 2, "column": 1}, "end_location": {"row": 2, "column": 2}, "message": "Undefined name `x`"},
+            {"code": None, "filename": "/ws/bad.py", "location": {"row": 2, "column": 7}, "end_location": {"row": 2, "column": 8}, "message": "SyntaxError"},
+        ]
+        findings = _adapt("ruff", output, "linters.python")
+        self.assertNormalized(findings[0], file_path="/ws/a.py", line_start=1, col_start=8, col_end=10, rule_id="F401", level="warning")
+        self.assertEqual([f["level"] for f in findings[1:]], ["error", "error"])
+        self.assertEqual(findings[2]["rule_id"], "invalid-syntax")
+
+    def test_bandit(self):
+        output = {"results": [{"filename": "b.py", "test_id": "B602", "issue_severity": "HIGH", "issue_text": "shell=True", "line_number": 3, "line_range": [3, 4], "col_offset": 0, "code": "3 call()"}]}
+        self.assertNormalized(_adapt("bandit", output)[0], file_path="b.py", line_start=3, line_end=4, rule_id="B602", level="error", message_text="shell=True", code_snippet="3 call()")
+
+    def test_sarif(self):
+        output = {"version": "2.1.0", "runs": [{"results": [
+            {"ruleId": "R1", "message": {"text": "bad"}, "locations": [{"physicalLocation": {"artifactLocation": {"uri": "file:///ws/a.py"}, "region": {"startLine": 7, "endLine": 8, "snippet": {"text": "x"}}}}]},
+            {"ruleId": "R2", "level": "note", "message": {"text": "meh"}, "locations": []},
+        ]}]}
+        findings = _adapt("sarif", output)
+        self.assertNormalized(findings[0], file_path="/ws/a.py", line_start=7, line_end=8, rule_id="R1", level="warning", message_text="bad", code_snippet="x")
+        self.assertNormalized(findings[1], file_path=None, level="note")
+
+    def test_adapt_streams_items_and_reports_invalid_ones(self):
+        consumed = []
+        def items():
+            for i in range(3):
+                consumed.append(i)
+                yield {"line": i + 1} if i != 1 else "not a dict"
+        invalid = []
+        stream = get_tool_adapter(None).adapt(items(), "cat.tool", "a.py", invalid)
+        self.assertEqual(next(stream)["line_start"], 1)
+        self.assertEqual(consumed, [0]) # Item được xử lý từng cái một
+        self.assertEqual([f["line_start"] for f in stream], [3])
+        self.assertEqual(len(invalid), 1)
+
+    def test_registry_lookup_and_registration(self):
+        self.assertIs(get_tool_adapter("pylint --json {file_path}"), TOOL_OUTPUT_ADAPTERS["generic"])
+        self.assertIs(get_tool_adapter({"adapter": "no-such-adapter"}), TOOL_OUTPUT_ADAPTERS["generic"])
+
+        class UpperAdapter(ToolOutputAdapter):
+            name = "upper_test"
+            def normalize(self, item):
+                return {**super().normalize(item), "message_text": str(item.get("message", "")).upper()}
+        register_tool_adapter(UpperAdapter())
+        try:
+            self.assertEqual(_adapt("upper_test", [{"message": "hi"}])[0]["message_text"], "HI")
+        finally:
+            TOOL_OUTPUT_ADAPTERS.pop("upper_test", None)
+
+
+if __name__ == '__main__':
+    unittest.main()
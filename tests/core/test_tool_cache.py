@@ -0,0 +1,119 @@
+# NOVAGUARD-AI/tests/core/test_tool_cache.py
+
+import os
+import sys
+import time
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.tool_cache import ToolResultCache, get_tool_result_cache, get_tool_version, hash_path
+
+
+def _key(**overrides) -> str:
+    params = dict(
+        tool_id="linters.python", command_template="pylint {file_paths}", tool_version="pylint 3.1.0",
+        target_hashes={"a.py": "h1"}, config_hashes={".pylintrc": "c1"}, options={"expect_json": True},
+    )
+    params.update(overrides)
+    return ToolResultCache.make_key(**params)
+
+
+class TestToolResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir_manager = tempfile.TemporaryDirectory()
+        self.temp_dir = Path(self.temp_dir_manager.name)
+        self.cache_path = self.temp_dir / "cache" / "tools.sqlite"
+
+    def tearDown(self):
+        self.temp_dir_manager.cleanup()
+
+    def test_key_depends_on_every_field(self):
+        base = _key()
+        self.assertEqual(base, _key())
+        for overrides in (
+            {"tool_id": "linters.other"}, {"command_template": "pylint -E {file_paths}"}, {"tool_version": "pylint 3.2.0"},
+            {"target_hashes": {"a.py": "h2"}}, {"config_hashes": {".pylintrc": "c2"}}, {"options": {"expect_json": False}},
+        ):
+            self.assertNotEqual(base, _key(**overrides), overrides)
+
+    def test_roundtrip_persists_across_instances(self):
+        cache = ToolResultCache(self.cache_path)
+        self.assertIsNone(cache.get(_key()))
+        cache.put(_key(), "linters.python", [{"line": 1, "message": "m"}])
+        cache.put(_key(tool_id="echo.text"), "echo.text", "")
+        cache.close()
+
+        reopened = ToolResultCache(self.cache_path)
+        self.assertEqual(reopened.get(_key()), [{"line": 1, "message": "m"}])
+        self.assertEqual(reopened.get(_key(tool_id="echo.text")), "") # Output rỗng vẫn là một kết quả hợp lệ
+        self.assertEqual(reopened.stats()["hits"], 2)
+        reopened.close()
+
+    def test_expired_and_lru_entries_are_evicted(self):
+        cache = ToolResultCache(self.cache_path, max_age_seconds=60)
+        cache.put(_key(), "linters.python", [])
+        with patch("src.core.tool_cache.time.time", return_value=time.time() + 120):
+            self.assertIsNone(cache.get(_key()))
+        cache.close()
+
+        small_cache = ToolResultCache(self.temp_dir / "small.sqlite", max_size_bytes=300)
+        for i in range(5):
+            small_cache.put(_key(target_hashes={"a.py": f"h{i}"}), "linters.python", [{"message": "x" * 80}])
+        self.assertLessEqual(small_cache.stats()["size_bytes"], 300)
+        self.assertIsNone(small_cache.get(_key(target_hashes={"a.py": "h0"})))
+        self.assertIsNotNone(small_cache.get(_key(target_hashes={"a.py": "h4"})))
+        small_cache.close()
+
+    def test_bypass_skips_lookup_but_stores(self):
+        cache = ToolResultCache(self.cache_path, bypass=True)
+        cache.put(_key(), "linters.python", [1])
+        self.assertIsNone(cache.get(_key()))
+        cache.bypass = False
+        self.assertEqual(cache.get(_key()), [1])
+        cache.close()
+
+    def test_hash_path_covers_files_and_directories(self):
+        rules_dir = self.temp_dir / "rules"
+        rules_dir.mkdir()
+        (rules_dir / "a.yml").write_text("rules: []")
+        file_hash, dir_hash = hash_path(rules_dir / "a.yml"), hash_path(rules_dir)
+        self.assertEqual(hash_path(self.temp_dir / "nope"), "missing")
+        (rules_dir / "b.yml").write_text("rules: []")
+        self.assertEqual(hash_path(rules_dir / "a.yml"), file_hash)
+        self.assertNotEqual(hash_path(rules_dir), dir_hash)
+
+    @patch("src.core.tool_cache.subprocess.run")
+    def test_tool_version_is_probed_once(self, mock_run):
+        mock_run.return_value = MagicMock(returncode=0, stdout="faketool 9.9\n", stderr="")
+        self.assertEqual(get_tool_version("faketool-unique --version"), "faketool 9.9")
+        self.assertEqual(get_tool_version("faketool-unique --version"), "faketool 9.9")
+        mock_run.assert_called_once()
+        mock_run.side_effect = FileNotFoundError("missing")
+        self.assertIsNone(get_tool_version("not-installed-tool --version"))
+
+    def test_get_tool_result_cache_respects_config_and_env(self):
+        config = MagicMock(spec=Config)
+        settings = {"enabled": False}
+        config.get_tool_cache_setting.side_effect = lambda name, default=None: settings.get(name, default)
+        self.assertIsNone(get_tool_result_cache(config))
+
+        settings.update({"enabled": True, "path": str(self.temp_dir / "from_config.sqlite")})
+        env_path = self.temp_dir / "from_env.sqlite"
+        with patch.dict(os.environ, {"NOVAGUARD_TOOL_CACHE_PATH": str(env_path), "NOVAGUARD_TOOL_CACHE_BYPASS": "true"}):
+            cache = get_tool_result_cache(config)
+        self.assertEqual(cache.cache_path, env_path.resolve())
+        self.assertTrue(cache.bypass)
+        cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,6 +17,9 @@ if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
 from src.core.tool_runner import ToolRunner, ToolExecutionError, TOOL_OUTPUT_SUBDIR
+from src.core.tool_cache import ToolResultCache
+from src.core.json_stream import StreamedJsonOutput
+from src.core.process_runner import ToolProcessResult, ToolResourceUsage, ToolProcessTimeout
 from src.core.config_loader import Config # Chỉ để type hint
 
 # Mock Config class
@@ -33,6 +36,13 @@ class MockConfig:
             return command_config
         return None
 
+    def get_tool_config(self, tool_category: str, tool_key: str) -> Optional[Union[str, Dict[str, Any]]]:
+        return self.tools_config.get(tool_category, {}).get(tool_key)
+
+    def get_tool_resource_limits(self, tool_category: str, tool_key: str) -> Dict[str, Any]:
+        tool_cfg = self.get_tool_config(tool_category, tool_key)
+        return (tool_cfg.get("resource_limits") if isinstance(tool_cfg, dict) else None) or {}
+
 # --- Test Class ---
 class TestToolRunner(unittest.TestCase):
 
@@ -54,6 +64,9 @@ class TestToolRunner(unittest.TestCase):
                 "empty_output_ok": "empty_tool_ok {file_path}", # Tool chạy ok, không output
                 "empty_output_fail": "empty_tool_fail --code=1 {file_path}", # Tool chạy lỗi, không output
             },
+            "batch": {
+                "pylint": "pylint --output-format=json --jobs={jobs} {file_paths}",
+            },
             "sast": {
                 "output_file_json": "fake_sast --json --output {output_file} {project_root}",
                 "output_file_text": "fake_sast_text --output {output_file} {project_root}"
@@ -82,7 +95,7 @@ class TestToolRunner(unittest.TestCase):
         proc.returncode = returncode
         return proc
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_success_stdout_text(self, mock_subprocess_run):
         """Test successful run returning text via stdout."""
         mock_process = self.create_mock_process(stdout="Simple tool output text\n ") # Include whitespace to test strip()
@@ -100,7 +113,7 @@ class TestToolRunner(unittest.TestCase):
         self.assertEqual(kwargs.get('cwd'), self.workspace_path)
 
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_success_stdout_json(self, mock_subprocess_run):
         """Test successful run returning JSON via stdout."""
         json_output = '{"status": "ok", "count": 5}'
@@ -113,12 +126,12 @@ class TestToolRunner(unittest.TestCase):
         )
         self.assertEqual(result, {"status": "ok", "count": 5})
         expected_command = f"fake_linter --format=json {self.test_file_abs_path}"
-        mock_subprocess_run.assert_called_once_with(
-            shlex.split(expected_command),
-            capture_output=True, text=True, cwd=self.workspace_path, timeout=120, check=False
-        )
+        mock_subprocess_run.assert_called_once()
+        args, kwargs = mock_subprocess_run.call_args
+        self.assertEqual(args[0], shlex.split(expected_command))
+        self.assertEqual((kwargs["cwd"], kwargs["timeout_seconds"], kwargs["stdout_path"]), (self.workspace_path, 120, None))
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_success_stdout_json_parse_error(self, mock_subprocess_run):
         """Test run succeeding but outputting invalid JSON when JSON is expected."""
         invalid_json_output = '{"status": "ok", count: 5}'
@@ -131,7 +144,7 @@ class TestToolRunner(unittest.TestCase):
         )
         self.assertEqual(result, invalid_json_output) # Returns raw text due to parse error
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     @patch('pathlib.Path.exists') # Mock exists check
     @patch('pathlib.Path.read_text') # Mock reading
     @patch('pathlib.Path.unlink') # Mock deleting
@@ -179,21 +192,32 @@ class TestToolRunner(unittest.TestCase):
             pass # Assertion passed if called
 
 
-    @patch('subprocess.run', side_effect=FileNotFoundError("Command not found"))
+    @patch('src.core.tool_runner.run_tool_process', side_effect=FileNotFoundError("Command not found"))
     def test_run_command_not_found(self, mock_subprocess_run):
         """Test failure when the command executable is not found."""
         result = self.runner.run("echo", "simple", expect_json_output=False)
         self.assertIsNone(result)
         mock_subprocess_run.assert_called_once()
 
-    @patch('subprocess.run', side_effect=subprocess.TimeoutExpired(cmd="cmd", timeout=10))
+    @patch('src.core.tool_runner.run_tool_process', side_effect=subprocess.TimeoutExpired(cmd="cmd", timeout=10))
     def test_run_timeout_expired(self, mock_subprocess_run):
         """Test failure due to command timeout."""
         result = self.runner.run("echo", "simple", timeout_seconds=10)
         self.assertIsNone(result)
         mock_subprocess_run.assert_called_once()
-
-    @patch('subprocess.run')
+        self.assertEqual(len(self.runner.pop_timeout_messages()), 1)
+        self.assertEqual(self.runner.pop_timeout_messages(), []) # Đã được lấy ra
+
+    def test_output_file_names_do_not_collide_for_same_basename(self):
+        """Files with the same basename in different directories get distinct temp output files."""
+        _, out_a = self.runner._prepare_command_and_context("sast", "output_file_json", "pkg_a/utils.py")
+        _, out_b = self.runner._prepare_command_and_context("sast", "output_file_json", "pkg_b/utils.py")
+        _, out_a_again = self.runner._prepare_command_and_context("sast", "output_file_json", "pkg_a/utils.py")
+        self.assertEqual(len({out_a, out_b, out_a_again}), 3)
+        self.assertTrue(out_a.name.startswith("sast_output_file_json_utils_py_"))
+        self.assertEqual(out_a.parent, self.runner.tool_output_dir.resolve())
+
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_non_zero_exit_code_no_output(self, mock_subprocess_run):
         """Test failure with non-zero exit code and no output."""
         mock_process = self.create_mock_process(returncode=1, stdout="", stderr="Tool failed")
@@ -211,7 +235,7 @@ class TestToolRunner(unittest.TestCase):
         expected_msg_part = "failed with exit code 1 and produced no output"
         self.assertIn(expected_msg_part, str(cm.exception))
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_non_zero_exit_code_with_output(self, mock_subprocess_run):
         """Test non-zero exit but with valid output (e.g., linters finding issues)."""
         json_output = '{"findings": 1, "message": "Issues found"}'
@@ -243,7 +267,7 @@ class TestToolRunner(unittest.TestCase):
         result = self.runner.run("linters", "non_existent_linter", self.test_file_rel_path)
         self.assertIsNone(result)
 
-    @patch('subprocess.run')
+    @patch('src.core.tool_runner.run_tool_process')
     def test_run_success_empty_output(self, mock_subprocess_run):
         """Test successful run that produces empty stdout."""
         mock_process = self.create_mock_process(stdout=" \n ") # Empty after strip()
@@ -258,5 +282,140 @@ class TestToolRunner(unittest.TestCase):
         self.assertIsNone(result)
 
 
+
+    @patch('src.core.tool_runner.run_tool_process')
+    def test_run_batch_invokes_once_and_splits_per_file(self, mock_subprocess_run):
+        """Batch tools get all files in one command; JSON output is split back per file."""
+        other_file = "src/other file.py"
+        pylint_output = [
+            {"path": self.test_file_rel_path, "line": 1, "symbol": "missing-docstring", "message": "m1"},
+            {"path": str(self.workspace_path / other_file), "line": 3, "symbol": "invalid-name", "message": "m2"},
+            {"path": self.test_file_rel_path, "line": 2, "symbol": "unused-import", "message": "m3"},
+        ]
+        mock_subprocess_run.return_value = self.create_mock_process(stdout=json.dumps(pylint_output), returncode=16)
+        result = self.runner.run_batch("batch", "pylint", [self.test_file_rel_path, other_file], jobs=4)
+
+        mock_subprocess_run.assert_called_once()
+        command = mock_subprocess_run.call_args.args[0]
+        self.assertEqual(command[:3], ["pylint", "--output-format=json", "--jobs=4"])
+        self.assertEqual(command[3:], [str(self.test_file_abs_path), str(self.workspace_path / other_file)])
+        self.assertEqual([f["message"] for f in result[self.test_file_rel_path]], ["m1", "m3"])
+        self.assertEqual([f["file_path"] for f in result[other_file]], [other_file])
+
+    @patch('src.core.tool_runner.get_tool_version', return_value="fake_linter 1.0")
+    @patch('src.core.tool_runner.run_tool_process')
+    def test_run_serves_unchanged_files_from_result_cache(self, mock_subprocess_run, _mock_version):
+        cache = ToolResultCache(self.workspace_path / ".cache" / "tools.sqlite")
+        runner = ToolRunner(self.mock_config, self.workspace_path, result_cache=cache)
+        mock_subprocess_run.return_value = self.create_mock_process(stdout='[{"line": 1}]')
+
+        first = runner.run("linter", "output_stdout_json", self.test_file_rel_path, expect_json_output=True)
+        second = runner.run("linter", "output_stdout_json", self.test_file_rel_path, expect_json_output=True)
+        self.assertEqual(first, second)
+        self.assertEqual(mock_subprocess_run.call_count, 1)
+
+        self.test_file_abs_path.write_text("print('changed')") # Nội dung đổi -> chạy lại
+        runner.run("linter", "output_stdout_json", self.test_file_rel_path, expect_json_output=True)
+        self.assertEqual(mock_subprocess_run.call_count, 2)
+
+        runner.run("sast", "output_file_json", expect_json_output=True) # Quét toàn project không được cache
+        runner.run("sast", "output_file_json", expect_json_output=True)
+        self.assertEqual(mock_subprocess_run.call_count, 4)
+        cache.close()
+
+    @patch('src.core.tool_runner.get_tool_version', return_value="pylint 3.1.0")
+    @patch('src.core.tool_runner.run_tool_process')
+    def test_run_batch_only_reruns_changed_files(self, mock_subprocess_run, _mock_version):
+        cache = ToolResultCache(self.workspace_path / ".cache" / "tools.sqlite")
+        runner = ToolRunner(self.mock_config, self.workspace_path, result_cache=cache)
+        other_file = "src/other.py"
+        (self.workspace_path / other_file).write_text("x = 1")
+        mock_subprocess_run.return_value = self.create_mock_process(stdout=json.dumps([
+            {"path": self.test_file_rel_path, "line": 1, "message": "m1"}, {"path": other_file, "line": 2, "message": "m2"},
+        ]))
+        first = runner.run_batch("batch", "pylint", [self.test_file_rel_path, other_file])
+
+        (self.workspace_path / other_file).write_text("x = 2")
+        mock_subprocess_run.return_value = self.create_mock_process(stdout=json.dumps([]))
+        second = runner.run_batch("batch", "pylint", [self.test_file_rel_path, other_file])
+
+        self.assertEqual(mock_subprocess_run.call_count, 2)
+        self.assertEqual(mock_subprocess_run.call_args.args[0][-1:], [str(self.workspace_path / other_file)]) # Chỉ file đã đổi
+        self.assertEqual(second[self.test_file_rel_path], first[self.test_file_rel_path])
+        self.assertEqual(second[other_file], [])
+
+        self.assertEqual(runner.run_batch("batch", "pylint", [self.test_file_rel_path, other_file]), second)
+        self.assertEqual(mock_subprocess_run.call_count, 2) # Tất cả từ cache
+        cache.close()
+
+    def test_split_findings_flattens_eslint_style_output(self):
+        eslint_output = [{"filePath": str(self.test_file_abs_path), "messages": [{"line": 4, "ruleId": "no-undef"}]}]
+        result = self.runner.split_findings_by_file(eslint_output, [self.test_file_rel_path, "lib/empty.js"])
+        self.assertEqual(result, {self.test_file_rel_path: [{"line": 4, "ruleId": "no-undef", "file_path": self.test_file_rel_path}], "lib/empty.js": []})
+
+    @patch('src.core.tool_runner.run_tool_process')
+    def test_run_batch_non_json_output_raises(self, mock_subprocess_run):
+        mock_subprocess_run.return_value = self.create_mock_process(stdout="not json")
+        with self.assertRaises(ToolExecutionError):
+            self.runner.run_batch("batch", "pylint", [self.test_file_rel_path])
+
+    @patch('src.core.tool_runner.run_tool_process')
+    def test_resource_limits_are_passed_and_usage_is_recorded(self, mock_run_tool_process):
+        self.mock_tools_config["linter"]["limited"] = {"command": "fake_linter {file_path}", "resource_limits": {"cpu_seconds": 5, "max_output_mb": 1}}
+        usage = ToolResourceUsage(tool_id="linter.limited", target=self.test_file_rel_path, wall_seconds=5.1, user_cpu_seconds=5.0, return_code=-24, limit_exceeded="cpu_seconds")
+        mock_run_tool_process.return_value = ToolProcessResult(["fake_linter"], -24, "partial", "", usage)
+
+        self.assertEqual(self.runner.run("linter", "limited", self.test_file_rel_path), "partial")
+        limits = mock_run_tool_process.call_args.kwargs["limits"]
+        self.assertEqual((limits.cpu_seconds, limits.max_output_mb, limits.memory_mb), (5, 1, None))
+        self.assertEqual(mock_run_tool_process.call_args.kwargs["spool_dir"], self.expected_tool_output_dir)
+        self.assertEqual(self.runner.pop_resource_usage(), [usage])
+        messages = self.runner.pop_timeout_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertIn("exceeded its cpu_seconds limit (5)", messages[0])
+
+        timeout_usage = ToolResourceUsage(tool_id="linter.limited", target=self.test_file_rel_path, wall_seconds=10, timed_out=True)
+        mock_run_tool_process.side_effect = ToolProcessTimeout(["fake_linter"], 10, timeout_usage)
+        self.assertIsNone(self.runner.run("linter", "limited", self.test_file_rel_path, timeout_seconds=10))
+        self.assertEqual(self.runner.pop_resource_usage(), [timeout_usage])
+
+    def _streaming_runner(self, script: str, command_suffix: str = "", result_cache=None):
+        (self.workspace_path / "emit.py").write_text(script)
+        tools_cfg = {"sast": {"streamed": {
+            "command": f"{shlex.quote(sys.executable)} emit.py {command_suffix}".strip(), "stream_output": True, "cache_config_files": ["emit.py"],
+        }}}
+        return ToolRunner(MockConfig(tools_cfg), self.workspace_path, result_cache=result_cache)
+
+    def test_stream_output_from_stdout_is_read_item_by_item(self):
+        runner = self._streaming_runner("import json; print(json.dumps({'version': 1, 'results': [{'id': i} for i in range(3)]}))")
+        output = runner.run("sast", "streamed", expect_json_output=True)
+        self.assertIsInstance(output, StreamedJsonOutput)
+        self.assertTrue(output.path.exists()) # stdout được ghi ra file tạm, chưa được đọc
+        self.assertEqual([item["id"] for item in output], [0, 1, 2])
+        self.assertEqual(list(self.expected_tool_output_dir.iterdir()), [])
+
+    def test_stream_output_from_output_file_with_nonzero_exit(self):
+        script = "import sys, json; open(sys.argv[1], 'w').write(json.dumps({'results': [{'id': 7}]})); sys.exit(1)"
+        output = self._streaming_runner(script, "{output_file}").run("sast", "streamed", expect_json_output=True)
+        self.assertEqual(list(output), [{"id": 7}])
+
+    def test_stream_output_falls_back_to_text_and_empty_rules(self):
+        self.assertEqual(self._streaming_runner("print('not json')").run("sast", "streamed", expect_json_output=True), "not json")
+        self.assertIsNone(self._streaming_runner("pass").run("sast", "streamed", expect_json_output=True))
+        with self.assertRaises(ToolExecutionError):
+            self._streaming_runner("import sys; sys.exit(2)").run("sast", "streamed", expect_json_output=True)
+        self.assertEqual(list(self.expected_tool_output_dir.iterdir()), [])
+
+    @patch('src.core.tool_runner.get_tool_version', return_value="emit 1.0")
+    def test_streamed_output_is_cached_once_fully_read(self, _mock_version):
+        cache = ToolResultCache(self.workspace_path / ".cache" / "tools.sqlite")
+        runner = self._streaming_runner("import json; print(json.dumps({'results': [{'id': 1}]}))", "{relative_file_paths}", result_cache=cache)
+        first = runner.run("sast", "streamed", expect_json_output=True, target_file_relative_paths=[self.test_file_rel_path])
+        self.assertEqual(cache.stats()["stores"], 0) # Chưa đọc xong thì chưa lưu
+        self.assertEqual(list(first), [{"id": 1}])
+        second = runner.run("sast", "streamed", expect_json_output=True, target_file_relative_paths=[self.test_file_rel_path])
+        self.assertEqual(second, {"results": [{"id": 1}]})
+        cache.close()
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
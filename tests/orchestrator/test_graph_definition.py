@@ -1,9 +1,10 @@
 # NOVAGUARD-AI/tests/orchestrator/test_graph_definition.py
 
+import os
 import unittest
 from pathlib import Path
 import sys
-from unittest.mock import MagicMock 
+from unittest.mock import MagicMock, patch
 import traceback
 
 # Thêm src vào sys.path
@@ -15,9 +16,13 @@ if str(project_root) not in sys.path:
 from src.orchestrator.graph_definition import (
     should_run_meta_reviewer, 
     initial_check_for_files,
+    is_parallel_agents_enabled,
+    is_async_pipeline_enabled,
+    get_run_models,
+    get_preload_models,
     get_compiled_graph # Import để test việc biên dịch
 ) 
-from src.orchestrator.state import GraphState
+from src.orchestrator.state import GraphState, OverwriteList, append_list_update
 from src.core.shared_context import SharedReviewContext, ChangedFile
 from src.core.config_loader import Config
 
@@ -121,6 +126,141 @@ class TestGraphCompilation(unittest.TestCase):
              # Sử dụng traceback đã import để in lỗi chi tiết hơn
              self.fail(f"get_compiled_graph failed during compilation: {e}\n{traceback.format_exc()}")
 
+     def test_parallel_graph_compiles_and_fans_out_agents(self):
+         """Kiểm tra graph ở chế độ song song: 4 agent cùng nhận cạnh từ run_tier1_tools."""
+         mock_config = MagicMock(spec=Config)
+         mock_config.get_model_for_agent.return_value = None
+         mock_config.get_orchestration_setting.return_value = True
+
+         with patch.dict(os.environ, {}, clear=False):
+             os.environ.pop("NOVAGUARD_PARALLEL_AGENTS", None)
+             app = get_compiled_graph(app_config=mock_config)
+
+         edges = {(edge.source, edge.target) for edge in app.get_graph().edges}
+         for agent_node in ["style_guardian", "bug_hunter", "securi_sense", "opti_tune"]:
+             self.assertIn(("run_tier1_tools", agent_node), edges)
+             self.assertIn((agent_node, "generate_sarif"), edges)
+         self.assertNotIn(("style_guardian", "bug_hunter"), edges)
+
+     def test_work_queue_graph_uses_single_agent_node(self):
+         """Kiểm tra chế độ work_queue thay 4 agent node bằng một node agent_work_queue."""
+         mock_config = MagicMock(spec=Config)
+         mock_config.get_model_for_agent.return_value = None
+         mock_config.get_orchestration_setting.side_effect = lambda key, default=None: {"agent_scheduler": "work_queue"}.get(key, default)
+
+         app = get_compiled_graph(app_config=mock_config)
+
+         graph = app.get_graph()
+         edges = {(edge.source, edge.target) for edge in graph.edges}
+         self.assertIn(("run_tier1_tools", "agent_work_queue"), edges)
+         self.assertIn(("agent_work_queue", "generate_sarif"), edges)
+         self.assertNotIn("style_guardian", graph.nodes)
+
+     def test_combined_agent_mode_uses_single_reviewer_node(self):
+         """Kiểm tra agent_mode combined thay 4 agent node bằng một node combined_reviewer (kể cả khi bật parallel)."""
+         mock_config = MagicMock(spec=Config)
+         mock_config.get_model_for_agent.return_value = None
+         settings = {"agent_mode": "combined", "parallel_agents": True}
+         mock_config.get_orchestration_setting.side_effect = lambda key, default=None: settings.get(key, default)
+
+         with patch.dict(os.environ, {}, clear=False):
+             os.environ.pop("NOVAGUARD_AGENT_MODE", None)
+             os.environ.pop("NOVAGUARD_PARALLEL_AGENTS", None)
+             app = get_compiled_graph(app_config=mock_config)
+
+         graph = app.get_graph()
+         edges = {(edge.source, edge.target) for edge in graph.edges}
+         self.assertIn(("run_tier1_tools", "combined_reviewer"), edges)
+         self.assertIn(("combined_reviewer", "generate_sarif"), edges)
+         self.assertNotIn("style_guardian", graph.nodes)
+
+
+class TestParallelAgentsSupport(unittest.TestCase):
+
+    def test_is_parallel_agents_enabled_from_config(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.get_orchestration_setting.return_value = True
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_PARALLEL_AGENTS", None)
+            self.assertTrue(is_parallel_agents_enabled(mock_config))
+            mock_config.get_orchestration_setting.return_value = False
+            self.assertFalse(is_parallel_agents_enabled(mock_config))
+
+    def test_is_parallel_agents_enabled_env_override(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.get_orchestration_setting.return_value = False
+        with patch.dict(os.environ, {"NOVAGUARD_PARALLEL_AGENTS": "true"}):
+            self.assertTrue(is_parallel_agents_enabled(mock_config))
+        mock_config.get_orchestration_setting.return_value = True
+        with patch.dict(os.environ, {"NOVAGUARD_PARALLEL_AGENTS": "false"}):
+            self.assertFalse(is_parallel_agents_enabled(mock_config))
+
+    def test_is_async_pipeline_enabled_config_and_env_override(self):
+        mock_config = MagicMock(spec=Config)
+        mock_config.get_orchestration_setting.side_effect = lambda key, default=None: {"async_pipeline": True}.get(key, default)
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_ASYNC_PIPELINE", None)
+            self.assertTrue(is_async_pipeline_enabled(mock_config))
+        with patch.dict(os.environ, {"NOVAGUARD_ASYNC_PIPELINE": "0"}):
+            self.assertFalse(is_async_pipeline_enabled(mock_config))
+        mock_config.get_orchestration_setting.side_effect = None
+        mock_config.get_orchestration_setting.return_value = MagicMock() # Giá trị không phải bool -> tắt
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_ASYNC_PIPELINE", None)
+            self.assertFalse(is_async_pipeline_enabled(mock_config))
+
+    def test_append_update_adds_node_items(self):
+        existing = [{"rule_id": "A"}]
+        self.assertEqual(append_list_update(existing, [{"rule_id": "B"}]), [{"rule_id": "A"}, {"rule_id": "B"}])
+        self.assertEqual(existing, [{"rule_id": "A"}]) # Không sửa list hiện có
+
+    def test_append_parallel_branch_updates_keep_all_items(self):
+        # Item trùng với item đã có vẫn được giữ (mỗi node chỉ trả về item mới của nó)
+        after_first_branch = append_list_update(["initial error"], ["style error"])
+        merged = append_list_update(after_first_branch, ["initial error", "bug error"])
+        self.assertEqual(merged, ["initial error", "style error", "initial error", "bug error"])
+
+    def test_append_overwrite_replaces_value(self):
+        existing = [{"rule_id": "A"}, {"rule_id": "B"}]
+        refined = OverwriteList([{"rule_id": "Meta.1"}])
+        self.assertEqual(append_list_update(existing, refined), [{"rule_id": "Meta.1"}])
+
+    def test_append_handles_empty_values(self):
+        self.assertEqual(append_list_update([], ["x"]), ["x"])
+        self.assertEqual(append_list_update(["x"], None), ["x"])
+        self.assertEqual(append_list_update(None, None), [])
+
+
+
+class TestRunModels(unittest.TestCase):
+
+    def _config(self, orchestration, meta: bool = False) -> Config:
+        agents = {
+            "StyleGuardian": "style:7b", "BugHunter": "bug:7b", "SecuriSense": "sec:13b", "OptiTune": "style:7b",
+            "CombinedReviewer": "combined:7b", "MetaReviewer": "meta:8x7b",
+        }
+        if meta:
+            agents["meta_reviewer"] = "meta:8x7b"
+        models_config = {"orchestration": orchestration, "modes": {"test": {"agents": agents, "tasks": {"summarize": "task:3b"}}}}
+        return Config(ollama_base_url="http://localhost:11434", models_config=models_config, tools_config={}, prompt_templates={}, active_mode="test")
+
+    def test_only_models_of_the_active_agent_mode_are_used(self):
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_AGENT_MODE", None)
+            specialists = get_run_models(self._config({"agent_mode": "specialists"}))
+            combined = get_run_models(self._config({"agent_mode": "combined"}, meta=True))
+        # Model của CombinedReviewer, MetaReviewer (không bật) và tasks không được dùng
+        self.assertEqual(specialists, {"style:7b": ["StyleGuardian", "OptiTune"], "bug:7b": ["BugHunter"], "sec:13b": ["SecuriSense"]})
+        self.assertEqual(combined, {"combined:7b": ["CombinedReviewer"], "meta:8x7b": ["MetaReviewer"]})
+
+    def test_model_affinity_preloads_only_the_first_batch_model(self):
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_AGENT_MODE", None)
+            affinity_config = self._config({"agent_scheduler": "model_affinity"})
+            graph_config = self._config({"agent_scheduler": "graph"})
+            self.assertEqual(get_preload_models(affinity_config, get_run_models(affinity_config)), ["style:7b"])
+            self.assertEqual(get_preload_models(graph_config, get_run_models(graph_config)), ["style:7b", "bug:7b", "sec:13b"])
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,6 +2,7 @@ import unittest
 from pathlib import Path
 import sys
 import copy
+import tempfile
 from typing import Dict, Any, Optional, List
 from unittest.mock import MagicMock, patch, call # Import call
 
@@ -16,6 +17,8 @@ from src.orchestrator.state import GraphState
 from src.core.shared_context import SharedReviewContext, ChangedFile
 from src.core.config_loader import Config
 from src.core.tool_runner import ToolRunner, ToolExecutionError 
+from src.core.json_stream import StreamedJsonOutput
+from src.core.process_runner import ToolResourceUsage
 from src.orchestrator.state import GraphState
 # Import thêm node mới và agent tương ứng
 from src.orchestrator.nodes import (
@@ -26,7 +29,10 @@ from src.orchestrator.nodes import (
     activate_securi_sense_node,
     activate_opti_tune_node,
     run_meta_review_node,
-    generate_sarif_report_node
+    run_agent_work_queue_node,
+    generate_sarif_report_node,
+    BUNDLED_SEMGREP_RULES_PATH,
+    _project_tool_extra_vars
 )
 from src.core.shared_context import SharedReviewContext, ChangedFile
 from src.core.config_loader import Config
@@ -81,7 +87,7 @@ class TestOrchestratorNodes_PrepareFiles(unittest.TestCase):
         result_update = prepare_review_files_node(initial_state)
         self.assertIn("files_to_review", result_update); self.assertIn("error_messages", result_update)
         self.assertEqual(len(result_update.get("files_to_review", [])), 0)
-        self.assertEqual(result_update.get("error_messages"), ["initial error"])
+        self.assertEqual(result_update.get("error_messages"), []) # Chỉ lỗi mới; lỗi cũ vẫn nằm trong state
 
     def test_prepare_files_language_already_set(self):
         initial_files = [ChangedFile(path="src/main.py", content="", language="override_python")]
@@ -93,6 +99,18 @@ class TestOrchestratorNodes_PrepareFiles(unittest.TestCase):
         updated_files = result_update.get("files_to_review", [])
         self.assertEqual(len(updated_files), 1); self.assertEqual(updated_files[0].language, "override_python")
 
+    def test_prepare_files_skips_pure_renames(self):
+        initial_files = [
+            ChangedFile(path="new.py", content="x = 1", change_type="renamed", old_path="old.py", similarity=100, diff_hunks=[]),
+            ChangedFile(path="moved.py", content="y = 2", change_type="renamed", old_path="orig.py", similarity=90),
+        ]
+        initial_state: GraphState = {
+            "shared_context": self.shared_context, "files_to_review": copy.deepcopy(initial_files),
+            "error_messages": [], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None,
+        }
+        result_update = prepare_review_files_node(initial_state)
+        self.assertEqual([f.path for f in result_update["files_to_review"]], ["moved.py"])
+
 class TestOrchestratorNodes_RunTier1(unittest.TestCase):
 
     def setUp(self):
@@ -155,6 +173,125 @@ class TestOrchestratorNodes_RunTier1(unittest.TestCase):
         self.assertEqual(len(result_update.get("error_messages", [])), 0)
         self.assertIn("sast", results); self.assertIn("generic_semgrep_project", results["sast"]); self.assertEqual(len(results["sast"]["generic_semgrep_project"]), 0)
 
+    @patch('src.orchestrator.nodes.ToolRunner')
+    def test_run_tier1_batch_linter_runs_once_for_all_files(self, MockToolRunner):
+        self.mock_tools_config["linters"]["python"] = {"command": "pylint --jobs={jobs} {file_paths}", "target_type": "batch", "jobs": 0}
+        mock_runner_instance = MockToolRunner.return_value
+        mock_runner_instance.run.return_value = None
+        mock_runner_instance.run_batch.return_value = {
+            "a.py": [{"line": 3, "symbol": "C0103", "message": "Invalid name"}],
+            "b.py": [],
+        }
+        files = [ChangedFile(path=p, content="...", language="python") for p in ("a.py", "b.py")]
+        initial_state: GraphState = {"shared_context": self.shared_context, "files_to_review": files, "error_messages": [], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None}
+        result_update = run_tier1_tools_node(initial_state)
+
+        mock_runner_instance.run_batch.assert_called_once_with(tool_category="linters", tool_key="python", target_file_relative_paths=["a.py", "b.py"], jobs=0)
+        self.assertFalse(any(c.kwargs.get("tool_key") == "python" for c in mock_runner_instance.run.call_args_list))
+        python_findings = result_update["tier1_tool_results"]["linters"]["python"]
+        self.assertEqual([(f["file_path"], f["line_start"], f["rule_id"], f["tool_name"]) for f in python_findings], [("a.py", 3, "C0103", "linters.python")])
+        self.assertEqual(result_update["error_messages"], [])
+
+    @patch('src.orchestrator.nodes.get_tier1_max_workers', return_value=4)
+    @patch('src.orchestrator.nodes.ToolRunner')
+    def test_run_tier1_parallel_collects_failures_and_timeouts(self, MockToolRunner, _mock_workers):
+        mock_runner_instance = MockToolRunner.return_value
+        def run_side_effect(*args, **kwargs):
+            path = kwargs.get("target_file_relative_path")
+            if path == "pkg_b/utils.py": raise ToolExecutionError("pylint crashed", stderr="Traceback", return_code=32)
+            if path == "pkg_a/utils.py": return [{"line": 1, "message": "Missing docstring", "symbol": "C0114"}]
+            return None
+        mock_runner_instance.run.side_effect = run_side_effect
+        mock_runner_instance.pop_timeout_messages.return_value = ["Tool 'sast.generic_semgrep_project' timed out after 120 seconds for project."]
+
+        files = [ChangedFile(path=p, content="...", language="python") for p in ("pkg_a/utils.py", "pkg_b/utils.py", "pkg_c/utils.py")]
+        initial_state: GraphState = {"shared_context": self.shared_context, "files_to_review": files, "error_messages": ["earlier"], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None}
+        result_update = run_tier1_tools_node(initial_state)
+
+        self.assertEqual(mock_runner_instance.run.call_count, 4) # 3 file Pylint + Semgrep
+        python_findings = result_update["tier1_tool_results"]["linters"]["python"]
+        self.assertEqual([f["file_path"] for f in python_findings], ["pkg_a/utils.py"])
+        errors = result_update["error_messages"]
+        self.assertEqual(len(errors), 2) # "earlier" đã có trong state, không trả về lại
+        self.assertIn("execution failed for pkg_b/utils.py", errors[0])
+        self.assertIn("timed out", errors[1])
+
+    @patch('src.orchestrator.nodes.ToolRunner')
+    def test_run_tier1_returns_tool_resource_usage(self, MockToolRunner):
+        mock_runner_instance = MockToolRunner.return_value
+        mock_runner_instance.run.return_value = None
+        mock_runner_instance.pop_resource_usage.return_value = [
+            ToolResourceUsage(tool_id="linters.python", target="src/utils.py", wall_seconds=0.5, user_cpu_seconds=0.4, return_code=0),
+            ToolResourceUsage(tool_id="sast.generic_semgrep_project", target="project", wall_seconds=120.0, timed_out=True),
+        ]
+        files = [ChangedFile(path="src/utils.py", content="...", language="python")]
+        initial_state: GraphState = {"shared_context": self.shared_context, "files_to_review": files, "error_messages": [], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None}
+        result_update = run_tier1_tools_node(initial_state)
+
+        diagnostics = result_update["tier1_tool_diagnostics"]
+        self.assertEqual([(d["tool_id"], d["timed_out"]) for d in diagnostics], [("linters.python", False), ("sast.generic_semgrep_project", True)])
+        self.assertEqual(diagnostics[0]["user_cpu_seconds"], 0.4)
+
+    @patch('src.orchestrator.nodes.ToolRunner')
+    def test_run_tier1_semgrep_changed_files_only(self, MockToolRunner):
+        self.mock_tools_config["sast"]["generic_semgrep_project"] = {
+            "command": "semgrep --config {rules_path} --json -o {output_file} {relative_file_paths}", "target_type": "project",
+            "changed_files_only": True, "rules_path": "/nonexistent/rules", "rules_fallback": "p/ci", "adapter": "semgrep",
+        }
+        mock_runner_instance = MockToolRunner.return_value
+        semgrep_output = {"results": [
+            {"check_id": "A", "path": "src/utils.py", "start": {"line": 5}, "extra": {"message": "in changed file", "severity": "ERROR"}},
+            {"check_id": "B", "path": str(self.workspace_path / "src/utils.py"), "start": {"line": 6}, "extra": {"message": "absolute path", "severity": "ERROR"}},
+            {"check_id": "C", "path": "vendor/other.py", "start": {"line": 1}, "extra": {"message": "unrelated", "severity": "ERROR"}},
+        ]}
+        mock_runner_instance.run.side_effect = lambda *args, **kwargs: semgrep_output if kwargs.get("tool_category") == "sast" else None
+
+        files = [ChangedFile(path="src/utils.py", content="...", language="python")]
+        initial_state: GraphState = {"shared_context": self.shared_context, "files_to_review": files, "error_messages": [], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None}
+        result_update = run_tier1_tools_node(initial_state)
+
+        mock_runner_instance.run.assert_any_call(
+            tool_category="sast", tool_key="generic_semgrep_project", target_file_relative_path=None, expect_json_output=True,
+            additional_context_vars={"rules_path": "p/ci"}, target_file_relative_paths=["src/utils.py"],
+        )
+        sast_findings = result_update["tier1_tool_results"]["sast"]["generic_semgrep_project"]
+        self.assertEqual([(f["rule_id"], f["file_path"]) for f in sast_findings], [("A", "src/utils.py"), ("B", "src/utils.py")])
+
+        # rules_fallback để trống: ruleset tối thiểu đi kèm NovaGuard là phương án cuối
+        mock_runner_instance.run.reset_mock()
+        self.mock_tools_config["sast"]["generic_semgrep_project"]["rules_fallback"] = ""
+        run_tier1_tools_node(initial_state)
+        sast_call = next(c for c in mock_runner_instance.run.call_args_list if c.kwargs.get("tool_category") == "sast")
+        self.assertEqual(sast_call.kwargs["additional_context_vars"], {"rules_path": str(BUNDLED_SEMGREP_RULES_PATH)})
+        self.assertTrue(BUNDLED_SEMGREP_RULES_PATH.is_dir())
+
+        # Không có file thay đổi thì không chạy tool
+        mock_runner_instance.run.reset_mock()
+        run_tier1_tools_node({**initial_state, "files_to_review": []})
+        self.assertFalse(any(c.kwargs.get("tool_category") == "sast" for c in mock_runner_instance.run.call_args_list))
+
+    @patch('src.orchestrator.nodes.ToolRunner')
+    def test_run_tier1_streamed_project_output_keeps_findings_before_json_error(self, MockToolRunner):
+        self.mock_tools_config["sast"]["generic_semgrep_project"] = {
+            "command": "semgrep --json -o {output_file} {relative_file_paths}", "target_type": "project",
+            "changed_files_only": True, "adapter": "semgrep", "stream_output": True,
+        }
+        temp_dir = tempfile.TemporaryDirectory(); self.addCleanup(temp_dir.cleanup)
+        output_path = Path(temp_dir.name) / "semgrep.output"
+        output_path.write_text('{"results": [{"check_id": "A", "path": "src/utils.py", "start": {"line": 2}, "extra": {"severity": "ERROR", "message": "m"}},'
+                               ' {"check_id": "B", "path": "other.py", "start": {"line": 1}, "extra": {}}, {"check_id": ')
+        streamed = StreamedJsonOutput(output_path, ["results"], "sast.generic_semgrep_project")
+        MockToolRunner.return_value.run.side_effect = lambda *args, **kwargs: streamed if kwargs.get("tool_category") == "sast" else None
+
+        files = [ChangedFile(path="src/utils.py", content="...", language="python")]
+        initial_state: GraphState = {"shared_context": self.shared_context, "files_to_review": files, "error_messages": [], "tier1_tool_results": {}, "agent_findings": [], "final_sarif_report": None}
+        result_update = run_tier1_tools_node(initial_state)
+
+        sast_findings = result_update["tier1_tool_results"]["sast"]["generic_semgrep_project"]
+        self.assertEqual([(f["rule_id"], f["level"]) for f in sast_findings], [("A", "error")])
+        self.assertTrue(any("invalid JSON output" in e for e in result_update["error_messages"]))
+        self.assertFalse(output_path.exists())
+
     @patch('src.orchestrator.nodes.ToolRunner')
     def test_run_tier1_semgrep_success(self, MockToolRunner):
         mock_runner_instance = MockToolRunner.return_value
@@ -227,7 +364,7 @@ class TestOrchestratorNodes_RunTier1(unittest.TestCase):
 
         expected_error_msg = f"Tool 'linters.python' execution failed for src/main.py: {error_msg}"
         final_errors = result_update.get("error_messages", [])
-        self.assertIn("previous error", final_errors)
+        self.assertNotIn("previous error", final_errors) # Node chỉ trả về lỗi mới
         self.assertIn(expected_error_msg, final_errors)
 
     @patch('src.orchestrator.nodes.ToolRunner')
@@ -244,6 +381,17 @@ class TestOrchestratorNodes_RunTier1(unittest.TestCase):
         expected_results = {'linters': {'python': []}, 'sast': {'generic_semgrep_project': []}}
         self.assertDictEqual(result_update["tier1_tool_results"], expected_results)
         self.assertEqual(len(result_update.get("error_messages", [])), 0)
+    def test_bundled_semgrep_ruleset_is_only_a_fallback_for_semgrep_tools(self):
+        repo_path = Path("/nonexistent/repo")
+        with self.assertLogs("src.orchestrator.nodes", level="WARNING") as logs:
+            semgrep_vars = _project_tool_extra_vars({"adapter": "semgrep", "rules_path": "rulez", "rules_fallback": ""}, repo_path)
+            other_vars = _project_tool_extra_vars({"adapter": "sarif", "rules_path": "rulez"}, repo_path)
+        self.assertEqual(semgrep_vars, {"rules_path": str(BUNDLED_SEMGREP_RULES_PATH)})
+        # Tool khác không nhận ruleset Semgrep hay registry pack mặc định
+        self.assertEqual(other_vars, {"rules_path": str(repo_path / "rulez")})
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(_project_tool_extra_vars({"adapter": "semgrep", "rules_path": "rulez"}, repo_path), {"rules_path": "p/default"})
+
 
 # --- Test Class cho Agent Activation Nodes ---
 # --- Test Class cho Agent Activation Nodes ---
@@ -311,10 +459,7 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         self.assertIn("agent_findings", result_update)
         final_findings = result_update["agent_findings"]
-        self.assertEqual(len(final_findings), len(initial_agent_findings) + len(mock_style_findings))
-        self.assertEqual(final_findings[0]["rule_id"], "PrevAgent.some_rule") 
-        self.assertEqual(final_findings[1]["rule_id"], "StyleGuardian.llm_style_1")
-        self.assertEqual(final_findings[2]["message_text"], "LLM style suggestion 2")
+        self.assertEqual(final_findings, mock_style_findings) # Chỉ finding mới; reducer append vào state
         MockStyleGuardianAgent.assert_called_once()
         MockOllamaClient.assert_called_once()
         MockPromptManager.assert_called_once()
@@ -342,7 +487,7 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         self.assertListEqual(result_update.get("agent_findings"), [])
         final_errors = result_update.get("error_messages")
-        self.assertIn("initial", final_errors)
+        self.assertNotIn("initial", final_errors) # Node chỉ trả về lỗi mới
         expected_error_substring = f"Error during StyleGuardian execution: {error_message}"
         self.assertTrue(any(expected_error_substring in msg for msg in final_errors), 
                         f"Expected error substring '{expected_error_substring}' not found in {final_errors}")
@@ -373,9 +518,7 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         self.assertIn("agent_findings", result_update)
         final_findings = result_update["agent_findings"]
-        self.assertEqual(len(final_findings), len(initial_agent_findings) + len(mock_bug_findings))
-        self.assertEqual(final_findings[0]["rule_id"], "StyleGuardian.some_finding") 
-        self.assertEqual(final_findings[1]["rule_id"], "BugHunter.llm_bug_null")     
+        self.assertEqual(final_findings, mock_bug_findings) # Chỉ finding mới
 
         MockBugHunterAgent.assert_called_once()
         mock_agent_instance.review.assert_called_once()
@@ -404,11 +547,11 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         result_update = activate_bug_hunter_node(initial_state)
 
-        # agent_findings không thay đổi so với ban đầu
-        self.assertEqual(result_update.get("agent_findings"), initial_agent_findings) 
+        # Không thêm finding nào (finding cũ vẫn nằm trong state)
+        self.assertEqual(result_update.get("agent_findings"), []) 
         
         final_errors = result_update.get("error_messages")
-        self.assertIn("old", final_errors)
+        self.assertNotIn("old", final_errors) # Node chỉ trả về lỗi mới
         expected_error_substring = f"Error during BugHunter execution: {error_message}"
         self.assertTrue(any(expected_error_substring in msg for msg in final_errors),
                         f"Expected error substring '{expected_error_substring}' not found in {final_errors}")
@@ -441,9 +584,7 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
         # Assertions
         self.assertIn("agent_findings", result_update)
         final_findings = result_update["agent_findings"]
-        self.assertEqual(len(final_findings), len(initial_agent_findings) + len(mock_sec_findings))
-        self.assertEqual(final_findings[0]["rule_id"], "BugHunter.some_bug") # Finding cũ
-        self.assertEqual(final_findings[1]["rule_id"], "SecuriSense.llm_sec_sqli")     # Finding mới
+        self.assertEqual(final_findings, mock_sec_findings) # Chỉ finding mới
 
         # Kiểm tra agent được khởi tạo và gọi đúng
         MockSecuriSenseAgent.assert_called_once()
@@ -474,12 +615,12 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         result_update = activate_securi_sense_node(initial_state)
 
-        # agent_findings không thay đổi
-        self.assertEqual(result_update.get("agent_findings"), initial_agent_findings) 
+        # Không thêm finding nào
+        self.assertEqual(result_update.get("agent_findings"), []) 
         
         # error_messages chứa lỗi cũ và lỗi mới
         final_errors = result_update.get("error_messages")
-        self.assertIn("old_sec_error", final_errors)
+        self.assertNotIn("old_sec_error", final_errors) # Node chỉ trả về lỗi mới
         expected_error_substring = f"Error during SecuriSense execution: {error_message}"
         self.assertTrue(any(expected_error_substring in msg for msg in final_errors),
                         f"Expected error substring '{expected_error_substring}' not found in {final_errors}")
@@ -513,10 +654,7 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
         # Assertions
         self.assertIn("agent_findings", result_update)
         final_findings = result_update["agent_findings"]
-        self.assertEqual(len(final_findings), len(initial_agent_findings) + len(mock_opti_findings))
-        self.assertEqual(final_findings[0]["rule_id"], "SecuriSense.some_vuln") # Finding cũ
-        self.assertEqual(final_findings[1]["rule_id"], "OptiTune.llm_opt_loop")    # Finding mới 1
-        self.assertEqual(final_findings[2]["rule_id"], "OptiTune.llm_opt_concurrency") # Finding mới 2
+        self.assertEqual([f["rule_id"] for f in final_findings], ["OptiTune.llm_opt_loop", "OptiTune.llm_opt_concurrency"]) # Chỉ finding mới
 
         # Kiểm tra agent được khởi tạo và gọi đúng
         MockOptiTuneAgent.assert_called_once()
@@ -546,17 +684,62 @@ class TestOrchestratorNodes_AgentActivation(unittest.TestCase):
 
         result_update = activate_opti_tune_node(initial_state)
 
-        # agent_findings không thay đổi
-        self.assertEqual(result_update.get("agent_findings"), initial_agent_findings) 
+        # Không thêm finding nào
+        self.assertEqual(result_update.get("agent_findings"), []) 
         
         # error_messages chứa lỗi cũ và lỗi mới
         final_errors = result_update.get("error_messages")
-        self.assertIn("old_opt_error", final_errors)
+        self.assertNotIn("old_opt_error", final_errors) # Node chỉ trả về lỗi mới
         expected_error_substring = f"Error during OptiTune execution: {error_message}"
         self.assertTrue(any(expected_error_substring in msg for msg in final_errors),
                         f"Expected error substring '{expected_error_substring}' not found in {final_errors}")
 
 
+    @patch('src.orchestrator.nodes.AgentWorkQueueScheduler')
+    @patch('src.orchestrator.nodes.OllamaClientWrapper')
+    @patch('src.orchestrator.nodes.PromptManager')
+    def test_agent_work_queue_node_merges_results(self, MockPromptManager, MockOllamaClient, MockScheduler):
+        """Test work queue node returns the scheduler findings and errors (appended to the state by the reducer)."""
+        queued_findings = [{"rule_id": "BugHunter.llm_bug_x", "file_path": "style.py"}]
+        MockScheduler.return_value.run.return_value = (queued_findings, ["Error during OptiTune execution for good.py: boom"])
+        initial_state: GraphState = {
+            "shared_context": self.shared_context, "files_to_review": copy.deepcopy(self.sample_files),
+            "tier1_tool_results": copy.deepcopy(self.sample_tier1_results),
+            "agent_findings": [{"rule_id": "prev"}], "error_messages": ["old"], "final_sarif_report": None,
+        }
+
+        result_update = run_agent_work_queue_node(initial_state)
+
+        self.assertEqual(result_update["agent_findings"], queued_findings)
+        self.assertEqual(result_update["error_messages"], ["Error during OptiTune execution for good.py: boom"])
+        agent_names = [name for name, _ in MockScheduler.call_args.kwargs["agent_classes"]]
+        self.assertEqual(agent_names, ["StyleGuardian", "BugHunter", "SecuriSense", "OptiTune"])
+        run_kwargs = MockScheduler.return_value.run.call_args.kwargs
+        self.assertEqual(run_kwargs["tier1_tool_results"], initial_state["tier1_tool_results"])
+
+
+    @patch('src.orchestrator.nodes.BugHunterAgent')
+    @patch('src.orchestrator.nodes.StyleGuardianAgent')
+    @patch('src.orchestrator.nodes.OllamaClientWrapper')
+    @patch('src.orchestrator.nodes.PromptManager')
+    def test_agent_nodes_share_one_ollama_client(self, MockPromptManager, MockOllamaClient, MockStyleGuardianAgent, MockBugHunterAgent):
+        """Test the Ollama client is created once and reused by every agent node."""
+        MockStyleGuardianAgent.return_value.review.return_value = []
+        MockBugHunterAgent.return_value.review.return_value = []
+        initial_state: GraphState = {
+            "shared_context": self.shared_context, "files_to_review": copy.deepcopy(self.sample_files),
+            "tier1_tool_results": {}, "agent_findings": [], "error_messages": [], "final_sarif_report": None,
+        }
+
+        activate_style_guardian_node(initial_state)
+        activate_bug_hunter_node(initial_state)
+
+        MockOllamaClient.assert_called_once()
+        self.assertEqual(MockOllamaClient.call_args.kwargs["backend"], "native")
+        self.assertIs(MockStyleGuardianAgent.call_args.kwargs["ollama_client"], MockOllamaClient.return_value)
+        self.assertIs(MockBugHunterAgent.call_args.kwargs["ollama_client"], MockOllamaClient.return_value)
+
+
 # >>> THÊM TEST CLASS MỚI CHO META REVIEWER NODE <<<
 class TestOrchestratorNodes_MetaReviewer(unittest.TestCase):
 
@@ -664,12 +847,12 @@ class TestOrchestratorNodes_MetaReviewer(unittest.TestCase):
 
         result_update = run_meta_review_node(initial_state)
 
-        # agent_findings không thay đổi, trả về list gốc
-        self.assertEqual(result_update.get("agent_findings"), self.initial_agent_findings) 
+        # Không append gì: agent_findings trong state giữ nguyên
+        self.assertEqual(result_update.get("agent_findings"), []) 
         
-        # error_messages chứa lỗi cũ và lỗi mới
+        # Chỉ lỗi mới được trả về
         final_errors = result_update.get("error_messages")
-        self.assertIn("old_meta_error", final_errors)
+        self.assertNotIn("old_meta_error", final_errors)
         expected_error_substring = f"Error during MetaReviewer execution: {error_message}"
         self.assertTrue(any(expected_error_substring in msg for msg in final_errors),
                         f"Expected error substring '{expected_error_substring}' not found in {final_errors}")
@@ -783,6 +966,18 @@ class TestOrchestratorNodes_GenerateSarif(unittest.TestCase):
         mock_generator_instance.get_sarif_report.assert_called_once()
         self.assertEqual(result_update["final_sarif_report"], self.mock_sarif_dict)
         self.assertEqual(result_update.get("error_messages", []), [])
+        mock_generator_instance.set_invocation_property.assert_not_called() # Không có diagnostics của Tier 1
+
+    @patch('src.orchestrator.nodes.SarifGenerator')
+    def test_generate_sarif_reports_tier1_resource_usage(self, MockSarifGenerator):
+        MockSarifGenerator.return_value.get_sarif_report.return_value = self.mock_sarif_dict
+        diagnostics = [{"tool_id": "linters.python", "target": "1 files", "wall_seconds": 0.2}]
+        initial_state: GraphState = {
+            "shared_context": self.shared_context, "files_to_review": [], "tier1_tool_results": {}, "tier1_tool_diagnostics": diagnostics,
+            "agent_findings": [], "error_messages": [], "final_sarif_report": None,
+        }
+        generate_sarif_report_node(initial_state)
+        MockSarifGenerator.return_value.set_invocation_property.assert_called_once_with("tier1ToolResourceUsage", diagnostics)
 
     @patch('src.orchestrator.nodes.SarifGenerator') 
     def test_generate_sarif_with_initial_errors(self, MockSarifGenerator):
@@ -811,8 +1006,8 @@ class TestOrchestratorNodes_GenerateSarif(unittest.TestCase):
         
         mock_generator_instance.get_sarif_report.assert_called_once()
         self.assertEqual(result_update["final_sarif_report"], self.mock_sarif_dict)
-        # error_messages gốc được giữ lại
-        self.assertEqual(result_update.get("error_messages", []), ["Tool X failed earlier"])
+        # Không có lỗi mới (lỗi gốc vẫn nằm trong state)
+        self.assertEqual(result_update.get("error_messages", []), [])
 
 
     @patch('src.orchestrator.nodes.SarifGenerator') 
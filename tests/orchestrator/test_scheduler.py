@@ -0,0 +1,307 @@
+# NOVAGUARD-AI/tests/orchestrator/test_scheduler.py
+
+import sys
+import time
+import asyncio
+import threading
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import MagicMock
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.core.shared_context import ChangedFile
+from src.core.ollama_client import OllamaClientWrapper
+from src.orchestrator.scheduler import AgentWorkQueueScheduler, EndpointConcurrencyLimiter
+
+
+class FakeAgent:
+    """Agent giả lập: trả về một finding cho mỗi file, có thể chậm hoặc lỗi theo file."""
+    supported_languages = ["python"]
+    delays = {}
+    failing_paths = set()
+    in_flight = 0
+    max_in_flight_seen = 0
+    lock = threading.Lock()
+
+    def __init__(self, config, ollama_client, prompt_manager):
+        self.name = type(self).__name__
+
+    def review(self, files_data, tier1_tool_results=None, pr_context=None):
+        file_data = files_data[0]
+        with FakeAgent.lock:
+            FakeAgent.in_flight += 1
+            FakeAgent.max_in_flight_seen = max(FakeAgent.max_in_flight_seen, FakeAgent.in_flight)
+        try:
+            time.sleep(self.delays.get(file_data.path, 0.01))
+            if file_data.path in self.failing_paths:
+                raise RuntimeError("LLM unavailable")
+            return [{"rule_id": f"{self.name}.x", "file_path": file_data.path}]
+        finally:
+            with FakeAgent.lock:
+                FakeAgent.in_flight -= 1
+
+    async def areview(self, files_data, tier1_tool_results=None, pr_context=None):
+        file_data = files_data[0]
+        FakeAgent.in_flight += 1
+        FakeAgent.max_in_flight_seen = max(FakeAgent.max_in_flight_seen, FakeAgent.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(file_data.path, 0.01))
+            if file_data.path in self.failing_paths:
+                raise RuntimeError("LLM unavailable")
+            return [{"rule_id": f"{self.name}.x", "file_path": file_data.path}]
+        finally:
+            FakeAgent.in_flight -= 1
+
+
+class FakeStyleAgent(FakeAgent):
+    pass
+
+
+class FakeBugAgent(FakeAgent):
+    pass
+
+
+class FakeOptAgent(FakeAgent):
+    pass
+
+
+class ModelTrackingClient:
+    """Client giả lập ghi lại thứ tự pin/release và model của từng request."""
+
+    def __init__(self, events: List[str]):
+        self.base_url = "http://mock-ollama:11434"
+        self.model_switches = 0
+        self.events = events
+        self.last_model = None
+        self.lock = threading.Lock()
+
+    def use(self, model_name: str) -> None:
+        with self.lock:
+            if self.last_model is not None and self.last_model != model_name:
+                self.model_switches += 1
+            self.last_model = model_name
+            self.events.append(f"run:{model_name}")
+
+    def pin_model(self, model_name: str) -> None:
+        self.events.append(f"pin:{model_name}")
+
+    def release_model(self, model_name: str) -> None:
+        self.events.append(f"release:{model_name}")
+
+
+class TestAgentWorkQueueScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_config = MagicMock(spec=Config)
+        self.mock_config.ollama_base_url = "http://mock-ollama:11434"
+        self.mock_config.get_orchestration_setting.return_value = None
+        self.mock_client = MagicMock()
+        self.mock_client.base_url = "http://mock-ollama:11434"
+        FakeAgent.delays = {}
+        FakeAgent.failing_paths = set()
+        FakeAgent.in_flight = 0
+        FakeAgent.max_in_flight_seen = 0
+        self.files = [
+            ChangedFile(path="a.py", content="", language="python"),
+            ChangedFile(path="b.py", content="", language="python"),
+            ChangedFile(path="notes.md", content="", language="markdown"),
+            ChangedFile(path="c.py", content="", language="python"),
+        ]
+
+    def _make_scheduler(self, **kwargs) -> AgentWorkQueueScheduler:
+        return AgentWorkQueueScheduler(
+            config=self.mock_config,
+            agent_classes=[("Style", FakeStyleAgent), ("Bug", FakeBugAgent)],
+            ollama_client=self.mock_client,
+            prompt_manager=MagicMock(),
+            **kwargs
+        )
+
+    def test_build_work_items_filters_unsupported_languages(self):
+        scheduler = self._make_scheduler()
+        items = scheduler.build_work_items(self.files)
+        self.assertEqual([(i.agent_name, i.file.path) for i in items], [
+            ("Style", "a.py"), ("Style", "b.py"), ("Style", "c.py"),
+            ("Bug", "a.py"), ("Bug", "b.py"), ("Bug", "c.py"),
+        ])
+        self.assertEqual([i.index for i in items], list(range(6)))
+
+    def test_results_are_merged_in_deterministic_order(self):
+        # File đầu tiên chạy chậm nhất nên sẽ hoàn thành cuối cùng
+        FakeAgent.delays = {"a.py": 0.2}
+        scheduler = self._make_scheduler(max_workers=6, max_in_flight_per_endpoint=6)
+        findings, errors = scheduler.run(self.files)
+        self.assertEqual(errors, [])
+        self.assertEqual([(f["rule_id"], f["file_path"]) for f in findings], [
+            ("FakeStyleAgent.x", "a.py"), ("FakeStyleAgent.x", "b.py"), ("FakeStyleAgent.x", "c.py"),
+            ("FakeBugAgent.x", "a.py"), ("FakeBugAgent.x", "b.py"), ("FakeBugAgent.x", "c.py"),
+        ])
+        self.assertEqual(len(scheduler.item_latencies), 6)
+
+    def test_max_in_flight_per_endpoint_is_respected(self):
+        FakeAgent.delays = {"a.py": 0.05, "b.py": 0.05, "c.py": 0.05}
+        scheduler = self._make_scheduler(max_workers=6, max_in_flight_per_endpoint=2)
+        scheduler.run(self.files)
+        self.assertEqual(FakeAgent.max_in_flight_seen, 2)
+
+    def test_balanced_client_leaves_the_limit_to_the_balancer_and_logs_the_serving_endpoint(self):
+        FakeAgent.delays = {"a.py": 0.05, "b.py": 0.05, "c.py": 0.05}
+        client = OllamaClientWrapper(base_url="http://primary:11434", backend="native")
+        client.balancer = MagicMock(base_urls=["http://primary:11434", "http://host-b:11434"], endpoints=[1, 2], max_in_flight_per_endpoint=2)
+        served_by = {"a.py": "http://host-b:11434", "b.py": "http://primary:11434", "c.py": "http://host-b:11434"}
+        def review(agent_self, files_data, tier1_tool_results=None, pr_context=None):
+            client._record_model_use(served_by[files_data[0].path], "coder:7b") # Như khi balancer chọn endpoint
+            return FakeAgent.review(agent_self, files_data, tier1_tool_results, pr_context)
+        agent_class = type("RoutedAgent", (FakeAgent,), {"review": review})
+        scheduler = AgentWorkQueueScheduler(
+            config=self.mock_config, agent_classes=[("Style", agent_class), ("Bug", agent_class)],
+            ollama_client=client, prompt_manager=MagicMock(), max_workers=6, max_in_flight_per_endpoint=1
+        )
+        with self.assertLogs("src.orchestrator.scheduler", level="INFO") as logs:
+            scheduler.run(self.files)
+        # Không giới hạn theo base_url chính: balancer giới hạn từng endpoint nó chọn
+        self.assertGreater(FakeAgent.max_in_flight_seen, 1)
+        self.assertTrue(any("Style:a.py finished" in line and "endpoint http://host-b:11434," in line for line in logs.output))
+        self.assertTrue(any("Bug:b.py finished" in line and "endpoint http://primary:11434," in line for line in logs.output))
+        self.assertTrue(any("max 2 in flight per endpoint (2 endpoints)" in line for line in logs.output))
+
+    def test_failed_items_are_reported_without_losing_other_results(self):
+        FakeAgent.failing_paths = {"b.py"}
+        scheduler = self._make_scheduler(max_workers=3)
+        findings, errors = scheduler.run(self.files)
+        self.assertEqual(len(findings), 4)
+        self.assertEqual(errors, [
+            "Error during Style execution for b.py: LLM unavailable",
+            "Error during Bug execution for b.py: LLM unavailable",
+        ])
+
+    def test_arun_keeps_order_limits_endpoint_and_reports_errors(self):
+        FakeAgent.delays = {"a.py": 0.1, "b.py": 0.02, "c.py": 0.02}
+        FakeAgent.failing_paths = {"c.py"}
+        scheduler = self._make_scheduler(max_workers=6, max_in_flight_per_endpoint=3)
+        findings, errors = asyncio.run(scheduler.arun(self.files))
+        self.assertEqual(FakeAgent.max_in_flight_seen, 3)
+        self.assertEqual([(f["rule_id"], f["file_path"]) for f in findings], [
+            ("FakeStyleAgent.x", "a.py"), ("FakeStyleAgent.x", "b.py"),
+            ("FakeBugAgent.x", "a.py"), ("FakeBugAgent.x", "b.py"),
+        ])
+        self.assertEqual(errors, [
+            "Error during Style execution for c.py: LLM unavailable",
+            "Error during Bug execution for c.py: LLM unavailable",
+        ])
+
+    def test_settings_fall_back_to_config_then_defaults(self):
+        self.mock_config.get_orchestration_setting.side_effect = lambda key, default=None: {"max_workers": 8}.get(key, default)
+        scheduler = self._make_scheduler()
+        self.assertEqual(scheduler.max_workers, 8)
+        self.assertEqual(scheduler.max_in_flight_per_endpoint, 2)
+
+
+class TestModelAffinityScheduling(unittest.TestCase):
+
+    def setUp(self):
+        self.models = {"Style": "model-a", "Bug": "model-b", "Opt": "model-a"}
+        self.mock_config = MagicMock(spec=Config)
+        self.mock_config.ollama_base_url = "http://mock-ollama:11434"
+        self.mock_config.get_orchestration_setting.side_effect = lambda key, default=None: {"agent_scheduler": "model_affinity"}.get(key, default)
+        self.mock_config.get_model_for_agent.side_effect = lambda name: self.models[name]
+        self.events: List[str] = []
+        self.client = ModelTrackingClient(self.events)
+        FakeAgent.delays = {}
+        FakeAgent.failing_paths = set()
+        self.files = [ChangedFile(path="a.py", content="", language="python"), ChangedFile(path="b.py", content="", language="python")]
+
+        client = self.client
+        self.calls: List[tuple] = []
+        def tracked_review(agent_self, files_data, tier1_tool_results=None, pr_context=None):
+            client.use(self.models[agent_self.scheduler_name])
+            self.calls.append((files_data[0].path, agent_self.scheduler_name, threading.current_thread().name))
+            return [{"rule_id": f"{agent_self.name}.x", "file_path": files_data[0].path}]
+        async def tracked_areview(agent_self, files_data, tier1_tool_results=None, pr_context=None):
+            return tracked_review(agent_self, files_data, tier1_tool_results, pr_context)
+        self.agent_classes = [
+            (name, type(f"Tracked{cls.__name__}", (cls,), {"scheduler_name": name, "review": tracked_review, "areview": tracked_areview}))
+            for name, cls in [("Style", FakeStyleAgent), ("Bug", FakeBugAgent), ("Opt", FakeOptAgent)]
+        ]
+
+    def _make_scheduler(self, **kwargs) -> AgentWorkQueueScheduler:
+        return AgentWorkQueueScheduler(
+            config=self.mock_config, agent_classes=self.agent_classes, ollama_client=self.client,
+            prompt_manager=MagicMock(), max_workers=4, **kwargs
+        )
+
+    def _assert_grouped_run(self, scheduler: AgentWorkQueueScheduler, findings) -> None:
+        self.assertTrue(scheduler.model_affinity)
+        self.assertEqual(self.events, [
+            "pin:model-a", "run:model-a", "run:model-a", "run:model-a", "run:model-a", "release:model-a",
+            "pin:model-b", "run:model-b", "run:model-b", "release:model-b",
+        ])
+        self.assertEqual(scheduler.model_switches, 1)
+        # Kết quả vẫn theo thứ tự agent rồi file
+        self.assertEqual([f["file_path"] for f in findings], ["a.py", "b.py"] * 3)
+        self.assertEqual(findings[2]["rule_id"], "TrackedFakeBugAgent.x")
+
+    def test_run_drains_one_model_at_a_time(self):
+        scheduler = self._make_scheduler()
+        self.assertEqual([item.model_name for item in scheduler.build_work_items(self.files)], ["model-a"] * 2 + ["model-b"] * 2 + ["model-a"] * 2)
+        findings, errors = scheduler.run(self.files)
+        self.assertEqual(errors, [])
+        self._assert_grouped_run(scheduler, findings)
+
+    def test_arun_drains_one_model_at_a_time(self):
+        scheduler = self._make_scheduler()
+        findings, errors = asyncio.run(scheduler.arun(self.files))
+        self.assertEqual(errors, [])
+        self._assert_grouped_run(scheduler, findings)
+
+    def test_without_affinity_models_interleave(self):
+        scheduler = self._make_scheduler(model_affinity=False)
+        scheduler.max_workers = 1
+        scheduler.run(self.files)
+        self.assertNotIn("pin:model-a", self.events)
+        self.assertEqual(scheduler.model_switches, 2) # a -> b -> a
+
+
+    def test_shared_prefix_layout_runs_each_file_back_to_back(self):
+        settings = {"agent_scheduler": "model_affinity", "prompt_layout": "shared_prefix"}
+        self.mock_config.get_orchestration_setting.side_effect = lambda key, default=None: settings.get(key, default)
+        scheduler = self._make_scheduler()
+        self.assertTrue(scheduler.chain_by_file)
+        findings, errors = scheduler.run(self.files)
+        self.assertEqual(errors, [])
+        self._assert_grouped_run(scheduler, findings)
+        # Các agent cùng model của một file chạy nối tiếp nhau (theo thứ tự agent) trên cùng một worker
+        for path in ("a.py", "b.py"):
+            model_a_calls = [(agent, thread) for file_path, agent, thread in self.calls if file_path == path and agent != "Bug"]
+            self.assertEqual([agent for agent, _ in model_a_calls], ["Style", "Opt"])
+            self.assertEqual(len({thread for _, thread in model_a_calls}), 1)
+
+        self.events.clear()
+        self.client.last_model = None
+        findings, errors = asyncio.run(scheduler.arun(self.files))
+        self.assertEqual(errors, [])
+        self._assert_grouped_run(scheduler, findings)
+
+
+class TestEndpointConcurrencyLimiter(unittest.TestCase):
+
+    def test_limits_are_tracked_per_endpoint(self):
+        limiter = EndpointConcurrencyLimiter(max_in_flight_per_endpoint=1)
+        acquired: List[str] = []
+        with limiter.slot("http://host-a"):
+            # Endpoint khác không bị chặn bởi slot đang giữ của host-a
+            with limiter.slot("http://host-b"):
+                acquired.append("b")
+            self.assertFalse(limiter._get_semaphore("http://host-a").acquire(blocking=False))
+        self.assertEqual(acquired, ["b"])
+        self.assertTrue(limiter._get_semaphore("http://host-a").acquire(blocking=False))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# NOVAGUARD-AI/tests/orchestrator/test_tool_executor.py
+
+import os
+import sys
+import time
+import threading
+import unittest
+from pathlib import Path
+from typing import List
+from unittest.mock import MagicMock, patch
+
+# Thêm src vào sys.path
+project_root = Path(__file__).resolve().parent.parent.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from src.core.config_loader import Config
+from src.orchestrator.tool_executor import (
+    Tier1ToolExecutor, ToolJob, get_tier1_max_workers, get_tool_concurrency_class,
+    CONCURRENCY_EXCLUSIVE, CONCURRENCY_PARALLEL, DEFAULT_TIER1_MAX_WORKERS
+)
+
+
+class ConcurrencyTracker:
+    """Đếm số job đang chạy cùng lúc và ghi lại số job chạy chung với mỗi job exclusive."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.in_flight_during_exclusive: List[int] = []
+
+    def make_job(self, index: int, concurrency: str, delay: float = 0.05, fail: bool = False) -> ToolJob:
+        def run(errors: List[str]):
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                if concurrency == CONCURRENCY_EXCLUSIVE:
+                    self.in_flight_during_exclusive.append(self.in_flight)
+            try:
+                time.sleep(delay)
+                if fail:
+                    raise RuntimeError(f"boom {index}")
+                if index == 0:
+                    errors.append(f"note {index}")
+                return [{"job": index}]
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+        return ToolJob(index=index, tool_id=f"cat.tool{index}", target=f"file{index}.py", concurrency=concurrency, run=run)
+
+
+class TestTier1ToolExecutor(unittest.TestCase):
+
+    def test_parallel_jobs_run_n_wide_and_keep_job_order(self):
+        tracker = ConcurrencyTracker()
+        # Job đầu chậm nhất để kết quả hoàn thành không theo thứ tự
+        jobs = [tracker.make_job(i, CONCURRENCY_PARALLEL, delay=0.15 if i == 0 else 0.05) for i in range(6)]
+        results = Tier1ToolExecutor(max_workers=3).run(jobs)
+
+        self.assertEqual([r.index for r in results], list(range(6)))
+        self.assertEqual([r.findings for r in results], [[{"job": i}] for i in range(6)])
+        self.assertEqual(results[0].error_messages, ["note 0"])
+        self.assertEqual(tracker.max_in_flight, 3)
+
+    def test_exclusive_jobs_run_alone(self):
+        tracker = ConcurrencyTracker()
+        jobs = [
+            tracker.make_job(0, CONCURRENCY_PARALLEL),
+            tracker.make_job(1, CONCURRENCY_EXCLUSIVE),
+            tracker.make_job(2, CONCURRENCY_PARALLEL),
+            tracker.make_job(3, CONCURRENCY_EXCLUSIVE),
+            tracker.make_job(4, CONCURRENCY_PARALLEL),
+        ]
+        results = Tier1ToolExecutor(max_workers=4).run(jobs)
+
+        self.assertEqual([r.index for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual(tracker.in_flight_during_exclusive, [1, 1])
+        self.assertEqual(tracker.max_in_flight, 3)
+
+    def test_job_exception_is_collected_as_error(self):
+        tracker = ConcurrencyTracker()
+        jobs = [tracker.make_job(0, CONCURRENCY_PARALLEL, fail=True), tracker.make_job(1, CONCURRENCY_PARALLEL)]
+        results = Tier1ToolExecutor(max_workers=2).run(jobs)
+
+        self.assertEqual(results[0].findings, [])
+        self.assertEqual(len(results[0].error_messages), 1)
+        self.assertIn("boom 0", results[0].error_messages[0])
+        self.assertEqual(results[1].findings, [{"job": 1}])
+
+    def test_single_worker_runs_sequentially(self):
+        tracker = ConcurrencyTracker()
+        results = Tier1ToolExecutor(max_workers=1).run([tracker.make_job(i, CONCURRENCY_PARALLEL, delay=0.01) for i in range(3)])
+        self.assertEqual(len(results), 3)
+        self.assertEqual(tracker.max_in_flight, 1)
+
+
+class TestTier1Settings(unittest.TestCase):
+
+    def test_concurrency_class_defaults_and_overrides(self):
+        self.assertEqual(get_tool_concurrency_class("pylint {file_path}", is_project_tool=False), CONCURRENCY_PARALLEL)
+        self.assertEqual(get_tool_concurrency_class({"command": "x"}, is_project_tool=True), CONCURRENCY_EXCLUSIVE)
+        self.assertEqual(get_tool_concurrency_class({"command": "x", "concurrency": "Exclusive"}, is_project_tool=False), CONCURRENCY_EXCLUSIVE)
+        self.assertEqual(get_tool_concurrency_class({"command": "x", "concurrency": "parallel"}, is_project_tool=True), CONCURRENCY_PARALLEL)
+        self.assertEqual(get_tool_concurrency_class({"command": "x", "concurrency": "bogus"}, is_project_tool=True), CONCURRENCY_EXCLUSIVE)
+
+    def test_max_workers_from_config_and_env(self):
+        config = MagicMock(spec=Config)
+        config.get_orchestration_setting.return_value = 6
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_TIER1_MAX_WORKERS", None)
+            self.assertEqual(get_tier1_max_workers(config), 6)
+        with patch.dict(os.environ, {"NOVAGUARD_TIER1_MAX_WORKERS": "2"}):
+            self.assertEqual(get_tier1_max_workers(config), 2)
+        with patch.dict(os.environ, {"NOVAGUARD_TIER1_MAX_WORKERS": "many"}):
+            self.assertEqual(get_tier1_max_workers(config), 6)
+        config.get_orchestration_setting.return_value = 0
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_TIER1_MAX_WORKERS", None)
+            self.assertEqual(get_tier1_max_workers(config), DEFAULT_TIER1_MAX_WORKERS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,9 +8,11 @@ import tempfile
 import yaml
 import copy
 import json # Cần json
+import asyncio
+import threading
 import traceback # Cần traceback
 from typing import Dict, Any, Optional, List
-from unittest.mock import patch, MagicMock, call, ANY # Import ANY nếu cần
+from unittest.mock import patch, MagicMock, AsyncMock, call, ANY # Import ANY nếu cần
 
 # Thêm src vào sys.path
 project_root = Path(__file__).resolve().parent.parent
@@ -176,6 +178,106 @@ class TestIntegrationGraphRun(unittest.TestCase):
         self.assertIn("final_sarif_report", final_state)
         self.assertEqual(final_state["final_sarif_report"], self.mock_final_sarif)
 
+    @patch('src.orchestrator.nodes.SarifGenerator')
+    @patch('src.orchestrator.nodes.OllamaClientWrapper')
+    @patch('src.orchestrator.nodes.ToolRunner')
+    @patch('src.orchestrator.nodes.MetaReviewerAgent')
+    @patch('src.orchestrator.nodes.OptiTuneAgent')
+    @patch('src.orchestrator.nodes.SecuriSenseAgent')
+    @patch('src.orchestrator.nodes.BugHunterAgent')
+    @patch('src.orchestrator.nodes.StyleGuardianAgent')
+    def test_graph_invocation_parallel_agents(
+        self, MockStyleAgent, MockBugAgent, MockSecAgent, MockOptiAgent, MockMetaAgent,
+        MockToolRunner, MockOllamaClient, MockSarifGenerator):
+        """Parallel mode: the 4 agents run concurrently and their findings/errors are merged."""
+        self.config.orchestration_config["parallel_agents"] = True
+        MockToolRunner.return_value.run.return_value = None
+        MockSarifGenerator.return_value.get_sarif_report.return_value = self.mock_final_sarif
+
+        # Mỗi agent chờ tại barrier: chỉ vượt qua được nếu cả 4 agent đang chạy cùng lúc.
+        all_agents_running = threading.Barrier(4, timeout=10)
+        def make_review(findings):
+            def review(**kwargs):
+                all_agents_running.wait()
+                return findings
+            return review
+        MockStyleAgent.return_value.review.side_effect = make_review(self.mock_style_finding_list)
+        MockBugAgent.return_value.review.side_effect = make_review(self.mock_bug_finding_list)
+        MockSecAgent.return_value.review.side_effect = make_review(self.mock_sec_finding_list)
+        def failing_opti_review(**kwargs):
+            all_agents_running.wait()
+            raise RuntimeError("OptiTune exploded")
+        MockOptiAgent.return_value.review.side_effect = failing_opti_review
+
+        initial_state = {
+            "shared_context": self.shared_context,
+            "files_to_review": copy.deepcopy(self.sample_files),
+            "tier1_tool_results": {}, "agent_findings": [], "error_messages": ["pre-existing error"],
+            "final_sarif_report": None,
+        }
+        app = get_compiled_graph(app_config=self.config)
+        final_state = app.invoke(initial_state)
+
+        rule_ids = sorted(f["rule_id"] for f in final_state["agent_findings"])
+        expected_rule_ids = sorted(f["rule_id"] for f in self.mock_style_finding_list + self.mock_bug_finding_list + self.mock_sec_finding_list)
+        self.assertEqual(rule_ids, expected_rule_ids)
+        errors = final_state["error_messages"]
+        self.assertEqual(errors[0], "pre-existing error")
+        self.assertEqual(len(errors), 2, f"Unexpected errors: {errors}")
+        self.assertIn("Error during OptiTune execution: OptiTune exploded", errors[1])
+
+    @patch('src.orchestrator.nodes.SarifGenerator')
+    @patch('src.orchestrator.nodes.OllamaClientWrapper')
+    @patch('src.orchestrator.nodes.ToolRunner')
+    @patch('src.orchestrator.nodes.MetaReviewerAgent')
+    @patch('src.orchestrator.nodes.OptiTuneAgent')
+    @patch('src.orchestrator.nodes.SecuriSenseAgent')
+    @patch('src.orchestrator.nodes.BugHunterAgent')
+    @patch('src.orchestrator.nodes.StyleGuardianAgent')
+    def test_graph_ainvoke_async_pipeline(
+        self, MockStyleAgent, MockBugAgent, MockSecAgent, MockOptiAgent, MockMetaAgent,
+        MockToolRunner, MockOllamaClient, MockSarifGenerator):
+        """Async pipeline: ainvoke awaits every agent's areview() concurrently on one event loop."""
+        self.config.orchestration_config["parallel_agents"] = True
+        self.config.orchestration_config["async_pipeline"] = True
+        self.config.orchestration_config["max_in_flight_per_endpoint"] = 4
+        MockToolRunner.return_value.run.return_value = None
+        MockSarifGenerator.return_value.get_sarif_report.return_value = self.mock_final_sarif
+
+        in_flight = {"now": 0, "max": 0}
+        def make_areview(findings):
+            async def areview(**kwargs):
+                async with kwargs["request_semaphore"]:
+                    in_flight["now"] += 1
+                    in_flight["max"] = max(in_flight["max"], in_flight["now"])
+                    await asyncio.sleep(0.05)
+                    in_flight["now"] -= 1
+                return findings
+            return AsyncMock(side_effect=areview)
+        MockStyleAgent.return_value.areview = make_areview(self.mock_style_finding_list)
+        MockBugAgent.return_value.areview = make_areview(self.mock_bug_finding_list)
+        MockSecAgent.return_value.areview = make_areview(self.mock_sec_finding_list)
+        MockOptiAgent.return_value.areview = make_areview(self.mock_opti_finding_list)
+
+        initial_state = {
+            "shared_context": self.shared_context,
+            "files_to_review": copy.deepcopy(self.sample_files),
+            "tier1_tool_results": {}, "agent_findings": [], "error_messages": [],
+            "final_sarif_report": None,
+        }
+        with patch.dict(os.environ, {}, clear=False):
+            os.environ.pop("NOVAGUARD_ASYNC_PIPELINE", None)
+            app = get_compiled_graph(app_config=self.config)
+        final_state = asyncio.run(app.ainvoke(initial_state))
+
+        self.assertEqual(in_flight["max"], 4)
+        MockStyleAgent.return_value.review.assert_not_called()
+        rule_ids = sorted(f["rule_id"] for f in final_state["agent_findings"])
+        expected_rule_ids = sorted(f["rule_id"] for f in self.mock_style_finding_list + self.mock_bug_finding_list + self.mock_sec_finding_list + self.mock_opti_finding_list)
+        self.assertEqual(rule_ids, expected_rule_ids)
+        self.assertEqual(final_state["error_messages"], [])
+        self.assertEqual(final_state["final_sarif_report"], self.mock_final_sarif)
+
 # --- Main execution ---
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file